@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重複タイムスタンプ統合のベンチマークスクリプト
+10万行の入力で、従来のdict再構築ループと consolidate.py の consolidate_max の処理時間を比較
+"""
+
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from consolidate import consolidate_max
+
+ROWS = 100_000
+REPEAT = 5
+START = datetime(2025, 8, 1, tzinfo=timezone.utc)
+
+
+def make_records(rows, duplicate_ratio):
+    """duplicate_ratioの割合で既出タイムスタンプを含む行を作成"""
+    random.seed(0)
+    unique = max(1, int(rows * (1 - duplicate_ratio)))
+    timestamps = [(START + timedelta(minutes=5 * i)).isoformat() for i in range(unique)]
+    records = []
+    for i in range(rows):
+        ts = timestamps[i] if i < unique else random.choice(timestamps)
+        records.append({'id': i, 'timestamp': ts, 'ask_total': random.uniform(1000, 5000),
+                        'bid_total': random.uniform(1000, 5000), 'price': random.uniform(110000, 120000),
+                        'group_id': 'default-group'})
+    return records
+
+
+def legacy_consolidate(records):
+    """従来の各fetch関数にあったループ"""
+    consolidated_data = {}
+    for record in records:
+        ts = record['timestamp']
+        if ts not in consolidated_data:
+            consolidated_data[ts] = record
+        else:
+            existing = consolidated_data[ts]
+            consolidated_data[ts] = {
+                'timestamp': ts,
+                'ask_total': max(record['ask_total'], existing['ask_total']),
+                'bid_total': max(record['bid_total'], existing['bid_total']),
+                'price': record['price']
+            }
+    return list(consolidated_data.values())
+
+
+def measure(func, *args):
+    best = float('inf')
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    print(f"=== 重複タイムスタンプ統合ベンチマーク（{ROWS:,}行、{REPEAT}回の最小値） ===\n")
+
+    for ratio in (0.0, 0.1, 0.5, 0.9):
+        records = make_records(ROWS, ratio)
+        assert [(r['timestamp'], r['ask_total'], r['bid_total'], r['price']) for r in consolidate_max(records)] == \
+            [(r['timestamp'], r['ask_total'], r['bid_total'], r['price']) for r in legacy_consolidate(records)]
+
+        print(f"重複率 {int(ratio * 100)}%:")
+        print(f"  従来ループ      : {measure(legacy_consolidate, records):8.1f} ms")
+        print(f"  consolidate_max : {measure(consolidate_max, records):8.1f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クラウド書き込み方式（cloud_sync.transport）のベンチマークスクリプト
+同じサンプル列を CloudSyncManager に流し、書き込み方式ごとのリクエスト数・処理時間・保存行数を比較する。
+rest / bulk_rpc は擬似ネットワーク遅延付きの LocalPostgrestClient に、memory はメモリ上のdictに書き込む
+
+  python benchmark_transports.py                        # 24時間分（20秒間隔）、1リクエスト20ms
+  python benchmark_transports.py --hours 6 --latency-ms 50 --window 0.5
+
+結果の行がすべての方式で一致することも確認する
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from cloud_transport import InMemoryTransport
+from local_postgrest import LocalPostgrestClient
+from sync_scheduler import TABLE_INTERVALS
+
+START = datetime(2025, 8, 4, tzinfo=timezone.utc)
+
+# (表示名, 設定)
+CASES = [
+    ('rest（SELECT→書き込み）', {'transport': 'rest', 'use_rpc_upsert': False}),
+    ('rest（1行ずつRPC）', {'transport': 'rest'}),
+    ('bulk_rpc', {'transport': 'bulk_rpc'}),
+    ('memory', {'transport': 'memory'}),
+]
+
+
+def make_samples(hours, interval_seconds):
+    """interval_seconds間隔のサンプル（タイムスタンプ, Ask, Bid, 価格）を作成"""
+    random.seed(0)
+    samples = []
+    for i in range(int(hours * 3600 / interval_seconds)):
+        ts = START + timedelta(seconds=i * interval_seconds)
+        samples.append((ts.isoformat(), random.uniform(1000, 5000), random.uniform(1000, 5000),
+                        random.uniform(110000, 120000)))
+    return samples
+
+
+def make_manager(options, latency, window):
+    options = dict(options)
+    # memory方式は設定では選べないため、トランスポートを直接渡す
+    transport = InMemoryTransport() if options.get('transport') == 'memory' else None
+    if transport is not None:
+        del options['transport']
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': dict(options, batch_window_seconds=window)}, f)
+    client = LocalPostgrestClient(latency=latency)
+    manager = CloudSyncManager(config_path=config_path, client=client, transport=transport)
+    if not window:
+        # ワーカースレッドを介さずに書き込み、書き込み方式そのものの時間を測る
+        manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    return manager, client
+
+
+def table_rows(manager, client, table_name):
+    """保存された行を (タイムスタンプ, Ask, Bid) のリストで返す"""
+    if manager.transport_name == 'memory':
+        rows = manager.transport.rows(table_name)
+    else:
+        rows = client.table(table_name).select('*').eq('group_id', manager.group_id).execute().data
+    return sorted((row['timestamp'][:19], round(row['ask_total'], 6), round(row['bid_total'], 6)) for row in rows)
+
+
+def run_case(options, samples, latency, window):
+    manager, client = make_manager(options, latency, window)
+    started = time.perf_counter()
+    for sample in samples:
+        manager.sync_data_async(*sample)
+    manager.shutdown_writes(timeout=60)
+    elapsed = time.perf_counter() - started
+    stats = manager.transport.get_stats()
+    rows = {table_name: table_rows(manager, client, table_name) for table_name in TABLE_INTERVALS}
+    return elapsed, stats, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='クラウド書き込み方式のベンチマーク')
+    parser.add_argument('--hours', type=float, default=24, help='サンプルの期間（時間）')
+    parser.add_argument('--interval', type=float, default=20, help='サンプル間隔（秒）')
+    parser.add_argument('--latency-ms', type=float, default=20, help='1リクエストあたりの擬似ネットワーク遅延（ミリ秒）')
+    parser.add_argument('--window', type=float, default=0.0, help='cloud_sync.batch_window_seconds（0なら同期的に書き込む）')
+    args = parser.parse_args()
+    # 切り替え時の警告などは表示しない
+    logging.basicConfig(level=logging.ERROR)
+
+    samples = make_samples(args.hours, args.interval)
+    print(f"=== クラウド書き込み方式のベンチマーク（{len(samples):,}サンプル、"
+          f"遅延 {args.latency_ms:g}ms/リクエスト、窓 {args.window:g}秒） ===\n")
+    print(f"{'方式':<26}{'リクエスト':>10}{'保存行':>8}{'時間(秒)':>10}{'行/秒':>10}")
+
+    expected = None
+    for name, options in CASES:
+        elapsed, stats, rows = run_case(options, samples, args.latency_ms / 1000, args.window)
+        if expected is None:
+            expected = rows
+        elif rows != expected:
+            raise AssertionError(f"{name} の保存結果が他の方式と一致しません")
+        rate = stats['rows'] / elapsed if elapsed > 0 else float('inf')
+        print(f"{name:<26}{stats['requests']:>10,}{stats['rows']:>8,}{elapsed:>10.2f}{rate:>10,.0f}")
+
+    print("\n全ての方式で保存結果が一致しました")
+    print("memory は通信を含まない同期処理自体の時間。通常は bulk_rpc、関数を作成できない環境では rest を選ぶ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+グラフ表示用の範囲クエリデータソース
+表示範囲＋先読みマージン分のデータを時間足テーブルから範囲クエリ（timestamp BETWEEN）で
+バックグラウンドスレッドにて取得し、一定期間ごとのブロック単位でLRUキャッシュする
+"""
+
+import sqlite3
+import threading
+import queue
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+# 各時間足テーブルの間隔（秒）
+TABLE_INTERVAL_SECONDS = {
+    'order_book_5min': 300,
+    'order_book_15min': 900,
+    'order_book_30min': 1800,
+    'order_book_1hour': 3600,
+    'order_book_2hour': 7200,
+    'order_book_4hour': 14400,
+    'order_book_daily': 86400
+}
+
+
+class ChartRangeSource:
+    """時間足テーブルの範囲データをブロック単位で非同期取得・キャッシュする"""
+
+    def __init__(self, db_path: str, block_points: int = 300, max_blocks: int = 64,
+                 prefetch_ratio: float = 0.5, max_request_blocks: int = 16):
+        """
+        Args:
+            db_path: SQLiteデータベースのパス
+            block_points: 1ブロックあたりの足の本数
+            max_blocks: キャッシュする最大ブロック数（全テーブル合計）
+            prefetch_ratio: 表示幅に対する先読みマージンの割合（左右それぞれ）
+            max_request_blocks: 1回の要求で取得する最大ブロック数（新しい側を優先）
+        """
+        self.db_path = db_path
+        self.block_points = block_points
+        self.max_blocks = max_blocks
+        self.prefetch_ratio = prefetch_ratio
+        self.max_request_blocks = max_request_blocks
+        self.logger = logging.getLogger(__name__)
+
+        # (テーブル名, ブロック番号) -> [(datetime, ask, bid), ...]
+        self._blocks: OrderedDict = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        self._requests: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # 統計情報
+        self.stats = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'queries': 0,
+            'rows_loaded': 0,
+            'evictions': 0,
+            'errors': 0
+        }
+
+    def start(self):
+        """バックグラウンドの取得スレッドを開始"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="ChartRangeSource")
+        self._thread.start()
+
+    def stop(self):
+        """取得スレッドを停止"""
+        if not self._running:
+            return
+        self._running = False
+        self._requests.put(None)
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def request_range(self, table_name: str, start: datetime, end: datetime,
+                      on_ready: Optional[Callable[[str], None]] = None) -> bool:
+        """表示範囲＋先読みマージンのデータ取得を要求（ブロックしない）
+
+        Returns:
+            未取得のブロックがあり取得を開始した場合True（完了時にon_readyが呼ばれる）
+        """
+        if table_name not in TABLE_INTERVAL_SECONDS:
+            return False
+
+        start_epoch, end_epoch = self._to_epoch(start), self._to_epoch(end)
+        margin = (end_epoch - start_epoch) * self.prefetch_ratio
+        block_ids = self._block_ids(table_name, start_epoch - margin, end_epoch + margin)
+        # 極端に広い範囲は新しい側のブロックに限定
+        block_ids = block_ids[-self.max_request_blocks:]
+
+        missing = []
+        with self._lock:
+            for block_id in block_ids:
+                key = (table_name, block_id)
+                if key in self._blocks:
+                    self._blocks.move_to_end(key)
+                    self.stats['cache_hits'] += 1
+                elif key not in self._pending:
+                    self._pending.add(key)
+                    missing.append(key)
+                    self.stats['cache_misses'] += 1
+
+        if not missing:
+            return False
+
+        self._requests.put((missing, on_ready))
+        return True
+
+    def get_range(self, table_name: str, start: datetime, end: datetime) -> List[Tuple[datetime, float, float]]:
+        """キャッシュ済みのデータから指定範囲を取得（DBにはアクセスしない）"""
+        if table_name not in TABLE_INTERVAL_SECONDS:
+            return []
+
+        start_epoch, end_epoch = self._to_epoch(start), self._to_epoch(end)
+        rows = []
+        with self._lock:
+            for block_id in self._block_ids(table_name, start_epoch, end_epoch):
+                block = self._blocks.get((table_name, block_id))
+                if block:
+                    rows.extend(block)
+
+        return [row for row in rows if start_epoch <= self._to_epoch(row[0]) <= end_epoch]
+
+    def invalidate(self, table_name: Optional[str] = None):
+        """キャッシュを破棄（テーブル指定時はそのテーブルのみ）"""
+        with self._lock:
+            for key in list(self._blocks.keys()):
+                if table_name is None or key[0] == table_name:
+                    del self._blocks[key]
+
+    def _block_span(self, table_name: str) -> int:
+        return TABLE_INTERVAL_SECONDS[table_name] * self.block_points
+
+    def _block_ids(self, table_name: str, start_epoch: float, end_epoch: float) -> range:
+        span = self._block_span(table_name)
+        return range(int(start_epoch // span), int(end_epoch // span) + 1)
+
+    @staticmethod
+    def _to_epoch(dt: datetime) -> float:
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+
+    def _worker(self):
+        """取得要求を処理（専用のSQLite接続を使用）"""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            while self._running:
+                item = self._requests.get()
+                if item is None:
+                    break
+                keys, on_ready = item
+
+                loaded_tables = set()
+                for table_name, block_id in keys:
+                    try:
+                        rows = self._query_block(conn, table_name, block_id)
+                        with self._lock:
+                            self._blocks[(table_name, block_id)] = rows
+                            self._blocks.move_to_end((table_name, block_id))
+                            while len(self._blocks) > self.max_blocks:
+                                self._blocks.popitem(last=False)
+                                self.stats['evictions'] += 1
+                        loaded_tables.add(table_name)
+                    except Exception as e:
+                        self.stats['errors'] += 1
+                        self.logger.error(f"[{table_name}] 範囲データ取得エラー: {e}")
+                    finally:
+                        with self._lock:
+                            self._pending.discard((table_name, block_id))
+
+                if on_ready:
+                    for table_name in loaded_tables:
+                        try:
+                            on_ready(table_name)
+                        except Exception as e:
+                            self.logger.error(f"範囲データ通知エラー: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    def _query_block(self, conn: sqlite3.Connection, table_name: str, block_id: int) -> List[Tuple[datetime, float, float]]:
+        """1ブロック分のデータを範囲クエリで取得"""
+        span = self._block_span(table_name)
+        start = datetime.fromtimestamp(block_id * span, tz=timezone.utc)
+        end = datetime.fromtimestamp((block_id + 1) * span - 1, tz=timezone.utc)
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT timestamp, ask_total, bid_total
+            FROM {table_name}
+            WHERE timestamp BETWEEN ? AND ?
+            ORDER BY timestamp
+        """, (start.isoformat(), end.isoformat()))
+
+        rows = [(datetime.fromisoformat(ts), ask, bid) for ts, ask, bid in cursor.fetchall()]
+        self.stats['queries'] += 1
+        self.stats['rows_loaded'] += len(rows)
+        return rows
@@ -0,0 +1,203 @@
+"""
+板推移グラフの描画処理
+Tk埋め込みキャンバスでの通常描画と、ワーカースレッド上の専用Aggキャンバスで
+画像化してTkに渡すオフスレッド描画の両方で共通の描画関数を使用する
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from chart_ticks import apply_time_ticks
+
+
+def draw_depth_chart(ax_ask, ax_bid, times, asks, bids, timeframe):
+    """売り板・買い板のグラフを描画（Figureの再描画は呼び出し側で行う）"""
+    # 各グラフのY軸範囲を計算
+    ask_min = 0
+    ask_max = 1
+    bid_min = 0
+    bid_max = 1
+
+    if asks and bids:
+        # 各板の最小値・最大値を取得
+        min_ask = min(asks)
+        min_bid = min(bids)
+        max_ask = max(asks)
+        max_bid = max(bids)
+
+        # 各板の変動幅を計算
+        ask_range = max_ask - min_ask
+        bid_range = max_bid - min_bid
+
+        # より大きい幅を共通幅として採用（最小幅を設定）
+        common_range = max(ask_range, bid_range, 1.0)  # 最小幅1.0を保証
+
+        # 各グラフの表示範囲を設定（自身の最小値から共通幅分）
+        ask_min = min_ask
+        ask_max = min_ask + common_range
+        bid_min = min_bid
+        bid_max = min_bid + common_range
+
+    # 売り板グラフを更新
+    ax_ask.clear()
+    ax_ask.plot(times, asks, color='#ff6b6b', linewidth=2)
+    ax_ask.fill_between(times, asks, ask_min, color='#ff6b6b', alpha=0.3)
+    ax_ask.grid(True, alpha=0.2, color='#444444')
+    ax_ask.set_facecolor('#1e1e1e')
+    ax_ask.set_ylim(ask_min, ask_max)
+
+    # 売り板のY軸を反転（下向きに表示）
+    ax_ask.invert_yaxis()
+
+    # 買い板グラフを更新
+    ax_bid.clear()
+    ax_bid.plot(times, bids, color='#51cf66', linewidth=2)
+    ax_bid.fill_between(times, bids, bid_min, color='#51cf66', alpha=0.3)
+    ax_bid.grid(True, alpha=0.2, color='#444444')
+    ax_bid.set_facecolor('#1e1e1e')
+    ax_bid.set_ylim(bid_min, bid_max)
+
+    # X軸の設定（最大30ラベル、0時は月/日表示）
+    apply_time_ticks([ax_ask, ax_bid], times, timeframe)
+
+
+class OffThreadChartRenderer:
+    """ワーカースレッドでグラフを画像化し、完成したビットマップを渡すレンダラー"""
+
+    def __init__(self, on_frame: Callable[[Dict[str, Any]], None], dpi: int = 80,
+                 facecolor: str = '#2b2b2b', metrics_window: int = 100):
+        """
+        Args:
+            on_frame: 描画完了時に呼ばれる関数（ワーカースレッドから呼ばれる）
+                      引数は {'width', 'height', 'rgba', 'render_ms', 'submitted_at'}
+            dpi: 描画解像度
+            facecolor: 背景色
+            metrics_window: フレーム時間の統計に使う直近フレーム数
+        """
+        self.on_frame = on_frame
+        self.dpi = dpi
+        self.facecolor = facecolor
+        self.logger = logging.getLogger(__name__)
+
+        # 最新の描画要求のみ保持（古い要求は上書きしてスキップ）
+        self._pending: Optional[Dict[str, Any]] = None
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # フレーム時間の統計
+        self._render_times: deque = deque(maxlen=metrics_window)
+        self._handoff_times: deque = deque(maxlen=metrics_window)
+        self.stats = {
+            'frames_submitted': 0,
+            'frames_rendered': 0,
+            'frames_skipped': 0,
+            'render_errors': 0
+        }
+
+    def start(self):
+        """描画スレッドを開始"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="ChartRenderer")
+        self._thread.start()
+
+    def stop(self):
+        """描画スレッドを停止"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def submit(self, times, asks, bids, timeframe, width: int, height: int, xlim=None):
+        """描画を要求（Tkスレッドから呼び出し、すぐに戻る）"""
+        request = {
+            'times': list(times),
+            'asks': list(asks),
+            'bids': list(bids),
+            'timeframe': timeframe,
+            'width': max(int(width), 100),
+            'height': max(int(height), 100),
+            'xlim': xlim,
+            'submitted_at': time.perf_counter()
+        }
+        with self._condition:
+            if self._pending is not None:
+                self.stats['frames_skipped'] += 1
+            self._pending = request
+            self.stats['frames_submitted'] += 1
+            self._condition.notify()
+
+    def record_handoff(self, frame: Dict[str, Any]):
+        """Tk側で画像を表示し終えた時点で呼び出し、要求から表示までの時間を記録"""
+        self._handoff_times.append((time.perf_counter() - frame['submitted_at']) * 1000)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """フレーム時間の統計を取得（ミリ秒）"""
+        metrics = self.stats.copy()
+        for name, values in (('render_ms', list(self._render_times)),
+                             ('frame_ms', list(self._handoff_times))):
+            if values:
+                ordered = sorted(values)
+                metrics[name] = {
+                    'last': round(values[-1], 1),
+                    'avg': round(sum(values) / len(values), 1),
+                    'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+                    'max': round(ordered[-1], 1)
+                }
+            else:
+                metrics[name] = None
+        return metrics
+
+    def _worker(self):
+        """描画要求を処理（専用のFigureとAggキャンバスを使用）"""
+        fig = Figure(dpi=self.dpi)
+        fig.patch.set_facecolor(self.facecolor)
+        canvas = FigureCanvasAgg(fig)
+        ax_ask = fig.add_subplot(2, 1, 1)
+        ax_bid = fig.add_subplot(2, 1, 2)
+
+        while True:
+            with self._condition:
+                while self._running and self._pending is None:
+                    self._condition.wait()
+                if not self._running:
+                    break
+                request, self._pending = self._pending, None
+
+            try:
+                started = time.perf_counter()
+                fig.set_size_inches(request['width'] / self.dpi, request['height'] / self.dpi)
+
+                draw_depth_chart(ax_ask, ax_bid, request['times'], request['asks'],
+                                 request['bids'], request['timeframe'])
+                if request['xlim'] is not None:
+                    ax_ask.set_xlim(request['xlim'])
+                    ax_bid.set_xlim(request['xlim'])
+                fig.tight_layout(pad=2.0)
+
+                canvas.draw()
+                width, height = canvas.get_width_height()
+                rgba = bytes(canvas.buffer_rgba())
+                render_ms = (time.perf_counter() - started) * 1000
+                self._render_times.append(render_ms)
+                self.stats['frames_rendered'] += 1
+
+                self.on_frame({
+                    'width': width,
+                    'height': height,
+                    'rgba': rgba,
+                    'render_ms': render_ms,
+                    'submitted_at': request['submitted_at']
+                })
+            except Exception as e:
+                self.stats['render_errors'] += 1
+                self.logger.error(f"オフスレッド描画エラー: {e}")
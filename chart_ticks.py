@@ -0,0 +1,117 @@
+"""
+グラフX軸のティック位置・ラベル生成
+ティック位置はエポック秒の配列からNumPyでまとめて計算し、
+ラベル文字列は時間足ごと・分単位のバケットごとにキャッシュして再描画間で使い回す
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Sequence
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.ticker import Formatter, Locator
+
+SECONDS_PER_DAY = 86400.0
+
+# matplotlibの日付数値（エポックからの日数）とUNIXエポックとの差
+_MPL_EPOCH_OFFSET = mdates.date2num(datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+
+def to_epoch_array(times: Sequence[datetime]) -> np.ndarray:
+    """datetimeのリストをエポック秒の配列に変換（タイムゾーンなしはUTCとして扱う）"""
+    return np.fromiter(
+        (t.timestamp() if t.tzinfo else t.replace(tzinfo=timezone.utc).timestamp() for t in times),
+        dtype=np.float64, count=len(times)
+    )
+
+
+class TickLabelCache:
+    """時間足ごとのティックラベルキャッシュ（キーは分単位のエポック秒）"""
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._labels: Dict[str, Dict[int, str]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def labels_for(self, timeframe: str, epochs: np.ndarray) -> Dict[int, str]:
+        """エポック秒の配列に対応するラベルを取得（未キャッシュ分だけまとめて生成）"""
+        buckets = (epochs // 60).astype(np.int64) * 60
+
+        with self._lock:
+            cache = self._labels.setdefault(timeframe, {})
+            missing = np.array([b for b in np.unique(buckets) if int(b) not in cache], dtype=np.int64)
+            self.stats['hits'] += len(buckets) - len(missing)
+            self.stats['misses'] += len(missing)
+
+            if len(missing):
+                if len(cache) + len(missing) > self.max_entries:
+                    cache.clear()
+                cache.update(zip((int(b) for b in missing), self._format(timeframe, missing)))
+
+            return {int(b): cache[int(b)] for b in buckets}
+
+    @staticmethod
+    def _format(timeframe: str, buckets: np.ndarray):
+        """ラベル文字列をまとめて生成（日足はすべて月/日、それ以外は0時のみ月/日で他は時）"""
+        moments = buckets.astype('datetime64[s]')
+        months = moments.astype('datetime64[M]')
+        month_numbers = months.astype(np.int64) % 12 + 1
+        day_numbers = (moments.astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64) + 1
+        seconds_of_day = buckets % int(SECONDS_PER_DAY)
+        hours = seconds_of_day // 3600
+
+        if timeframe == "1日":
+            show_date = np.ones(len(buckets), dtype=bool)
+        else:
+            show_date = seconds_of_day < 60
+
+        return [f"{m}/{d}" if date else f"{h}"
+                for m, d, h, date in zip(month_numbers, day_numbers, hours, show_date)]
+
+
+# 再描画・描画スレッド間で共有するラベルキャッシュ
+label_cache = TickLabelCache()
+
+
+class DataPointLocator(Locator):
+    """データ点から一定間隔で間引いた位置にティックを置くロケータ（最大max_labels本）"""
+
+    def __init__(self, epochs: np.ndarray, max_labels: int = 30):
+        self.max_labels = max_labels
+        skip_interval = max(1, len(epochs) // max_labels)
+        self.tick_epochs = epochs[::skip_interval]
+        self.positions = self.tick_epochs / SECONDS_PER_DAY + _MPL_EPOCH_OFFSET
+
+    def __call__(self):
+        return self.positions
+
+    def tick_values(self, vmin, vmax):
+        return self.positions
+
+
+class BucketLabelFormatter(Formatter):
+    """キャッシュ済みのラベルを返すフォーマッタ"""
+
+    def __init__(self, timeframe: str, tick_epochs: np.ndarray, cache: TickLabelCache = None):
+        self.labels = (cache or label_cache).labels_for(timeframe, tick_epochs)
+
+    def __call__(self, x, pos=None):
+        epoch = round((x - _MPL_EPOCH_OFFSET) * SECONDS_PER_DAY)
+        return self.labels.get(int(epoch // 60) * 60, "")
+
+
+def apply_time_ticks(axes, times: Sequence[datetime], timeframe: str, max_labels: int = 30):
+    """両グラフのX軸にロケータ・フォーマッタとラベル回転を設定"""
+    epochs = to_epoch_array(times)
+    locator = DataPointLocator(epochs, max_labels)
+    formatter = BucketLabelFormatter(timeframe, locator.tick_epochs)
+
+    # ラベルの回転（日足またはデータ点が多い場合）
+    rotation = 45 if timeframe == "1日" or len(times) > 100 else 0
+
+    for ax in axes:
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(formatter)
+        ax.tick_params(axis='x', labelrotation=rotation)
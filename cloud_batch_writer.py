@@ -0,0 +1,91 @@
+"""
+クラウド書き込みのバッチ化
+1回の取得（または短い時間窓）で発生する全時間足テーブルへの書き込みをまとめ、
+upsert_order_book_max_bulk の1回の呼び出しで送信する
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# create_upsert_functions.sql の一括upsert関数
+BULK_UPSERT_FUNCTION = 'upsert_order_book_max_bulk'
+
+
+def merge_row(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """同じテーブル・タイムスタンプの行を最大値マージ（サーバー側と同じく、増えた場合のみ価格を更新）"""
+    if new['ask_total'] > existing['ask_total'] or new['bid_total'] > existing['bid_total']:
+        merged = dict(existing)
+        merged['ask_total'] = max(existing['ask_total'], new['ask_total'])
+        merged['bid_total'] = max(existing['bid_total'], new['bid_total'])
+        merged['price'] = new['price']
+        return merged
+    return existing
+
+
+class CloudBatchWriter:
+    """書き込み行を集めて一括送信するライター
+
+    rowsは {'table', 'timestamp', 'ask_total', 'bid_total', 'price', 'group_id'} の辞書。
+    window_secondsが0なら submit() ごとに即送信、正の値なら最初の行から窓の終わりまで溜めて送信する。
+    送信はdispatch(func, batch)で行う（既定はデーモンスレッド）
+    """
+
+    def __init__(self, write_batch: Callable[[List[Dict[str, Any]]], Any], window_seconds: float = 0.0,
+                 dispatch: Optional[Callable] = None):
+        self.write_batch = write_batch
+        self.window_seconds = window_seconds
+        self.dispatch = dispatch or self._dispatch_thread
+        self._pending: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.stats = {'submitted_rows': 0, 'merged_rows': 0, 'batches': 0}
+
+    @staticmethod
+    def _dispatch_thread(func, batch):
+        threading.Thread(target=func, args=(batch,), daemon=True).start()
+
+    def submit(self, rows: List[Dict[str, Any]]):
+        """書き込み行を追加（窓なしなら即送信）"""
+        with self._lock:
+            for row in rows:
+                key = (row['table'], row['timestamp'], row.get('group_id'))
+                self.stats['submitted_rows'] += 1
+                if key in self._pending:
+                    self._pending[key] = merge_row(self._pending[key], row)
+                    self.stats['merged_rows'] += 1
+                else:
+                    self._pending[key] = dict(row)
+
+            if self.window_seconds > 0:
+                if self._timer is None and self._pending:
+                    self._timer = threading.Timer(self.window_seconds, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            batch = self._take_pending()
+
+        if batch:
+            self.dispatch(self.write_batch, batch)
+
+    def flush(self):
+        """溜まっている行をすぐに送信"""
+        with self._lock:
+            batch = self._take_pending()
+        if batch:
+            self.dispatch(self.write_batch, batch)
+
+    def _take_pending(self) -> List[Dict[str, Any]]:
+        """ロック内で呼び出し、保留中の行を取り出す"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = list(self._pending.values())
+        self._pending.clear()
+        if batch:
+            self.stats['batches'] += 1
+        return batch
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
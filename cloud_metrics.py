@@ -0,0 +1,275 @@
+"""
+クラウド同期のメトリクス
+テーブルごとの書き込み時間のヒストグラム、エラー分類ごとのエラー数・リトライ数を集計し、
+Prometheusのテキスト形式（/metrics）でローカルのHTTPエンドポイントから公開する。
+キュー長・Realtimeの遅延・転送バイト数などの現在値は、読み出し時に各部品の統計から集める
+（CloudSyncManager.metrics_families）。値はすべてメモリ上にあるため、読み出しでネットワークへはアクセスしない
+"""
+
+import bisect
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 書き込み時間のヒストグラムの区切り（秒）
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# エラーの分類
+ERROR_CLASSES = (
+    'timeout',           # 接続・読み取りのタイムアウト
+    'connection',        # 接続できない・切断された
+    'rate_limited',      # HTTP 429
+    'server_error',      # HTTP 5xx
+    'client_error',      # HTTP 4xx・PostgRESTのリクエストエラー
+    'missing_function',  # RPC関数が未作成（PGRST202）
+    'database',          # PostgreSQLのエラー（SQLSTATE）
+    'other',
+)
+
+# (ラベル, 値) のリスト
+Samples = List[Tuple[Dict[str, str], float]]
+# (メトリクス名, 種類, 説明, サンプル)
+Family = Tuple[str, str, str, Samples]
+
+
+def classify_error(error: BaseException) -> str:
+    """例外をエラー分類のいずれかに振り分ける"""
+    name = type(error).__name__
+    code = str(getattr(error, 'code', '') or '')
+    if isinstance(error, TimeoutError) or 'Timeout' in name:
+        return 'timeout'
+    if code == 'PGRST202' or 'PGRST202' in str(error):
+        return 'missing_function'
+    if isinstance(error, ConnectionError) or 'Connect' in name or name in (
+            'NetworkError', 'ReadError', 'WriteError', 'RemoteProtocolError'):
+        return 'connection'
+
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None and len(code) == 3 and code.isdigit():
+        status = int(code)
+    if status == 429:
+        return 'rate_limited'
+    if status is not None and 500 <= int(status) < 600:
+        return 'server_error'
+    if status is not None and 400 <= int(status) < 500:
+        return 'client_error'
+    if code.startswith('PGRST'):
+        return 'client_error'
+    if len(code) == 5 and code[:2].isalnum():
+        return 'database'
+    return 'other'
+
+
+class Histogram:
+    """Prometheusと同じ累積バケットのヒストグラム"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後は+Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, 累積件数) のリスト（最後は +Inf）"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else _format_value(bound), total))
+        return result
+
+    def quantile(self, ratio: float) -> Optional[float]:
+        """ratio番目の値が入るバケットの上限（+Infに入る場合は最大の区切り）"""
+        if not self.count:
+            return None
+        rank = ratio * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class CloudMetrics:
+    """書き込み時間・書き込み行数・エラー・リトライを集計"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._write_latency: Dict[str, Histogram] = {}
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._retries: Dict[str, int] = {}
+
+    def observe_write(self, table_name: str, seconds: float):
+        """テーブルへの書き込み（1リクエスト）にかかった時間"""
+        with self._lock:
+            histogram = self._write_latency.get(table_name)
+            if histogram is None:
+                histogram = self._write_latency[table_name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count_rows(self, table_name: str, action: str, count: int = 1):
+        """書き込んだ行数（action: inserted / updated / skipped）"""
+        with self._lock:
+            key = (table_name, action)
+            self._rows[key] = self._rows.get(key, 0) + count
+
+    def record_error(self, stage: str, error: BaseException) -> str:
+        """エラーを分類して数え、分類を返す（stage: write / read / realtime など）"""
+        error_class = classify_error(error)
+        with self._lock:
+            key = (stage, error_class)
+            self._errors[key] = self._errors.get(key, 0) + 1
+        return error_class
+
+    def record_retry(self, error: BaseException) -> str:
+        """リトライの原因になったエラーを分類して数える"""
+        error_class = classify_error(error)
+        with self._lock:
+            self._retries[error_class] = self._retries.get(error_class, 0) + 1
+        return error_class
+
+    def families(self) -> List[Family]:
+        """集計値をPrometheusのメトリクスファミリーとして返す"""
+        with self._lock:
+            latency = []
+            for table_name, histogram in sorted(self._write_latency.items()):
+                for le, count in histogram.cumulative():
+                    latency.append(({'table': table_name, 'le': le}, count))
+                latency.append(({'table': table_name, '__suffix__': '_sum'}, histogram.sum))
+                latency.append(({'table': table_name, '__suffix__': '_count'}, histogram.count))
+            rows = [({'table': t, 'action': a}, v) for (t, a), v in sorted(self._rows.items())]
+            errors = [({'stage': s, 'error_class': c}, v) for (s, c), v in sorted(self._errors.items())]
+            retries = [({'error_class': c}, v) for c, v in sorted(self._retries.items())]
+        return [
+            ('cloud_write_duration_seconds', 'histogram', 'テーブルごとの書き込みリクエストの所要時間', latency),
+            ('cloud_rows_written_total', 'counter', 'テーブル・結果ごとの書き込み行数', rows),
+            ('cloud_errors_total', 'counter', '処理・エラー分類ごとのエラー数', errors),
+            ('cloud_write_retries_total', 'counter', 'エラー分類ごとの書き込みリトライ数', retries),
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """統計表示用の集計値（書き込み時間はバケット上限による近似のパーセンタイル）"""
+        with self._lock:
+            return {
+                'write_latency': {
+                    table_name: {
+                        'count': h.count,
+                        'avg_ms': round(h.sum / h.count * 1000, 1) if h.count else None,
+                        'p50_ms': _to_ms(h.quantile(0.5)),
+                        'p95_ms': _to_ms(h.quantile(0.95)),
+                    }
+                    for table_name, h in self._write_latency.items()
+                },
+                'errors': {f"{s}.{c}": v for (s, c), v in self._errors.items()},
+                'retries': dict(self._retries),
+            }
+
+
+def _to_ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return f"{value:.1f}"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_prometheus(families: Iterable[Family]) -> str:
+    """メトリクスファミリーをPrometheusのテキスト形式（0.0.4）に変換"""
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {_escape(help_text)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            labels = dict(labels)
+            suffix = labels.pop('__suffix__', '_bucket' if kind == 'histogram' else '')
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name}{suffix} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """/metrics（Prometheusのテキスト形式）と /health（JSON）を返すローカルHTTPサーバー
+
+    port=0 なら空いているポートを使う。start() は公開したURLを返す
+    """
+
+    def __init__(self, render: Callable[[], str], health: Optional[Callable[[], Dict[str, Any]]] = None,
+                 host: str = '127.0.0.1', port: int = 9464, log_callback=None):
+        self.render = render
+        self.health = health
+        self.host = host
+        self.port = port
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> str:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                try:
+                    if path == '/metrics':
+                        body = server.render().encode('utf-8')
+                        content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                    elif path == '/health' and server.health:
+                        body = json.dumps(server.health(), ensure_ascii=False, default=str).encode('utf-8')
+                        content_type = 'application/json; charset=utf-8'
+                    else:
+                        self.send_error(404)
+                        return
+                except Exception as e:
+                    server.logger.error(f"[メトリクス] 出力エラー: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # アクセスごとのログは出さない
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="CloudMetricsServer", daemon=True)
+        self._thread.start()
+        url = f"http://{self.host}:{self.port}/metrics"
+        msg = f"[メトリクス] {url} で公開しています"
+        self.logger.info(msg)
+        if self.log_callback:
+            self.log_callback(msg, "INFO")
+        return url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
@@ -0,0 +1,163 @@
+"""
+クラウド書き込みの永続アウトボックス
+送信前の書き込み行をSQLiteファイルに記録し、送信に成功したら削除する。
+通信断などで残った行はドレイナーがタイムスタンプ順にまとめて再送する
+（サーバー側は最大値マージのupsertなので、同じ行を複数回送っても結果は変わらない）
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class CloudOutbox:
+    """未送信の書き込み行を保持するSQLiteテーブル"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cloud_outbox (
+                table_name TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                group_id TEXT NOT NULL,
+                ask_total REAL NOT NULL,
+                bid_total REAL NOT NULL,
+                price REAL NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (table_name, timestamp, group_id)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cloud_outbox_timestamp ON cloud_outbox(timestamp)")
+        self._conn.commit()
+
+    def add(self, rows: List[Dict[str, Any]]):
+        """行を記録（同じ行が既にあれば最大値マージ）"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO cloud_outbox (table_name, timestamp, group_id, ask_total, bid_total, price, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (table_name, timestamp, group_id) DO UPDATE SET
+                    ask_total = MAX(ask_total, excluded.ask_total),
+                    bid_total = MAX(bid_total, excluded.bid_total),
+                    price = CASE WHEN excluded.ask_total > ask_total OR excluded.bid_total > bid_total
+                                 THEN excluded.price ELSE price END
+            """, [(row['table'], row['timestamp'], row['group_id'], row['ask_total'],
+                   row['bid_total'], row['price'], now) for row in rows])
+            self._conn.commit()
+
+    def remove(self, rows: List[Dict[str, Any]]):
+        """送信済みの行を削除（送信後により大きな値が記録された行は残す）"""
+        with self._lock:
+            self._conn.executemany("""
+                DELETE FROM cloud_outbox
+                WHERE table_name = ? AND timestamp = ? AND group_id = ?
+                  AND ask_total <= ? AND bid_total <= ?
+            """, [(row['table'], row['timestamp'], row['group_id'], row['ask_total'], row['bid_total'])
+                  for row in rows])
+            self._conn.commit()
+
+    def peek(self, limit: int = 200, min_age: float = 0.0) -> List[Dict[str, Any]]:
+        """古いタイムスタンプ順に行を取得（記録からmin_age秒以上経過したもののみ）"""
+        with self._lock:
+            cursor = self._conn.execute("""
+                SELECT table_name, timestamp, group_id, ask_total, bid_total, price
+                FROM cloud_outbox
+                WHERE created_at <= ?
+                ORDER BY timestamp, table_name
+                LIMIT ?
+            """, (time.time() - min_age, limit))
+            return [{'table': r[0], 'timestamp': r[1], 'group_id': r[2],
+                     'ask_total': r[3], 'bid_total': r[4], 'price': r[5]} for r in cursor.fetchall()]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cloud_outbox").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxDrainer:
+    """アウトボックスに残った行を定期的にまとめて再送するスレッド
+
+    replay(rows)は行を送信し、失敗時は例外を送出する関数。
+    失敗が続く間は待ち時間を倍にしていき（最大max_interval）、成功すると元に戻す
+    """
+
+    def __init__(self, outbox: CloudOutbox, replay: Callable[[List[Dict[str, Any]]], Any],
+                 interval: float = 30.0, max_interval: float = 600.0, batch_size: int = 200,
+                 min_age: float = 60.0, log_callback=None):
+        self.outbox = outbox
+        self.replay = replay
+        self.interval = interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'replayed_rows': 0, 'replay_batches': 0, 'replay_failures': 0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="CloudOutboxDrainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """次の待ちを打ち切ってすぐに再送を試みる"""
+        self._wake.set()
+
+    def _loop(self):
+        wait = self.interval
+        while not self._stop.is_set():
+            self._wake.wait(wait)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            wait = self.interval if self.drain() else min(self.max_interval, wait * 2)
+
+    def drain(self) -> bool:
+        """残っている行をすべて再送（失敗したらFalse）"""
+        total = 0
+        while True:
+            rows = self.outbox.peek(self.batch_size, self.min_age)
+            if not rows:
+                break
+            try:
+                self.replay(rows)
+            except Exception as e:
+                self.stats['replay_failures'] += 1
+                msg = f"[アウトボックス] 再送失敗（残り{self.outbox.count()}件）: {e}"
+                self.logger.warning(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "WARNING")
+                return False
+            self.outbox.remove(rows)
+            self.stats['replay_batches'] += 1
+            self.stats['replayed_rows'] += len(rows)
+            total += len(rows)
+
+        if total:
+            msg = f"[アウトボックス] 未送信の{total}件を再送しました"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+        return True
@@ -0,0 +1,71 @@
+"""
+Supabaseテーブルのキーセットページング読み出し
+OFFSETや件数上限を使わず「timestamp > 最後に読んだ値」で次のページを取得するため、
+範囲の大きさに関係なくメモリ使用量は1ページ分で済み、途中の位置から再開できる
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def iter_pages(client, table_name: str, group_id: str, after: Optional[str] = None,
+               until: Optional[str] = None, page_size: int = 1000,
+               include_after: bool = False) -> Iterator[List[Dict[str, Any]]]:
+    """タイムスタンプ昇順のページを順に返すジェネレータ
+
+    after: この値より後（include_afterがTrueなら以上）の行から読み始める
+    until: この値以下の行まで読む（Noneなら最新まで）
+    """
+    position = after
+    inclusive = include_after
+    while True:
+        query = client.table(table_name).select('*').eq('group_id', group_id)
+        if position:
+            query = query.gte('timestamp', position) if inclusive else query.gt('timestamp', position)
+        if until:
+            query = query.lte('timestamp', until)
+        page = query.order('timestamp').limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        position = page[-1]['timestamp']
+        inclusive = False
+
+
+class SyncCursorStore:
+    """ジョブごとの読み出し位置をJSONファイルに保存し、中断後に再開できるようにする"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cursors: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._cursors = json.load(f)
+        except (OSError, ValueError):
+            self._cursors = {}
+
+    def get(self, job: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._cursors.get(job)
+            return dict(cursor) if cursor else None
+
+    def set(self, job: str, position: str, until: Optional[str]):
+        with self._lock:
+            self._cursors[job] = {'position': position, 'until': until}
+            self._save()
+
+    def clear(self, job: str):
+        with self._lock:
+            if self._cursors.pop(job, None) is not None:
+                self._save()
+
+    def _save(self):
+        """一時ファイルに書いてから置き換え（書き込み途中で終了しても壊れないように）"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._cursors, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,19 +1,23 @@
 import json
+import os
 import threading
 import logging
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, Callable
 from functools import wraps
 
 # Supabaseのインポートを試行
 try:
-    from supabase import create_client, Client
+    from supabase import Client
     SUPABASE_AVAILABLE = True
 except ImportError:
     SUPABASE_AVAILABLE = False
     Client = None
-    create_client = None
+
+# 共通設定のクライアント作成とリクエスト計測
+from supabase_client_factory import create_supabase_client, RequestMetrics
 
 # Realtime同期用の非同期実装をインポート
 try:
@@ -23,6 +27,33 @@ except ImportError:
     REALTIME_AVAILABLE = False
     RealtimeSync = None
 
+# バッチ書き込み
+from cloud_batch_writer import CloudBatchWriter
+from cloud_transport import (CloudTransport, BulkRpcTransport, InMemoryTransport, create_transport,
+                             is_missing_function_error, DEFAULT_TRANSPORT)
+from cloud_write_pool import CloudWritePool
+from cloud_outbox import CloudOutbox, OutboxDrainer
+from cloud_pager import iter_pages, SyncCursorStore
+from gap_backfill import GapBackfillCoordinator
+from realtime_batcher import RealtimeBatcher
+from leader_lease import LeaderLease
+from cloud_metrics import CloudMetrics, MetricsServer, render_prometheus
+from consolidate import consolidate_max
+from minute_tier import (MinuteTierBuffer, MINUTE_TABLE, MINUTE_INTERVAL, MINUTE_TIMEFRAME_NAME,
+                         DOWNSAMPLE_FUNCTION, DOWNSAMPLE_RUN_INTERVAL)
+from sync_scheduler import SyncScheduler, TABLE_INTERVALS, parse_timestamp, floor_to_boundary
+
+# テーブル名と時間足名の対応
+TIMEFRAME_NAMES = {
+    'order_book_5min': '5分足',
+    'order_book_15min': '15分足',
+    'order_book_30min': '30分足',
+    'order_book_1hour': '1時間足',
+    'order_book_2hour': '2時間足',
+    'order_book_4hour': '4時間足',
+    'order_book_daily': '日足'
+}
+
 # リトライデコレータ
 def retry_on_failure(max_retries: int = 3, delay: int = 5):
     """失敗時に自動リトライするデコレータ"""
@@ -51,15 +82,18 @@ def retry_on_failure(max_retries: int = 3, delay: int = 5):
     return decorator
 
 class CloudSyncManager:
-    def __init__(self, config_path: str = None, log_callback=None, local_db_callback=None):
+    def __init__(self, config_path: str = None, log_callback=None, local_db_callback=None, client=None,
+                 local_batch_callback=None, realtime_client_factory=None,
+                 transport: Optional[CloudTransport] = None):
         # loggerを最初に初期化
         self.logger = logging.getLogger(__name__)
         self.log_callback = log_callback
         self.local_db_callback = local_db_callback  # ローカルDBへの保存用コールバック
+        # 複数テーブルの行を1トランザクションで保存するコールバック（{テーブル名: [record, ...]}）
+        self.local_batch_callback = local_batch_callback
         
         # config_pathが指定されていない場合は、AppDataから読み込む
         if config_path is None:
-            import os
             appdata_dir = os.path.join(os.environ.get('APPDATA', ''), 'CoinglassScraper')
             config_path = os.path.join(appdata_dir, 'config.json')
         
@@ -79,6 +113,73 @@ class CloudSyncManager:
         self.last_sync: Optional[datetime] = None
         self.sync_interval = self.config.get("cloud_sync", {}).get("sync_interval_minutes", 5)
         self.group_id = self.config.get("cloud_sync", {}).get("group_id", "default-group")
+        # クラウドからの読み出し1ページあたりの件数
+        self.page_size = self.config.get("cloud_sync", {}).get("page_size", 1000)
+        # 書き込み方式（cloud_transport.py）。use_rpc_upsert=false の既存設定は1行ずつのSELECT→UPDATE/INSERTになる
+        use_rpc_upsert = self.config.get("cloud_sync", {}).get("use_rpc_upsert", True)
+        self.transport_name = self.config.get("cloud_sync", {}).get(
+            "transport", DEFAULT_TRANSPORT if use_rpc_upsert else 'rest')
+        self._use_rpc_upsert = use_rpc_upsert
+        self.transport: Optional[CloudTransport] = None
+        # 外部から渡された書き込み方式（ベンチマーク・テスト用。memory方式はここからのみ使える）
+        self._injected_transport = transport
+        if transport is not None:
+            self.transport_name = transport.name
+        
+        # 書き込み時間・エラー分類ごとの件数（/metrics とヘルスチェック用）
+        self.metrics = CloudMetrics()
+        self.metrics_server: Optional[MetricsServer] = None
+        # クラウドにあることが分かっている各テーブルの最新タイムスタンプ（保存成功・Realtime受信から更新）
+        self.cloud_latest: Dict[str, datetime] = {}
+        
+        # 書き込みは固定数のワーカーで処理（失敗時はバックオフで再試行）
+        self.write_pool = CloudWritePool(
+            workers=self.config.get("cloud_sync", {}).get("write_workers", 2),
+            max_queue=self.config.get("cloud_sync", {}).get("write_queue_size", 100),
+            on_failure=self._on_write_failed,
+            log_callback=self.log_callback,
+            on_retry=self._on_write_retry
+        )
+        
+        # サーバー側ロールアップ（create_rollup_functions.sql）を使う場合は5分足だけを書き込む
+        self.server_rollup = self.config.get("cloud_sync", {}).get("server_rollup", False)
+        
+        # 1分足のクラウド階層（create_1min_tier.sql）。1分足は溜めてまとめて送り、古い行は5分足へ間引く
+        self.minute_tier = self.config.get("cloud_sync", {}).get("minute_tier_enabled", False)
+        # 1日未満は全件削除になるため、サーバー側の検証と同じく1日以上に丸める
+        retention_days = self.config.get("cloud_sync", {}).get("minute_tier_retention_days", 1)
+        self.minute_tier_retention_days = max(1, int(retention_days))
+        if self.minute_tier_retention_days != retention_days:
+            msg = f"[{MINUTE_TIMEFRAME_NAME}] minute_tier_retention_days={retention_days} は使えないため {self.minute_tier_retention_days}日 にします"
+            self.logger.warning(msg)
+            if self.log_callback:
+                self.log_callback(msg, "WARNING")
+        self.minute_buffer: Optional[MinuteTierBuffer] = None
+        if self.minute_tier:
+            self.minute_buffer = MinuteTierBuffer(
+                upload_minutes=self.config.get("cloud_sync", {}).get("minute_tier_upload_minutes", 15))
+        self.use_downsample = True
+        self.last_downsample: Optional[datetime] = None
+        
+        # サンプルのタイムスタンプとテーブルごとの境界で同期タイミングを決める
+        if self.server_rollup:
+            intervals = {'order_book_5min': TABLE_INTERVALS['order_book_5min']}
+        else:
+            intervals = dict(TABLE_INTERVALS)
+        if self.minute_tier:
+            intervals[MINUTE_TABLE] = MINUTE_INTERVAL
+        self.sync_scheduler = SyncScheduler(
+            intervals=intervals,
+            grace_seconds=self.config.get("cloud_sync", {}).get("sync_grace_seconds", 240),
+            catchup_intervals=self.config.get("cloud_sync", {}).get("sync_catchup_intervals", 3)
+        )
+        
+        # 1回の取得で発生する全時間足の書き込みを1リクエストにまとめる
+        self.batch_writer = CloudBatchWriter(
+            self._save_batch,
+            window_seconds=self.config.get("cloud_sync", {}).get("batch_window_seconds", 0.0),
+            dispatch=self._dispatch_batch
+        )
         
         # 各時間足の最終保存時刻を記録
         self.last_save_times = {
@@ -97,16 +198,153 @@ class CloudSyncManager:
             'failed_saves': 0,
             'retry_count': 0,
             'last_health_check': None,
-            'realtime_updates': 0  # Realtime同期のカウンター追加
+            'realtime_updates': 0,  # Realtime同期のカウンター追加
+            'batch_requests': 0,  # トランスポートへ渡した書き込みバッチ数
+            'leader_gap_fills': 0  # フォロワーとして補完した境界の数
         }
+        # 前回のヘルスチェックの結果（変化したときだけINFOで記録する）
+        self._last_health_status = None
         
         # Realtime関連の初期化
         self.realtime_sync: Optional[RealtimeSync] = None  # 非同期版Realtime同期
         self.latest_timestamps = {}  # 各テーブルの最新タイムスタンプ
         self.realtime_enabled = self.config.get("cloud_sync", {}).get("realtime_enabled", True)
+        # Realtime用の非同期クライアントのファクトリー（Noneならsupabaseのcreate_async_client）
+        self.realtime_client_factory = realtime_client_factory
+        # 再接続後に取得し直す直近の区間数（切断中のUPDATEは最新タイムスタンプ以前の行に入るため）
+        self.realtime_refetch_intervals = max(1, int(
+            self.config.get("cloud_sync", {}).get("realtime_refetch_intervals", 2)))
+        # INSERTイベントによる欠損補完はテーブルごとにまとめてバックグラウンドで実行
+        self.gap_backfill = GapBackfillCoordinator(
+            self._fetch_gap_rows,
+            self._apply_gap_rows,
+            log_callback=self.log_callback
+        )
+        # UPDATEイベントは短い時間窓でまとめてローカルDBへ反映
+        self.realtime_batcher = RealtimeBatcher(
+            self._apply_realtime_batch,
+            window_seconds=self.config.get("cloud_sync", {}).get("realtime_batch_window_ms", 300) / 1000,
+            log_callback=self.log_callback,
+            on_applied=self._record_realtime_lag
+        )
+        
+        # リクエストごとの応答時間
+        self.request_metrics = RequestMetrics()
         
-        if self.enabled and SUPABASE_AVAILABLE:
+        if client is not None:
+            # 外部から渡されたクライアント（local_postgrest.LocalPostgrestClientなど）を使用
+            self.client = client
+            self.enabled = True
+        elif self.enabled and SUPABASE_AVAILABLE:
             self._initialize_client()
+        if self.client:
+            self.transport = self._injected_transport or self._create_transport()
+        
+        # 未送信の書き込みを記録するアウトボックス（通信断からの復帰後に再送）
+        self.outbox: Optional[CloudOutbox] = None
+        self.outbox_drainer: Optional[OutboxDrainer] = None
+        # 範囲読み出しの再開位置
+        self.cursor_store: Optional[SyncCursorStore] = None
+        # グループ内で書き込むクライアントを1台に絞るリース（create_leader_lease.sql）
+        self.leader_lease: Optional[LeaderLease] = None
+        # フォロワーが、リーダーの保存していない境界を自分で書き込むまでの猶予（サンプル時刻基準の秒数）
+        self.leader_gap_fill = timedelta(
+            seconds=self.config.get("cloud_sync", {}).get("leader_gap_fill_seconds", 180))
+        
+        if self.enabled and self.client:
+            self.write_pool.start()
+            self._initialize_outbox(config_path)
+            self.cursor_store = SyncCursorStore(
+                os.path.join(os.path.dirname(os.path.abspath(config_path)), 'sync_cursors.json'))
+            if self.config.get("cloud_sync", {}).get("leader_election", False):
+                self.leader_lease = LeaderLease(
+                    self.client,
+                    self.group_id,
+                    holder_id=self.config.get("cloud_sync", {}).get("leader_holder_id"),
+                    ttl_seconds=self.config.get("cloud_sync", {}).get("leader_lease_ttl_seconds", 60),
+                    log_callback=self.log_callback
+                )
+                self.leader_lease.start()
+            metrics_port = self.config.get("cloud_sync", {}).get("metrics_port")
+            if metrics_port is not None:
+                self._start_metrics_server(metrics_port)
+    
+    def _start_metrics_server(self, port: int):
+        """/metrics と /health を返すローカルHTTPサーバーを起動（失敗してもクラウド同期は続ける）"""
+        try:
+            self.metrics_server = MetricsServer(
+                self.render_metrics,
+                health=self.health_check,
+                host=self.config.get("cloud_sync", {}).get("metrics_host", "127.0.0.1"),
+                port=port,
+                log_callback=self.log_callback
+            )
+            self.metrics_server.start()
+        except Exception as e:
+            self.metrics_server = None
+            msg = f"[メトリクス] サーバーの起動に失敗: {e}"
+            self.logger.error(msg)
+            if self.log_callback:
+                self.log_callback(msg, "ERROR")
+    
+    def _initialize_outbox(self, config_path: str):
+        """アウトボックスとドレイナーを初期化（失敗時はアウトボックスなしで動作）"""
+        try:
+            outbox_path = self.config.get("cloud_sync", {}).get("outbox_path") or \
+                os.path.join(os.path.dirname(os.path.abspath(config_path)), 'cloud_outbox.db')
+            self.outbox = CloudOutbox(outbox_path)
+            self.outbox_drainer = OutboxDrainer(
+                self.outbox,
+                self._replay_outbox_rows,
+                interval=self.config.get("cloud_sync", {}).get("outbox_drain_interval_seconds", 30),
+                log_callback=self.log_callback
+            )
+            self.outbox_drainer.start()
+            
+            pending = self.outbox.count()
+            if pending:
+                msg = f"[アウトボックス] 未送信の書き込みが{pending}件あります（接続後に再送します）"
+                self.logger.info(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "INFO")
+        except Exception as e:
+            self.outbox = None
+            self.outbox_drainer = None
+            msg = f"[アウトボックス] 初期化失敗: {e}"
+            self.logger.error(msg)
+            if self.log_callback:
+                self.log_callback(msg, "ERROR")
+    
+    def _create_transport(self) -> CloudTransport:
+        """設定の書き込み方式を作成（未知の名前・memoryなら既定の方式を使う）"""
+        if self.transport_name == InMemoryTransport.name:
+            # 通信しない方式を設定で選ぶと、クラウドに届かない書き込みが保存済みとして扱われる
+            msg = (f"[クラウド書き込み] {InMemoryTransport.name} 方式はベンチマーク・テスト専用のため設定では使えません。"
+                   f"{DEFAULT_TRANSPORT} で保存します")
+            self.logger.warning(msg)
+            if self.log_callback:
+                self.log_callback(msg, "WARNING")
+            self.transport_name = DEFAULT_TRANSPORT
+        try:
+            transport = create_transport(self.transport_name, self.client, self.group_id,
+                                         use_rpc=self._use_rpc_upsert, log_callback=self.log_callback)
+        except ValueError as e:
+            msg = f"[クラウド書き込み] {e}。{DEFAULT_TRANSPORT} で保存します"
+            self.logger.warning(msg)
+            if self.log_callback:
+                self.log_callback(msg, "WARNING")
+            self.transport_name = DEFAULT_TRANSPORT
+            transport = create_transport(DEFAULT_TRANSPORT, self.client, self.group_id,
+                                         use_rpc=self._use_rpc_upsert, log_callback=self.log_callback)
+        return transport
+    
+    @property
+    def use_rpc_upsert(self) -> bool:
+        """1行ずつの保存でサーバー側の最大値マージupsertを使っているか"""
+        transport = self.transport
+        if isinstance(transport, BulkRpcTransport):
+            transport = transport.fallback
+        return bool(getattr(transport, 'use_rpc', False))
     
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         try:
@@ -121,14 +359,16 @@ class CloudSyncManager:
     
     @retry_on_failure(max_retries=3, delay=5)
     def _initialize_client(self):
-        if not SUPABASE_AVAILABLE or not create_client:
+        if not SUPABASE_AVAILABLE:
             return
         
         try:
             cloud_config = self.config.get("cloud_sync", {})
-            self.client = create_client(
+            self.client = create_supabase_client(
                 cloud_config["url"],
-                cloud_config["anon_key"]
+                cloud_config["anon_key"],
+                http_config=cloud_config.get("http"),
+                metrics=self.request_metrics
             )
             msg = "[接続成功] Supabase接続を初期化しました"
             self.logger.info(msg)
@@ -142,27 +382,31 @@ class CloudSyncManager:
             self.enabled = False
             raise e
     
-    def should_sync(self) -> bool:
+    def sync_data_async(self, timestamp: str, ask_total: float, bid_total: float, price: float):
+        """サンプルのタイムスタンプで境界を判定し、該当するテーブルの行をまとめて送信"""
         if not self.enabled or not self.client:
-            return False
-        
-        now = datetime.now()
-        current_minute = now.minute
-        
-        # 5分間隔の固定タイミング（0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55分）
-        if current_minute % 5 != 0:
-            return False
-        
-        # 最初の同期または前回の同期から5分以上経過している場合
-        if not self.last_sync:
-            return True
+            return
         
-        # 前回の同期から少なくとも4分以上経過していることを確認
-        elapsed = (now - self.last_sync).total_seconds()
-        return elapsed >= 240  # 4分 = 240秒
-    
-    def sync_data_async(self, timestamp: str, ask_total: float, bid_total: float, price: float):
-        if not self.should_sync():
+        due = self.sync_scheduler.on_sample(timestamp, ask_total, bid_total, price)
+        if due and self.leader_lease:
+            due = self._filter_follower_rows(due, timestamp)
+        # 1分足はバッファに溜め、送信の境界をまたいだ回に他の時間足と同じリクエストで送る
+        minute_rows = []
+        if self.minute_buffer:
+            minute_due = [row for row in due if row[0] == MINUTE_TABLE]
+            if minute_due:
+                due = [row for row in due if row[0] != MINUTE_TABLE]
+                minute_rows = self.minute_buffer.add([self._build_row(*row) for row in minute_due])
+                self.sync_scheduler.mark_synced(minute_due)
+        if minute_rows:
+            msg = f"[{MINUTE_TIMEFRAME_NAME}] {len(minute_rows)}件をまとめて送信: {minute_rows[0]['timestamp']} ～ {minute_rows[-1]['timestamp']}"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+        if not due:
+            if minute_rows:
+                self._submit_rows(minute_rows)
+                self._maybe_downsample_minute_tier()
             return
         
         # 同期実行のログ（詳細化）
@@ -171,239 +415,293 @@ class CloudSyncManager:
         if self.log_callback:
             self.log_callback(msg, "INFO")
         
-        thread = threading.Thread(
-            target=self._sync_to_cloud,
-            args=(timestamp, ask_total, bid_total, price),
-            daemon=True
-        )
-        thread.start()
-        self.last_sync = datetime.now()
+        # 上位時間足と、直近の区間で同期されていなかった境界をまとめてログ出力
+        names = [TIMEFRAME_NAMES[table_name] for table_name, *_ in due if table_name != 'order_book_5min']
+        if names:
+            msg = f"[時間足保存] {', '.join(names)} を保存対象として検出"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+        sample_time = parse_timestamp(timestamp)
+        caught_up = [f"{TIMEFRAME_NAMES[table_name]} {boundary}" for table_name, boundary, *_ in due
+                     if parse_timestamp(boundary) < floor_to_boundary(sample_time, TABLE_INTERVALS[table_name])]
+        if caught_up:
+            msg = f"[同期補完] 未同期だった境界を送信: {', '.join(caught_up)}"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
         
-        # 各時間足データの保存チェック
-        self._check_and_save_all_timeframes(timestamp, ask_total, bid_total, price)
+        self._submit_rows(minute_rows + [self._build_row(*row) for row in due])
+        self.last_sync = datetime.now()
+        self.sync_scheduler.mark_synced(due)
+        if minute_rows:
+            self._maybe_downsample_minute_tier()
+    
+    def _filter_follower_rows(self, due: list, timestamp: str) -> list:
+        """フォロワーならリーダーが保存済みの境界を除き、猶予を過ぎても保存されない境界だけを返す"""
+        if self.leader_lease.is_leader():
+            return due
+        synced_until = self.leader_lease.synced_until
+        sample_time = parse_timestamp(timestamp)
+        covered, gap_fill = [], []
+        for row in due:
+            boundary = parse_timestamp(row[1])
+            if synced_until and boundary <= synced_until:
+                covered.append(row)
+            elif row[0] == MINUTE_TABLE and self.minute_buffer:
+                # リーダーは1分足をバッファに溜めて送信境界でまとめて送るため、保存位置から判断できない
+                # （補完はリースを引き継いでから行う）
+                continue
+            elif sample_time - boundary >= self._leader_gap_fill_for(row[0]):
+                gap_fill.append(row)
+        # リーダーが保存した境界は同期済みとして扱い、残りは次のサンプルで再判定する
+        if covered:
+            self.sync_scheduler.mark_synced(covered)
+        if gap_fill:
+            self.stats['leader_gap_fills'] += len(gap_fill)
+            names = ', '.join(f"{MINUTE_TIMEFRAME_NAME if row[0] == MINUTE_TABLE else TIMEFRAME_NAMES[row[0]]} {row[1]}"
+                              for row in gap_fill)
+            msg = f"[リーダー選出] リーダーが保存していない境界を補完: {names}"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+        return gap_fill
     
-    def _check_and_save_all_timeframes(self, timestamp: str, ask_total: float, bid_total: float, price: float):
-        """全時間足データの保存チェック（改良版）"""
+    def _leader_gap_fill_for(self, table_name: str) -> timedelta:
+        """フォロワーが補完するまでの猶予（境界が補完対象の区間から外れる前に補完するよう時間足の長さで制限）"""
+        catchup = timedelta(minutes=self.sync_scheduler.intervals[table_name] * self.sync_scheduler.catchup_intervals)
+        return min(self.leader_gap_fill, catchup) if catchup else self.leader_gap_fill
+    
+    def _submit_rows(self, rows: list):
+        """行をアウトボックスに記録してから一括書き込みに渡す"""
+        self.stats['total_saves'] += len(rows)
+        if self.outbox:
+            self.outbox.add(rows)
+        self.batch_writer.submit(rows)
+    
+    def _maybe_downsample_minute_tier(self):
+        """前回から一定時間が経っていれば、1分足の間引き（保持ジョブ）をワーカープールで実行"""
+        if not self.use_downsample:
+            return
+        now = datetime.now()
+        if self.last_downsample and now - self.last_downsample < DOWNSAMPLE_RUN_INTERVAL:
+            return
+        self.last_downsample = now
+        self.write_pool.submit(self.downsample_minute_tier)
+    
+    def downsample_minute_tier(self) -> Optional[Dict[str, int]]:
+        """保持期間より古い自グループの1分足を5分足へ間引いて削除し、{downsampled, deleted}を返す
+
+        関数が未作成ならNoneを返して以後は呼ばない。その他の失敗は例外を送出し、ワーカープールの再試行と
+        サーキットブレーカーに失敗として数えさせる
+        """
+        if not self.enabled or not self.client:
+            return None
         try:
-            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            saved_timeframes = []
-            
-            # 15分足（00, 15, 30, 45分）
-            if dt.minute in [0, 15, 30, 45]:
-                self._save_timeframe_data('order_book_15min', dt, 15, ask_total, bid_total, price)
-                saved_timeframes.append('15分足')
-            
-            # 30分足（00, 30分）
-            if dt.minute in [0, 30]:
-                self._save_timeframe_data('order_book_30min', dt, 30, ask_total, bid_total, price)
-                saved_timeframes.append('30分足')
-            
-            # 1時間足（毎時00分）
-            if dt.minute == 0:
-                self._save_timeframe_data('order_book_1hour', dt, 60, ask_total, bid_total, price)
-                saved_timeframes.append('1時間足')
-            
-            # 2時間足（偶数時の00分）
-            if dt.hour % 2 == 0 and dt.minute == 0:
-                self._save_timeframe_data('order_book_2hour', dt, 120, ask_total, bid_total, price)
-                saved_timeframes.append('2時間足')
-            
-            # 4時間足（0, 4, 8, 12, 16, 20時の00分）
-            if dt.hour in [0, 4, 8, 12, 16, 20] and dt.minute == 0:
-                self._save_timeframe_data('order_book_4hour', dt, 240, ask_total, bid_total, price)
-                saved_timeframes.append('4時間足')
-            
-            # 日足（毎日00:00）
-            if dt.hour == 0 and dt.minute == 0:
-                self._save_timeframe_data('order_book_daily', dt, 1440, ask_total, bid_total, price)
-                saved_timeframes.append('日足')
-            
-            # 保存した時間足をまとめてログ出力
-            if saved_timeframes:
-                msg = f"[時間足保存] {', '.join(saved_timeframes)} を保存対象として検出"
+            result = self.client.rpc(DOWNSAMPLE_FUNCTION, {
+                'p_retention_days': self.minute_tier_retention_days,
+                'p_group_id': self.group_id
+            }).execute()
+            counts = result.data[0] if result.data else {'downsampled': 0, 'deleted': 0}
+            if counts['deleted']:
+                msg = f"[{MINUTE_TIMEFRAME_NAME}] {self.minute_tier_retention_days}日より古い{counts['deleted']}件を削除し、5分足へ{counts['downsampled']}件を反映しました"
                 self.logger.info(msg)
                 if self.log_callback:
                     self.log_callback(msg, "INFO")
-                
+            return counts
         except Exception as e:
-            msg = f"[エラー] 時間足データ保存チェック失敗: {e}"
+            if is_missing_function_error(e):
+                # 保持ジョブがないサーバーでは呼び出しをやめる（pg_cronなどで実行している前提）
+                self.use_downsample = False
+                msg = f"[情報] {DOWNSAMPLE_FUNCTION} が見つからないため、1分足の間引きを行いません（create_1min_tier.sql を適用してください）"
+                self.logger.warning(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "WARNING")
+                return None
+            msg = f"[{MINUTE_TIMEFRAME_NAME}] 間引きエラー: {e}"
             self.logger.error(msg)
             if self.log_callback:
                 self.log_callback(msg, "ERROR")
+            raise
     
-    def _save_timeframe_data(self, table_name: str, dt: datetime, interval_minutes: int, 
-                            ask_total: float, bid_total: float, price: float):
-        """指定された時間足データをSupabaseに保存（改良版）"""
-        try:
-            # タイムスタンプを適切な時間足に丸める
-            if interval_minutes <= 60:  # 分足の場合
-                minutes = (dt.minute // interval_minutes) * interval_minutes
-                rounded_timestamp = dt.replace(minute=minutes, second=0, microsecond=0)
-            elif interval_minutes < 1440:  # 時間足の場合
-                hours = (dt.hour // (interval_minutes // 60)) * (interval_minutes // 60)
-                rounded_timestamp = dt.replace(hour=hours, minute=0, second=0, microsecond=0)
-            else:  # 日足の場合
-                rounded_timestamp = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # 時間足の名前を取得
-            timeframe_names = {
-                'order_book_15min': '15分足',
-                'order_book_30min': '30分足',
-                'order_book_1hour': '1時間足',
-                'order_book_2hour': '2時間足',
-                'order_book_4hour': '4時間足',
-                'order_book_daily': '日足'
-            }
-            timeframe_name = timeframe_names.get(table_name, table_name)
-            
-            # 統計情報を更新
-            self.stats['total_saves'] += 1
-            
-            # 別スレッドでデータを保存
-            thread = threading.Thread(
-                target=self._save_to_table_with_retry,
-                args=(table_name, timeframe_name, rounded_timestamp.isoformat(), ask_total, bid_total, price),
-                daemon=True
-            )
-            thread.start()
-            
-        except Exception as e:
-            self.stats['failed_saves'] += 1
-            msg = f"[{timeframe_name}] データ保存準備エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
+    def _build_row(self, table_name: str, timestamp: str, ask_total: float, bid_total: float, price: float) -> Dict[str, Any]:
+        """一括書き込み用の行を作成"""
+        return {
+            'table': table_name,
+            'timestamp': timestamp,
+            'ask_total': ask_total,
+            'bid_total': bid_total,
+            'price': price,
+            'group_id': self.group_id
+        }
     
-    @retry_on_failure(max_retries=3, delay=5)
-    def _save_to_table_with_retry(self, table_name: str, timeframe_name: str, timestamp: str, 
-                                 ask_total: float, bid_total: float, price: float):
-        """指定されたテーブルにデータを保存（リトライ機能付き・最大値比較付き）"""
-        try:
-            # 既存データを確認
-            existing = self.client.table(table_name)\
-                .select('*')\
-                .eq('timestamp', timestamp)\
-                .eq('group_id', self.group_id)\
-                .execute()
-            
-            if existing.data:
-                # 最大値を選択してアップデート
-                existing_data = existing.data[0]
-                if ask_total > existing_data['ask_total'] or bid_total > existing_data['bid_total']:
-                    update_data = {
-                        'ask_total': max(ask_total, existing_data['ask_total']),
-                        'bid_total': max(bid_total, existing_data['bid_total']),
-                        'price': price
-                    }
-                    self.client.table(table_name)\
-                        .update(update_data)\
-                        .eq('timestamp', timestamp)\
-                        .eq('group_id', self.group_id)\
-                        .execute()
-                    
-                    # 成功ログ（詳細化）
-                    dt = datetime.fromisoformat(timestamp)
-                    msg = f"[{timeframe_name}] ✓ 更新: {dt.strftime('%Y-%m-%d %H:%M:%S')} (Ask: {existing_data['ask_total']:.1f}→{update_data['ask_total']:.1f}, Bid: {existing_data['bid_total']:.1f}→{update_data['bid_total']:.1f})"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-                else:
-                    msg = f"[{timeframe_name}] - スキップ: {timestamp} (既に最新)"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
+    def _dispatch_batch(self, func, rows: list):
+        """一括書き込みをワーカープールに投入（キューが満杯なら破棄）"""
+        if not self.write_pool.submit(func, rows):
+            self.stats['failed_saves'] += len(rows)
+            if self.outbox:
+                msg = f"[クラウド書き込み] 送信キューが満杯のため {len(rows)}件 をアウトボックスに保留しました: {rows[0]['timestamp']}"
             else:
-                # 新規データとして挿入
-                data = {
-                    "timestamp": timestamp,
-                    "ask_total": ask_total,
-                    "bid_total": bid_total,
-                    "price": price,
-                    "group_id": self.group_id
-                }
-                self.client.table(table_name).insert(data).execute()
-                
-                # 成功ログ（詳細化）
-                dt = datetime.fromisoformat(timestamp)
-                msg = f"[{timeframe_name}] ✓ 新規保存: {dt.strftime('%Y-%m-%d %H:%M:%S')} | Ask: {ask_total:.1f} | Bid: {bid_total:.1f}"
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-            
-            # 統計情報と最終保存時刻を更新
-            self.stats['successful_saves'] += 1
-            self.last_save_times[table_name] = datetime.now()
-                
-        except Exception as e:
-            self.stats['failed_saves'] += 1
-            msg = f"[{timeframe_name}] ✗ 保存失敗: {timestamp} - {e}"
+                msg = f"[クラウド書き込み] 送信キューが満杯のため {len(rows)}件 を破棄しました: {rows[0]['timestamp']}"
+            self.logger.warning(msg)
+            if self.log_callback:
+                self.log_callback(msg, "WARNING")
+    
+    def _on_write_retry(self, func, args, error):
+        """書き込みの再試行をエラー分類ごとに数える"""
+        self.metrics.record_retry(error)
+    
+    def _on_write_failed(self, func, args, error):
+        """リトライ上限に達した書き込みの処理"""
+        if func == self.downsample_minute_tier:
+            msg = f"[{MINUTE_TIMEFRAME_NAME}] 間引きがリトライ上限に達しました（次回の実行時に再試行します）: {error}"
             self.logger.error(msg)
             if self.log_callback:
                 self.log_callback(msg, "ERROR")
-            raise e  # リトライのために例外を再発生
+            return
+        rows = args[0] if args else []
+        if self.outbox:
+            msg = f"[クラウド書き込み] リトライ上限に達したため {len(rows)}件 をアウトボックスに保留しました: {error}"
+        else:
+            msg = f"[クラウド書き込み] リトライ上限に達したため {len(rows)}件 を破棄しました: {error}"
+        self.logger.error(msg)
+        if self.log_callback:
+            self.log_callback(msg, "ERROR")
     
-    @retry_on_failure(max_retries=3, delay=5)
-    def _sync_to_cloud(self, timestamp: str, ask_total: float, bid_total: float, price: float):
-        """5分足データの同期（リトライ機能付き）"""
+    def _save_batch(self, rows: list) -> Dict[str, str]:
+        """行をまとめて保存し、テーブルごとの結果を返す（最大値比較付き・失敗時は例外を送出してプールが再試行）"""
         try:
-            data = {
-                "timestamp": timestamp,
-                "ask_total": ask_total,
-                "bid_total": bid_total,
-                "price": price,
-                "group_id": self.group_id
-            }
+            started = time.perf_counter()
+            results = self._write_batch(rows)
+            elapsed = time.perf_counter() - started
             
-            # 既存データを確認
-            existing = self.client.table('order_book_5min')\
-                .select('*')\
-                .eq('timestamp', timestamp)\
-                .eq('group_id', self.group_id)\
-                .execute()
+            # 1リクエストにまとめた行は、どのテーブルも同じ時間で保存されたものとして記録
+            for table_name in {row['table'] for row in rows}:
+                self.metrics.observe_write(table_name, elapsed)
             
-            if existing.data:
-                # 最大値を選択してアップデート
-                existing_data = existing.data[0]
-                if ask_total > existing_data['ask_total'] or bid_total > existing_data['bid_total']:
-                    update_data = {
-                        'ask_total': max(ask_total, existing_data['ask_total']),
-                        'bid_total': max(bid_total, existing_data['bid_total']),
-                        'price': price
-                    }
-                    self.client.table('order_book_5min')\
-                        .update(update_data)\
-                        .eq('timestamp', timestamp)\
-                        .eq('group_id', self.group_id)\
-                        .execute()
-                    msg = f"[5分足] ✓ 更新: {timestamp} (Ask: {existing_data['ask_total']:.1f}→{update_data['ask_total']:.1f}, Bid: {existing_data['bid_total']:.1f}→{update_data['bid_total']:.1f})"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-                else:
-                    msg = f"[5分足] - スキップ: {timestamp} (既に最新)"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-            else:
-                # 新規データとして挿入
-                self.client.table('order_book_5min').insert(data).execute()
-                msg = f"[5分足] ✓ 新規保存: {timestamp} | Ask: {ask_total:.1f} | Bid: {bid_total:.1f} | Price: ${price:,.1f}"
+            minute_actions = {}
+            for row in rows:
+                table_name = row['table']
+                action, previous, current = results[(table_name, row['timestamp'])]
+                self.metrics.count_rows(table_name, action)
+                self._update_cloud_latest(table_name, row['timestamp'])
+                if table_name == MINUTE_TABLE:
+                    # 1分足は行ごとではなく件数でログ出力
+                    minute_actions[action] = minute_actions.get(action, 0) + 1
+                    continue
+                self._log_write_result(table_name, row, action, previous, current)
+                if table_name in self.last_save_times:
+                    self.last_save_times[table_name] = datetime.now()
+            
+            if minute_actions:
+                msg = (f"[{MINUTE_TIMEFRAME_NAME}] ✓ 保存: 新規 {minute_actions.get('inserted', 0)}件 / "
+                       f"更新 {minute_actions.get('updated', 0)}件 / スキップ {minute_actions.get('skipped', 0)}件")
                 self.logger.info(msg)
                 if self.log_callback:
                     self.log_callback(msg, "INFO")
             
-            self.stats['successful_saves'] += 1
+            # 統計情報を更新
+            self.stats['successful_saves'] += len(rows)
+            if self.leader_lease and rows:
+                self.leader_lease.report_synced(max(rows, key=lambda row: parse_timestamp(row['timestamp']))['timestamp'])
+            if self.outbox:
+                self.outbox.remove(rows)
+                # 送信できたので、通信断中に残った行があれば再送する
+                if self.outbox_drainer:
+                    self.outbox_drainer.wake()
+            return {table_name: action for (table_name, _), (action, _, _) in results.items()}
                 
         except Exception as e:
-            self.stats['failed_saves'] += 1
-            msg = f"[5分足] ✗ 同期エラー: {e}"
+            self.stats['failed_saves'] += len(rows)
+            self.metrics.record_error('write', e)
+            # 1分足はまとめて送るため、同じ時間足の名前は1回だけ表示
+            names = ', '.join(dict.fromkeys(
+                MINUTE_TIMEFRAME_NAME if row['table'] == MINUTE_TABLE else TIMEFRAME_NAMES.get(row['table'], row['table'])
+                for row in rows))
+            msg = f"[{names}] ✗ 保存失敗: {rows[0]['timestamp'] if rows else ''} - {e}"
             self.logger.error(msg)
             if self.log_callback:
                 self.log_callback(msg, "ERROR")
-            raise e  # リトライのために例外を再発生
+            raise e  # ワーカープールでのリトライのために例外を再発生
+    
+    def _update_cloud_latest(self, table_name: str, timestamp: str):
+        """クラウドにあることが分かった行のタイムスタンプで、テーブルの最新時刻を更新"""
+        try:
+            dt = parse_timestamp(timestamp)
+        except (TypeError, ValueError):
+            return
+        current = self.cloud_latest.get(table_name)
+        if current is None or dt > current:
+            self.cloud_latest[table_name] = dt
+    
+    def _replay_outbox_rows(self, rows: list):
+        """アウトボックスに残った行をまとめて再送（ドレイナーから呼ばれる）"""
+        self._write_batch(rows)
+    
+    def _write_batch(self, rows: list) -> Dict[tuple, tuple]:
+        """行をまとめて最大値マージし、(テーブル, タイムスタンプ)ごとの(action, previous, current)を返す"""
+        self.stats['batch_requests'] += 1
+        return self.transport.write_rows(rows)
+    
+    def _log_write_result(self, table_name: str, row: Dict[str, Any], action: str,
+                          previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]):
+        """1行分の保存結果をログ出力"""
+        timeframe_name = TIMEFRAME_NAMES.get(table_name, table_name)
+        timestamp = row['timestamp']
+        if action == 'updated':
+            msg = f"[{timeframe_name}] ✓ 更新: {timestamp} ({self._format_change(previous, current)})"
+        elif action == 'inserted':
+            msg = f"[{timeframe_name}] ✓ 新規保存: {timestamp} | Ask: {row['ask_total']:.1f} | Bid: {row['bid_total']:.1f} | Price: ${row['price']:,.1f}"
+        else:
+            msg = f"[{timeframe_name}] - スキップ: {timestamp} (既に最新)"
+        self.logger.info(msg)
+        if self.log_callback:
+            self.log_callback(msg, "INFO")
+    
+    def shutdown_writes(self, timeout: float = 5.0):
+        """保留中の書き込みを送信してからワーカープールを停止"""
+        if self.minute_buffer and self.enabled and self.client:
+            minute_rows = self.minute_buffer.drain()
+            if minute_rows:
+                self._submit_rows(minute_rows)
+        self.batch_writer.flush()
+        self.write_pool.stop(timeout)
+        if self.leader_lease:
+            self.leader_lease.stop(timeout)
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.outbox_drainer:
+            self.outbox_drainer.stop(timeout)
+        if self.outbox:
+            self.outbox.close()
+            self.outbox = None
+    
+    @staticmethod
+    def _format_change(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> str:
+        """更新ログ用のAsk/Bid変化の文字列"""
+        if previous:
+            return (f"Ask: {previous['ask_total']:.1f}→{current['ask_total']:.1f}, "
+                    f"Bid: {previous['bid_total']:.1f}→{current['bid_total']:.1f}")
+        return f"Ask: →{float(current['ask_total']):.1f}, Bid: →{float(current['bid_total']):.1f}"
+
+    # 各テーブルのデータが正常とみなせる経過時間（秒）
+    HEALTH_MAX_AGE_SECONDS = {
+        'order_book_5min': 300,
+        'order_book_15min': 900,
+        'order_book_30min': 1800,
+        'order_book_1hour': 3600,
+        'order_book_2hour': 7200,
+        'order_book_4hour': 14400,
+        'order_book_daily': 86400
+    }
     
     def health_check(self) -> Dict[str, Any]:
-        """ヘルスチェック機能"""
+        """ヘルスチェック機能（メモリ上の統計だけで判定し、ネットワークにはアクセスしない）
+        
+        各テーブルの鮮度は、このセッションで保存に成功した行とRealtime等で受け取った行のうち
+        最も新しいタイムスタンプから判定する
+        """
         if not self.enabled or not self.client:
             return {
                 'status': 'DISABLED',
@@ -411,73 +709,51 @@ class CloudSyncManager:
             }
         
         try:
+            now = datetime.now(timezone.utc)
+            pool_stats = self.write_pool.get_stats()
             results = {
                 'status': 'OK',
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': now.isoformat(),
                 'statistics': self.stats.copy(),
+                'write_pool': pool_stats,
+                'outbox_pending': self.outbox.count() if self.outbox else 0,
+                'errors': self.metrics.snapshot()['errors'],
                 'table_status': {}
             }
             
-            # 各テーブルの最新データをチェック
-            tables = [
-                ('order_book_5min', '5分足', 300),  # 5分データは5時間以内が正常
-                ('order_book_15min', '15分足', 900),  # 15分データは15時間以内が正常
-                ('order_book_30min', '30分足', 1800),  # 30分データは30時間以内が正常
-                ('order_book_1hour', '1時間足', 3600),  # 1時間データは60時間以内が正常
-                ('order_book_2hour', '2時間足', 7200),  # 2時間データは120時間以内が正常
-                ('order_book_4hour', '4時間足', 14400),  # 4時間データは240時間以内が正常
-                ('order_book_daily', '日足', 86400)  # 日足データは10日以内が正常
-            ]
-            
-            for table_name, timeframe_name, max_age_seconds in tables:
-                try:
-                    # 最新データを取得
-                    latest = self.client.table(table_name)\
-                        .select('timestamp')\
-                        .eq('group_id', self.group_id)\
-                        .order('timestamp', desc=True)\
-                        .limit(1)\
-                        .execute()
-                    
-                    if latest.data:
-                        last_update = datetime.fromisoformat(latest.data[0]['timestamp'].replace('Z', '+00:00'))
-                        age = (datetime.now() - last_update).total_seconds()
-                        
-                        if age < max_age_seconds:
-                            status = 'OK'
-                        elif age < max_age_seconds * 2:
-                            status = 'WARNING'
-                        else:
-                            status = 'STALE'
-                        
-                        results['table_status'][table_name] = {
-                            'name': timeframe_name,
-                            'status': status,
-                            'last_update': last_update.isoformat(),
-                            'age_minutes': round(age / 60, 1)
-                        }
-                    else:
-                        results['table_status'][table_name] = {
-                            'name': timeframe_name,
-                            'status': 'EMPTY',
-                            'message': 'データがありません'
-                        }
-                        
-                except Exception as e:
+            for table_name, max_age_seconds in self.HEALTH_MAX_AGE_SECONDS.items():
+                timeframe_name = TIMEFRAME_NAMES[table_name]
+                last_update = self.cloud_latest.get(table_name)
+                if last_update is None:
                     results['table_status'][table_name] = {
                         'name': timeframe_name,
-                        'status': 'ERROR',
-                        'error': str(e)
+                        'status': 'EMPTY',
+                        'message': 'このセッションでは保存・受信したデータがありません'
                     }
+                    continue
+                
+                age = (now - last_update).total_seconds()
+                if age < max_age_seconds:
+                    status = 'OK'
+                elif age < max_age_seconds * 2:
+                    status = 'WARNING'
+                else:
+                    status = 'STALE'
+                results['table_status'][table_name] = {
+                    'name': timeframe_name,
+                    'status': status,
+                    'last_update': last_update.isoformat(),
+                    'age_minutes': round(age / 60, 1)
+                }
             
             # 全体のステータスを判定
             statuses = [t.get('status', 'ERROR') for t in results['table_status'].values()]
-            if all(s == 'OK' for s in statuses):
+            if pool_stats['breaker_state'] != CloudWritePool.CLOSED:
+                results['status'] = 'ERROR'
+                results['message'] = '書き込みの連続失敗により送信を停止しています'
+            elif all(s == 'OK' for s in statuses):
                 results['status'] = 'HEALTHY'
                 results['message'] = 'すべてのテーブルが正常です'
-            elif any(s == 'ERROR' for s in statuses):
-                results['status'] = 'ERROR'
-                results['message'] = 'エラーが発生しているテーブルがあります'
             elif any(s == 'STALE' for s in statuses):
                 results['status'] = 'WARNING'
                 results['message'] = '古いデータのテーブルがあります'
@@ -485,11 +761,15 @@ class CloudSyncManager:
                 results['status'] = 'OK'
                 results['message'] = '概ね正常です'
             
-            # ヘルスチェック実行をログに記録
+            # ヘルスチェック実行をログに記録（/health の定期取得でログが埋まらないよう、変化時以外はDEBUG）
             msg = f"[ヘルスチェック] {results['status']}: {results['message']}"
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
+            if results['status'] != self._last_health_status:
+                self._last_health_status = results['status']
+                self.logger.info(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "INFO")
+            else:
+                self.logger.debug(msg)
             
             self.stats['last_health_check'] = datetime.now().isoformat()
             return results
@@ -504,6 +784,59 @@ class CloudSyncManager:
                 'error': str(e)
             }
     
+    def metrics_families(self) -> list:
+        """CloudMetricsの集計値に、書き込みキュー・アウトボックス・Realtime・HTTPの現在値を加えたメトリクス"""
+        families = self.metrics.families()
+        pool_stats = self.write_pool.get_stats()
+        families.append(('cloud_write_queue_depth', 'gauge', '書き込みキューの待ち件数',
+                         [({'queue': 'ready'}, pool_stats['queue_depth']),
+                          ({'queue': 'scheduled'}, pool_stats['scheduled'])]))
+        families.append(('cloud_write_in_flight', 'gauge', '送信中の書き込み', [({}, pool_stats['in_flight'])]))
+        families.append(('cloud_write_tasks_total', 'counter', 'ワーカープールの書き込みタスク数',
+                         [({'result': key}, pool_stats[key])
+                          for key in ('submitted', 'completed', 'failed', 'retried', 'rejected')]))
+        families.append(('cloud_write_breaker_open', 'gauge', 'サーキットブレーカーで送信を止めているか',
+                         [({}, 0 if pool_stats['breaker_state'] == CloudWritePool.CLOSED else 1)]))
+        families.append(('cloud_outbox_pending_rows', 'gauge', 'アウトボックスの未送信行数',
+                         [({}, self.outbox.count() if self.outbox else 0)]))
+        if self.transport:
+            transport = self.transport.get_stats()
+            families.append(('cloud_transport_requests_total', 'counter', '書き込み方式ごとの送信リクエスト数',
+                             [({'transport': transport['transport']}, transport['requests'])]))
+        
+        http = self.request_metrics.summary()
+        families.append(('cloud_http_requests_total', 'counter', 'エンドポイントごとのHTTPリクエスト数',
+                         [({'endpoint': endpoint}, e['count']) for endpoint, e in sorted(http['endpoints'].items())]))
+        families.append(('cloud_http_errors_total', 'counter', 'エンドポイントごとのHTTPエラー応答数',
+                         [({'endpoint': endpoint}, e['errors']) for endpoint, e in sorted(http['endpoints'].items())]))
+        families.append(('cloud_http_bytes_total', 'counter', 'HTTPの送受信バイト数（受信は圧縮後）',
+                         [({'direction': 'sent'}, http['bytes_sent']),
+                          ({'direction': 'received'}, http['bytes_received'])]))
+        
+        if self.realtime_sync:
+            realtime = self.realtime_sync.stats
+            lag = [({'stat': stat}, realtime[f'lag_ms{suffix}'] / 1000)
+                   for stat, suffix in (('last', ''), ('avg', '_avg'), ('max', '_max'))
+                   if realtime.get(f'lag_ms{suffix}') is not None]
+            families.append(('cloud_realtime_lag_seconds', 'gauge', 'Realtimeのコミットからローカル反映までの遅延', lag))
+            families.append(('cloud_realtime_events_total', 'counter', 'テーブルごとのRealtime受信イベント数',
+                             [({'table': t}, count) for t, count in sorted(realtime['events'].items())]))
+            families.append(('cloud_realtime_reconnects_total', 'counter', 'Realtimeの再接続回数',
+                             [({}, realtime['reconnects'])]))
+        
+        now = datetime.now(timezone.utc)
+        families.append(('cloud_table_data_age_seconds', 'gauge', 'テーブルごとの最新データの経過時間',
+                         [({'table': t}, round((now - latest).total_seconds(), 3))
+                          for t, latest in sorted(self.cloud_latest.items())]))
+        if self.leader_lease:
+            families.append(('cloud_leader', 'gauge', 'このクライアントがリーダーか',
+                             [({}, 1 if self.leader_lease.is_leader() else 0)]))
+        return families
+    
+    def render_metrics(self) -> str:
+        """Prometheusのテキスト形式のメトリクス"""
+        return render_prometheus(self.metrics_families())
+    
     def get_statistics(self) -> Dict[str, Any]:
         """統計情報を取得"""
         stats = self.stats.copy()
@@ -516,6 +849,31 @@ class CloudSyncManager:
         else:
             stats['success_rate'] = 0
         
+        # ワーカープールの状態
+        pool_stats = self.write_pool.get_stats()
+        stats['queue_depth'] = pool_stats['queue_depth']
+        stats['in_flight'] = pool_stats['in_flight']
+        stats['retry_count'] = pool_stats['retried']
+        stats['write_pool'] = pool_stats
+        stats['outbox_pending'] = self.outbox.count() if self.outbox else 0
+        if self.outbox_drainer:
+            stats['outbox'] = dict(self.outbox_drainer.stats)
+        
+        # HTTPリクエストの応答時間
+        stats['http'] = self.request_metrics.summary()
+        
+        # Realtime購読の状態
+        if self.realtime_sync:
+            stats['realtime'] = dict(self.realtime_sync.stats)
+        stats['realtime_batch'] = dict(self.realtime_batcher.stats)
+        stats['metrics'] = self.metrics.snapshot()
+        if self.transport:
+            stats['transport'] = self.transport.get_stats()
+        if self.leader_lease:
+            stats['leader'] = self.leader_lease.get_stats()
+        if self.minute_buffer:
+            stats['minute_tier'] = dict(self.minute_buffer.stats, pending=self.minute_buffer.pending_count())
+        
         # 各テーブルの最終保存からの経過時間
         stats['last_save_ages'] = {}
         for table_name, last_time in self.last_save_times.items():
@@ -538,32 +896,12 @@ class CloudSyncManager:
             if self.log_callback:
                 self.log_callback(msg, "INFO")
             
-            # 全データを取得（最大10000件まで）
-            result = self.client.table('order_book_5min')\
-                .select('*')\
-                .eq('group_id', self.group_id)\
-                .order('timestamp')\
-                .limit(10000)\
-                .execute()
+            # 全データをページ単位で取得
+            records = [row for page in self.iter_pages('order_book_5min') for row in page]
             
-            if result.data:
+            if records:
                 # 重複するタイムスタンプがある場合は最大値を選択
-                consolidated_data = {}
-                for record in result.data:
-                    ts = record['timestamp']
-                    if ts not in consolidated_data:
-                        consolidated_data[ts] = record
-                    else:
-                        # 最大値を選択
-                        existing = consolidated_data[ts]
-                        consolidated_data[ts] = {
-                            'timestamp': ts,
-                            'ask_total': max(record['ask_total'], existing['ask_total']),
-                            'bid_total': max(record['bid_total'], existing['bid_total']),
-                            'price': record['price']
-                        }
-                
-                result_list = list(consolidated_data.values())
+                result_list = consolidate_max(records)
                 msg = f"[データ取得] ✓ {len(result_list)}件のデータを取得しました"
                 self.logger.info(msg)
                 if self.log_callback:
@@ -594,33 +932,17 @@ class CloudSyncManager:
             if self.log_callback:
                 self.log_callback(msg, "INFO")
             
-            # 指定期間のデータを取得
-            result = self.client.table('order_book_5min')\
-                .select('*')\
-                .eq('group_id', self.group_id)\
-                .gte('timestamp', start_time.strftime('%Y-%m-%d %H:%M:%S'))\
-                .lte('timestamp', end_time.strftime('%Y-%m-%d %H:%M:%S'))\
-                .order('timestamp')\
-                .execute()
+            # 指定期間のデータをページ単位で取得
+            records = [row for page in self.iter_pages(
+                'order_book_5min',
+                after=start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                until=end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                include_after=True
+            ) for row in page]
             
-            if result.data:
+            if records:
                 # 重複するタイムスタンプがある場合は最大値を選択
-                consolidated_data = {}
-                for record in result.data:
-                    ts = record['timestamp']
-                    if ts not in consolidated_data:
-                        consolidated_data[ts] = record
-                    else:
-                        # 最大値を選択
-                        existing = consolidated_data[ts]
-                        consolidated_data[ts] = {
-                            'timestamp': ts,
-                            'ask_total': max(record['ask_total'], existing['ask_total']),
-                            'bid_total': max(record['bid_total'], existing['bid_total']),
-                            'price': record['price']
-                        }
-                
-                result_list = list(consolidated_data.values())
+                result_list = consolidate_max(records)
                 msg = f"[欠損データ取得] ✓ {len(result_list)}件のデータを取得"
                 self.logger.info(msg)
                 if self.log_callback:
@@ -640,74 +962,111 @@ class CloudSyncManager:
                 self.log_callback(msg, "ERROR")
             return []
     
-    def fetch_initial_data(self) -> Dict[str, list]:
-        """起動時に各時間足テーブルからデータを取得"""
+    def iter_pages(self, table_name: str, after: Optional[str] = None, until: Optional[str] = None,
+                   include_after: bool = False):
+        """自グループの行をタイムスタンプ昇順のページ単位で返すジェネレータ（件数上限なし）"""
+        return iter_pages(self.client, table_name, self.group_id, after=after, until=until,
+                          page_size=self.page_size, include_after=include_after)
+    
+    def stream_range(self, table_name: str, after: Optional[str], until: Optional[str], sink: Callable,
+                     job: Optional[str] = None, include_after: bool = False) -> int:
+        """範囲内の行をページごとにsink(table_name, page)へ渡し、渡した件数を返す
+        
+        jobを指定すると、各ページをsinkに渡した後の位置を保存し、
+        同じjob・同じ終了位置で再度呼ばれたときは中断した位置から再開する
+        """
+        if job and self.cursor_store:
+            saved = self.cursor_store.get(job)
+            if saved and saved['until'] == until and (not after or saved['position'] > after):
+                after, include_after = saved['position'], False
+        
+        total = 0
+        for page in self.iter_pages(table_name, after=after, until=until, include_after=include_after):
+            position = page[-1]['timestamp']
+            # 重複するタイムスタンプがある場合は最大値を選択
+            page = consolidate_max(page)
+            sink(table_name, page)
+            total += len(page)
+            if job and self.cursor_store:
+                self.cursor_store.set(job, position, until)
+        
+        if job and self.cursor_store:
+            self.cursor_store.clear(job)
+        return total
+    
+    def sync_tables_to_local(self, since: Dict[str, Optional[str]], sink: Callable) -> Dict[str, int]:
+        """各時間足テーブルのsince以降の行をページごとにsink(table_name, page)へ流す（7テーブル並行）
+        
+        sinceの行自体も、他クライアントによる更新を反映するため含める。
+        戻り値はテーブルごとの件数（取得エラーのテーブルは-1）
+        """
         if not self.enabled or not self.client:
             return {}
         
-        tables = [
-            ('order_book_5min', '5分足'),
-            ('order_book_15min', '15分足'),
-            ('order_book_30min', '30分足'),
-            ('order_book_1hour', '1時間足'),
-            ('order_book_2hour', '2時間足'),
-            ('order_book_4hour', '4時間足'),
-            ('order_book_daily', '日足')
-        ]
-        
-        all_data = {}
+        counts = {}
+        with ThreadPoolExecutor(max_workers=len(TIMEFRAME_NAMES), thread_name_prefix="InitialFetch") as executor:
+            futures = {
+                executor.submit(self._sync_table_to_local, table_name, since.get(table_name), sink): table_name
+                for table_name in TIMEFRAME_NAMES
+            }
+            for future in as_completed(futures):
+                counts[futures[future]] = future.result()
+        return counts
+    
+    def sync_minute_tier_to_local(self, since: Optional[str], sink: Callable) -> int:
+        """クラウドの1分足（保持期間内）のsince以降の行をページごとにsink(table_name, page)へ流し、件数を返す
         
-        for table_name, timeframe_name in tables:
-            try:
-                msg = f"[初期データ取得] {timeframe_name}を取得中..."
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-                
-                # 各テーブルから最新1000件を取得
-                result = self.client.table(table_name)\
-                    .select('*')\
-                    .eq('group_id', self.group_id)\
-                    .order('timestamp', desc=True)\
-                    .limit(1000)\
-                    .execute()
+        1分足の階層が無効なら0、取得エラーなら-1
+        """
+        if not self.enabled or not self.client or not self.minute_tier:
+            return 0
+        return self._sync_table_to_local(MINUTE_TABLE, since, sink)
+    
+    def _sync_table_to_local(self, table_name: str, since: Optional[str], sink: Callable) -> int:
+        """1テーブル分をページ単位で取得してsinkへ流す（エラー時は-1）"""
+        timeframe_name = MINUTE_TIMEFRAME_NAME if table_name == MINUTE_TABLE else TIMEFRAME_NAMES[table_name]
+        try:
+            msg = f"[初期データ取得] {timeframe_name}を取得中...（{since or '全期間'} 以降）"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+            
+            count = self.stream_range(table_name, since, None, sink, include_after=True)
+            
+            if count:
+                msg = f"[初期データ取得] ✓ {timeframe_name}: {count}件取得"
+            else:
+                msg = f"[初期データ取得] {timeframe_name}: 新しいデータなし"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+            return count
                 
-                if result.data:
-                    # 重複するタイムスタンプがある場合は最大値を選択
-                    consolidated_data = {}
-                    for record in result.data:
-                        ts = record['timestamp']
-                        if ts not in consolidated_data:
-                            consolidated_data[ts] = record
-                        else:
-                            # 最大値を選択
-                            existing = consolidated_data[ts]
-                            consolidated_data[ts] = {
-                                'timestamp': ts,
-                                'ask_total': max(record['ask_total'], existing['ask_total']),
-                                'bid_total': max(record['bid_total'], existing['bid_total']),
-                                'price': record['price']
-                            }
-                    
-                    all_data[table_name] = list(consolidated_data.values())
-                    msg = f"[初期データ取得] ✓ {timeframe_name}: {len(all_data[table_name])}件取得"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-                else:
-                    all_data[table_name] = []
-                    msg = f"[初期データ取得] {timeframe_name}: データなし"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-                        
-            except Exception as e:
-                msg = f"[初期データ取得] ✗ {timeframe_name}取得エラー: {e}"
-                self.logger.error(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "ERROR")
-                all_data[table_name] = []
+        except Exception as e:
+            self.metrics.record_error('read', e)
+            msg = f"[初期データ取得] ✗ {timeframe_name}取得エラー: {e}"
+            self.logger.error(msg)
+            if self.log_callback:
+                self.log_callback(msg, "ERROR")
+            return -1
+    
+    def fetch_initial_data(self, since: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, list]:
+        """起動時に各時間足テーブルからデータを取得し、テーブルごとのリストで返す
         
+        sinceにテーブルごとのローカル最新タイムスタンプを渡すと、それ以降の行だけを取得する。
+        大きな範囲ではメモリに溜めずに済む sync_tables_to_local を使うこと
+        """
+        if not self.enabled or not self.client:
+            return {}
+        
+        all_data = {table_name: [] for table_name in TIMEFRAME_NAMES}
+        lock = threading.Lock()
+        
+        def collect(table_name, page):
+            with lock:
+                all_data[table_name].extend(page)
+        
+        self.sync_tables_to_local(since or {}, collect)
         return all_data
     
     def get_sync_status(self) -> Dict[str, Any]:
@@ -726,7 +1085,7 @@ class CloudSyncManager:
         
         return status
     
-    def setup_realtime_sync(self, local_db_callback=None):
+    def setup_realtime_sync(self, local_db_callback=None, local_batch_callback=None):
         """Realtime同期の設定"""
         if not self.enabled or not self.client or not self.realtime_enabled:
             return False
@@ -734,6 +1093,8 @@ class CloudSyncManager:
         # ローカルDB保存用コールバックを設定
         if local_db_callback:
             self.local_db_callback = local_db_callback
+        if local_batch_callback:
+            self.local_batch_callback = local_batch_callback
         
         # 非同期版Realtimeクラスが利用可能か確認
         if not REALTIME_AVAILABLE:
@@ -747,7 +1108,8 @@ class CloudSyncManager:
             # Realtime同期インスタンスを作成
             self.realtime_sync = RealtimeSync(
                 config=self.config,
-                log_callback=self.log_callback
+                log_callback=self.log_callback,
+                client_factory=self.realtime_client_factory
             )
             
             # 更新コールバックを設定
@@ -758,10 +1120,16 @@ class CloudSyncManager:
                     'event_type': event_type,
                     'new': new_data
                 }
-                self.handle_realtime_update(table_name, timeframe_name, payload)
+                # バッチャーへ渡したUPDATEはTrue（遅延はローカルへの反映時に記録する）
+                return self.handle_realtime_update(table_name, timeframe_name, payload)
+            
+            # 再接続したら切断中の変更をバックグラウンドで補完
+            def realtime_reconnect_handler():
+                threading.Thread(target=self.catch_up_realtime, daemon=True, name="RealtimeCatchUp").start()
             
             # Realtime同期を開始
-            if self.realtime_sync.start(update_callback=realtime_update_handler):
+            if self.realtime_sync.start(update_callback=realtime_update_handler,
+                                        reconnect_callback=realtime_reconnect_handler):
                 msg = "[Realtime] 非同期版Realtime同期を開始しました"
                 self.logger.info(msg)
                 if self.log_callback:
@@ -782,7 +1150,7 @@ class CloudSyncManager:
             return False
     
     def handle_realtime_update(self, table_name: str, timeframe_name: str, payload: Dict[str, Any]):
-        """他ユーザーからの更新を処理"""
+        """他ユーザーからの更新を処理（UPDATEをバッチャーへ渡した場合はTrue）"""
         try:
             event_type = payload.get('event_type', 'UNKNOWN')
             
@@ -798,20 +1166,15 @@ class CloudSyncManager:
                 if not new_timestamp:
                     return
                 
-                # UPDATEイベントの場合は直接ローカルDBに保存（タイムスタンプチェック不要）
+                # UPDATEイベントはバッチャーに渡し、時間窓ごとにまとめてローカルDBに保存（タイムスタンプチェック不要）
                 if event_type == 'UPDATE':
-                    # 単一レコードをリストとして渡す
-                    if self.local_db_callback:
-                        self.local_db_callback(table_name, [new_data])
-                        
-                        # 統計情報を更新
-                        self.stats['realtime_updates'] += 1
-                        
-                        msg = f"[Realtime] {timeframe_name}: UPDATEイベントを処理 (timestamp: {new_timestamp}, ask: {new_data.get('ask_total')}, bid: {new_data.get('bid_total')})"
-                        self.logger.info(msg)
-                        if self.log_callback:
-                            self.log_callback(msg, "INFO")
-                    return
+                    if self.local_db_callback or self.local_batch_callback:
+                        record = dict(new_data)
+                        commit_timestamp = record.pop('commit_timestamp', None)
+                        self.realtime_batcher.submit(table_name, record, commit_timestamp)
+                        self.logger.debug(f"[Realtime] {timeframe_name}: UPDATEイベントを受信 (timestamp: {new_timestamp})")
+                        return True
+                    return False
                 
                 # INSERTの場合は従来通りタイムスタンプチェック
                 if table_name not in self.latest_timestamps:
@@ -819,74 +1182,99 @@ class CloudSyncManager:
                 
                 latest_local = self.latest_timestamps[table_name]
                 
-                # より新しいデータの場合
+                # より新しいデータの場合はギャップデータの取得を要求
+                # （同じテーブルの要求はまとめられ、取得・保存はバックグラウンドで行う）
                 if not latest_local or new_timestamp > latest_local:
-                    # ギャップデータを取得
-                    gap_data = self.fetch_gap_data(table_name, latest_local, new_timestamp)
-                    
-                    if gap_data:
-                        # ローカルDBに保存（コールバック経由）
-                        if self.local_db_callback:
-                            self.local_db_callback(table_name, gap_data)
-                        
-                        # 最新タイムスタンプを更新
-                        self.latest_timestamps[table_name] = new_timestamp
-                        
-                        # 統計情報を更新
-                        self.stats['realtime_updates'] += len(gap_data)
-                        
-                        msg = f"[Realtime] {timeframe_name}: {len(gap_data)}件の新規データを同期"
-                        self.logger.info(msg)
-                        if self.log_callback:
-                            self.log_callback(msg, "INFO")
+                    self.gap_backfill.request(table_name, latest_local, new_timestamp)
                 
         except Exception as e:
+            self.metrics.record_error('realtime', e)
             msg = f"[Realtime] {timeframe_name}更新処理エラー: {e}"
             self.logger.error(msg)
             if self.log_callback:
                 self.log_callback(msg, "ERROR")
     
+    def catch_up_realtime(self):
+        """Realtime再接続後、各テーブルの直近の区間を取得し直し、最新タイムスタンプより新しい行を補完"""
+        if not self.enabled or not self.client:
+            return
+        
+        for table_name, timeframe_name in TIMEFRAME_NAMES.items():
+            after = self.latest_timestamps.get(table_name)
+            if not after:
+                continue
+            try:
+                # 切断中のUPDATE（開いている境界の最大値マージなど）は最新タイムスタンプ以前の行に入るため、
+                # 最新タイムスタンプを含む直近の区間はそのまま取得し直す
+                refetch_from = parse_timestamp(after) - timedelta(
+                    minutes=TABLE_INTERVALS[table_name] * self.realtime_refetch_intervals)
+                rows = self._fetch_gap_rows(table_name, refetch_from.isoformat(), after)
+                if rows:
+                    self._apply_gap_rows(table_name, rows, after)
+                
+                latest = self.client.table(table_name)\
+                    .select('timestamp')\
+                    .eq('group_id', self.group_id)\
+                    .order('timestamp', desc=True)\
+                    .limit(1)\
+                    .execute().data
+                if latest and latest[0]['timestamp'] > after:
+                    self.gap_backfill.request(table_name, after, latest[0]['timestamp'])
+            except Exception as e:
+                msg = f"[Realtime] {timeframe_name}の再接続後の補完に失敗: {e}"
+                self.logger.error(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "ERROR")
+    
+    def _apply_realtime_batch(self, batches: Dict[str, list]):
+        """時間窓内のUPDATEイベントをまとめてローカルDBに保存（RealtimeBatcherから呼ばれる）"""
+        if self.local_batch_callback:
+            self.local_batch_callback(batches)
+        elif self.local_db_callback:
+            for table_name, records in batches.items():
+                self.local_db_callback(table_name, records)
+        else:
+            return
+        
+        # 統計情報を更新
+        count = sum(len(records) for records in batches.values())
+        self.stats['realtime_updates'] += count
+        
+        summary = ", ".join(f"{TIMEFRAME_NAMES.get(t, t)} {len(r)}件" for t, r in batches.items())
+        msg = f"[Realtime] UPDATEイベント{count}件をまとめて反映 ({summary})"
+        self.logger.info(msg)
+        if self.log_callback:
+            self.log_callback(msg, "INFO")
+    
+    def _record_realtime_lag(self, commit_timestamps: list):
+        """まとめて反映したUPDATEイベントごとに、コミットからローカル反映までの遅延を記録"""
+        if self.realtime_sync:
+            for commit_timestamp in commit_timestamps:
+                self.realtime_sync.record_lag(commit_timestamp)
+    
+    def _apply_gap_rows(self, table_name: str, rows: list, until: str):
+        """欠損補完で取得した行をまとめてローカルDBに保存（GapBackfillCoordinatorから呼ばれる）"""
+        if self.local_db_callback:
+            self.local_db_callback(table_name, rows)
+        
+        # 最新タイムスタンプを更新
+        self.update_latest_timestamps(table_name, until)
+        
+        # 統計情報を更新
+        self.stats['realtime_updates'] += len(rows)
+        
+        msg = f"[Realtime] {TIMEFRAME_NAMES.get(table_name, table_name)}: {len(rows)}件の新規データを同期"
+        self.logger.info(msg)
+        if self.log_callback:
+            self.log_callback(msg, "INFO")
+    
     def fetch_gap_data(self, table_name: str, start_timestamp: Optional[str], end_timestamp: str) -> list:
         """指定期間のギャップデータを取得"""
         if not self.enabled or not self.client:
             return []
         
         try:
-            query = self.client.table(table_name)\
-                .select('*')\
-                .eq('group_id', self.group_id)
-            
-            # 開始タイムスタンプがある場合
-            if start_timestamp:
-                query = query.gt('timestamp', start_timestamp)
-            
-            # 終了タイムスタンプまで
-            query = query.lte('timestamp', end_timestamp)\
-                .order('timestamp')\
-                .limit(100)  # 一度に100件まで
-            
-            result = query.execute()
-            
-            if result.data:
-                # 重複するタイムスタンプがある場合は最大値を選択
-                consolidated_data = {}
-                for record in result.data:
-                    ts = record['timestamp']
-                    if ts not in consolidated_data:
-                        consolidated_data[ts] = record
-                    else:
-                        # 最大値を選択
-                        existing = consolidated_data[ts]
-                        consolidated_data[ts] = {
-                            'timestamp': ts,
-                            'ask_total': max(record['ask_total'], existing['ask_total']),
-                            'bid_total': max(record['bid_total'], existing['bid_total']),
-                            'price': record['price']
-                        }
-                
-                return list(consolidated_data.values())
-            
-            return []
+            return self._fetch_gap_rows(table_name, start_timestamp, end_timestamp)
             
         except Exception as e:
             msg = f"[Realtime] ギャップデータ取得エラー: {e}"
@@ -895,6 +1283,15 @@ class CloudSyncManager:
                 self.log_callback(msg, "ERROR")
             return []
     
+    def _fetch_gap_rows(self, table_name: str, start_timestamp: Optional[str], end_timestamp: str) -> list:
+        """指定期間のギャップデータを取得（エラーは呼び出し側へ送出）"""
+        # 開始タイムスタンプより後、終了タイムスタンプまでをページ単位で取得
+        records = [row for page in self.iter_pages(table_name, after=start_timestamp, until=end_timestamp)
+                   for row in page]
+        
+        # 重複するタイムスタンプがある場合は最大値を選択
+        return consolidate_max(records)
+    
     def _get_latest_local_timestamp(self, table_name: str) -> Optional[str]:
         """ローカルの最新タイムスタンプを取得（プレースホルダー）"""
         # この関数は実際にはcoinglass_scraper.py側で実装される
@@ -904,6 +1301,7 @@ class CloudSyncManager:
     def update_latest_timestamps(self, table_name: str, timestamp: str):
         """各テーブルの最新タイムスタンプを更新"""
         try:
+            self._update_cloud_latest(table_name, timestamp)
             # 現在の最新タイムスタンプと比較
             current = self.latest_timestamps.get(table_name)
             if not current or timestamp > current:
@@ -949,6 +1347,9 @@ class CloudSyncManager:
     def cleanup_realtime(self):
         """Realtime接続のクリーンアップ"""
         try:
+            # 実行中・保留中の欠損補完を止める
+            self.gap_backfill.stop()
+            
             # 非同期版Realtime同期を停止
             if self.realtime_sync:
                 self.realtime_sync.stop()
@@ -958,6 +1359,9 @@ class CloudSyncManager:
                 if self.log_callback:
                     self.log_callback(msg, "INFO")
             
+            # 受信済みのUPDATEイベントを反映してから止める
+            self.realtime_batcher.stop()
+            
         except Exception as e:
             msg = f"[Realtime] クリーンアップエラー: {e}"
             self.logger.error(msg)
@@ -1,407 +1,18 @@
-import json
-import threading
-import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+"""
+互換用のモジュール
+以前はCloudSyncManagerの別実装をここに置いていたが、同期処理は cloud_sync.py に一本化した。
+書き込み方式は差し替えたファイルではなく設定の cloud_sync.transport（rest / bulk_rpc / memory）で選ぶ
+（cloud_transport.py、比較は benchmark_transports.py）
+"""
 
-# Supabaseのインポートを試行
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
-    Client = None
-    create_client = None
+import warnings
 
-class CloudSyncManager:
-    def __init__(self, config_path: str = None, log_callback=None):
-        # loggerを最初に初期化
-        self.logger = logging.getLogger(__name__)
-        self.log_callback = log_callback
-        
-        # config_pathが指定されていない場合は、AppDataから読み込む
-        if config_path is None:
-            import os
-            appdata_dir = os.path.join(os.environ.get('APPDATA', ''), 'CoinglassScraper')
-            config_path = os.path.join(appdata_dir, 'config.json')
-        
-        # 設定を読み込み
-        self.config = self._load_config(config_path)
-        # Supabaseが利用できない場合は無効化
-        if not SUPABASE_AVAILABLE:
-            self.enabled = False
-            msg = "Supabaseモジュールが利用できないため、クラウド同期は無効です"
-            self.logger.warning(msg)
-            if self.log_callback:
-                self.log_callback(msg, "WARNING")
-        else:
-            self.enabled = self.config.get("cloud_sync", {}).get("enabled", False)
-        
-        self.client: Optional[Client] = None
-        self.last_sync: Optional[datetime] = None
-        self.sync_interval = self.config.get("cloud_sync", {}).get("sync_interval_minutes", 5)
-        self.group_id = self.config.get("cloud_sync", {}).get("group_id", "default-group")
-        
-        if self.enabled and SUPABASE_AVAILABLE:
-            self._initialize_client()
-    
-    def _load_config(self, config_path: str) -> Dict[str, Any]:
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            msg = f"設定ファイルの読み込みに失敗: {e}"
-            self.logger.warning(msg)
-            if self.log_callback:
-                self.log_callback(msg, "WARNING")
-            return {}
-    
-    def _initialize_client(self):
-        if not SUPABASE_AVAILABLE or not create_client:
-            return
-        
-        try:
-            cloud_config = self.config.get("cloud_sync", {})
-            self.client = create_client(
-                cloud_config["url"],
-                cloud_config["anon_key"]
-            )
-            msg = "Supabase接続を初期化しました"
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
-        except Exception as e:
-            msg = f"Supabase初期化エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-            self.enabled = False
-    
-    def should_sync(self) -> bool:
-        if not self.enabled or not self.client:
-            return False
-        
-        now = datetime.now()
-        current_minute = now.minute
-        
-        # 5分間隔の固定タイミング（0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55分）
-        if current_minute % 5 != 0:
-            return False
-        
-        # 最初の同期または前回の同期から5分以上経過している場合
-        if not self.last_sync:
-            return True
-        
-        # 前回の同期から少なくとも4分以上経過していることを確認
-        # （同じ5分間隔で複数回同期しないようにするため）
-        elapsed = (now - self.last_sync).total_seconds()
-        return elapsed >= 240  # 4分 = 240秒
-    
-    def sync_data_async(self, timestamp: str, ask_total: float, bid_total: float, price: float):
-        if not self.should_sync():
-            return
-        
-        # 同期実行のログ
-        msg = f"クラウド同期スレッドを起動: {timestamp}"
-        self.logger.info(msg)
-        if self.log_callback:
-            self.log_callback(msg, "INFO")
-        
-        thread = threading.Thread(
-            target=self._sync_to_cloud,
-            args=(timestamp, ask_total, bid_total, price),
-            daemon=True
-        )
-        thread.start()
-        self.last_sync = datetime.now()
-        
-        # 各時間足データの保存チェック
-        self._check_and_save_all_timeframes(timestamp, ask_total, bid_total, price)
-    
-    def _check_and_save_all_timeframes(self, timestamp: str, ask_total: float, bid_total: float, price: float):
-        """全時間足データの保存チェック"""
-        try:
-            # タイムスタンプをdatetimeオブジェクトに変換
-            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            
-            # 15分足（00, 15, 30, 45分）
-            if dt.minute in [0, 15, 30, 45]:
-                self._save_timeframe_data('order_book_15min', dt, 15, ask_total, bid_total, price)
-            
-            # 30分足（00, 30分）
-            if dt.minute in [0, 30]:
-                self._save_timeframe_data('order_book_30min', dt, 30, ask_total, bid_total, price)
-            
-            # 1時間足（毎時00分）
-            if dt.minute == 0:
-                self._save_timeframe_data('order_book_1hour', dt, 60, ask_total, bid_total, price)
-            
-            # 2時間足（0, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22時の00分）
-            if dt.hour % 2 == 0 and dt.minute == 0:
-                self._save_timeframe_data('order_book_2hour', dt, 120, ask_total, bid_total, price)
-            
-            # 4時間足（0, 4, 8, 12, 16, 20時の00分）
-            if dt.hour in [0, 4, 8, 12, 16, 20] and dt.minute == 0:
-                self._save_timeframe_data('order_book_4hour', dt, 240, ask_total, bid_total, price)
-            
-            # 日足（毎日00:00）
-            if dt.hour == 0 and dt.minute == 0:
-                self._save_timeframe_data('order_book_daily', dt, 1440, ask_total, bid_total, price)
-                
-        except Exception as e:
-            msg = f"時間足データ保存チェックエラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-    
-    def _save_timeframe_data(self, table_name: str, dt: datetime, interval_minutes: int, 
-                            ask_total: float, bid_total: float, price: float):
-        """指定された時間足データをSupabaseに保存"""
-        try:
-            # タイムスタンプを適切な時間足に丸める
-            if interval_minutes <= 60:  # 分足の場合
-                minutes = (dt.minute // interval_minutes) * interval_minutes
-                rounded_timestamp = dt.replace(minute=minutes, second=0, microsecond=0)
-            elif interval_minutes < 1440:  # 時間足の場合
-                hours = (dt.hour // (interval_minutes // 60)) * (interval_minutes // 60)
-                rounded_timestamp = dt.replace(hour=hours, minute=0, second=0, microsecond=0)
-            else:  # 日足の場合
-                rounded_timestamp = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # 時間足の名前を取得
-            timeframe_names = {
-                'order_book_15min': '15分足',
-                'order_book_30min': '30分足',
-                'order_book_1hour': '1時間足',
-                'order_book_2hour': '2時間足',
-                'order_book_4hour': '4時間足',
-                'order_book_daily': '日足'
-            }
-            timeframe_name = timeframe_names.get(table_name, table_name)
-            
-            msg = f"{timeframe_name}データを保存: {rounded_timestamp.isoformat()}"
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
-            
-            # 別スレッドでデータを保存
-            thread = threading.Thread(
-                target=self._save_to_table,
-                args=(table_name, rounded_timestamp.isoformat(), ask_total, bid_total, price),
-                daemon=True
-            )
-            thread.start()
-            
-        except Exception as e:
-            msg = f"{table_name}データ保存エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-    
-    def _save_to_table(self, table_name: str, timestamp: str, ask_total: float, bid_total: float, price: float):
-        """指定されたテーブルにデータを保存"""
-        try:
-            data = {
-                "timestamp": timestamp,
-                "ask_total": ask_total,
-                "bid_total": bid_total,
-                "price": price,
-                "group_id": self.group_id
-            }
-            
-            # upsert（存在する場合は更新、なければ挿入）
-            self.client.table(table_name).upsert(data).execute()
-            
-            msg = f"{table_name}にデータを保存しました: {timestamp}"
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
-                
-        except Exception as e:
-            msg = f"{table_name}保存エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-    
-    def _sync_to_cloud(self, timestamp: str, ask_total: float, bid_total: float, price: float):
-        try:
-            data = {
-                "timestamp": timestamp,
-                "ask_total": ask_total,
-                "bid_total": bid_total,
-                "price": price,
-                "group_id": self.group_id
-            }
-            
-            # 同期開始のログ
-            msg = f"Supabaseへの同期を開始: {timestamp}"
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
-            
-            # 既存データを確認
-            existing = self.client.table('order_book_shared')\
-                .select('*')\
-                .eq('timestamp', timestamp)\
-                .eq('group_id', self.group_id)\
-                .execute()
-            
-            if existing.data:
-                # 最大値を選択してアップデート
-                existing_data = existing.data[0]
-                if ask_total > existing_data['ask_total'] or bid_total > existing_data['bid_total']:
-                    update_data = {
-                        'ask_total': max(ask_total, existing_data['ask_total']),
-                        'bid_total': max(bid_total, existing_data['bid_total']),
-                        'price': price
-                    }
-                    self.client.table('order_book_shared')\
-                        .update(update_data)\
-                        .eq('timestamp', timestamp)\
-                        .eq('group_id', self.group_id)\
-                        .execute()
-                    msg = f"データを更新しました: {timestamp} (ask: {existing_data['ask_total']} → {update_data['ask_total']}, bid: {existing_data['bid_total']} → {update_data['bid_total']})"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-                else:
-                    msg = f"データは既に最新です（更新スキップ）: {timestamp}"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-            else:
-                # 新規データとして挿入
-                self.client.table('order_book_shared').insert(data).execute()
-                msg = f"新規データをアップロード: {timestamp} (ask: {ask_total}, bid: {bid_total}, price: {price})"
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-                
-        except Exception as e:
-            msg = f"クラウド同期エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-    
-    def fetch_all_data(self):
-        """Supabaseから全データを取得"""
-        if not self.enabled or not self.client:
-            return []
-        
-        try:
-            msg = "Supabaseから全データを取得中..."
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
-            
-            # 全データを取得（最大10000件まで）
-            result = self.client.table('order_book_shared')\
-                .select('*')\
-                .eq('group_id', self.group_id)\
-                .order('timestamp')\
-                .limit(10000)\
-                .execute()
-            
-            if result.data:
-                # 重複するタイムスタンプがある場合は最大値を選択
-                consolidated_data = {}
-                for record in result.data:
-                    ts = record['timestamp']
-                    if ts not in consolidated_data:
-                        consolidated_data[ts] = record
-                    else:
-                        # 最大値を選択
-                        existing = consolidated_data[ts]
-                        consolidated_data[ts] = {
-                            'timestamp': ts,
-                            'ask_total': max(record['ask_total'], existing['ask_total']),
-                            'bid_total': max(record['bid_total'], existing['bid_total']),
-                            'price': record['price']
-                        }
-                
-                result_list = list(consolidated_data.values())
-                msg = f"Supabaseから{len(result_list)}件のデータを取得しました"
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-                return result_list
-            else:
-                msg = "Supabaseにデータはありませんでした"
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-                return []
-                
-        except Exception as e:
-            msg = f"全データ取得エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-            return []
-    
-    def fetch_missing_data(self, start_time: datetime, end_time: datetime):
-        if not self.enabled or not self.client:
-            return []
-        
-        try:
-            # データ取得開始のログ
-            msg = f"Supabaseから欠損データを取得中: {start_time.strftime('%Y-%m-%d %H:%M:%S')} ～ {end_time.strftime('%Y-%m-%d %H:%M:%S')}"
-            self.logger.info(msg)
-            if self.log_callback:
-                self.log_callback(msg, "INFO")
-            
-            # 指定期間のデータを取得
-            result = self.client.table('order_book_shared')\
-                .select('*')\
-                .eq('group_id', self.group_id)\
-                .gte('timestamp', start_time.strftime('%Y-%m-%d %H:%M:%S'))\
-                .lte('timestamp', end_time.strftime('%Y-%m-%d %H:%M:%S'))\
-                .order('timestamp')\
-                .execute()
-            
-            if result.data:
-                # 重複するタイムスタンプがある場合は最大値を選択
-                consolidated_data = {}
-                for record in result.data:
-                    ts = record['timestamp']
-                    if ts not in consolidated_data:
-                        consolidated_data[ts] = record
-                    else:
-                        # 最大値を選択
-                        existing = consolidated_data[ts]
-                        consolidated_data[ts] = {
-                            'timestamp': ts,
-                            'ask_total': max(record['ask_total'], existing['ask_total']),
-                            'bid_total': max(record['bid_total'], existing['bid_total']),
-                            'price': record['price']
-                        }
-                
-                result_list = list(consolidated_data.values())
-                msg = f"Supabaseから{len(result_list)}件のデータを取得しました"
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-                return result_list
-            else:
-                msg = "Supabaseに該当するデータはありませんでした"
-                self.logger.info(msg)
-                if self.log_callback:
-                    self.log_callback(msg, "INFO")
-                return []
-            
-        except Exception as e:
-            msg = f"データ取得エラー: {e}"
-            self.logger.error(msg)
-            if self.log_callback:
-                self.log_callback(msg, "ERROR")
-            return []
-    
-    def get_sync_status(self) -> Dict[str, Any]:
-        return {
-            'enabled': self.enabled,
-            'connected': self.client is not None,
-            'last_sync': self.last_sync.isoformat() if self.last_sync else None,
-            'group_id': self.group_id,
-            'next_sync': (self.last_sync + timedelta(minutes=self.sync_interval)).isoformat() 
-                         if self.last_sync else None
-        }
\ No newline at end of file
+from cloud_sync import CloudSyncManager, SUPABASE_AVAILABLE, retry_on_failure
+
+warnings.warn(
+    f"{__name__} は cloud_sync に統合されました。cloud_sync.CloudSyncManager を使用してください",
+    DeprecationWarning,
+    stacklevel=2
+)
+
+__all__ = ['CloudSyncManager', 'SUPABASE_AVAILABLE', 'retry_on_failure']
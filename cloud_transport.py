@@ -0,0 +1,256 @@
+"""
+クラウドへの書き込み方式（トランスポート）
+CloudSyncManager はまとめた行（{'table', 'timestamp', 'ask_total', 'bid_total', 'price', 'group_id'}）を
+トランスポートの write_rows() に渡すだけで、送り方は設定（cloud_sync.transport）で選ぶ。
+
+  - rest     : 1行ごとに upsert_order_book_max を呼ぶ。関数がなければ SELECT→UPDATE/INSERT
+  - bulk_rpc : upsert_order_book_max_bulk の1回の呼び出しで全行を送る。関数がなければ rest に切り替える
+  - memory   : メモリ上のdictに最大値マージする（通信なし。ベンチマーク・テスト用で、
+               CloudSyncManager には transport 引数で渡す。設定で指定した場合は bulk_rpc になる）
+
+write_rows() の戻り値は (テーブル, タイムスタンプ) ごとの (action, previous, current)。
+action は 'inserted' / 'updated' / 'skipped'、previous は既存の行が分かる方式でのみ入る
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cloud_batch_writer import BULK_UPSERT_FUNCTION
+
+UPSERT_FUNCTION = 'upsert_order_book_max'
+DEFAULT_TRANSPORT = 'bulk_rpc'
+
+# (action, previous, current)
+WriteResult = Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def is_missing_function_error(error: Exception) -> bool:
+    """PostgRESTの「関数が見つからない」エラーか判定"""
+    code = getattr(error, 'code', None)
+    return code == 'PGRST202' or 'PGRST202' in str(error)
+
+
+class CloudTransport:
+    """書き込み方式の共通部分（リクエスト数・行数の集計とログ）"""
+
+    name = ''
+
+    def __init__(self, log_callback=None):
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'rows': 0}
+
+    def _log(self, msg: str, level: str = "INFO"):
+        getattr(self.logger, level.lower(), self.logger.info)(msg)
+        if self.log_callback:
+            self.log_callback(msg, level)
+
+    def _count(self, requests: int = 0, rows: int = 0):
+        """送信したリクエスト数（失敗を含む）と、保存できた行数を加算"""
+        with self._stats_lock:
+            self.stats['requests'] += requests
+            self.stats['rows'] += rows
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> Dict[tuple, WriteResult]:
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self.stats, transport=self.name)
+
+
+class RestTransport(CloudTransport):
+    """1行ずつ送る方式（upsert_order_book_max、関数がなければ SELECT→UPDATE/INSERT）"""
+
+    name = 'rest'
+
+    def __init__(self, client, group_id: str, use_rpc: bool = True, log_callback=None):
+        super().__init__(log_callback)
+        self.client = client
+        self.group_id = group_id
+        # サーバー側の最大値マージupsert（create_upsert_functions.sql）を使うか
+        self.use_rpc = use_rpc
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> Dict[tuple, WriteResult]:
+        results = {}
+        for row in rows:
+            results[(row['table'], row['timestamp'])] = self.write_row(
+                row['table'], row['timestamp'], row['ask_total'], row['bid_total'], row['price'])
+            self._count(rows=1)
+        return results
+
+    def write_row(self, table_name: str, timestamp: str, ask_total: float, bid_total: float,
+                  price: float) -> WriteResult:
+        """最大値マージで1件を書き込む（previousはRPC経由では不明なためNone）"""
+        if self.use_rpc:
+            try:
+                self._count(requests=1)
+                result = self.client.rpc(UPSERT_FUNCTION, {
+                    'p_table': table_name,
+                    'p_timestamp': timestamp,
+                    'p_ask_total': ask_total,
+                    'p_bid_total': bid_total,
+                    'p_price': price,
+                    'p_group_id': self.group_id
+                }).execute()
+                if not result.data:
+                    return 'skipped', None, None
+                row = result.data[0]
+                return ('inserted' if row.get('inserted') else 'updated'), None, row
+            except Exception as e:
+                if not is_missing_function_error(e):
+                    raise
+                # 関数が未作成のサーバーでは従来の確認→書き込みに切り替える
+                self.use_rpc = False
+                self._log(f"[情報] {UPSERT_FUNCTION} が見つからないため、SELECT→UPDATE/INSERT方式で保存します"
+                          f"（create_upsert_functions.sql を適用してください）", "WARNING")
+
+        return self._select_then_write(table_name, timestamp, ask_total, bid_total, price)
+
+    def _select_then_write(self, table_name: str, timestamp: str, ask_total: float, bid_total: float,
+                           price: float) -> WriteResult:
+        """既存データを確認してからUPDATE/INSERTする従来の保存方式"""
+        self._count(requests=1)
+        existing = self.client.table(table_name)\
+            .select('*')\
+            .eq('timestamp', timestamp)\
+            .eq('group_id', self.group_id)\
+            .execute()
+
+        if not existing.data:
+            # 新規データとして挿入
+            data = {
+                "timestamp": timestamp,
+                "ask_total": ask_total,
+                "bid_total": bid_total,
+                "price": price,
+                "group_id": self.group_id
+            }
+            self._count(requests=1)
+            self.client.table(table_name).insert(data).execute()
+            return 'inserted', None, data
+
+        # 最大値を選択してアップデート
+        existing_data = existing.data[0]
+        if ask_total > existing_data['ask_total'] or bid_total > existing_data['bid_total']:
+            update_data = {
+                'ask_total': max(ask_total, existing_data['ask_total']),
+                'bid_total': max(bid_total, existing_data['bid_total']),
+                'price': price
+            }
+            self._count(requests=1)
+            self.client.table(table_name)\
+                .update(update_data)\
+                .eq('timestamp', timestamp)\
+                .eq('group_id', self.group_id)\
+                .execute()
+            return 'updated', existing_data, update_data
+        return 'skipped', existing_data, None
+
+
+class BulkRpcTransport(CloudTransport):
+    """全行を upsert_order_book_max_bulk の1回の呼び出しで送る方式"""
+
+    name = 'bulk_rpc'
+
+    def __init__(self, client, group_id: str, use_rpc: bool = True, log_callback=None):
+        super().__init__(log_callback)
+        self.client = client
+        # 一括関数が未作成のサーバーで使う1行ずつの方式
+        self.fallback = RestTransport(client, group_id, use_rpc=use_rpc, log_callback=log_callback)
+        self.available = True
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> Dict[tuple, WriteResult]:
+        if self.available:
+            try:
+                self._count(requests=1)
+                result = self.client.rpc(BULK_UPSERT_FUNCTION, {'p_rows': rows}).execute()
+                self._count(rows=len(rows))
+                # row_indexは入力配列での位置（1始まり）
+                results = {}
+                for item in result.data:
+                    row = rows[item['row_index'] - 1]
+                    current = item if item['action'] != 'skipped' else None
+                    results[(row['table'], row['timestamp'])] = (item['action'], None, current)
+                return results
+            except Exception as e:
+                if not is_missing_function_error(e):
+                    raise
+                self.available = False
+                self._log(f"[情報] {BULK_UPSERT_FUNCTION} が見つからないため、テーブルごとに保存します"
+                          f"（create_upsert_functions.sql を適用してください）", "WARNING")
+        return self.fallback.write_rows(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        fallback = self.fallback.get_stats()
+        stats['requests'] += fallback['requests']
+        stats['rows'] += fallback['rows']
+        stats['bulk_available'] = self.available
+        return stats
+
+
+class InMemoryTransport(CloudTransport):
+    """メモリ上のdictへ最大値マージする方式（通信なし）
+
+    latency を指定すると write_rows() ごとにその秒数だけ待ち、1リクエストの往復を模擬する
+    """
+
+    name = 'memory'
+
+    def __init__(self, group_id: str = 'default-group', latency: float = 0.0, log_callback=None):
+        super().__init__(log_callback)
+        self.group_id = group_id
+        self.latency = latency
+        self._lock = threading.Lock()
+        # {テーブル名: {(タイムスタンプ, group_id): 行}}
+        self.tables: Dict[str, Dict[tuple, Dict[str, Any]]] = {}
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> Dict[tuple, WriteResult]:
+        self._count(requests=1, rows=len(rows))
+        if self.latency:
+            time.sleep(self.latency)
+        results = {}
+        with self._lock:
+            for row in rows:
+                table = self.tables.setdefault(row['table'], {})
+                key = (row['timestamp'], row.get('group_id', self.group_id))
+                existing = table.get(key)
+                if existing is None:
+                    current = {'timestamp': row['timestamp'], 'ask_total': row['ask_total'],
+                               'bid_total': row['bid_total'], 'price': row['price'], 'group_id': key[1]}
+                    table[key] = current
+                    results[(row['table'], row['timestamp'])] = ('inserted', None, dict(current))
+                elif row['ask_total'] > existing['ask_total'] or row['bid_total'] > existing['bid_total']:
+                    previous = dict(existing)
+                    existing['ask_total'] = max(existing['ask_total'], row['ask_total'])
+                    existing['bid_total'] = max(existing['bid_total'], row['bid_total'])
+                    existing['price'] = row['price']
+                    results[(row['table'], row['timestamp'])] = ('updated', previous, dict(existing))
+                else:
+                    results[(row['table'], row['timestamp'])] = ('skipped', dict(existing), None)
+        return results
+
+    def rows(self, table_name: str) -> List[Dict[str, Any]]:
+        """テーブルの行をタイムスタンプ順に返す"""
+        with self._lock:
+            return [dict(row) for _, row in sorted(self.tables.get(table_name, {}).items())]
+
+
+TRANSPORTS = {
+    RestTransport.name: RestTransport,
+    BulkRpcTransport.name: BulkRpcTransport,
+    InMemoryTransport.name: InMemoryTransport,
+}
+
+
+def create_transport(name: str, client, group_id: str, use_rpc: bool = True, log_callback=None) -> CloudTransport:
+    """設定名からトランスポートを作成（未知の名前は ValueError）"""
+    if name == InMemoryTransport.name:
+        return InMemoryTransport(group_id, log_callback=log_callback)
+    if name not in TRANSPORTS:
+        raise ValueError(f"未知のトランスポートです: {name}（{', '.join(TRANSPORTS)} のいずれか）")
+    return TRANSPORTS[name](client, group_id, use_rpc=use_rpc, log_callback=log_callback)
@@ -0,0 +1,256 @@
+"""
+クラウド書き込み用の固定サイズワーカープール
+書き込みごとにスレッドを作らず、上限付きキューと固定数のワーカーで処理する。
+失敗時はワーカーを止めずに指数バックオフ（ジッター付き）で再投入し、
+連続失敗が続いた場合はサーキットブレーカーで一定時間送信を止める
+"""
+
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class _Task:
+    """キューに積む書き込みタスク"""
+
+    __slots__ = ('func', 'args', 'attempt')
+
+    def __init__(self, func: Callable, args: tuple):
+        self.func = func
+        self.args = args
+        self.attempt = 0
+
+
+class CloudWritePool:
+    """上限付きキュー・バックオフ・サーキットブレーカー付きのワーカープール
+
+    submit() はキューとバックオフ待ちのタスクの合計が max_queue に達していればFalseを返す
+    （呼び出し側をブロックしない）。ブレーカーが開いている間もこの上限で受け付けを止める。
+    リトライ上限まで失敗したタスクは on_failure(func, args, error) に渡される。
+    再試行を予約するたびに on_retry(func, args, error) が呼ばれる（エラー分類ごとの集計用）
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, workers: int = 2, max_queue: int = 100, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 60.0, jitter: float = 0.5,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30.0,
+                 on_failure: Optional[Callable] = None, log_callback=None,
+                 on_retry: Optional[Callable] = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.on_failure = on_failure
+        self.on_retry = on_retry
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: 'queue.Queue[Optional[_Task]]' = queue.Queue(maxsize=max_queue)
+        self._delayed = []  # (実行時刻, 連番, タスク) のヒープ
+        self._sequence = itertools.count()
+        self._delayed_cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = False
+
+        self._in_flight = 0
+        self._breaker_state = self.CLOSED
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probe_running = False
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retried': 0,
+            'rejected': 0,
+            'breaker_trips': 0
+        }
+
+    def _log(self, msg: str, level: str = "INFO"):
+        getattr(self.logger, level.lower(), self.logger.info)(msg)
+        if self.log_callback:
+            self.log_callback(msg, level)
+
+    def start(self):
+        """ワーカーとバックオフ用スケジューラを起動"""
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"CloudWriter-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        scheduler = threading.Thread(target=self._scheduler_loop, name="CloudWriterScheduler", daemon=True)
+        scheduler.start()
+        self._threads.append(scheduler)
+
+    def stop(self, timeout: float = 5.0):
+        """ワーカーを停止（キューに残ったタスクは処理してから終了）"""
+        if not self._running:
+            return
+        self._running = False
+        for _ in range(self.workers):
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        with self._delayed_cond:
+            self._delayed_cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, func: Callable, *args) -> bool:
+        """タスクを投入（キューとバックオフ待ちの合計が上限ならFalse）"""
+        task = _Task(func, args)
+        # ブレーカー開放中はキューから取り出したタスクがバックオフ待ちに移るため、待ちの件数も上限に含める
+        with self._delayed_cond:
+            scheduled = len(self._delayed)
+        try:
+            if self._queue.qsize() + scheduled >= self.max_queue:
+                raise queue.Full
+            self._queue.put_nowait(task)
+        except queue.Full:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return False
+        with self._lock:
+            self.stats['submitted'] += 1
+        return True
+
+    # --- ワーカー ---
+    def _worker_loop(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            try:
+                self._run(task)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, task: _Task):
+        wait = self._breaker_wait()
+        if wait > 0:
+            # ブレーカーが開いている間は試行回数を消費せずに後回し
+            self._schedule(task, wait)
+            return
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            task.func(*task.args)
+        except Exception as e:
+            self._record_failure()
+            task.attempt += 1
+            if task.attempt < self.max_retries:
+                delay = self._backoff(task.attempt)
+                with self._lock:
+                    self.stats['retried'] += 1
+                if self.on_retry:
+                    self.on_retry(task.func, task.args, e)
+                self._log(f"[リトライ {task.attempt}/{self.max_retries}] {getattr(task.func, '__name__', 'task')} 失敗: {e}（{delay:.1f}秒後に再試行）", "WARNING")
+                self._schedule(task, delay)
+            else:
+                with self._lock:
+                    self.stats['failed'] += 1
+                if self.on_failure:
+                    self.on_failure(task.func, task.args, e)
+        else:
+            self._record_success()
+            with self._lock:
+                self.stats['completed'] += 1
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        """指数バックオフ（±jitterの割合でランダムにずらす）"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    # --- 遅延実行 ---
+    def _schedule(self, task: _Task, delay: float):
+        with self._delayed_cond:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), task))
+            self._delayed_cond.notify()
+
+    def _scheduler_loop(self):
+        while True:
+            with self._delayed_cond:
+                while self._running and (not self._delayed or self._delayed[0][0] > time.monotonic()):
+                    timeout = self._delayed[0][0] - time.monotonic() if self._delayed else None
+                    self._delayed_cond.wait(timeout)
+                if not self._running:
+                    return
+                _, _, task = heapq.heappop(self._delayed)
+            try:
+                self._queue.put_nowait(task)
+            except queue.Full:
+                # キューが空くまで少し待って再投入
+                self._schedule(task, self.base_delay)
+
+    # --- サーキットブレーカー ---
+    def _breaker_wait(self) -> float:
+        """送信を待つべき秒数（0なら送信可）"""
+        with self._lock:
+            if self._breaker_state == self.CLOSED:
+                return 0.0
+            now = time.monotonic()
+            if self._breaker_state == self.OPEN:
+                if now < self._open_until:
+                    return self._open_until - now
+                self._breaker_state = self.HALF_OPEN
+                self._probe_running = False
+            # 半開状態では1件だけ試行
+            if self._probe_running:
+                return max(self.base_delay, 0.1)
+            self._probe_running = True
+            return 0.0
+
+    def _record_success(self):
+        with self._lock:
+            recovered = self._breaker_state != self.CLOSED
+            self._breaker_state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_running = False
+        if recovered:
+            self._log("[クラウド書き込み] 接続が回復したため送信を再開します", "INFO")
+
+    def _record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            tripped = (self._breaker_state == self.HALF_OPEN or
+                       (self._breaker_state == self.CLOSED and self._consecutive_failures >= self.breaker_threshold))
+            if tripped:
+                self._breaker_state = self.OPEN
+                self._open_until = time.monotonic() + self.breaker_cooldown
+                self._probe_running = False
+                self.stats['breaker_trips'] += 1
+        if tripped:
+            self._log(f"[クラウド書き込み] 連続{self._consecutive_failures}回失敗したため{self.breaker_cooldown:.0f}秒間送信を停止します", "WARNING")
+
+    # --- 統計 ---
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = self._in_flight
+            stats['breaker_state'] = self._breaker_state
+        stats['queue_depth'] = self._queue.qsize()
+        with self._delayed_cond:
+            stats['scheduled'] = len(self._delayed)
+        return stats
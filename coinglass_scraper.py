@@ -31,9 +31,15 @@ import platform
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 import sqlite3
+import json
 import pystray
-from PIL import Image
-from cloud_sync import CloudSyncManager
+from PIL import Image, ImageTk
+from cloud_sync import CloudSyncManager, TIMEFRAME_NAMES
+from sync_scheduler import SyncScheduler, parse_timestamp
+from ui_dispatcher import UIDispatcher
+from log_buffer import LogRingBuffer, LOG_LEVELS
+from chart_data_source import ChartRangeSource
+from chart_renderer import draw_depth_chart, OffThreadChartRenderer
 
 
 class CoinglassScraper:
@@ -560,6 +566,22 @@ class ScraperGUI:
         self.scraper = CoinglassScraper()
         self.scraper_thread = None
         
+        # ログ表示用のリングバッファ（溢れた古いログはファイルに退避）
+        appdata_dir = os.path.join(os.environ.get('APPDATA', ''), 'CoinglassScraper')
+        self.log_buffer = LogRingBuffer(
+            capacity=5000,
+            spill_path=os.path.join(appdata_dir, 'gui_log_spill.log')
+        )
+        self.log_view_lines = 1000  # ウィジェットに表示する最大行数
+        
+        # 各スレッドからのログ・グラフ更新要求をTkスレッドでまとめて処理
+        self.ui_dispatcher = UIDispatcher(
+            self.root,
+            log_sink=self._append_log_entries,
+            graph_refresh=self.update_graph
+        )
+        self.ui_dispatcher.start()
+        
         # グラフ用のデータ履歴（全データ保持）
         self.time_history = []
         self.ask_history = []
@@ -568,6 +590,17 @@ class ScraperGUI:
         # 初期値を設定
         self.cloud_sync = None
         
+        # パン操作で読み込む過去データ用
+        self.chart_source = None
+        self.chart_table_name = None  # 現在表示中の時間足テーブル
+        self.chart_loaded_start = None  # 専用テーブルから読み込んだ最古の時刻
+        self.chart_history_start = {}  # テーブルごとの表示要求済み最古時刻
+        
+        # グラフの描画モード（inline: Tkスレッドで描画, offthread: ワーカーで画像化）
+        self.ui_config = self._load_ui_config()
+        self.render_mode = self.ui_config.get('render_mode', 'inline')
+        self.chart_renderer = None
+        
         self.setup_ui()
         self.setup_graph()
         
@@ -575,7 +608,8 @@ class ScraperGUI:
         try:
             self.cloud_sync = CloudSyncManager(
                 log_callback=self.add_log,
-                local_db_callback=self.save_realtime_data_to_local_db
+                local_db_callback=self.save_realtime_data_to_local_db,
+                local_batch_callback=self.save_realtime_batch_to_local_db
             )
             if self.cloud_sync.enabled:
                 self.add_log("クラウド同期機能が有効です", "INFO")
@@ -583,8 +617,16 @@ class ScraperGUI:
             self.add_log(f"クラウド同期の初期化に失敗: {str(e)}", "WARNING")
             self.cloud_sync = None
         
+        # ローカルの時間足テーブルもクラウド同期と同じ境界規則で保存する
+        self.local_scheduler = self._create_local_scheduler()
+        
         # データベースの初期化
         self.init_database()
+        
+        # パン用の範囲データソース（別接続・別スレッドで範囲クエリ）
+        if hasattr(self, 'db_path'):
+            self.chart_source = ChartRangeSource(self.db_path)
+            self.chart_source.start()
         # 既存データの読み込み
         self.load_historical_data()
         
@@ -592,6 +634,22 @@ class ScraperGUI:
         self.tray_icon = None
         self.is_minimized_to_tray = False
         
+    def _create_local_scheduler(self):
+        """ローカルの時間足テーブル用のスケジューラー（猶予・補完区間はクラウド同期の設定に合わせる）"""
+        if self.cloud_sync:
+            return SyncScheduler(grace_seconds=self.cloud_sync.sync_scheduler.grace.total_seconds(),
+                                 catchup_intervals=self.cloud_sync.sync_scheduler.catchup_intervals)
+        return SyncScheduler()
+    
+    def _load_ui_config(self):
+        """config.jsonのUI設定を読み込む（存在しない場合は空）"""
+        try:
+            appdata_dir = os.path.join(os.environ.get('APPDATA', ''), 'CoinglassScraper')
+            with open(os.path.join(appdata_dir, 'config.json'), 'r', encoding='utf-8') as f:
+                return json.load(f).get('ui', {})
+        except Exception:
+            return {}
+    
     def setup_ui(self):
         """UIのセットアップ"""
         # スタイル設定
@@ -676,7 +734,7 @@ class ScraperGUI:
         self.timeframe_combo = ttk.Combobox(control_frame, textvariable=self.timeframe_var, 
                                      values=["1分"], width=8, state="readonly")  # 初期は1分のみ
         self.timeframe_combo.grid(row=0, column=5, padx=5)
-        self.timeframe_combo.bind('<<ComboboxSelected>>', lambda e: self.update_graph())
+        self.timeframe_combo.bind('<<ComboboxSelected>>', lambda e: self.on_timeframe_changed())
         
         # ヘッドレスモード
         self.headless_var = tk.BooleanVar(value=True)
@@ -705,8 +763,25 @@ class ScraperGUI:
         log_frame = ttk.LabelFrame(padding="5")
         log_frame.configure(text="ログ")
         
+        # ログ表示レベルと検索
+        log_toolbar = ttk.Frame(log_frame)
+        log_toolbar.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 3))
+        
+        ttk.Label(log_toolbar, text="表示レベル:", font=('Arial', 9)).pack(side=tk.LEFT)
+        self.log_level_var = tk.StringVar(value=self.log_buffer.min_level)
+        log_level_combo = ttk.Combobox(log_toolbar, textvariable=self.log_level_var,
+                                       values=list(LOG_LEVELS.keys()), width=9, state="readonly")
+        log_level_combo.pack(side=tk.LEFT, padx=5)
+        log_level_combo.bind('<<ComboboxSelected>>', lambda e: self.on_log_level_changed())
+        
+        self.log_search_var = tk.StringVar()
+        log_search_entry = ttk.Entry(log_toolbar, textvariable=self.log_search_var, width=30)
+        log_search_entry.pack(side=tk.LEFT, padx=(15, 5))
+        log_search_entry.bind('<Return>', lambda e: self.search_log())
+        ttk.Button(log_toolbar, text="ログ検索", command=self.search_log, width=10).pack(side=tk.LEFT)
+        
         self.log_text = scrolledtext.ScrolledText(log_frame, height=6, width=110)
-        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.log_text.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # PanedWindowにグラフとログを追加
         paned_window.add(self.graph_frame, weight=3)  # グラフは重み3
@@ -720,7 +795,7 @@ class ScraperGUI:
         self.graph_frame.columnconfigure(0, weight=1)
         self.graph_frame.rowconfigure(0, weight=1)
         log_frame.columnconfigure(0, weight=1)
-        log_frame.rowconfigure(0, weight=1)
+        log_frame.rowconfigure(1, weight=1)
         
     def update_display(self, data):
         """表示を更新"""
@@ -786,20 +861,61 @@ class ScraperGUI:
             self.add_log("データ取得に失敗しました（板情報が空です）", "WARNING")
     
     def add_log(self, message, level="INFO"):
-        """ログを追加"""
+        """ログを追加（どのスレッドからでも呼び出し可能）"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {level}: {message}\n"
         
+        # Tkウィジェットへの書き込みはディスパッチャ経由でTkスレッドから行う
+        self.ui_dispatcher.post_log((level, log_entry))
+    
+    def _append_log_entries(self, entries):
+        """溜まったログを1回の挿入でウィジェットに追加（Tkスレッド専用）"""
+        # リングバッファに記録し、表示レベルに合うものだけをウィジェットへ
+        visible = self.log_buffer.extend(entries)
+        if not visible:
+            return
+        
         # 現在のスクロール位置を取得（最下部にいるかチェック）
         # yview()[1]が1.0の場合、最下部にいる
         at_bottom = self.log_text.yview()[1] >= 0.99
         
-        self.log_text.insert(tk.END, log_entry)
+        self.log_text.insert(tk.END, ''.join(visible))
+        self._trim_log_widget()
         
         # 最下部にいた場合のみ自動スクロール
         if at_bottom:
             self.log_text.see(tk.END)
     
+    def _trim_log_widget(self):
+        """ウィジェットの行数を上限以内に保つ"""
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        overflow = line_count - self.log_view_lines
+        if overflow > 0:
+            self.log_text.delete('1.0', f'{overflow + 1}.0')
+    
+    def on_log_level_changed(self):
+        """表示レベル変更時にバッファからログを再表示"""
+        self.log_buffer.set_min_level(self.log_level_var.get())
+        self.log_text.delete(1.0, tk.END)
+        self.log_text.insert(tk.END, ''.join(self.log_buffer.visible_entries(self.log_view_lines)))
+        self.log_text.see(tk.END)
+    
+    def search_log(self):
+        """退避ファイルを含むログ全体をキーワード検索して別ウィンドウに表示"""
+        keyword = self.log_search_var.get().strip()
+        if not keyword:
+            return
+        
+        results = self.log_buffer.search(keyword)
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"ログ検索: {keyword} ({len(results)}件)")
+        window.geometry("900x400")
+        result_text = scrolledtext.ScrolledText(window, width=110)
+        result_text.pack(fill=tk.BOTH, expand=True)
+        result_text.insert(tk.END, ''.join(results) if results else "該当するログはありません\n")
+        result_text.see(tk.END)
+    
     def update_timeframe_options(self):
         """データ量に基づいて選択可能な時間足を更新"""
         data_count = len(self.time_history)
@@ -861,7 +977,19 @@ class ScraperGUI:
         
         # tkinterにキャンバスを埋め込む
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.graph_frame)
-        self.canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        if self.render_mode == 'offthread':
+            # オフスレッド描画：ワーカーで画像化したビットマップをLabelに表示
+            # （このモードではマウスによるパン・ズームは無効）
+            self.graph_frame.grid_propagate(False)
+            self.chart_image_label = tk.Label(self.graph_frame, bg='#2b2b2b', bd=0, highlightthickness=0)
+            self.chart_image_label.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+            self.chart_photo = None
+            self.chart_renderer = OffThreadChartRenderer(
+                on_frame=lambda frame: self.ui_dispatcher.call_soon(self._show_chart_frame, frame)
+            )
+            self.chart_renderer.start()
+        else:
+            self.canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # TradingView風のマウス操作を実装
         self.setup_interactive_controls()
@@ -914,6 +1042,9 @@ class ScraperGUI:
                 
                 # グラフを再描画
                 self.canvas.draw_idle()
+                
+                # 縮小で過去側が見えた場合は範囲データを要求
+                self.request_visible_history()
             except Exception as e:
                 self.logger.error(f"ズームエラー: {e}")
         
@@ -949,6 +1080,9 @@ class ScraperGUI:
         
         # マウスボタンを離したとき
         def on_release(event):
+            if self.press is not None:
+                # パン後に過去側が見えた場合は範囲データを要求
+                self.request_visible_history()
             self.press = None
         
         # ダブルクリックでリセット
@@ -966,6 +1100,61 @@ class ScraperGUI:
         self.canvas.mpl_connect('motion_notify_event', on_motion)
         self.canvas.mpl_connect('button_release_event', on_release)
     
+    def request_visible_history(self):
+        """表示範囲が読み込み済みデータより過去に及ぶ場合、範囲データを非同期で要求"""
+        if not self.chart_source or not self.chart_table_name or self.chart_loaded_start is None:
+            return
+        
+        xmin, xmax = self.ax_ask.get_xlim()
+        visible_start = mdates.num2date(xmin)
+        visible_end = mdates.num2date(xmax)
+        
+        table_name = self.chart_table_name
+        current_start = self.chart_history_start.get(table_name, self._as_utc(self.chart_loaded_start))
+        if visible_start >= current_start:
+            return
+        self.chart_history_start[table_name] = visible_start
+        
+        # 取得完了はワーカースレッドから通知されるため、ディスパッチャ経由でTkスレッドに戻す
+        started = self.chart_source.request_range(
+            table_name, visible_start, visible_end,
+            on_ready=lambda t: self.ui_dispatcher.call_soon(self.on_chart_range_loaded, t)
+        )
+        if not started:
+            # すべてキャッシュ済みの場合はすぐに再描画
+            self.on_chart_range_loaded(table_name)
+    
+    def on_chart_range_loaded(self, table_name):
+        """範囲データの取得完了時に表示範囲を保ったまま再描画（Tkスレッド）"""
+        if table_name == self.chart_table_name:
+            self.update_graph(preserve_view=True)
+    
+    def on_timeframe_changed(self):
+        """時間足変更時はパンで広げた表示範囲をリセット"""
+        self.chart_history_start = {}
+        self.update_graph()
+    
+    @staticmethod
+    def _as_utc(dt):
+        """タイムゾーンなしの時刻をUTCとして扱う"""
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    
+    def _merge_chart_history(self, table_name, times, asks, bids):
+        """パンで取得済みの過去データを最新データの前に結合"""
+        history_start = self.chart_history_start.get(table_name)
+        first = self._as_utc(times[0])
+        if not self.chart_source or history_start is None or history_start >= first:
+            return times, asks, bids
+        
+        older = [row for row in self.chart_source.get_range(table_name, history_start, first)
+                 if self._as_utc(row[0]) < first]
+        if not older:
+            return times, asks, bids
+        
+        return ([row[0] for row in older] + times,
+                [row[1] for row in older] + asks,
+                [row[2] for row in older] + bids)
+    
     def select_best_values(self, data_list):
         """3つの取得データから最適値を選定（最大値を採用）"""
         if not data_list or len(data_list) == 0:
@@ -1006,6 +1195,8 @@ class ScraperGUI:
             self.db_path = os.path.join(appdata_dir, "btc_usdt_order_book.db")
             # スレッドセーフな接続を作成
             self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # 複数スレッドからの一括書き込み用ロック
+            self.db_write_lock = threading.Lock()
             cursor = self.conn.cursor()
             
             # テーブルの作成
@@ -1111,55 +1302,30 @@ class ScraperGUI:
                 timestamp = timestamp.replace(tzinfo=timezone.utc)
             rounded_timestamp = timestamp.replace(second=0, microsecond=0)
             
-            cursor = self.conn.cursor()
-            
-            # 1分足データは常にorder_book_historyに保存
-            cursor.execute("""
-                INSERT OR REPLACE INTO order_book_history 
-                (timestamp, ask_total, bid_total, price)
-                VALUES (?, ?, ?, ?)
-            """, (rounded_timestamp.isoformat(), ask_total, bid_total, price))
-            
-            # 第2段階：時間足に応じたテーブルへの保存
-            dt = rounded_timestamp
-            
-            # 5分足への保存（分が5の倍数の場合）
-            if dt.minute % 5 == 0:
-                self._save_to_timeframe_table('order_book_5min', rounded_timestamp, ask_total, bid_total, price)
-                # 5分足は頻繁なのでDEBUGレベル
-                self.add_log(f"[5分足DB] データを保存: {rounded_timestamp.strftime('%H:%M:%S')}", "DEBUG")
-            
-            # 15分足への保存（分が15の倍数の場合）
-            if dt.minute % 15 == 0:
-                self._save_to_timeframe_table('order_book_15min', rounded_timestamp, ask_total, bid_total, price)
-                self.add_log(f"[15分足DB] データを保存: {rounded_timestamp.strftime('%H:%M:%S')}", "INFO")
-            
-            # 30分足への保存（分が30の倍数の場合）
-            if dt.minute % 30 == 0:
-                self._save_to_timeframe_table('order_book_30min', rounded_timestamp, ask_total, bid_total, price)
-                self.add_log(f"[30分足DB] データを保存: {rounded_timestamp.strftime('%H:%M:%S')}", "INFO")
-            
-            # 1時間足への保存（分が0の場合）
-            if dt.minute == 0:
-                self._save_to_timeframe_table('order_book_1hour', rounded_timestamp, ask_total, bid_total, price)
-                self.add_log(f"[1時間足DB] データを保存: {rounded_timestamp.strftime('%H:%M:%S')}", "INFO")
+            # 同じ接続の他の書き込み（Realtime反映・起動時の取得）とトランザクションが混ざらないようにする
+            with self.db_write_lock:
+                cursor = self.conn.cursor()
                 
-                # 2時間足への保存（時間が2の倍数の場合）
-                if dt.hour % 2 == 0:
-                    self._save_to_timeframe_table('order_book_2hour', rounded_timestamp, ask_total, bid_total, price)
-                    self.add_log(f"[2時間足DB] データを保存: {rounded_timestamp.strftime('%H:%M:%S')}", "INFO")
+                # 1分足データは常にorder_book_historyに保存
+                cursor.execute("""
+                    INSERT OR REPLACE INTO order_book_history 
+                    (timestamp, ask_total, bid_total, price)
+                    VALUES (?, ?, ?, ?)
+                """, (rounded_timestamp.isoformat(), ask_total, bid_total, price))
                 
-                # 4時間足への保存（時間が4の倍数の場合）
-                if dt.hour % 4 == 0:
-                    self._save_to_timeframe_table('order_book_4hour', rounded_timestamp, ask_total, bid_total, price)
-                    self.add_log(f"[4時間足DB] データを保存: {rounded_timestamp.strftime('%H:%M:%S')}", "INFO")
+                # 第2段階：時間足に応じたテーブルへの保存
+                # クラウド同期と同じ境界規則（境界から猶予時間内の最初のサンプル）で保存する
+                due = self.local_scheduler.on_sample(rounded_timestamp.isoformat(), ask_total, bid_total, price)
+                for table_name, boundary, row_ask, row_bid, row_price in due:
+                    boundary_dt = parse_timestamp(boundary)
+                    self._save_to_timeframe_table(table_name, boundary_dt, row_ask, row_bid, row_price)
+                    # 5分足は頻繁なのでDEBUGレベル
+                    level = "DEBUG" if table_name == 'order_book_5min' else "INFO"
+                    time_format = '%Y-%m-%d %H:%M:%S' if table_name == 'order_book_daily' else '%H:%M:%S'
+                    self.add_log(f"[{TIMEFRAME_NAMES[table_name]}DB] データを保存: {boundary_dt.strftime(time_format)}", level)
                 
-                # 日足への保存（0時の場合）
-                if dt.hour == 0:
-                    self._save_to_timeframe_table('order_book_daily', rounded_timestamp, ask_total, bid_total, price)
-                    self.add_log(f"[日足DB] データを保存: {rounded_timestamp.strftime('%Y-%m-%d %H:%M:%S')}", "INFO")
-            
-            self.conn.commit()
+                self.conn.commit()
+            self.local_scheduler.mark_synced(due)
             
             # クラウド同期を実行（丸めたタイムスタンプを使用）
             if hasattr(self, 'cloud_sync') and self.cloud_sync:
@@ -1182,12 +1348,13 @@ class ScraperGUI:
             
             # 300日以上前のデータを削除
             cutoff_date = (datetime.now(timezone.utc) - timedelta(days=300)).isoformat()
-            cursor.execute("""
-                DELETE FROM order_book_history 
-                WHERE timestamp < ?
-            """, (cutoff_date,))
-            
-            self.conn.commit()
+            with self.db_write_lock:
+                cursor.execute("""
+                    DELETE FROM order_book_history 
+                    WHERE timestamp < ?
+                """, (cutoff_date,))
+                
+                self.conn.commit()
             
         except Exception as e:
             self.add_log(f"データ保存エラー: {str(e)}", "ERROR")
@@ -1195,7 +1362,8 @@ class ScraperGUI:
             for i in range(3):
                 try:
                     time.sleep(0.1)
-                    self.conn.commit()
+                    with self.db_write_lock:
+                        self.conn.commit()
                     break
                 except:
                     if i == 2:
@@ -1220,18 +1388,41 @@ class ScraperGUI:
         return
     
     def fetch_initial_timeframe_data(self):
-        """各時間足テーブルから初期データを取得してローカルDBに保存"""
+        """各時間足テーブルからローカルの最新タイムスタンプ以降のデータを取得してローカルDBに保存"""
         try:
-            # cloud_syncのfetch_initial_dataメソッドを持っている
-            all_timeframe_data = self.cloud_sync.fetch_initial_data()
+            # ローカルDBの最新タイムスタンプ以降だけを取得（7テーブル並行）
+            watermarks = self.get_latest_timestamps_for_all_tables()
+            changed_counts = {}
+            
+            def save_page(table_name, page):
+                # 取得したページをそのままローカルDBに反映（Supabaseテーブル名とローカルテーブル名は同じ）
+                with self.db_write_lock:
+                    changed = self._bulk_upsert_local(table_name, page)
+                    self.conn.commit()
+                changed_counts[table_name] = changed_counts.get(table_name, 0) + changed
+            
+            fetched_counts = self.cloud_sync.sync_tables_to_local(watermarks, save_page)
+            
+            # 1分足の階層が有効なら、他のクライアントが送った1分足もorder_book_historyに反映
+            if self.cloud_sync.minute_tier:
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT MAX(timestamp) FROM order_book_history")
+                minute_since = cursor.fetchone()[0]
+                
+                def save_minute_page(table_name, page):
+                    with self.db_write_lock:
+                        changed = self._bulk_upsert_local('order_book_history', page)
+                        self.conn.commit()
+                    changed_counts[table_name] = changed_counts.get(table_name, 0) + changed
+                
+                minute_count = self.cloud_sync.sync_minute_tier_to_local(minute_since, save_minute_page)
+                if minute_count > 0:
+                    self.add_log(f"[ローカルDB] 1分足: {minute_count}件取得、{changed_counts.get('order_book_1min', 0)}件を反映")
             
-            if not all_timeframe_data:
+            if not fetched_counts or all(count < 0 for count in fetched_counts.values()):
                 self.add_log("時間足データの取得に失敗しました", "WARNING")
                 return
             
-            # 第3段階：Supabaseデータとの比較・更新
-            # 各時間足データを対応するローカルテーブルに保存
-            
             # 時間足の表示名
             timeframe_names = {
                 'order_book_5min': '5分足',
@@ -1243,72 +1434,38 @@ class ScraperGUI:
                 'order_book_daily': '日足'
             }
             
-            cursor = self.conn.cursor()
-            
-            # 各時間足のデータを処理
-            for supabase_table, records in all_timeframe_data.items():
-                if not records:
-                    continue
-                
-                # Supabaseテーブル名とローカルテーブル名は同じ
-                local_table = supabase_table
-                
-                timeframe_name = timeframe_names.get(supabase_table, supabase_table)
-                self.add_log(f"[初期データ取得] {timeframe_name}: {len(records)}件取得")
-                
-                new_count = 0
-                update_count = 0
-                
-                for record in records:
-                    try:
-                        # タイムスタンプをUTC付きで保持
-                        timestamp_str = record['timestamp']
-                        if 'Z' in timestamp_str:
-                            timestamp_str = timestamp_str.replace('Z', '+00:00')
-                        # すでにUTC付きフォーマットなのでそのまま使用
-                        
-                        # 既存データをチェック
-                        cursor.execute(f"""
-                            SELECT ask_total, bid_total FROM {local_table}
-                            WHERE timestamp = ?
-                        """, (timestamp_str,))
-                        
-                        existing = cursor.fetchone()
-                        
-                        if existing:
-                            # 最大値を選択して更新
-                            new_ask = max(record['ask_total'], existing[0])
-                            new_bid = max(record['bid_total'], existing[1])
-                            
-                            if new_ask > existing[0] or new_bid > existing[1]:
-                                cursor.execute(f"""
-                                    UPDATE {local_table}
-                                    SET ask_total = ?, bid_total = ?, price = ?
-                                    WHERE timestamp = ?
-                                """, (new_ask, new_bid, record['price'], timestamp_str))
-                                update_count += 1
-                        else:
-                            # 新規挿入
-                            cursor.execute(f"""
-                                INSERT INTO {local_table}
-                                (timestamp, ask_total, bid_total, price)
-                                VALUES (?, ?, ?, ?)
-                            """, (timestamp_str, record['ask_total'], record['bid_total'], record['price']))
-                            new_count += 1
-                            
-                    except Exception as e:
-                        # 個別のレコードエラーは継続
-                        self.add_log(f"[{timeframe_name}] レコード処理エラー: {str(e)}", "DEBUG")
-                        continue
-                
-                self.add_log(f"[ローカルDB] {timeframe_name}: 新規{new_count}件、更新{update_count}件")
+            for table_name, count in fetched_counts.items():
+                if count > 0:
+                    timeframe_name = timeframe_names.get(table_name, table_name)
+                    self.add_log(f"[ローカルDB] {timeframe_name}: {count}件取得、{changed_counts.get(table_name, 0)}件を反映")
             
-            self.conn.commit()
             self.add_log("時間足データの取得・保存完了")
                 
         except Exception as e:
             self.add_log(f"時間足データ取得エラー: {str(e)}", "ERROR")
     
+    def _bulk_upsert_local(self, table_name, records) -> int:
+        """レコードを時間足テーブルに最大値マージで一括保存し、挿入・更新された件数を返す（コミットは呼び出し側）"""
+        rows = []
+        for record in records:
+            # タイムスタンプをUTC付きで保持
+            timestamp_str = record['timestamp']
+            if 'Z' in timestamp_str:
+                timestamp_str = timestamp_str.replace('Z', '+00:00')
+            rows.append((timestamp_str, record['ask_total'], record['bid_total'], record['price']))
+        
+        before = self.conn.total_changes
+        self.conn.executemany(f"""
+            INSERT INTO {table_name} (timestamp, ask_total, bid_total, price)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(timestamp) DO UPDATE SET
+                ask_total = MAX(ask_total, excluded.ask_total),
+                bid_total = MAX(bid_total, excluded.bid_total),
+                price = excluded.price
+            WHERE excluded.ask_total > ask_total OR excluded.bid_total > bid_total
+        """, rows)
+        return self.conn.total_changes - before
+    
     def fetch_missing_data_from_cloud(self):
         """（無効化）クラウドから欠損データを取得"""
         # 第5段階の実装：リアルタイム欠損補完を削除
@@ -1346,12 +1503,9 @@ class ScraperGUI:
                         timestamps[table_name] = result[0]
                         self.add_log(f"[{table_name}] 最新タイムスタンプ: {result[0]}", "DEBUG")
                     else:
-                        # テーブルが空の場合、デフォルト値を設定
-                        # 過去のデータを取得するために現在時刻から適切な期間前を設定
-                        from datetime import datetime, timedelta, timezone
-                        default_timestamp = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-                        timestamps[table_name] = default_timestamp
-                        self.add_log(f"[{table_name}] データなし、デフォルト: {default_timestamp}", "DEBUG")
+                        # テーブルが空の場合はNone（起動時の取得でクラウドの全期間を読み込む）
+                        timestamps[table_name] = None
+                        self.add_log(f"[{table_name}] データなし、全期間を取得します", "DEBUG")
                         
                 except sqlite3.OperationalError as e:
                     # テーブルが存在しない場合
@@ -1388,66 +1542,72 @@ class ScraperGUI:
             
             self.add_log(f"[Realtime同期] {table_name}から{len(records)}件のデータを保存開始", "INFO")
             
-            cursor = self.conn.cursor()
-            saved_count = 0
-            updated_count = 0
-            
-            for record in records:
+            with self.db_write_lock:
                 try:
-                    # タイムスタンプをUTC付きで保持
-                    timestamp_str = record['timestamp']
-                    if 'Z' in timestamp_str:
-                        timestamp_str = timestamp_str.replace('Z', '+00:00')
-                    # すでにUTC付きフォーマットなのでそのまま使用
-                    
-                    # 既存データをチェック（専用テーブルから）
-                    cursor.execute(f"""
-                        SELECT ask_total, bid_total FROM {table_name}
-                        WHERE timestamp = ?
-                    """, (timestamp_str,))
+                    cursor = self.conn.cursor()
+                    saved_count = 0
+                    updated_count = 0
                     
-                    existing = cursor.fetchone()
-                    
-                    if existing:
-                        # Realtime同期はSupabaseの値を絶対値として採用（最大値比較しない）
-                        new_ask = record['ask_total']
-                        new_bid = record['bid_total']
-                        
-                        # 値が変更されている場合のみUPDATE（増減に関わらず）
-                        if new_ask != existing[0] or new_bid != existing[1]:
+                    for record in records:
+                        try:
+                            # タイムスタンプをUTC付きで保持
+                            timestamp_str = record['timestamp']
+                            if 'Z' in timestamp_str:
+                                timestamp_str = timestamp_str.replace('Z', '+00:00')
+                            # すでにUTC付きフォーマットなのでそのまま使用
+                            
+                            # 既存データをチェック（専用テーブルから）
                             cursor.execute(f"""
-                                UPDATE {table_name}
-                                SET ask_total = ?, bid_total = ?, price = ?
+                                SELECT ask_total, bid_total FROM {table_name}
                                 WHERE timestamp = ?
-                            """, (new_ask, new_bid, record['price'], timestamp_str))
+                            """, (timestamp_str,))
                             
-                            if cursor.rowcount > 0:
-                                updated_count += 1
-                                self.add_log(f"[Realtime同期] {table_name}: {timestamp_str} を更新 (Ask: {existing[0]:.0f} → {new_ask:.0f}, Bid: {existing[1]:.0f} → {new_bid:.0f})", "DEBUG")
-                    else:
-                        # 新規挿入
-                        cursor.execute(f"""
-                            INSERT INTO {table_name}
-                            (timestamp, ask_total, bid_total, price)
-                            VALUES (?, ?, ?, ?)
-                        """, (
-                            timestamp_str,
-                            record['ask_total'],
-                            record['bid_total'],
-                            record['price']
-                        ))
-                        if cursor.rowcount > 0:
-                            saved_count += 1
-                            self.add_log(f"[Realtime同期] {table_name}: {timestamp_str} を新規保存 (Ask: {record['ask_total']:.0f}, Bid: {record['bid_total']:.0f})", "DEBUG")
+                            existing = cursor.fetchone()
                             
-                except Exception as e:
-                    # 個別のレコードエラーは継続
-                    self.add_log(f"[Realtime同期] レコード処理エラー: {str(e)}", "DEBUG")
-                    continue
+                            if existing:
+                                # Realtime同期はSupabaseの値を絶対値として採用（最大値比較しない）
+                                new_ask = record['ask_total']
+                                new_bid = record['bid_total']
+                                
+                                # 値が変更されている場合のみUPDATE（増減に関わらず）
+                                if new_ask != existing[0] or new_bid != existing[1]:
+                                    cursor.execute(f"""
+                                        UPDATE {table_name}
+                                        SET ask_total = ?, bid_total = ?, price = ?
+                                        WHERE timestamp = ?
+                                    """, (new_ask, new_bid, record['price'], timestamp_str))
+                                    
+                                    if cursor.rowcount > 0:
+                                        updated_count += 1
+                                        self.add_log(f"[Realtime同期] {table_name}: {timestamp_str} を更新 (Ask: {existing[0]:.0f} → {new_ask:.0f}, Bid: {existing[1]:.0f} → {new_bid:.0f})", "DEBUG")
+                            else:
+                                # 新規挿入
+                                cursor.execute(f"""
+                                    INSERT INTO {table_name}
+                                    (timestamp, ask_total, bid_total, price)
+                                    VALUES (?, ?, ?, ?)
+                                """, (
+                                    timestamp_str,
+                                    record['ask_total'],
+                                    record['bid_total'],
+                                    record['price']
+                                ))
+                                if cursor.rowcount > 0:
+                                    saved_count += 1
+                                    self.add_log(f"[Realtime同期] {table_name}: {timestamp_str} を新規保存 (Ask: {record['ask_total']:.0f}, Bid: {record['bid_total']:.0f})", "DEBUG")
+                                    
+                        except Exception as e:
+                            # 個別のレコードエラーは継続
+                            self.add_log(f"[Realtime同期] レコード処理エラー: {str(e)}", "DEBUG")
+                            continue
+                    
+                    if saved_count > 0 or updated_count > 0:
+                        self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
             
             if saved_count > 0 or updated_count > 0:
-                self.conn.commit()
-                
                 # テーブル名から時間足名を取得
                 timeframe_names = {
                     'order_book_5min': '5分足',
@@ -1476,10 +1636,89 @@ class ScraperGUI:
                     latest_timestamp = max(r['timestamp'] for r in records)
                     self.cloud_sync.update_latest_timestamps(table_name, latest_timestamp)
                 
-                # グラフを更新（UIスレッドで実行）
+                # グラフ更新を要求（UIスレッドで1フレームに1回だけ実行）
                 # 注意：現在の時間足設定が5分足以上の場合のみ更新
                 # （1分足・3分足は影響を受けない）
-                self.root.after(100, self.update_graph)
+                self.ui_dispatcher.request_graph_refresh()
+                
+        except Exception as e:
+            self.add_log(f"[Realtime同期] データ保存エラー: {str(e)}", "ERROR")
+    
+    def save_realtime_batch_to_local_db(self, batches: dict):
+        """Realtime同期で時間窓内に受信したデータを1トランザクションでローカルDBに保存
+
+        batches: {テーブル名: [record, ...]}（同じタイムスタンプは最後の値にまとめ済み）
+        """
+        try:
+            # サポートされているテーブルのリスト
+            supported_tables = [
+                'order_book_5min',   # 5分足
+                'order_book_15min',  # 15分足
+                'order_book_30min',  # 30分足
+                'order_book_1hour',  # 1時間足
+                'order_book_2hour',  # 2時間足
+                'order_book_4hour',  # 4時間足
+                'order_book_daily'   # 日足
+            ]
+            
+            changed_counts = {}
+            with self.db_write_lock:
+                try:
+                    for table_name, records in batches.items():
+                        if table_name not in supported_tables:
+                            self.add_log(f"[Realtime同期] {table_name}は未対応のテーブルです", "DEBUG")
+                            continue
+                        rows = []
+                        for record in records:
+                            # タイムスタンプをUTC付きで保持
+                            timestamp_str = record['timestamp']
+                            if 'Z' in timestamp_str:
+                                timestamp_str = timestamp_str.replace('Z', '+00:00')
+                            rows.append((timestamp_str, record['ask_total'], record['bid_total'], record['price']))
+                        
+                        # Realtime同期はSupabaseの値を絶対値として採用（最大値比較しない）
+                        # 値が変わった行だけを更新する
+                        before = self.conn.total_changes
+                        self.conn.executemany(f"""
+                            INSERT INTO {table_name} (timestamp, ask_total, bid_total, price)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(timestamp) DO UPDATE SET
+                                ask_total = excluded.ask_total,
+                                bid_total = excluded.bid_total,
+                                price = excluded.price
+                            WHERE excluded.ask_total != ask_total OR excluded.bid_total != bid_total
+                        """, rows)
+                        changed_counts[table_name] = self.conn.total_changes - before
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+            
+            # 時間足の表示名
+            timeframe_names = {
+                'order_book_5min': '5分足',
+                'order_book_15min': '15分足',
+                'order_book_30min': '30分足',
+                'order_book_1hour': '1時間足',
+                'order_book_2hour': '2時間足',
+                'order_book_4hour': '4時間足',
+                'order_book_daily': '日足'
+            }
+            
+            log_msg_parts = [f"{timeframe_names.get(t, t)} {count}件"
+                             for t, count in changed_counts.items() if count > 0]
+            if log_msg_parts:
+                self.add_log(f"[Realtime同期] {', '.join(log_msg_parts)}を反映")
+            
+            # 最新タイムスタンプをCloudSyncManagerに通知
+            if self.cloud_sync:
+                for table_name in changed_counts:
+                    latest_timestamp = max(r['timestamp'] for r in batches[table_name])
+                    self.cloud_sync.update_latest_timestamps(table_name, latest_timestamp)
+            
+            # バッチ全体でグラフ更新を1回だけ要求
+            if log_msg_parts:
+                self.ui_dispatcher.request_graph_refresh()
                 
         except Exception as e:
             self.add_log(f"[Realtime同期] データ保存エラー: {str(e)}", "ERROR")
@@ -1530,7 +1769,8 @@ class ScraperGUI:
                 self.cloud_sync.initialize_latest_timestamps(latest_timestamps)
                 
                 # Realtime同期を開始
-                if self.cloud_sync.setup_realtime_sync(self.save_realtime_data_to_local_db):
+                if self.cloud_sync.setup_realtime_sync(self.save_realtime_data_to_local_db,
+                                                   self.save_realtime_batch_to_local_db):
                     self.add_log("Realtime同期を開始しました", "INFO")
                 else:
                     self.add_log("Realtime同期の開始に失敗しました", "WARNING")
@@ -1637,8 +1877,8 @@ class ScraperGUI:
             self.add_log(f"[{table_name}] データ読み込みエラー: {str(e)}", "ERROR")
             return [], [], []
     
-    def update_graph(self):
-        """グラフを更新"""
+    def update_graph(self, preserve_view=False):
+        """グラフを更新（preserve_view=Trueの場合は現在のX軸表示範囲を維持）"""
         # 時間足の設定取得
         timeframe = self.timeframe_var.get()
         timeframe_intervals = {
@@ -1665,12 +1905,21 @@ class ScraperGUI:
             "1日": "order_book_daily"
         }
         
+        saved_xlim = self.ax_ask.get_xlim() if preserve_view else None
+        self.chart_table_name = None
+        
         try:
             # 5分足以上は専用テーブルから読み込み
             if timeframe in timeframe_tables:
                 table_name = timeframe_tables[timeframe]
                 times, asks, bids = self.load_timeframe_data_from_db(table_name)
                 
+                if times:
+                    # パンで読み込んだ過去データを結合
+                    self.chart_table_name = table_name
+                    self.chart_loaded_start = times[0]
+                    times, asks, bids = self._merge_chart_history(table_name, times, asks, bids)
+                
                 if not times:
                     # データがない場合は従来の動的生成にフォールバック
                     self.add_log(f"[{timeframe}] 専用テーブルにデータがありません。動的生成にフォールバックします。")
@@ -1691,86 +1940,22 @@ class ScraperGUI:
             if len(times) < 2:
                 return
             
-            # 各グラフのY軸範囲を計算
-            ask_min = 0
-            ask_max = 1
-            bid_min = 0
-            bid_max = 1
-            
-            if asks and bids:
-                # 各板の最小値・最大値を取得
-                min_ask = min(asks)
-                min_bid = min(bids)
-                max_ask = max(asks)
-                max_bid = max(bids)
-                
-                # 各板の変動幅を計算
-                ask_range = max_ask - min_ask
-                bid_range = max_bid - min_bid
-                
-                # より大きい幅を共通幅として採用（最小幅を設定）
-                common_range = max(ask_range, bid_range, 1.0)  # 最小幅1.0を保証
-                
-                # 各グラフの表示範囲を設定（自身の最小値から共通幅分）
-                ask_min = min_ask
-                ask_max = min_ask + common_range
-                bid_min = min_bid
-                bid_max = min_bid + common_range
-            
-            # 売り板グラフを更新
-            self.ax_ask.clear()
-            self.ax_ask.plot(times, asks, color='#ff6b6b', linewidth=2)
-            self.ax_ask.fill_between(times, asks, ask_min, color='#ff6b6b', alpha=0.3)
-            self.ax_ask.grid(True, alpha=0.2, color='#444444')
-            self.ax_ask.set_facecolor('#1e1e1e')
-            self.ax_ask.set_ylim(ask_min, ask_max)
-            
-            # 売り板のY軸を反転（下向きに表示）
-            self.ax_ask.invert_yaxis()
-            
-            # 買い板グラフを更新
-            self.ax_bid.clear()
-            self.ax_bid.plot(times, bids, color='#51cf66', linewidth=2)
-            self.ax_bid.fill_between(times, bids, bid_min, color='#51cf66', alpha=0.3)
-            self.ax_bid.grid(True, alpha=0.2, color='#444444')
-            self.ax_bid.set_facecolor('#1e1e1e')
-            self.ax_bid.set_ylim(bid_min, bid_max)
-            
-            # X軸の設定（最大30ラベル、0時は月/日表示）
-            for ax in [self.ax_ask, self.ax_bid]:
-                # データ点数から間引き間隔を計算（最大30ラベル）
-                max_labels = 30
-                data_count = len(times)
-                skip_interval = max(1, data_count // max_labels)
-                
-                # 表示するティックの位置とラベルを準備
-                tick_positions = []
-                tick_labels = []
-                
-                for i in range(0, data_count, skip_interval):
-                    if i < data_count:
-                        tick_positions.append(times[i])
-                        time_obj = times[i]
-                        
-                        # 日足の場合はすべて月/日表示
-                        if timeframe == "1日":
-                            tick_labels.append(f"{time_obj.month}/{time_obj.day}")
-                        else:
-                            # 0時の場合は月/日表示、それ以外は時間のみ
-                            if time_obj.hour == 0 and time_obj.minute == 0:
-                                tick_labels.append(f"{time_obj.month}/{time_obj.day}")
-                            else:
-                                tick_labels.append(f"{time_obj.hour}")
-                
-                # カスタムティックを設定
-                ax.set_xticks(tick_positions)
-                ax.set_xticklabels(tick_labels)
-                
-                # ラベルの回転（必要に応じて）
-                if timeframe == "1日" or data_count > 100:
-                    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-                else:
-                    plt.setp(ax.xaxis.get_majorticklabels(), rotation=0, ha='center')
+            if self.chart_renderer:
+                # ワーカースレッドで画像化し、完成後にTkスレッドで表示
+                self.chart_renderer.submit(
+                    times, asks, bids, timeframe,
+                    self.chart_image_label.winfo_width(),
+                    self.chart_image_label.winfo_height(),
+                    xlim=saved_xlim
+                )
+                return
+            
+            draw_depth_chart(self.ax_ask, self.ax_bid, times, asks, bids, timeframe)
+            
+            # パン・ズーム中の表示範囲を復元
+            if saved_xlim is not None:
+                self.ax_ask.set_xlim(saved_xlim)
+                self.ax_bid.set_xlim(saved_xlim)
             
             # グラフを再描画
             self.canvas.draw()
@@ -1779,10 +1964,25 @@ class ScraperGUI:
             self.add_log(f"グラフ更新エラー: {str(e)}", "ERROR")
         
     
+    def _show_chart_frame(self, frame):
+        """オフスレッドで描画済みのビットマップを表示（Tkスレッド）"""
+        image = Image.frombuffer('RGBA', (frame['width'], frame['height']), frame['rgba'], 'raw', 'RGBA', 0, 1)
+        # PhotoImageは参照を保持しないと破棄されるため属性に保存
+        self.chart_photo = ImageTk.PhotoImage(image)
+        self.chart_image_label.configure(image=self.chart_photo)
+        self.chart_renderer.record_handoff(frame)
+        
+        # 50フレームごとにフレーム時間を記録
+        metrics = self.chart_renderer.get_metrics()
+        if metrics['frames_rendered'] % 50 == 0 and metrics['render_ms']:
+            self.add_log(f"[描画] 描画 平均{metrics['render_ms']['avg']}ms / 表示まで 平均{metrics['frame_ms']['avg']}ms "
+                         f"(p95 {metrics['frame_ms']['p95']}ms, スキップ{metrics['frames_skipped']}件)", "DEBUG")
+    
     def clear_all(self):
         """ログとグラフをクリア"""
-        # ログをクリア
+        # ログをクリア（バッファの内容は退避ファイルに残る）
         self.log_text.delete(1.0, tk.END)
+        self.log_buffer.clear()
         self.add_log("ログとグラフをクリアしました")
         
         # グラフの履歴データをクリア
@@ -1924,6 +2124,7 @@ class ScraperGUI:
         # Realtime接続をクリーンアップ
         if hasattr(self, 'cloud_sync') and self.cloud_sync:
             try:
+                self.cloud_sync.shutdown_writes()
                 self.cloud_sync.cleanup_realtime()
                 self.add_log("Realtime接続をクリーンアップしました")
             except Exception as e:
@@ -1942,6 +2143,13 @@ class ScraperGUI:
         except Exception as e:
             # print(f"データベースクローズエラー: {str(e)}")
             pass
+        
+        # UIディスパッチャと範囲データソースを停止
+        self.ui_dispatcher.stop()
+        if self.chart_source:
+            self.chart_source.stop()
+        if self.chart_renderer:
+            self.chart_renderer.stop()
             
         self.root.destroy()
     
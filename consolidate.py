@@ -0,0 +1,40 @@
+"""
+重複タイムスタンプの統合（最大値選択）
+取得経路（全件取得・欠損取得・初期同期・ギャップ補完）と移行スクリプトで共通に使う
+
+統合ルール:
+  - ask_total / bid_total : 同じタイムスタンプの中の最大値
+  - price                 : 同じタイムスタンプの中で最後に現れた行の値
+  - その他の列（id, group_id など）: 最初に現れた行の値をそのまま残す
+  - 出力順                : 各タイムスタンプが最初に現れた順
+
+PostgRESTの結果は行のリストで届くため、列へ詰め替えずに1パスで統合する（benchmark_consolidate.py 参照）
+"""
+
+from typing import Any, Dict, List, Sequence
+
+
+def consolidate_max(records: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """重複するタイムスタンプの行を最大値で1行にまとめる
+
+    重複がない行は元のdictをそのまま返し、統合した行は最初の行をコピーして値を置き換える
+    """
+    consolidated: Dict[str, Dict[str, Any]] = {}
+    copied = set()
+    for record in records:
+        ts = record['timestamp']
+        existing = consolidated.get(ts)
+        if existing is None:
+            consolidated[ts] = record
+            continue
+        # 元の行を書き換えないよう、最初の統合時にコピーする
+        if ts not in copied:
+            existing = dict(existing)
+            consolidated[ts] = existing
+            copied.add(ts)
+        if record['ask_total'] > existing['ask_total']:
+            existing['ask_total'] = record['ask_total']
+        if record['bid_total'] > existing['bid_total']:
+            existing['bid_total'] = record['bid_total']
+        existing['price'] = record['price']
+    return list(consolidated.values())
@@ -0,0 +1,89 @@
+-- 1分足のクラウド階層
+-- 各クライアントのローカル1分足（order_book_history）をグループで共有するためのテーブルと、
+-- 古い1分足を5分足へ間引いて削除する保持ジョブ（minute_tier.py、cloud_sync.minute_tier_enabled）
+--
+-- 前提: create_timeframe_tables.sql（order_book_5min）と create_upsert_functions.sql（upsert_order_book_max）
+--
+-- 容量の目安: 1グループあたり 1440行/日 × 保持日数（既定1日）。それより古い1分足は5分足に集約されるので
+-- 無料枠の行数上限を超えて増え続けることはない
+
+CREATE TABLE IF NOT EXISTS order_book_1min (
+  id SERIAL PRIMARY KEY,
+  timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+  ask_total NUMERIC NOT NULL,
+  bid_total NUMERIC NOT NULL,
+  price NUMERIC NOT NULL,
+  group_id VARCHAR(50) DEFAULT 'default-group',
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  UNIQUE(timestamp, group_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_1min_timestamp ON order_book_1min(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_1min_group_timestamp ON order_book_1min(group_id, timestamp);
+
+-- upsert_order_book_max / upsert_order_book_max_bulk の書き込み先に order_book_1min を含めるため、
+-- このファイルの後に create_upsert_functions.sql を再実行しておくこと（対象テーブルの一覧に追加済み）
+
+-- 保持期間より古い1分足を5分足へ最大値マージしてから削除する
+-- 5分足の値は sync_scheduler.py と同じく「5分境界から240秒未満で最も早い1分足」
+-- 対象は保持期間の境目を5分境界に切り捨てた時刻より前の行（5分の区間を途中で分けない）
+-- 行を削除する関数を anon に公開するため、対象は指定したグループだけ（NULLで全グループにはしない）、
+-- 保持日数は1日以上に限る。戻り値は5分足へ反映した行数と削除した1分足の行数
+
+-- 以前の版（p_group_id が NULL なら全グループ）が残らないように削除してから作成する
+DROP FUNCTION IF EXISTS downsample_order_book_1min(INTEGER, VARCHAR);
+
+CREATE OR REPLACE FUNCTION downsample_order_book_1min(
+  p_group_id VARCHAR,
+  p_retention_days INTEGER DEFAULT 1
+)
+RETURNS TABLE(downsampled INTEGER, deleted INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_cutoff TIMESTAMP WITH TIME ZONE;
+  r RECORD;
+BEGIN
+  IF p_group_id IS NULL THEN
+    RAISE EXCEPTION 'group_id is required';
+  END IF;
+  IF p_retention_days IS NULL OR p_retention_days < 1 THEN
+    RAISE EXCEPTION 'invalid retention days: %', p_retention_days;
+  END IF;
+
+  v_cutoff := to_timestamp(
+    floor(extract(epoch FROM now() - make_interval(days => p_retention_days)) / 300) * 300);
+  downsampled := 0;
+
+  FOR r IN
+    SELECT DISTINCT ON (m.group_id, b.bucket)
+           b.bucket, m.ask_total, m.bid_total, m.price, m.group_id
+    FROM order_book_1min AS m
+    CROSS JOIN LATERAL (
+      SELECT to_timestamp(floor(extract(epoch FROM m.timestamp) / 300) * 300) AS bucket
+    ) AS b
+    WHERE m.timestamp < v_cutoff
+      AND m.group_id = p_group_id
+      AND m.timestamp < b.bucket + interval '240 seconds'
+    ORDER BY m.group_id, b.bucket, m.timestamp
+  LOOP
+    PERFORM upsert_order_book_max('order_book_5min', r.bucket, r.ask_total, r.bid_total, r.price, r.group_id);
+    downsampled := downsampled + 1;
+  END LOOP;
+
+  DELETE FROM order_book_1min
+  WHERE timestamp < v_cutoff
+    AND group_id = p_group_id;
+  GET DIAGNOSTICS deleted = ROW_COUNT;
+  RETURN NEXT;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION downsample_order_book_1min(VARCHAR, INTEGER) TO anon;
+GRANT EXECUTE ON FUNCTION downsample_order_book_1min(VARCHAR, INTEGER) TO authenticated;
+
+-- 保持ジョブを pg_cron で1時間ごとに実行する（Supabaseの拡張機能で pg_cron を有効化）
+-- クライアントも1分足の送信後に1時間に1回呼び出すため、pg_cron がなくても保持期間は守られる
+-- SELECT cron.schedule('order-book-1min-downsample', '7 * * * *',
+--   $$SELECT d.* FROM (SELECT DISTINCT group_id FROM order_book_1min) AS g,
+--     LATERAL downsample_order_book_1min(g.group_id, 1) AS d$$);
@@ -0,0 +1,65 @@
+-- クラウドへ書き込むコレクターをグループごとに1台に絞るためのリース（leader_lease.py、cloud_sync.leader_election）
+-- 同じ group_id のクライアントはTTL付きのリース行を取り合い、保持者（リーダー）だけが各境界を書き込む。
+-- リーダーが更新をやめる（終了・通信断）とTTL経過後に他のクライアントが引き継ぐ
+--
+-- synced_until はリーダーが保存を終えた最新の境界。フォロワーはこれより新しい境界が
+-- 一定時間保存されないときだけ自分で書き込む（欠損の補完）
+
+CREATE TABLE IF NOT EXISTS collector_leases (
+  group_id VARCHAR(50) PRIMARY KEY,
+  holder TEXT NOT NULL,
+  expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+  acquired_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  synced_until TIMESTAMP WITH TIME ZONE
+);
+
+-- リースの取得・更新
+-- 保持者が自分、またはリースが期限切れなら自分を保持者にして期限を延ばす。
+-- 戻り値は更新後のリース（is_leader が true なら自分が保持者）
+CREATE OR REPLACE FUNCTION acquire_collector_lease(
+  p_group_id VARCHAR,
+  p_holder TEXT,
+  p_ttl_seconds NUMERIC DEFAULT 60,
+  p_synced_until TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE(holder TEXT, expires_at TIMESTAMP WITH TIME ZONE, synced_until TIMESTAMP WITH TIME ZONE, is_leader BOOLEAN)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+  INSERT INTO collector_leases AS l (group_id, holder, expires_at, acquired_at, synced_until)
+  VALUES (p_group_id, p_holder, now() + make_interval(secs => p_ttl_seconds), now(), p_synced_until)
+  ON CONFLICT (group_id) DO UPDATE SET
+    holder = EXCLUDED.holder,
+    expires_at = EXCLUDED.expires_at,
+    acquired_at = CASE WHEN l.holder = EXCLUDED.holder THEN l.acquired_at ELSE now() END,
+    synced_until = GREATEST(l.synced_until, EXCLUDED.synced_until)
+  WHERE l.holder = EXCLUDED.holder OR l.expires_at < now();
+
+  RETURN QUERY
+    SELECT l.holder, l.expires_at, l.synced_until, l.holder = p_holder
+    FROM collector_leases AS l
+    WHERE l.group_id = p_group_id;
+END;
+$$;
+
+-- リースの解放（終了時にすぐ他のクライアントへ引き継ぐ）。戻り値は解放できたか
+CREATE OR REPLACE FUNCTION release_collector_lease(
+  p_group_id VARCHAR,
+  p_holder TEXT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE collector_leases SET expires_at = now()
+  WHERE group_id = p_group_id AND holder = p_holder;
+  RETURN FOUND;
+END;
+$$;
+
+-- 関数の実行権限
+GRANT EXECUTE ON FUNCTION acquire_collector_lease(VARCHAR, TEXT, NUMERIC, TIMESTAMP WITH TIME ZONE) TO anon;
+GRANT EXECUTE ON FUNCTION acquire_collector_lease(VARCHAR, TEXT, NUMERIC, TIMESTAMP WITH TIME ZONE) TO authenticated;
+GRANT EXECUTE ON FUNCTION release_collector_lease(VARCHAR, TEXT) TO anon;
+GRANT EXECUTE ON FUNCTION release_collector_lease(VARCHAR, TEXT) TO authenticated;
@@ -0,0 +1,62 @@
+-- 内容ハッシュによる範囲照合用の集計関数（reconcile.py から呼び出す）
+-- 時間バケットごとに件数と行ハッシュの合計だけを返すため、一致している範囲は行を転送せずに照合できる
+--
+-- 行の文字列   : "<UNIX秒>|<ask_total>|<bid_total>|<price>"（値は小数点以下p_scale桁で四捨五入した整数）
+-- 行のハッシュ : 文字列のMD5の先頭15桁（16進）を整数にしたもの
+-- バケット     : floor(UNIX秒 / p_bucket_seconds) * p_bucket_seconds
+-- reconcile.py の row_hash / bucket_hashes と同じ定義なので、ローカルSQLiteの計算結果と直接比較できる
+
+CREATE OR REPLACE FUNCTION order_book_bucket_hashes(
+  p_table TEXT,
+  p_group_id VARCHAR DEFAULT 'default-group',
+  p_start TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  p_end TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  p_bucket_seconds INTEGER DEFAULT 86400,
+  p_scale INTEGER DEFAULT 2
+)
+RETURNS TABLE(bucket_start BIGINT, row_count BIGINT, hash_sum TEXT)
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+  -- 対象テーブルを限定（動的SQLのため）
+  IF p_table NOT IN (
+    'order_book_1min', 'order_book_5min', 'order_book_15min', 'order_book_30min', 'order_book_1hour',
+    'order_book_2hour', 'order_book_4hour', 'order_book_daily'
+  ) THEN
+    RAISE EXCEPTION 'unsupported table: %', p_table;
+  END IF;
+  IF p_bucket_seconds IS NULL OR p_bucket_seconds <= 0 THEN
+    RAISE EXCEPTION 'invalid bucket size: %', p_bucket_seconds;
+  END IF;
+
+  RETURN QUERY EXECUTE format(
+    'SELECT b.bucket_start, COUNT(*)::BIGINT, SUM(b.h)::TEXT
+     FROM (
+       SELECT e.epoch - (e.epoch %% $4) AS bucket_start,
+              (''x'' || lpad(substr(md5(
+                 e.epoch::TEXT || ''|'' ||
+                 round(t.ask_total * (10::NUMERIC ^ $5))::BIGINT::TEXT || ''|'' ||
+                 round(t.bid_total * (10::NUMERIC ^ $5))::BIGINT::TEXT || ''|'' ||
+                 round(t.price * (10::NUMERIC ^ $5))::BIGINT::TEXT
+               ), 1, 15), 16, ''0''))::BIT(64)::BIGINT::NUMERIC AS h
+       FROM %I AS t
+       CROSS JOIN LATERAL (SELECT floor(extract(epoch FROM t.timestamp))::BIGINT AS epoch) AS e
+       WHERE t.group_id = $1
+         AND ($2::TIMESTAMPTZ IS NULL OR t.timestamp >= $2)
+         AND ($3::TIMESTAMPTZ IS NULL OR t.timestamp < $3)
+     ) AS b
+     GROUP BY b.bucket_start
+     ORDER BY b.bucket_start',
+    p_table
+  )
+  USING p_group_id, p_start, p_end, p_bucket_seconds, p_scale;
+END;
+$$;
+
+-- 範囲検索用のインデックス（UNIQUE(timestamp, group_id) がない環境向け）
+CREATE INDEX IF NOT EXISTS idx_5min_group_timestamp ON order_book_5min(group_id, timestamp);
+
+-- 関数の実行権限
+GRANT EXECUTE ON FUNCTION order_book_bucket_hashes(TEXT, VARCHAR, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, INTEGER, INTEGER) TO anon;
+GRANT EXECUTE ON FUNCTION order_book_bucket_hashes(TEXT, VARCHAR, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, INTEGER, INTEGER) TO authenticated;
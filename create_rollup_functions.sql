@@ -0,0 +1,99 @@
+-- サーバー側の時間足ロールアップ
+-- order_book_5min への書き込みから15分足〜日足をデータベース内で生成する。
+-- クライアントは cloud_sync.server_rollup を true にすると5分足だけを書き込めばよくなり、
+-- 上位時間足の境界の丸め方がクライアントごとに食い違うこともなくなる
+--
+-- 前提: create_timeframe_tables.sql（各時間足テーブル）と create_upsert_functions.sql（upsert_order_book_max）
+--
+-- ロールアップの規則（クライアントの sync_scheduler.py と同じ）:
+--   上位時間足の境界（UTCのUNIX秒が時間足の長さで割り切れる時刻。日足は00:00、4時間足は0,4,8..時）に
+--   ある5分足の行を、その時間足の行として最大値マージでupsertする
+
+-- 1行分の5分足を該当する上位時間足へ反映
+CREATE OR REPLACE FUNCTION rollup_order_book_row(
+  p_timestamp TIMESTAMP WITH TIME ZONE,
+  p_ask_total NUMERIC,
+  p_bid_total NUMERIC,
+  p_price NUMERIC,
+  p_group_id VARCHAR DEFAULT 'default-group'
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_epoch BIGINT := floor(extract(epoch FROM p_timestamp))::BIGINT;
+  v_target RECORD;
+  v_count INTEGER := 0;
+BEGIN
+  FOR v_target IN
+    SELECT * FROM (VALUES
+      ('order_book_15min', 900),
+      ('order_book_30min', 1800),
+      ('order_book_1hour', 3600),
+      ('order_book_2hour', 7200),
+      ('order_book_4hour', 14400),
+      ('order_book_daily', 86400)
+    ) AS t(table_name, seconds)
+  LOOP
+    IF v_epoch % v_target.seconds = 0 THEN
+      PERFORM upsert_order_book_max(v_target.table_name, p_timestamp, p_ask_total, p_bid_total, p_price, p_group_id);
+      v_count := v_count + 1;
+    END IF;
+  END LOOP;
+  RETURN v_count;
+END;
+$$;
+
+-- 5分足の挿入・更新ごとに上位時間足へ反映するトリガー
+CREATE OR REPLACE FUNCTION trg_rollup_order_book_5min()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM rollup_order_book_row(NEW.timestamp, NEW.ask_total, NEW.bid_total, NEW.price,
+                                COALESCE(NEW.group_id, 'default-group'));
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS rollup_order_book_5min ON order_book_5min;
+CREATE TRIGGER rollup_order_book_5min
+  AFTER INSERT OR UPDATE OF ask_total, bid_total, price ON order_book_5min
+  FOR EACH ROW
+  EXECUTE FUNCTION trg_rollup_order_book_5min();
+
+-- 既存の5分足から上位時間足を作り直す（トリガー導入前のデータの移行や、定期ジョブでの補完用）
+-- p_group_id が NULL なら全グループ。戻り値は反映した5分足の行数
+CREATE OR REPLACE FUNCTION rollup_order_book_range(
+  p_group_id VARCHAR DEFAULT NULL,
+  p_start TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  p_end TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  r RECORD;
+  v_count INTEGER := 0;
+BEGIN
+  FOR r IN
+    SELECT timestamp, ask_total, bid_total, price, group_id
+    FROM order_book_5min
+    WHERE (p_group_id IS NULL OR group_id = p_group_id)
+      AND (p_start IS NULL OR timestamp >= p_start)
+      AND (p_end IS NULL OR timestamp < p_end)
+      AND floor(extract(epoch FROM timestamp))::BIGINT % 900 = 0
+    ORDER BY timestamp
+  LOOP
+    PERFORM rollup_order_book_row(r.timestamp, r.ask_total, r.bid_total, r.price, r.group_id);
+    v_count := v_count + 1;
+  END LOOP;
+  RETURN v_count;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION rollup_order_book_range(VARCHAR, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO authenticated;
+
+-- トリガーを使わない場合は pg_cron で定期的に直近の範囲を反映する（Supabaseの拡張機能で pg_cron を有効化）
+-- SELECT cron.schedule('order-book-rollup', '*/5 * * * *',
+--   $$SELECT rollup_order_book_range(NULL, now() - interval '1 day', now())$$);
@@ -1,5 +1,6 @@
 -- Create multiple timeframe tables for order book data
 -- Each table has the same structure as order_book_1hour
+-- 15分足〜日足を order_book_5min からサーバー側で生成する場合は create_rollup_functions.sql も実行する
 
 -- 15分足テーブルの作成
 CREATE TABLE IF NOT EXISTS order_book_15min (
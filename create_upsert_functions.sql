@@ -0,0 +1,92 @@
+-- 最大値マージ付きupsert関数
+-- クライアントの「SELECTで既存確認 → UPDATE/INSERT」を1回のRPC呼び出しに置き換える
+-- 同じグループの複数クライアントが同時に書き込んでも、行ロック内で最大値が採用される
+
+-- ON CONFLICT用の一意制約（order_book_5minは移行で作成されたため念のため追加）
+CREATE UNIQUE INDEX IF NOT EXISTS uq_5min_timestamp_group ON order_book_5min(timestamp, group_id);
+
+-- 1件を最大値マージでupsert
+-- 戻り値: 挿入・更新された場合は保存後の値とinserted（新規ならtrue）
+--         既存値の方が大きく変更がなかった場合は0行
+CREATE OR REPLACE FUNCTION upsert_order_book_max(
+  p_table TEXT,
+  p_timestamp TIMESTAMP WITH TIME ZONE,
+  p_ask_total NUMERIC,
+  p_bid_total NUMERIC,
+  p_price NUMERIC,
+  p_group_id VARCHAR DEFAULT 'default-group'
+)
+RETURNS TABLE(ask_total NUMERIC, bid_total NUMERIC, price NUMERIC, inserted BOOLEAN)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- 対象テーブルを限定（動的SQLのため）
+  IF p_table NOT IN (
+    'order_book_1min', 'order_book_5min', 'order_book_15min', 'order_book_30min', 'order_book_1hour',
+    'order_book_2hour', 'order_book_4hour', 'order_book_daily'
+  ) THEN
+    RAISE EXCEPTION 'unsupported table: %', p_table;
+  END IF;
+
+  RETURN QUERY EXECUTE format(
+    'INSERT INTO %I AS t (timestamp, ask_total, bid_total, price, group_id)
+     VALUES ($1, $2, $3, $4, $5)
+     ON CONFLICT (timestamp, group_id) DO UPDATE SET
+       ask_total = GREATEST(t.ask_total, EXCLUDED.ask_total),
+       bid_total = GREATEST(t.bid_total, EXCLUDED.bid_total),
+       price = EXCLUDED.price
+     WHERE EXCLUDED.ask_total > t.ask_total OR EXCLUDED.bid_total > t.bid_total
+     RETURNING t.ask_total, t.bid_total, t.price, (t.xmax = 0)',
+    p_table
+  )
+  USING p_timestamp, p_ask_total, p_bid_total, p_price, p_group_id;
+END;
+$$;
+
+-- 関数の実行権限
+GRANT EXECUTE ON FUNCTION upsert_order_book_max(TEXT, TIMESTAMP WITH TIME ZONE, NUMERIC, NUMERIC, NUMERIC, VARCHAR) TO anon;
+GRANT EXECUTE ON FUNCTION upsert_order_book_max(TEXT, TIMESTAMP WITH TIME ZONE, NUMERIC, NUMERIC, NUMERIC, VARCHAR) TO authenticated;
+
+-- 複数テーブル・複数行をまとめて最大値マージでupsert
+-- p_rows: [{"table", "timestamp", "ask_total", "bid_total", "price", "group_id"}, ...]
+-- タイムスタンプ順に処理し、入力行ごとに結果（action: inserted / updated / skipped）を返す
+CREATE OR REPLACE FUNCTION upsert_order_book_max_bulk(p_rows JSONB)
+RETURNS TABLE(row_index INTEGER, table_name TEXT, ask_total NUMERIC, bid_total NUMERIC, price NUMERIC, action TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  r RECORD;
+  u RECORD;
+BEGIN
+  FOR r IN
+    SELECT e.ordinality::INTEGER AS idx,
+           e.value->>'table' AS tbl,
+           (e.value->>'timestamp')::TIMESTAMP WITH TIME ZONE AS ts,
+           (e.value->>'ask_total')::NUMERIC AS ask,
+           (e.value->>'bid_total')::NUMERIC AS bid,
+           (e.value->>'price')::NUMERIC AS prc,
+           COALESCE(e.value->>'group_id', 'default-group') AS grp
+    FROM jsonb_array_elements(p_rows) WITH ORDINALITY AS e(value, ordinality)
+    ORDER BY ts, e.ordinality
+  LOOP
+    row_index := r.idx;
+    table_name := r.tbl;
+    SELECT * INTO u FROM upsert_order_book_max(r.tbl, r.ts, r.ask, r.bid, r.prc, r.grp);
+    IF FOUND THEN
+      ask_total := u.ask_total;
+      bid_total := u.bid_total;
+      price := u.price;
+      action := CASE WHEN u.inserted THEN 'inserted' ELSE 'updated' END;
+    ELSE
+      ask_total := NULL;
+      bid_total := NULL;
+      price := NULL;
+      action := 'skipped';
+    END IF;
+    RETURN NEXT;
+  END LOOP;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION upsert_order_book_max_bulk(JSONB) TO anon;
+GRANT EXECUTE ON FUNCTION upsert_order_book_max_bulk(JSONB) TO authenticated;
@@ -3,7 +3,8 @@
 
 import sqlite3
 import os
-from supabase import create_client, Client
+from supabase_client_factory import create_supabase_client, RequestMetrics
+from consolidate import consolidate_max
 from datetime import datetime
 import json
 
@@ -18,7 +19,8 @@ db_path = os.path.join(appdata_dir, "btc_usdt_order_book.db")
 print(f"データベースパス: {db_path}")
 
 # Supabaseクライアント初期化
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+metrics = RequestMetrics()
+supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY, metrics=metrics)
 
 # ローカルDB接続
 conn = sqlite3.connect(db_path)
@@ -63,8 +65,8 @@ while True:
     
     print(f"取得: {offset} - {offset + len(data)} 件")
     
-    # データをローカルDBに保存
-    for row in data:
+    # データをローカルDBに保存（重複タイムスタンプは最大値で1行にまとめる）
+    for row in consolidate_max(data):
         # UPSERT操作（既存データは更新、新規データは挿入）
         cursor.execute("""
             INSERT OR REPLACE INTO order_book_5min (
@@ -106,4 +108,5 @@ oldest_timestamp = cursor.fetchone()[0]
 print(f"最古タイムスタンプ: {oldest_timestamp}")
 
 conn.close()
+print(f"\n{metrics.format_summary()}")
 print("\n完了: Supabaseから全5分足データを取得しました")
\ No newline at end of file
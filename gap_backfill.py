@@ -0,0 +1,130 @@
+"""
+Realtime受信時の欠損補完コーディネーター
+INSERTイベントごとに欠損範囲の取得を要求されても、テーブルごとに保留中の範囲をまとめ、
+同じテーブルの取得は常に1本だけ実行する。取得結果はまとめて1回でローカルDBへ反映する
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _earliest(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    """範囲の始端として早い方（Noneは「最初から」なので最も早い）"""
+    if a is None or b is None:
+        return None
+    return min(a, b)
+
+
+class GapBackfillCoordinator:
+    """テーブル単位で欠損範囲を合体させて取得・反映する
+
+    fetch(table_name, after, until) -> rows  : afterより後、until以下の行を取得
+    apply(table_name, rows, until)           : 取得した行をまとめてローカルへ反映
+    afterがNoneの範囲は「最初から」を表す
+    """
+
+    def __init__(self, fetch: Callable[[str, Optional[str], str], List[Dict[str, Any]]],
+                 apply: Callable[[str, List[Dict[str, Any]], str], Any],
+                 max_workers: int = 4, log_callback=None):
+        self.fetch = fetch
+        self.apply = apply
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="GapBackfill")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[Optional[str], str]] = {}
+        self._running = set()
+        # 取得済み（実行中を含む）の範囲の終端
+        self._covered_until: Dict[str, str] = {}
+        # 実行中の取得に含まれるとみなして始端を切り詰めた要求の、元の始端（取得失敗時に戻す）
+        self._trimmed_after: Dict[str, Optional[str]] = {}
+        self._closed = False
+        self.stats = {'requests': 0, 'merged_requests': 0, 'skipped_requests': 0,
+                      'fetches': 0, 'rows_applied': 0, 'errors': 0}
+
+    def request(self, table_name: str, after: Optional[str], until: str):
+        """欠損範囲の取得を要求（実行中・保留中の範囲とまとめる）"""
+        with self._lock:
+            if self._closed:
+                return
+            self.stats['requests'] += 1
+
+            # 取得済み・取得中の部分は除く
+            covered = self._covered_until.get(table_name)
+            if covered and (after is None or after < covered):
+                if table_name in self._running:
+                    trimmed = self._trimmed_after.get(table_name, covered)
+                    self._trimmed_after[table_name] = _earliest(trimmed, after)
+                after = covered
+            if after is not None and until <= after:
+                self.stats['skipped_requests'] += 1
+                return
+
+            if table_name in self._pending:
+                pending_after, pending_until = self._pending[table_name]
+                after = _earliest(after, pending_after)
+                until = max(until, pending_until)
+                self.stats['merged_requests'] += 1
+            self._pending[table_name] = (after, until)
+
+            if table_name in self._running:
+                return
+            self._running.add(table_name)
+        self._executor.submit(self._run, table_name)
+
+    def _run(self, table_name: str):
+        """保留中の範囲がなくなるまで1テーブル分の取得・反映を繰り返す"""
+        while True:
+            with self._lock:
+                if self._closed or table_name not in self._pending:
+                    self._running.discard(table_name)
+                    self._trimmed_after.pop(table_name, None)
+                    return
+                after, until = self._pending.pop(table_name)
+                previous_covered = self._covered_until.get(table_name)
+                if not previous_covered or until > previous_covered:
+                    self._covered_until[table_name] = until
+                self.stats['fetches'] += 1
+
+            try:
+                rows = self.fetch(table_name, after, until)
+                if rows:
+                    self.apply(table_name, rows, until)
+                with self._lock:
+                    self.stats['rows_applied'] += len(rows)
+                    # 切り詰めた要求の範囲は今回の取得で反映済み
+                    self._trimmed_after.pop(table_name, None)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                    # 失敗した範囲は保留に戻し、次の要求時に再取得する
+                    # 実行中に届いた要求（始端を切り詰めたものを含む）とは、早い方の始端・遅い方の終端でまとめる
+                    if previous_covered is None:
+                        self._covered_until.pop(table_name, None)
+                    else:
+                        self._covered_until[table_name] = previous_covered
+                    if table_name in self._trimmed_after:
+                        after = _earliest(after, self._trimmed_after.pop(table_name))
+                    if table_name in self._pending:
+                        pending_after, pending_until = self._pending[table_name]
+                        after = _earliest(after, pending_after)
+                        until = max(until, pending_until)
+                    self._pending[table_name] = (after, until)
+                    self._running.discard(table_name)
+                msg = f"[Realtime] {table_name} の欠損補完に失敗: {e}"
+                self.logger.error(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "ERROR")
+                return
+
+    def is_idle(self) -> bool:
+        with self._lock:
+            return not self._running and not self._pending
+
+    def stop(self):
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,173 @@
+"""
+TTL付きリースによるリーダー選出（create_leader_lease.sql）
+同じ group_id で複数のスクレイパーを動かすと全員が同じ境界を書き込み、書き込み回数と最大値マージの競合が
+台数分に増える。リースを保持しているクライアント（リーダー）だけが書き込み、他（フォロワー）は
+リーダーの保存位置（synced_until）より新しい境界が一定時間保存されない場合だけ補完する。
+
+  - 更新  : ttl_seconds の1/3ごとに acquire_collector_lease を呼び、保持者なら期限を延ばす
+  - 失効  : 更新できないリーダーは、最後に成功した更新の送信時刻から ttl の2/3 を過ぎた時点で
+            自分からリーダーをやめる（サーバー側の期限より先にやめるため、2台が同時にリーダーにならない）
+  - 関数なし: リース関数が未作成のサーバーでは全員をリーダーとして扱い、従来どおり全員が書き込む
+"""
+
+import logging
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from cloud_transport import is_missing_function_error
+from sync_scheduler import parse_timestamp
+
+ACQUIRE_FUNCTION = 'acquire_collector_lease'
+RELEASE_FUNCTION = 'release_collector_lease'
+
+
+def default_holder_id() -> str:
+    """このプロセスを識別する保持者ID（ホスト名＋ランダムな接尾辞）"""
+    return f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    """グループ内のリーダーを決めるリース
+
+    is_leader()    : 自分がリーダーとして書き込んでよいか
+    synced_until   : リーダーが保存を終えた最新の境界（フォロワーが補完の要否を判断する）
+    report_synced(): 保存できた境界を記録し、次の更新でサーバーへ伝える
+    """
+
+    def __init__(self, client, group_id: str, holder_id: Optional[str] = None, ttl_seconds: float = 60.0,
+                 log_callback=None, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.group_id = group_id
+        self.holder_id = holder_id or default_holder_id()
+        self.ttl = float(ttl_seconds)
+        self.renew_interval = self.ttl / 3
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock
+        # リース関数が使えるか（Falseなら全員リーダー扱い）
+        self.available = True
+        self.leader: Optional[str] = None
+        self._lock = threading.Lock()
+        self._held = False
+        self._valid_until = 0.0
+        self._synced_until: Optional[datetime] = None
+        self._reported: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'renewals': 0, 'renew_failures': 0, 'acquired': 0, 'lost': 0}
+
+    def _log(self, msg: str, level: str = "INFO"):
+        getattr(self.logger, level.lower(), self.logger.info)(msg)
+        if self.log_callback:
+            self.log_callback(msg, level)
+
+    def is_leader(self) -> bool:
+        if not self.available:
+            return True
+        with self._lock:
+            return self._held and self.clock() < self._valid_until
+
+    @property
+    def synced_until(self) -> Optional[datetime]:
+        with self._lock:
+            return self._synced_until
+
+    def report_synced(self, timestamp: str):
+        """保存できた境界を記録（リーダーの場合のみ次の更新でサーバーへ伝わる）"""
+        dt = parse_timestamp(timestamp)
+        with self._lock:
+            if self._reported is None or dt > self._reported:
+                self._reported = dt
+
+    def renew(self) -> bool:
+        """リースを取得・更新し、自分がリーダーかを返す"""
+        if not self.available:
+            return True
+        sent_at = self.clock()
+        with self._lock:
+            reported = self._reported
+        try:
+            result = self.client.rpc(ACQUIRE_FUNCTION, {
+                'p_group_id': self.group_id,
+                'p_holder': self.holder_id,
+                'p_ttl_seconds': self.ttl,
+                'p_synced_until': reported.isoformat() if reported else None
+            }).execute()
+        except Exception as e:
+            if is_missing_function_error(e):
+                self.available = False
+                self._log(f"[リーダー選出] {ACQUIRE_FUNCTION} が見つからないため、全クライアントが書き込みます"
+                          f"（create_leader_lease.sql を適用してください）", "WARNING")
+                return True
+            self.stats['renew_failures'] += 1
+            self._log(f"[リーダー選出] リースの更新に失敗: {e}", "WARNING")
+            return self.is_leader()
+
+        lease = result.data[0] if result.data else {}
+        is_leader = bool(lease.get('is_leader'))
+        with self._lock:
+            was_leader = self._held
+            self._held = is_leader
+            if is_leader:
+                # 送信時刻を基準にし、サーバー側の期限より早くリーダーをやめる
+                self._valid_until = sent_at + self.ttl * 2 / 3
+            self.leader = lease.get('holder')
+            if lease.get('synced_until'):
+                self._synced_until = parse_timestamp(lease['synced_until'])
+            self.stats['renewals'] += 1
+
+        if is_leader and not was_leader:
+            self.stats['acquired'] += 1
+            self._log(f"[リーダー選出] リーダーになりました（{self.holder_id}）。このクライアントがクラウドへ書き込みます")
+        elif was_leader and not is_leader:
+            self.stats['lost'] += 1
+            self._log(f"[リーダー選出] リーダーが {self.leader} に交代しました。欠損の補完のみ書き込みます", "WARNING")
+        return is_leader
+
+    def release(self):
+        """保持しているリースを解放して、他のクライアントがすぐ引き継げるようにする"""
+        with self._lock:
+            held = self._held
+            self._held = False
+        if not held or not self.available:
+            return
+        try:
+            self.client.rpc(RELEASE_FUNCTION, {'p_group_id': self.group_id, 'p_holder': self.holder_id}).execute()
+            self._log("[リーダー選出] リースを解放しました")
+        except Exception as e:
+            self._log(f"[リーダー選出] リースの解放に失敗: {e}", "WARNING")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="LeaderLease", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0, release: bool = True):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if release:
+            self.release()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.renew()
+            if not self.available:
+                break
+            self._stop.wait(self.renew_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['is_leader'] = self.is_leader()
+        stats['leader'] = self.leader
+        stats['holder_id'] = self.holder_id
+        synced_until = self.synced_until
+        stats['synced_until'] = synced_until.isoformat() if synced_until else None
+        return stats
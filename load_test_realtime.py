@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Realtime受信の負荷試験スクリプト
+local_realtime_server.py のローカルサーバーから合成したUPDATEイベントを段階的に速度を上げて配信し、
+RealtimeSync → CloudSyncManager.handle_realtime_update → RealtimeBatcher → ローカルDB（SQLite）
+までの遅延（配信からローカルDBへのコミットまで）と、取りこぼしなく処理できる最大イベントレートを計測する
+
+  python load_test_realtime.py                       # 100〜3200件/秒を各5秒
+  python load_test_realtime.py --rates 500,1000 --duration 10 --window-ms 100
+  python load_test_realtime.py --client supabase     # supabaseの非同期クライアントで接続
+
+INSERTイベントはクラウドからの欠損取得を経由するため、ここではUPDATEイベントだけを配信する
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+from local_realtime_server import LocalRealtimeServer, create_local_realtime_client, LOCAL_ANON_KEY
+from realtime_sync import REALTIME_TABLES, STATE_SUBSCRIBED
+
+GROUP_ID = 'load-test'
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class LocalDatabase:
+    """コインチェッカー本体と同じ1トランザクションの一括反映を行うメモリDB"""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        for table_name, _ in REALTIME_TABLES:
+            self.conn.execute(f"""
+                CREATE TABLE {table_name} (
+                    timestamp TEXT PRIMARY KEY, ask_total REAL, bid_total REAL, price REAL
+                )
+            """)
+        self.lock = threading.Lock()
+        self.applied_at = {}
+        self.transactions = 0
+
+    def save_batch(self, batches):
+        with self.lock:
+            for table_name, records in batches.items():
+                self.conn.executemany(f"""
+                    INSERT INTO {table_name} (timestamp, ask_total, bid_total, price)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(timestamp) DO UPDATE SET
+                        ask_total = excluded.ask_total,
+                        bid_total = excluded.bid_total,
+                        price = excluded.price
+                    WHERE excluded.ask_total != ask_total OR excluded.bid_total != bid_total
+                """, [(r['timestamp'], r['ask_total'], r['bid_total'], r['price']) for r in records])
+            self.conn.commit()
+            self.transactions += 1
+            committed = time.perf_counter()
+            for table_name, records in batches.items():
+                for r in records:
+                    self.applied_at[(table_name, r['timestamp'])] = committed
+
+
+def percentile(ordered, ratio):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def run_stage(server, database, rate, duration, offset):
+    """1段階分のイベントを一定レートで配信し、遅延と処理件数を返す"""
+    count = int(rate * duration)
+    sent_at = {}
+    started = time.perf_counter()
+    for i in range(count):
+        target = started + i / rate
+        wait = target - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        table_name = REALTIME_TABLES[i % len(REALTIME_TABLES)][0]
+        timestamp = (START + timedelta(seconds=offset + i)).isoformat()
+        record = {'id': offset + i, 'timestamp': timestamp, 'ask_total': 1000.0 + i % 97,
+                  'bid_total': 2000.0 + i % 89, 'price': 100000.0, 'group_id': GROUP_ID}
+        sent_at[(table_name, timestamp)] = time.perf_counter()
+        server.publish(table_name, record, 'UPDATE')
+    publish_seconds = time.perf_counter() - started
+
+    # 配信し終えてから最大5秒待つ
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline:
+        with database.lock:
+            if all(key in database.applied_at for key in sent_at):
+                break
+        time.sleep(0.05)
+
+    with database.lock:
+        latencies = sorted((database.applied_at[key] - sent) * 1000
+                           for key, sent in sent_at.items() if key in database.applied_at)
+        last_applied = max((database.applied_at[key] for key in sent_at if key in database.applied_at),
+                           default=started)
+    result = {'rate': rate, 'sent': count, 'applied': len(latencies),
+              'publish_rate': round(count / publish_seconds) if publish_seconds else 0,
+              'throughput': round(len(latencies) / max(1e-9, last_applied - started))}
+    if latencies:
+        result.update(p50_ms=round(percentile(latencies, 0.5), 1), p95_ms=round(percentile(latencies, 0.95), 1),
+                      max_ms=round(latencies[-1], 1))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Realtime受信の負荷試験")
+    parser.add_argument('--rates', default='100,200,400,800,1600,3200', help="配信レート（件/秒、カンマ区切り）")
+    parser.add_argument('--duration', type=float, default=5.0, help="各レートの配信秒数")
+    parser.add_argument('--window-ms', type=int, default=300, help="cloud_sync.realtime_batch_window_ms")
+    parser.add_argument('--max-p95-ms', type=float, default=1000.0, help="維持できたとみなすp95遅延の上限")
+    parser.add_argument('--client', choices=('local', 'supabase'), default='local',
+                        help="Realtimeクライアント（local: 同梱の最小クライアント / supabase: create_async_client）")
+    args = parser.parse_args()
+    rates = [int(r) for r in args.rates.split(',') if r.strip()]
+
+    server = LocalRealtimeServer()
+    url = server.start()
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': {'enabled': True, 'url': url, 'anon_key': LOCAL_ANON_KEY, 'group_id': GROUP_ID,
+                                  'realtime_batch_window_ms': args.window_ms}}, f)
+
+    database = LocalDatabase()
+    manager = CloudSyncManager(
+        config_path=config_path,
+        client=LocalPostgrestClient(),
+        local_batch_callback=database.save_batch,
+        realtime_client_factory=create_local_realtime_client if args.client == 'local' else None
+    )
+
+    print(f"=== Realtime負荷試験（{url}、時間窓 {args.window_ms}ms、クライアント: {args.client}） ===\n")
+    if not manager.setup_realtime_sync():
+        print("Realtime同期を開始できませんでした")
+        server.stop()
+        return
+    deadline = time.monotonic() + 10
+    while (manager.realtime_sync.state != STATE_SUBSCRIBED or not server.subscriber_count()) \
+            and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if manager.realtime_sync.state != STATE_SUBSCRIBED:
+        print("購読が完了しませんでした")
+        manager.cleanup_realtime()
+        server.stop()
+        return
+    print(f"購読完了: {manager.realtime_sync.stats['subscribe_ms']}ms\n")
+
+    print(f"{'レート':>8} {'配信':>7} {'反映':>7} {'配信実績':>8} {'処理量':>8} {'p50':>8} {'p95':>8} {'最大':>8}")
+    max_sustained = None
+    offset = 0
+    for rate in rates:
+        result = run_stage(server, database, rate, args.duration, offset)
+        offset += result['sent']
+        sustained = result['applied'] == result['sent'] and result.get('p95_ms', float('inf')) <= args.max_p95_ms
+        print(f"{rate:>8} {result['sent']:>7} {result['applied']:>7} {result['publish_rate']:>8} "
+              f"{result['throughput']:>8} {result.get('p50_ms', '-'):>8} {result.get('p95_ms', '-'):>8} "
+              f"{result.get('max_ms', '-'):>8} {'OK' if sustained else 'NG'}")
+        if not sustained:
+            break
+        max_sustained = rate
+
+    batch_stats = manager.get_statistics()['realtime_batch']
+    print(f"\n最大維持レート: {max_sustained or '-'}件/秒（p95 ≤ {args.max_p95_ms:.0f}ms かつ取りこぼしなし）")
+    print(f"ローカルDBのトランザクション: {database.transactions}回 / イベント {batch_stats['events']}件 "
+          f"（最大 {batch_stats['max_batch_rows']}行/回）")
+
+    manager.cleanup_realtime()
+    manager.shutdown_writes()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""
+PostgREST互換のローカル代替クライアント（テスト・ベンチマーク用）
+SQLiteのメモリDBを使い、supabase-pyのクエリビルダー（table/select/eq/order/limit/insert/update/upsert/rpc）と
+同じ呼び出し方でCloudSyncManagerを動かせるようにする
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from reconcile import bucket_hashes, to_epoch
+from minute_tier import downsample_cutoff, downsample_minute_rows
+
+# Supabaseの注文板テーブル
+ORDER_BOOK_TABLES = (
+    'order_book_1min', 'order_book_5min', 'order_book_15min', 'order_book_30min', 'order_book_1hour',
+    'order_book_2hour', 'order_book_4hour', 'order_book_daily'
+)
+
+# create_rollup_functions.sqlで5分足から生成する上位時間足（分）
+ROLLUP_INTERVALS = {
+    'order_book_15min': 15, 'order_book_30min': 30, 'order_book_1hour': 60,
+    'order_book_2hour': 120, 'order_book_4hour': 240, 'order_book_daily': 1440
+}
+
+ORDER_BOOK_COLUMNS = ('id', 'timestamp', 'ask_total', 'bid_total', 'price', 'group_id', 'created_at')
+
+
+class LocalPostgrestError(Exception):
+    """postgrestのAPIErrorと同じ属性（code, message）を持つ例外"""
+
+    def __init__(self, message: str, code: str = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class LocalResponse:
+    """execute()の戻り値（supabase-pyのAPIResponse相当）"""
+
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def normalize_timestamp(value) -> str:
+    """timestamptzと同じくUTCの固定形式に正規化（タイムゾーンなしはUTCとして扱う）"""
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+class _QueryBuilder:
+    """テーブル単位のクエリビルダー"""
+
+    _OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+    def __init__(self, client: 'LocalPostgrestClient', table: str):
+        self._client = client
+        self._table = table
+        self._method = 'select'
+        self._payload = None
+        self._count = None
+        self._on_conflict = 'timestamp,group_id'
+        self._ignore_duplicates = False
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._offset = 0
+
+    # --- 操作 ---
+    def select(self, columns: str = '*', count: str = None):
+        self._method = 'select'
+        self._count = count
+        return self
+
+    def insert(self, rows):
+        self._method = 'insert'
+        self._payload = rows
+        return self
+
+    def update(self, values: Dict[str, Any]):
+        self._method = 'update'
+        self._payload = values
+        return self
+
+    def upsert(self, rows, on_conflict: str = 'timestamp,group_id', ignore_duplicates: bool = False):
+        self._method = 'upsert'
+        self._payload = rows
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self):
+        self._method = 'delete'
+        return self
+
+    # --- フィルタ・並び順 ---
+    def _filter(self, op: str, column: str, value):
+        if column == 'timestamp' and value is not None:
+            value = normalize_timestamp(value)
+        self._filters.append((column, self._OPERATORS[op], value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter('eq', column, value)
+
+    def neq(self, column, value):
+        return self._filter('neq', column, value)
+
+    def gt(self, column, value):
+        return self._filter('gt', column, value)
+
+    def gte(self, column, value):
+        return self._filter('gte', column, value)
+
+    def lt(self, column, value):
+        return self._filter('lt', column, value)
+
+    def lte(self, column, value):
+        return self._filter('lte', column, value)
+
+    def order(self, column: str, desc: bool = False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # --- 実行 ---
+    def _where(self):
+        if not self._filters:
+            return '', []
+        clause = ' AND '.join(f'"{column}" {op} ?' for column, op, _ in self._filters)
+        return f' WHERE {clause}', [value for _, _, value in self._filters]
+
+    def execute(self) -> LocalResponse:
+        return self._client._execute(self)
+
+
+class LocalPostgrestClient:
+    """SQLiteで動作するSupabaseクライアントの代替"""
+
+    def __init__(self, latency: float = 0.0):
+        # latency: 1リクエストあたりの擬似ネットワーク遅延（秒）
+        self.latency = latency
+        self.request_count = 0
+        self.rpc_calls: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._rpcs: Dict[str, Callable[['LocalPostgrestClient', Dict[str, Any]], Any]] = {
+            'upsert_order_book_max': _rpc_upsert_order_book_max,
+            'upsert_order_book_max_bulk': _rpc_upsert_order_book_max_bulk,
+            'order_book_bucket_hashes': _rpc_order_book_bucket_hashes,
+            'downsample_order_book_1min': _rpc_downsample_order_book_1min,
+            'acquire_collector_lease': _rpc_acquire_collector_lease,
+            'release_collector_lease': _rpc_release_collector_lease,
+        }
+        for table in ORDER_BOOK_TABLES:
+            self._create_table(table)
+        # create_leader_lease.sqlのリース行（期限はマイクロ秒まで持ち、文字列のまま比較できる形式）
+        self._conn.execute("""
+            CREATE TABLE collector_leases (
+                group_id TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at TEXT NOT NULL,
+                acquired_at TEXT NOT NULL,
+                synced_until TEXT
+            )
+        """)
+
+    def _create_table(self, table: str):
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{table}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                ask_total REAL NOT NULL,
+                bid_total REAL NOT NULL,
+                price REAL NOT NULL,
+                group_id TEXT DEFAULT 'default-group',
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(timestamp, group_id)
+            )
+        """)
+
+    def table(self, name: str) -> _QueryBuilder:
+        return _QueryBuilder(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any] = None):
+        """登録済みのRPCを呼び出すビルダーを返す（execute()で実行）"""
+        client = self
+
+        class _RpcCall:
+            def execute(self_inner) -> LocalResponse:
+                return client._call_rpc(name, params or {})
+
+        return _RpcCall()
+
+    def register_rpc(self, name: str, func: Callable[['LocalPostgrestClient', Dict[str, Any]], Any]):
+        """RPCを登録（funcは(client, params)を受け取り、結果データを返す）"""
+        self._rpcs[name] = func
+
+    def unregister_rpc(self, name: str):
+        """RPCを削除（関数未作成のサーバーを再現する場合に使用）"""
+        self._rpcs.pop(name, None)
+
+    def install_rollup_triggers(self):
+        """create_rollup_functions.sqlのトリガーと同じく、5分足の書き込みから上位時間足を生成する"""
+        with self._lock:
+            for table, minutes in ROLLUP_INTERVALS.items():
+                for event in ('INSERT', 'UPDATE'):
+                    self._conn.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS "rollup_{table}_{event.lower()}"
+                        AFTER {event} ON order_book_5min
+                        WHEN CAST(strftime('%s', NEW.timestamp) AS INTEGER) % {minutes * 60} = 0
+                        BEGIN
+                            INSERT INTO "{table}" (timestamp, ask_total, bid_total, price, group_id)
+                            VALUES (NEW.timestamp, NEW.ask_total, NEW.bid_total, NEW.price,
+                                    COALESCE(NEW.group_id, 'default-group'))
+                            ON CONFLICT(timestamp, group_id) DO UPDATE SET
+                                ask_total = MAX(ask_total, excluded.ask_total),
+                                bid_total = MAX(bid_total, excluded.bid_total),
+                                price = excluded.price
+                            WHERE excluded.ask_total > ask_total OR excluded.bid_total > bid_total;
+                        END
+                    """)
+            self._conn.commit()
+
+    def execute_sql(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        """RPC実装用にSQLを直接実行"""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def _begin_request(self):
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _call_rpc(self, name: str, params: Dict[str, Any]) -> LocalResponse:
+        self._begin_request()
+        func = self._rpcs.get(name)
+        if func is None:
+            raise LocalPostgrestError(
+                f"Could not find the function public.{name} in the schema cache", code='PGRST202')
+        with self._lock:
+            self.rpc_calls[name] = self.rpc_calls.get(name, 0) + 1
+            data = func(self, params)
+            self._conn.commit()
+        return LocalResponse(data)
+
+    def _execute(self, query: _QueryBuilder) -> LocalResponse:
+        self._begin_request()
+        with self._lock:
+            self._create_table(query._table)
+            handler = getattr(self, f'_do_{query._method}')
+            data, count = handler(query)
+            self._conn.commit()
+        return LocalResponse(data, count)
+
+    def _do_select(self, query: _QueryBuilder):
+        where, params = query._where()
+        sql = f'SELECT * FROM "{query._table}"{where}'
+        if query._order:
+            sql += ' ORDER BY ' + ', '.join(f'"{c}" {"DESC" if d else "ASC"}' for c, d in query._order)
+        if query._limit is not None:
+            sql += f' LIMIT {int(query._limit)} OFFSET {int(query._offset)}'
+        rows = [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+        count = None
+        if query._count:
+            count = self._conn.execute(f'SELECT COUNT(*) FROM "{query._table}"{where}', params).fetchone()[0]
+        return rows, count
+
+    @staticmethod
+    def _rows(payload) -> List[Dict[str, Any]]:
+        rows = payload if isinstance(payload, list) else [payload]
+        normalized = []
+        for row in rows:
+            row = dict(row)
+            if 'timestamp' in row:
+                row['timestamp'] = normalize_timestamp(row['timestamp'])
+            row.setdefault('group_id', 'default-group')
+            normalized.append(row)
+        return normalized
+
+    def _do_insert(self, query: _QueryBuilder):
+        inserted = []
+        for row in self._rows(query._payload):
+            columns = ', '.join(f'"{c}"' for c in row)
+            placeholders = ', '.join('?' for _ in row)
+            try:
+                cursor = self._conn.execute(
+                    f'INSERT INTO "{query._table}" ({columns}) VALUES ({placeholders})', list(row.values()))
+            except sqlite3.IntegrityError as e:
+                raise LocalPostgrestError(f'duplicate key value violates unique constraint: {e}', code='23505')
+            inserted.append(self._fetch_by_id(query._table, cursor.lastrowid))
+        return inserted, None
+
+    def _do_upsert(self, query: _QueryBuilder):
+        conflict = [c.strip() for c in query._on_conflict.split(',')]
+        saved = []
+        for row in self._rows(query._payload):
+            columns = ', '.join(f'"{c}"' for c in row)
+            placeholders = ', '.join('?' for _ in row)
+            updates = ', '.join(f'"{c}" = excluded."{c}"' for c in row if c not in conflict)
+            action = 'NOTHING' if query._ignore_duplicates or not updates else f'UPDATE SET {updates}'
+            self._conn.execute(
+                f'INSERT INTO "{query._table}" ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT ({", ".join(conflict)}) DO {action}', list(row.values()))
+            key_filter = ' AND '.join(f'"{c}" = ?' for c in conflict)
+            saved.extend(dict(r) for r in self._conn.execute(
+                f'SELECT * FROM "{query._table}" WHERE {key_filter}', [row.get(c) for c in conflict]))
+        return saved, None
+
+    def _do_update(self, query: _QueryBuilder):
+        values = dict(query._payload)
+        if 'timestamp' in values:
+            values['timestamp'] = normalize_timestamp(values['timestamp'])
+        where, params = query._where()
+        assignments = ', '.join(f'"{c}" = ?' for c in values)
+        ids = [r[0] for r in self._conn.execute(f'SELECT id FROM "{query._table}"{where}', params)]
+        self._conn.execute(f'UPDATE "{query._table}" SET {assignments}{where}', list(values.values()) + params)
+        return [self._fetch_by_id(query._table, i) for i in ids], None
+
+    def _do_delete(self, query: _QueryBuilder):
+        where, params = query._where()
+        rows = [dict(r) for r in self._conn.execute(f'SELECT * FROM "{query._table}"{where}', params)]
+        self._conn.execute(f'DELETE FROM "{query._table}"{where}', params)
+        return rows, None
+
+    def _fetch_by_id(self, table: str, row_id: int) -> Dict[str, Any]:
+        return dict(self._conn.execute(f'SELECT * FROM "{table}" WHERE id = ?', (row_id,)).fetchone())
+
+
+def _rpc_upsert_order_book_max(client: LocalPostgrestClient, params: Dict[str, Any]):
+    """create_upsert_functions.sqlのupsert_order_book_maxと同じ最大値マージ"""
+    table = params['p_table']
+    if table not in ORDER_BOOK_TABLES:
+        raise LocalPostgrestError(f'unsupported table: {table}', code='P0001')
+
+    timestamp = normalize_timestamp(params['p_timestamp'])
+    group_id = params.get('p_group_id', 'default-group')
+    ask_total, bid_total, price = params['p_ask_total'], params['p_bid_total'], params['p_price']
+
+    conn = client._conn
+    existing = conn.execute(
+        f'SELECT ask_total, bid_total FROM "{table}" WHERE timestamp = ? AND group_id = ?',
+        (timestamp, group_id)).fetchone()
+
+    if existing is None:
+        conn.execute(
+            f'INSERT INTO "{table}" (timestamp, ask_total, bid_total, price, group_id) VALUES (?, ?, ?, ?, ?)',
+            (timestamp, ask_total, bid_total, price, group_id))
+        return [{'ask_total': ask_total, 'bid_total': bid_total, 'price': price, 'inserted': True}]
+
+    if ask_total > existing['ask_total'] or bid_total > existing['bid_total']:
+        new_ask = max(ask_total, existing['ask_total'])
+        new_bid = max(bid_total, existing['bid_total'])
+        conn.execute(
+            f'UPDATE "{table}" SET ask_total = ?, bid_total = ?, price = ? WHERE timestamp = ? AND group_id = ?',
+            (new_ask, new_bid, price, timestamp, group_id))
+        return [{'ask_total': new_ask, 'bid_total': new_bid, 'price': price, 'inserted': False}]
+
+    return []
+
+
+def _rpc_upsert_order_book_max_bulk(client: LocalPostgrestClient, params: Dict[str, Any]):
+    """create_upsert_functions.sqlのupsert_order_book_max_bulkと同じ一括最大値マージ"""
+    indexed = sorted(enumerate(params['p_rows'], start=1),
+                     key=lambda item: (normalize_timestamp(item[1]['timestamp']), item[0]))
+    results = []
+    for index, row in indexed:
+        saved = _rpc_upsert_order_book_max(client, {
+            'p_table': row['table'],
+            'p_timestamp': row['timestamp'],
+            'p_ask_total': row['ask_total'],
+            'p_bid_total': row['bid_total'],
+            'p_price': row['price'],
+            'p_group_id': row.get('group_id') or 'default-group',
+        })
+        result = {'row_index': index, 'table_name': row['table'],
+                  'ask_total': None, 'bid_total': None, 'price': None, 'action': 'skipped'}
+        if saved:
+            result.update(saved[0])
+            result['action'] = 'inserted' if result.pop('inserted') else 'updated'
+        results.append(result)
+    return results
+
+
+def _rpc_order_book_bucket_hashes(client: LocalPostgrestClient, params: Dict[str, Any]):
+    """create_reconcile_functions.sqlのorder_book_bucket_hashesと同じバケット集計"""
+    table = params['p_table']
+    if table not in ORDER_BOOK_TABLES:
+        raise LocalPostgrestError(f'unsupported table: {table}', code='P0001')
+    bucket_seconds = params.get('p_bucket_seconds', 86400)
+    if not bucket_seconds or bucket_seconds <= 0:
+        raise LocalPostgrestError(f'invalid bucket size: {bucket_seconds}', code='P0001')
+
+    sql = f'SELECT timestamp, ask_total, bid_total, price FROM "{table}" WHERE group_id = ?'
+    args = [params.get('p_group_id', 'default-group')]
+    if params.get('p_start'):
+        sql += ' AND timestamp >= ?'
+        args.append(normalize_timestamp(params['p_start']))
+    if params.get('p_end'):
+        sql += ' AND timestamp < ?'
+        args.append(normalize_timestamp(params['p_end']))
+    rows = ((to_epoch(r['timestamp']), r['ask_total'], r['bid_total'], r['price'])
+            for r in client._conn.execute(sql, args))
+    buckets = bucket_hashes(rows, bucket_seconds, params.get('p_scale', 2))
+    return [{'bucket_start': start, 'row_count': count, 'hash_sum': str(total)}
+            for start, (count, total) in sorted(buckets.items())]
+
+
+def _rpc_downsample_order_book_1min(client: LocalPostgrestClient, params: Dict[str, Any]):
+    """create_1min_tier.sqlのdownsample_order_book_1minと同じ間引きと削除（グループ指定・保持1日以上が必須）"""
+    group_id = params.get('p_group_id')
+    retention_days = params.get('p_retention_days', 1)
+    if group_id is None:
+        raise LocalPostgrestError('group_id is required', code='P0001')
+    if retention_days is None or retention_days < 1:
+        raise LocalPostgrestError(f'invalid retention days: {retention_days}', code='P0001')
+    cutoff = normalize_timestamp(downsample_cutoff(datetime.now(timezone.utc), retention_days))
+    sql = 'SELECT timestamp, ask_total, bid_total, price, group_id FROM order_book_1min WHERE timestamp < ? AND group_id = ?'
+    args = [cutoff, group_id]
+
+    rows = [dict(r) for r in client._conn.execute(sql, args)]
+    downsampled = downsample_minute_rows(rows)
+    for row in downsampled:
+        _rpc_upsert_order_book_max(client, {
+            'p_table': 'order_book_5min',
+            'p_timestamp': row['timestamp'],
+            'p_ask_total': row['ask_total'],
+            'p_bid_total': row['bid_total'],
+            'p_price': row['price'],
+            'p_group_id': row['group_id'],
+        })
+    deleted = client._conn.execute(sql.replace('SELECT timestamp, ask_total, bid_total, price, group_id', 'DELETE'),
+                                   args).rowcount
+    return [{'downsampled': len(downsampled), 'deleted': deleted}]
+
+
+def _lease_time(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+
+def _rpc_acquire_collector_lease(client: LocalPostgrestClient, params: Dict[str, Any]):
+    """create_leader_lease.sqlのacquire_collector_leaseと同じリースの取得・更新"""
+    group_id, holder = params['p_group_id'], params['p_holder']
+    now = datetime.now(timezone.utc)
+    expires_at = _lease_time(now + timedelta(seconds=float(params.get('p_ttl_seconds', 60))))
+    synced_until = normalize_timestamp(params['p_synced_until']) if params.get('p_synced_until') else None
+
+    conn = client._conn
+    lease = conn.execute('SELECT * FROM collector_leases WHERE group_id = ?', (group_id,)).fetchone()
+    if lease is None:
+        conn.execute('INSERT INTO collector_leases VALUES (?, ?, ?, ?, ?)',
+                     (group_id, holder, expires_at, _lease_time(now), synced_until))
+    elif lease['holder'] == holder or lease['expires_at'] < _lease_time(now):
+        acquired_at = lease['acquired_at'] if lease['holder'] == holder else _lease_time(now)
+        # GREATESTと同じくNULLは無視
+        synced = max(filter(None, (lease['synced_until'], synced_until)), default=None)
+        conn.execute('UPDATE collector_leases SET holder = ?, expires_at = ?, acquired_at = ?, synced_until = ? '
+                     'WHERE group_id = ?', (holder, expires_at, acquired_at, synced, group_id))
+
+    lease = conn.execute('SELECT * FROM collector_leases WHERE group_id = ?', (group_id,)).fetchone()
+    return [{'holder': lease['holder'], 'expires_at': lease['expires_at'],
+             'synced_until': lease['synced_until'], 'is_leader': lease['holder'] == holder}]
+
+
+def _rpc_release_collector_lease(client: LocalPostgrestClient, params: Dict[str, Any]):
+    """create_leader_lease.sqlのrelease_collector_leaseと同じリースの解放"""
+    cursor = client._conn.execute('UPDATE collector_leases SET expires_at = ? WHERE group_id = ? AND holder = ?',
+                                  (_lease_time(datetime.now(timezone.utc)), params['p_group_id'], params['p_holder']))
+    return cursor.rowcount > 0
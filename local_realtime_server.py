@@ -0,0 +1,469 @@
+"""
+Supabase Realtime互換のローカル代替サーバー（テスト・負荷試験用）
+標準ライブラリだけでWebSocket（RFC 6455）とPhoenixチャンネルのプロトコルを話し、
+postgres_changesの購読（phx_join）に応答して、合成したINSERT/UPDATEイベントを配信する
+
+  - LocalRealtimeServer : 別スレッドのイベントループで動くサーバー。publish()でイベントを配信
+  - LocalRealtimeClient : RealtimeSyncが使う部分（channel/on_postgres_changes/subscribe/realtime.is_connected）
+                          だけを実装した非同期クライアント。supabaseが未インストールでも
+                          RealtimeSync(client_factory=create_local_realtime_client) で動かせる
+
+サーバーのURL（http://127.0.0.1:<port>）は cloud_sync.url としてsupabaseの非同期クライアントにも渡せる
+"""
+
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# supabase-pyのキー形式チェックを通るダミーのanon key
+LOCAL_ANON_KEY = 'local.realtime.key'
+
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    """WebSocketフレームを作成（クライアントからの送信はmask=True）"""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """WebSocketフレームを1つ読む（分割フレームは結合して返す）"""
+    opcode = None
+    chunks = []
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if key:
+            payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+        frame_opcode = first & 0x0F
+        # 制御フレームは分割フレームの途中にも割り込める
+        if frame_opcode >= OP_CLOSE:
+            return frame_opcode, payload
+        if frame_opcode != OP_CONTINUATION:
+            opcode = frame_opcode
+        chunks.append(payload)
+        if first & 0x80:
+            return opcode, b''.join(chunks)
+
+
+def _accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+def _matches_filter(filter_expr: Optional[str], record: Dict[str, Any]) -> bool:
+    """postgres_changesのフィルタ（column=eq.value）に一致するか（eq以外は常に一致とみなす）"""
+    if not filter_expr:
+        return True
+    column, _, condition = filter_expr.partition('=')
+    operator, _, value = condition.partition('.')
+    if operator != 'eq':
+        return True
+    return str(record.get(column)) == value
+
+
+class _Connection:
+    """サーバー側の1接続（Phoenixのメッセージ形式はvsn 1.0.0のオブジェクト/2.0.0の配列の両方に対応）"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.array_format = False
+        # topic -> [(binding_id, event, schema, table, filter)]
+        self.subscriptions: Dict[str, List[Tuple[int, str, str, str, Optional[str]]]] = {}
+        self.join_refs: Dict[str, Optional[str]] = {}
+
+    def send(self, topic: str, event: str, payload: Dict[str, Any], ref: Optional[str] = None):
+        if self.array_format:
+            message = [self.join_refs.get(topic), ref, topic, event, payload]
+        else:
+            message = {'topic': topic, 'event': event, 'payload': payload, 'ref': ref}
+        self.writer.write(encode_frame(OP_TEXT, json.dumps(message).encode()))
+
+
+class LocalRealtimeServer:
+    """Supabase Realtime互換のローカルサーバー
+
+    start()でバックグラウンドスレッドに起動し、publish()で購読中の接続へイベントを配信する
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.logger = logging.getLogger(__name__)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._connections: List[_Connection] = []
+        self._binding_ids = itertools.count(1)
+        self.stats = {'connections': 0, 'joins': 0, 'heartbeats': 0, 'published': 0, 'delivered': 0}
+
+    @property
+    def url(self) -> str:
+        """cloud_sync.url として渡すURL"""
+        return f"http://{self.host}:{self.port}"
+
+    # --- 起動・停止 ---
+    def start(self) -> str:
+        """サーバーを起動してURLを返す"""
+        self._thread = threading.Thread(target=self._thread_target, daemon=True, name="LocalRealtimeServer")
+        self._thread.start()
+        if not self._ready.wait(timeout=5):
+            raise RuntimeError("ローカルRealtimeサーバーの起動がタイムアウトしました")
+        return self.url
+
+    def _thread_target(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        """全接続を閉じてサーバーを停止"""
+        if not self.loop:
+            return
+
+        async def shutdown():
+            self._close_all()
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.loop = None
+
+    def drop_connections(self):
+        """全接続を切断（再接続のテスト用）"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._close_all)
+
+    def _close_all(self):
+        for connection in list(self._connections):
+            connection.writer.close()
+        self._connections.clear()
+
+    def subscriber_count(self) -> int:
+        """postgres_changesを購読中のチャンネル数"""
+        return sum(len(c.subscriptions) for c in list(self._connections))
+
+    # --- 配信 ---
+    def publish(self, table: str, record: Dict[str, Any], event_type: str = 'UPDATE',
+                commit_timestamp: Optional[str] = None, schema: str = 'public'):
+        """購読中の接続へpostgres_changesイベントを配信（どのスレッドからでも呼べる）"""
+        if not self.loop:
+            raise RuntimeError("サーバーが起動していません")
+        if commit_timestamp is None:
+            commit_timestamp = datetime.now(timezone.utc).isoformat()
+        self.loop.call_soon_threadsafe(self._broadcast, table, record, event_type, commit_timestamp, schema)
+
+    def _broadcast(self, table, record, event_type, commit_timestamp, schema):
+        self.stats['published'] += 1
+        data = {
+            'schema': schema, 'table': table, 'commit_timestamp': commit_timestamp,
+            'type': event_type, 'record': record, 'old_record': {} if event_type == 'INSERT' else {'id': record.get('id')},
+            'columns': [{'name': name, 'type': 'text'} for name in record], 'errors': None,
+        }
+        for connection in list(self._connections):
+            for topic, bindings in connection.subscriptions.items():
+                ids = [binding_id for binding_id, event, binding_schema, binding_table, binding_filter in bindings
+                       if event in ('*', event_type) and binding_schema == schema and binding_table == table
+                       and _matches_filter(binding_filter, record)]
+                if ids:
+                    connection.send(topic, 'postgres_changes', {'ids': ids, 'data': data})
+                    self.stats['delivered'] += 1
+
+    # --- 接続処理 ---
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if not await self._handshake(reader, writer):
+                return
+            connection = _Connection(writer)
+            self._connections.append(connection)
+            self.stats['connections'] += 1
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, payload[:2]))
+                    break
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+                    continue
+                if opcode == OP_TEXT:
+                    self._on_message(connection, json.loads(payload.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            self.logger.error(f"[LocalRealtime] 接続処理エラー: {e}")
+        finally:
+            self._connections[:] = [c for c in self._connections if c.writer is not writer]
+            writer.close()
+
+    async def _handshake(self, reader, writer) -> bool:
+        request = await reader.readuntil(b'\r\n\r\n')
+        headers = {}
+        for line in request.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if not key or headers.get('upgrade', '').lower() != 'websocket':
+            writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            writer.close()
+            return False
+        writer.write((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {_accept_key(key)}\r\n\r\n'
+        ).encode())
+        await writer.drain()
+        return True
+
+    def _on_message(self, connection: _Connection, message):
+        if isinstance(message, list):
+            connection.array_format = True
+            join_ref, ref, topic, event, payload = message
+        else:
+            join_ref = message.get('join_ref')
+            ref, topic, event, payload = (message.get('ref'), message.get('topic'),
+                                          message.get('event'), message.get('payload') or {})
+
+        if event == 'heartbeat':
+            self.stats['heartbeats'] += 1
+            connection.send(topic, 'phx_reply', {'status': 'ok', 'response': {}}, ref)
+        elif event == 'phx_join':
+            self.stats['joins'] += 1
+            connection.join_refs[topic] = join_ref or ref
+            bindings = []
+            response = []
+            for change in payload.get('config', {}).get('postgres_changes', []) or []:
+                binding_id = next(self._binding_ids)
+                bindings.append((binding_id, change.get('event', '*'), change.get('schema', 'public'),
+                                 change.get('table'), change.get('filter')))
+                response.append(dict(change, id=binding_id))
+            connection.subscriptions[topic] = bindings
+            connection.send(topic, 'phx_reply', {'status': 'ok', 'response': {'postgres_changes': response}}, ref)
+        elif event == 'phx_leave':
+            connection.subscriptions.pop(topic, None)
+            connection.send(topic, 'phx_reply', {'status': 'ok', 'response': {}}, ref)
+            connection.join_refs.pop(topic, None)
+        elif ref is not None:
+            # access_tokenなどは受け付けるだけ
+            connection.send(topic, 'phx_reply', {'status': 'ok', 'response': {}}, ref)
+
+
+class _LocalAuth:
+    async def sign_out(self):
+        pass
+
+
+class _LocalSocket:
+    """クライアント側のWebSocket接続（RealtimeSyncが参照する is_connected / close を持つ）"""
+
+    def __init__(self, url: str, key: str, heartbeat_seconds: float = 25.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.key = key
+        self.heartbeat_seconds = heartbeat_seconds
+        self.is_connected = False
+        self.channels: Dict[str, 'LocalRealtimeChannel'] = {}
+        self._refs = itertools.count(1)
+        self._reader = None
+        self._writer = None
+        self._tasks: List[asyncio.Task] = []
+
+    def next_ref(self) -> str:
+        return str(next(self._refs))
+
+    async def connect(self):
+        if self.is_connected:
+            return
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self._writer.write((
+            f'GET /realtime/v1/websocket?apikey={self.key}&vsn=1.0.0 HTTP/1.1\r\n'
+            f'Host: {self.host}:{self.port}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\n'
+            'Sec-WebSocket-Version: 13\r\n\r\n'
+        ).encode())
+        await self._writer.drain()
+        response = await self._reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in response.split(b'\r\n', 1)[0]:
+            self._writer.close()
+            raise ConnectionError(f"WebSocketのハンドシェイクに失敗: {response[:64]!r}")
+        if _accept_key(key).encode() not in response:
+            self._writer.close()
+            raise ConnectionError("Sec-WebSocket-Acceptが一致しません")
+        self.is_connected = True
+        self._tasks = [asyncio.ensure_future(self._read_loop()), asyncio.ensure_future(self._heartbeat_loop())]
+
+    def send(self, topic: str, event: str, payload: Dict[str, Any], ref: Optional[str] = None):
+        message = {'topic': topic, 'event': event, 'payload': payload, 'ref': ref}
+        self._writer.write(encode_frame(OP_TEXT, json.dumps(message).encode(), mask=True))
+
+    async def _read_loop(self):
+        try:
+            while True:
+                opcode, payload = await read_frame(self._reader)
+                if opcode == OP_CLOSE:
+                    break
+                if opcode == OP_PING:
+                    self._writer.write(encode_frame(OP_PONG, payload, mask=True))
+                    continue
+                if opcode != OP_TEXT:
+                    continue
+                message = json.loads(payload.decode())
+                channel = self.channels.get(message.get('topic'))
+                if channel:
+                    channel._on_message(message.get('event'), message.get('payload') or {}, message.get('ref'))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._on_closed(reader_finished=True)
+
+    async def _heartbeat_loop(self):
+        while self.is_connected:
+            await asyncio.sleep(self.heartbeat_seconds)
+            if self.is_connected:
+                self.send('phoenix', 'heartbeat', {}, self.next_ref())
+
+    def _on_closed(self, reader_finished: bool = False):
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        for task in self._tasks[1 if reader_finished else 0:]:
+            task.cancel()
+        if self._writer:
+            self._writer.close()
+        for channel in list(self.channels.values()):
+            channel._notify('CLOSED', None)
+
+    async def close(self):
+        if self._writer and self.is_connected:
+            try:
+                self._writer.write(encode_frame(OP_CLOSE, struct.pack('!H', 1000), mask=True))
+            except Exception:
+                pass
+        self._on_closed()
+
+
+class LocalRealtimeChannel:
+    """postgres_changesの購読だけを実装したチャンネル"""
+
+    def __init__(self, socket: _LocalSocket, name: str):
+        self.socket = socket
+        self.topic = f'realtime:{name}'
+        self._bindings: List[Tuple[Dict[str, Any], Callable]] = []
+        self._callbacks: Dict[int, Callable] = {}
+        self._join_ref: Optional[str] = None
+        self._status_callback: Optional[Callable] = None
+
+    def on_postgres_changes(self, event: str, callback: Callable, table: str = '*', schema: str = 'public',
+                            filter: Optional[str] = None):
+        change = {'event': event, 'schema': schema, 'table': table}
+        if filter:
+            change['filter'] = filter
+        self._bindings.append((change, callback))
+        return self
+
+    async def subscribe(self, callback: Optional[Callable] = None):
+        self._status_callback = callback
+        await self.socket.connect()
+        self.socket.channels[self.topic] = self
+        self._join_ref = self.socket.next_ref()
+        payload = {
+            'config': {'broadcast': {'ack': False, 'self': False}, 'presence': {'key': ''},
+                       'postgres_changes': [change for change, _ in self._bindings]},
+            'access_token': self.socket.key,
+        }
+        self.socket.send(self.topic, 'phx_join', payload, self._join_ref)
+        return self
+
+    async def unsubscribe(self):
+        if self.socket.is_connected:
+            self.socket.send(self.topic, 'phx_leave', {}, self.socket.next_ref())
+        self.socket.channels.pop(self.topic, None)
+
+    def _notify(self, status: str, error):
+        if self._status_callback:
+            self._status_callback(status, error)
+
+    def _on_message(self, event: str, payload: Dict[str, Any], ref: Optional[str]):
+        if event == 'phx_reply' and ref == self._join_ref:
+            if payload.get('status') != 'ok':
+                self._notify('CHANNEL_ERROR', payload.get('response'))
+                return
+            server_changes = payload.get('response', {}).get('postgres_changes', [])
+            self._callbacks = {change['id']: callback
+                               for change, (_, callback) in zip(server_changes, self._bindings)}
+            self._notify('SUBSCRIBED', None)
+        elif event == 'postgres_changes':
+            for binding_id in payload.get('ids', []):
+                callback = self._callbacks.get(binding_id)
+                if callback:
+                    callback(payload)
+        elif event == 'phx_error':
+            self._notify('CHANNEL_ERROR', payload)
+        elif event == 'phx_close':
+            self._notify('CLOSED', None)
+
+
+class LocalRealtimeClient:
+    """RealtimeSyncが使うAsyncClientの部分集合（channel / realtime / auth）"""
+
+    def __init__(self, url: str, key: str = LOCAL_ANON_KEY, heartbeat_seconds: float = 25.0):
+        self.realtime = _LocalSocket(url, key, heartbeat_seconds)
+        self.auth = _LocalAuth()
+
+    def channel(self, name: str) -> LocalRealtimeChannel:
+        return LocalRealtimeChannel(self.realtime, name)
+
+
+async def create_local_realtime_client(url: str, key: str = LOCAL_ANON_KEY) -> LocalRealtimeClient:
+    """create_async_clientと同じ呼び出し方のファクトリー（RealtimeSyncのclient_factoryに渡す）"""
+    return LocalRealtimeClient(url, key)
@@ -0,0 +1,135 @@
+"""
+GUIログ表示用のリングバッファ
+メモリ上には固定件数だけ保持し、溢れた古いログはファイルに退避する
+表示レベルでのフィルタリングと、退避ファイルを含めた検索に対応
+"""
+
+import os
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+# ログレベルの順序
+LOG_LEVELS = {
+    'DEBUG': 10,
+    'INFO': 20,
+    'WARNING': 30,
+    'ERROR': 40
+}
+
+
+class LogRingBuffer:
+    """固定容量のログバッファ（溢れた分はファイルに退避）"""
+
+    def __init__(self, capacity: int = 2000, spill_path: Optional[str] = None,
+                 max_spill_bytes: int = 20 * 1024 * 1024, min_level: str = 'DEBUG'):
+        """
+        Args:
+            capacity: メモリ上に保持する最大件数
+            spill_path: 溢れたログの退避先ファイル（Noneの場合は破棄）
+            max_spill_bytes: 退避ファイルの最大サイズ（超過時は.1にローテーション）
+            min_level: 表示する最小ログレベル
+        """
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        self.min_level = min_level
+
+        self._entries: deque = deque()
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self.stats = {
+            'appended': 0,
+            'spilled': 0,
+            'spill_errors': 0
+        }
+
+    def append(self, level: str, text: str) -> bool:
+        """ログを追加し、現在のフィルタで表示対象かを返す"""
+        return bool(self.extend([(level, text)]))
+
+    def extend(self, entries: List[Tuple[str, str]]) -> List[str]:
+        """複数のログをまとめて追加し、表示対象のテキストを返す（溢れた分の退避は1回の書き込み）"""
+        entries = list(entries)
+        spill = []
+        with self._lock:
+            self._entries.extend(entries)
+            self.stats['appended'] += len(entries)
+            while len(self._entries) > self.capacity:
+                spill.append(self._entries.popleft())
+
+        if spill:
+            self._spill(spill)
+
+        return [text for level, text in entries if self.is_visible(level)]
+
+    def is_visible(self, level: str) -> bool:
+        """指定レベルが現在のフィルタで表示対象か"""
+        return LOG_LEVELS.get(level, LOG_LEVELS['INFO']) >= LOG_LEVELS.get(self.min_level, 0)
+
+    def set_min_level(self, level: str):
+        """表示する最小ログレベルを設定"""
+        if level in LOG_LEVELS:
+            self.min_level = level
+
+    def visible_entries(self, limit: Optional[int] = None) -> List[str]:
+        """フィルタ適用後のログ（新しい方からlimit件、古い順）を取得"""
+        with self._lock:
+            entries = list(self._entries)
+        lines = [text for level, text in entries if self.is_visible(level)]
+        if limit is not None:
+            lines = lines[-limit:]
+        return lines
+
+    def clear(self):
+        """メモリ上のログを退避してからクリア"""
+        with self._lock:
+            entries = list(self._entries)
+            self._entries.clear()
+        if entries:
+            self._spill(entries)
+
+    def search(self, keyword: str, max_results: int = 500) -> List[str]:
+        """退避ファイルとメモリ上のログからキーワードを含む行を検索（古い順）"""
+        keyword = keyword.lower()
+        results: deque = deque(maxlen=max_results)
+
+        if self.spill_path:
+            for path in (self.spill_path + '.1', self.spill_path):
+                if not os.path.exists(path):
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                        for line in f:
+                            if keyword in line.lower():
+                                results.append(line if line.endswith('\n') else line + '\n')
+                except OSError:
+                    continue
+
+        with self._lock:
+            entries = list(self._entries)
+        for level, text in entries:
+            if keyword in text.lower():
+                results.append(text)
+
+        return list(results)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _spill(self, entries: List[Tuple[str, str]]):
+        """溢れたログをファイルに追記"""
+        if not self.spill_path:
+            return
+        try:
+            if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) > self.max_spill_bytes:
+                rotated = self.spill_path + '.1'
+                if os.path.exists(rotated):
+                    os.remove(rotated)
+                os.replace(self.spill_path, rotated)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(text for level, text in entries))
+            self.stats['spilled'] += len(entries)
+        except OSError:
+            self.stats['spill_errors'] += 1
@@ -8,6 +8,7 @@ import json
 import os
 from datetime import datetime, timedelta
 from supabase import create_client, Client
+from consolidate import consolidate_max
 
 def load_config():
     """設定ファイルを読み込む"""
@@ -65,7 +66,8 @@ def migrate_hourly_data():
         
         # 時間ごとにグループ化
         hourly_data = {}
-        for record in result.data:
+        # 同じタイムスタンプの重複行は最大値で1行にまとめてからグループ化
+        for record in consolidate_max(result.data):
             # タイムスタンプをパース
             ts_str = record['timestamp']
             dt = datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
@@ -8,7 +8,8 @@ MCPツールも活用してSQL経由で効率的に処理
 import json
 import os
 from datetime import datetime, timedelta
-from supabase import create_client, Client
+from supabase_client_factory import create_supabase_client, RequestMetrics
+from consolidate import consolidate_max
 
 def load_config():
     """設定ファイルを読み込む"""
@@ -37,9 +38,12 @@ def migrate_all_timeframes():
     
     # Supabaseクライアントを初期化
     try:
-        client = create_client(
+        metrics = RequestMetrics()
+        client = create_supabase_client(
             cloud_config["url"],
-            cloud_config["anon_key"]
+            cloud_config["anon_key"],
+            http_config=cloud_config.get("http"),
+            metrics=metrics
         )
         print("Supabaseに接続しました")
     except Exception as e:
@@ -91,6 +95,7 @@ def migrate_all_timeframes():
         except Exception as e:
             print(f"{timeframe_name}: エラー - {e}")
     
+    print(f"\n{metrics.format_summary()}")
     print("\n=== 移行完了 ===")
 
 def migrate_15min(client, group_id, table_name):
@@ -113,7 +118,8 @@ def migrate_15min(client, group_id, table_name):
     
     # 15分単位でグループ化
     grouped_data = {}
-    for record in result.data:
+    # 同じタイムスタンプの重複行は最大値で1行にまとめてからグループ化
+    for record in consolidate_max(result.data):
         dt = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
         # 15分単位に丸める
         rounded_dt = dt.replace(minute=(dt.minute // 15) * 15, second=0, microsecond=0)
@@ -162,7 +168,8 @@ def migrate_30min(client, group_id, table_name):
     
     # 30分単位でグループ化
     grouped_data = {}
-    for record in result.data:
+    # 同じタイムスタンプの重複行は最大値で1行にまとめてからグループ化
+    for record in consolidate_max(result.data):
         dt = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
         rounded_dt = dt.replace(minute=(dt.minute // 30) * 30, second=0, microsecond=0)
         key = rounded_dt.isoformat()
@@ -209,7 +216,8 @@ def migrate_2hour(client, group_id, table_name):
     
     # 2時間単位でグループ化
     grouped_data = {}
-    for record in result.data:
+    # 同じタイムスタンプの重複行は最大値で1行にまとめてからグループ化
+    for record in consolidate_max(result.data):
         dt = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
         rounded_dt = dt.replace(hour=(dt.hour // 2) * 2, minute=0, second=0, microsecond=0)
         key = rounded_dt.isoformat()
@@ -255,7 +263,8 @@ def migrate_4hour(client, group_id, table_name):
     
     # 4時間単位でグループ化
     grouped_data = {}
-    for record in result.data:
+    # 同じタイムスタンプの重複行は最大値で1行にまとめてからグループ化
+    for record in consolidate_max(result.data):
         dt = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
         rounded_dt = dt.replace(hour=(dt.hour // 4) * 4, minute=0, second=0, microsecond=0)
         key = rounded_dt.isoformat()
@@ -301,7 +310,8 @@ def migrate_daily(client, group_id, table_name):
     
     # 日単位でグループ化
     grouped_data = {}
-    for record in result.data:
+    # 同じタイムスタンプの重複行は最大値で1行にまとめてからグループ化
+    for record in consolidate_max(result.data):
         dt = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00'))
         rounded_dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
         key = rounded_dt.isoformat()
@@ -0,0 +1,116 @@
+"""
+1分足のクラウド階層（order_book_1min）
+各クライアントがローカルの order_book_history に持っている1分足を、グループ内で共有するための補助。
+
+  - 送信  : 1分足の行はすぐには送らず MinuteTierBuffer に溜め、upload_minutes の境界をまたいだ時点で
+            同じタイムスタンプを最大値で統合してから、その回の5分足・上位時間足と同じ一括upsertで送る
+            （15分なら15分足の境界で1リクエストにまとまり、1分足のためのリクエストは増えない）
+  - 保持  : クラウドの1分足は retention_days 日だけ残し、それより古い行は
+            downsample_order_book_1min（create_1min_tier.sql）で5分足へ最大値マージしてから削除する。
+            5分足の値は sync_scheduler.py と同じ「5分境界から猶予時間内の最初の1分足」
+  - 容量  : 1グループあたりの1分足は 1440行/日 × retention_days 程度に収まる
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from consolidate import consolidate_max
+from sync_scheduler import parse_timestamp, floor_to_boundary
+
+# クラウドの1分足テーブル
+MINUTE_TABLE = 'order_book_1min'
+MINUTE_TIMEFRAME_NAME = '1分足'
+MINUTE_INTERVAL = 1
+
+# 1分足から5分足への間引きと古い1分足の削除を行うサーバー側関数
+DOWNSAMPLE_FUNCTION = 'downsample_order_book_1min'
+DOWNSAMPLE_TABLE = 'order_book_5min'
+DOWNSAMPLE_INTERVAL = 5
+
+# クライアントから間引きを呼び出す間隔（pg_cronで定期実行していれば実質的に何もしない）
+DOWNSAMPLE_RUN_INTERVAL = timedelta(hours=1)
+
+
+class MinuteTierBuffer:
+    """1分足の行を溜め、送信の境界をまたいだらまとめて返す
+
+    upload_minutes: 送信の境界（UTCでこの分数の倍数の時刻）。溜めている最古の行より新しい境界の行が
+                    届いた時点で、その行までをまとめて返す
+    """
+
+    def __init__(self, upload_minutes: int = 15):
+        self.upload_minutes = max(1, int(upload_minutes))
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._oldest: Optional[datetime] = None
+        self.stats = {'buffered_rows': 0, 'uploads': 0, 'uploaded_rows': 0}
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """行を追加し、送信すべき行（統合済み・タイムスタンプ順）を返す（まだなら空リスト）"""
+        with self._lock:
+            newest = None
+            for row in rows:
+                dt = parse_timestamp(row['timestamp'])
+                self._rows.append(row)
+                self.stats['buffered_rows'] += 1
+                if self._oldest is None or dt < self._oldest:
+                    self._oldest = dt
+                if newest is None or dt > newest:
+                    newest = dt
+            if newest is None or floor_to_boundary(newest, self.upload_minutes) <= self._oldest:
+                return []
+            return self._drain()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """溜めている行をすべて返す（終了時の送信用）"""
+        with self._lock:
+            return self._drain()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        if not self._rows:
+            return []
+        rows = sorted(consolidate_max(self._rows), key=lambda row: parse_timestamp(row['timestamp']))
+        self._rows = []
+        self._oldest = None
+        self.stats['uploads'] += 1
+        self.stats['uploaded_rows'] += len(rows)
+        return rows
+
+
+def downsample_cutoff(now: datetime, retention_days: float) -> datetime:
+    """間引き対象の上限（retention_days日前を5分境界に切り捨てた時刻。これより前の1分足が対象）"""
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    return floor_to_boundary(now - timedelta(days=retention_days), DOWNSAMPLE_INTERVAL)
+
+
+def downsample_minute_rows(rows: Iterable[Dict[str, Any]], grace_seconds: float = 240) -> List[Dict[str, Any]]:
+    """1分足の行を5分足の行に間引く（create_1min_tier.sqlのdownsample_order_book_1minと同じ規則）
+
+    グループ・5分境界ごとに、境界からgrace_seconds秒未満で最も早い1分足をその境界の値とする
+    """
+    grace = timedelta(seconds=grace_seconds)
+    first: Dict[tuple, tuple] = {}
+    for row in rows:
+        dt = parse_timestamp(row['timestamp'])
+        boundary = floor_to_boundary(dt, DOWNSAMPLE_INTERVAL)
+        if dt - boundary >= grace:
+            continue
+        key = (row.get('group_id') or 'default-group', boundary)
+        if key not in first or dt < first[key][0]:
+            first[key] = (dt, row)
+    return [
+        {
+            'timestamp': boundary.isoformat(),
+            'ask_total': row['ask_total'],
+            'bid_total': row['bid_total'],
+            'price': row['price'],
+            'group_id': group_id
+        }
+        for (group_id, boundary), (_, row) in sorted(first.items(), key=lambda item: (item[0][1], item[0][0]))
+    ]
@@ -0,0 +1,116 @@
+"""
+Realtimeイベントのローカル反映のマイクロバッチ化
+UPDATEイベントを短い時間窓（既定300ms）だけ溜め、同じ(テーブル, タイムスタンプ)は最後の値だけを残して
+まとめて1回で反映する。イベントごとのSELECT・UPDATE・コミット・グラフ更新要求をなくし、
+DB書き込みをRealtimeスレッドから切り離す
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class RealtimeBatcher:
+    """Realtimeイベントを時間窓でまとめて反映するバッチャー
+
+    apply(batches) : {テーブル名: [record, ...]} をまとめて反映する（タイマースレッドから呼ばれる）
+    window_seconds : 最初のイベントからこの秒数だけ溜めて反映する。0なら submit() ごとに即反映する
+    on_applied(commit_timestamps) : 反映に成功したバッチの各イベント（置き換えられたものを含む）のコミット時刻
+    """
+
+    def __init__(self, apply: Callable[[Dict[str, List[Dict[str, Any]]]], Any], window_seconds: float = 0.3,
+                 log_callback=None, on_applied: Optional[Callable[[List[str]], Any]] = None):
+        self.apply = apply
+        self.on_applied = on_applied
+        self.window_seconds = window_seconds
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+        self._pending: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._commit_timestamps: List[str] = []
+        self._first_submitted: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        # 反映は常に1本ずつ（タイマーとflush()が重なっても順序を保つ）
+        self._apply_lock = threading.Lock()
+        self._closed = False
+        self.stats = {'events': 0, 'superseded_events': 0, 'batches': 0, 'rows_applied': 0,
+                      'errors': 0, 'max_batch_rows': 0, 'delay_ms': None, 'delay_ms_max': None}
+
+    def submit(self, table_name: str, record: Dict[str, Any], commit_timestamp: Optional[str] = None):
+        """イベントを追加（同じテーブル・タイムスタンプの保留中イベントは置き換える）"""
+        with self._lock:
+            if self._closed:
+                return
+            if commit_timestamp:
+                self._commit_timestamps.append(commit_timestamp)
+            key = (table_name, record['timestamp'])
+            self.stats['events'] += 1
+            if key in self._pending:
+                self.stats['superseded_events'] += 1
+                # 最後の値を採用し、反映順も最新のイベントに合わせる
+                del self._pending[key]
+            self._pending[key] = record
+            if self._first_submitted is None:
+                self._first_submitted = time.monotonic()
+
+            if self.window_seconds > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window_seconds, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """保留中のイベントをすぐに反映"""
+        with self._apply_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending = list(self._pending.items())
+                self._pending.clear()
+                commit_timestamps = self._commit_timestamps
+                self._commit_timestamps = []
+                first_submitted = self._first_submitted
+                self._first_submitted = None
+            if not pending:
+                return
+
+            batches: Dict[str, List[Dict[str, Any]]] = {}
+            for (table_name, _), record in pending:
+                batches.setdefault(table_name, []).append(record)
+
+            try:
+                self.apply(batches)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                msg = f"[Realtime] {len(pending)}件のイベントの反映に失敗: {e}"
+                self.logger.error(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "ERROR")
+                return
+
+            delay_ms = round((time.monotonic() - first_submitted) * 1000, 1)
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['rows_applied'] += len(pending)
+                self.stats['max_batch_rows'] = max(self.stats['max_batch_rows'], len(pending))
+                self.stats['delay_ms'] = delay_ms
+                if self.stats['delay_ms_max'] is None or delay_ms > self.stats['delay_ms_max']:
+                    self.stats['delay_ms_max'] = delay_ms
+            if self.on_applied and commit_timestamps:
+                self.on_applied(commit_timestamps)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self):
+        """保留中のイベントを反映してから受け付けを止める"""
+        with self._lock:
+            self._closed = True
+        self.flush()
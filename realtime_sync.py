@@ -4,10 +4,12 @@ Supabase Realtime同期用の非同期実装
 """
 
 import asyncio
+import random
 import threading
 import logging
+import time
 from typing import Optional, Dict, Any, Callable
-from datetime import datetime
+from datetime import datetime, timezone
 
 # 非同期版Supabaseクライアントのインポート
 try:
@@ -18,13 +20,36 @@ except ImportError:
     AsyncClient = None
     create_async_client = None
 
+# 接続状態
+STATE_STOPPED = 'stopped'
+STATE_CONNECTING = 'connecting'
+STATE_SUBSCRIBED = 'subscribed'
+STATE_RECONNECTING = 'reconnecting'
+
+# 切断とみなす購読状態
+DISCONNECTED_STATES = ('CHANNEL_ERROR', 'TIMED_OUT', 'CLOSED')
+
+# 監視する時間足テーブル
+REALTIME_TABLES = [
+    ('order_book_5min', '5分足'),
+    ('order_book_15min', '15分足'),
+    ('order_book_30min', '30分足'),
+    ('order_book_1hour', '1時間足'),
+    ('order_book_2hour', '2時間足'),
+    ('order_book_4hour', '4時間足'),
+    ('order_book_daily', '日足')
+]
+
 
 class RealtimeSync:
     """非同期版Supabaseクライアントを使用したRealtime同期"""
     
-    def __init__(self, config: Dict[str, Any], log_callback: Optional[Callable] = None):
+    def __init__(self, config: Dict[str, Any], log_callback: Optional[Callable] = None,
+                 client_factory: Optional[Callable] = None):
         self.config = config
         self.log_callback = log_callback
+        # create_async_clientの代わりに使うファクトリー（local_realtime_server.create_local_realtime_clientなど）
+        self.client_factory = client_factory
         self.logger = logging.getLogger(__name__)
         
         # 非同期クライアント
@@ -36,16 +61,35 @@ class RealtimeSync:
         self.enabled = config.get("cloud_sync", {}).get("realtime_enabled", True)
         self.group_id = config.get("cloud_sync", {}).get("group_id", "default-group")
         
-        # チャンネル管理
-        self.channels = {}
+        # チャンネル管理（全テーブルを1チャンネルで購読）
+        self.channel = None
+        self._routes = dict(REALTIME_TABLES)
+        self.subscribe_timeout = config.get("cloud_sync", {}).get("realtime_subscribe_timeout_seconds", 10)
         self.is_running = False
         
+        # 再接続（指数バックオフ）
+        self.reconnect_base_delay = config.get("cloud_sync", {}).get("realtime_reconnect_base_seconds", 1.0)
+        self.reconnect_max_delay = config.get("cloud_sync", {}).get("realtime_reconnect_max_seconds", 60.0)
+        self.state = STATE_STOPPED
+        self._disconnected: Optional[asyncio.Event] = None
+        
+        # 購読にかかった時間（ms）、テーブルごとの受信イベント数、接続状態、
+        # Realtimeの遅延（コミット時刻から反映完了までのms）
+        self.stats: Dict[str, Any] = {
+            'subscribe_ms': None, 'events': {}, 'state': STATE_STOPPED,
+            'reconnects': 0, 'disconnects': 0,
+            'lag_ms': None, 'lag_ms_avg': None, 'lag_ms_max': None
+        }
+        
         # コールバック
         self.update_callback: Optional[Callable] = None
+        # 再接続後に呼ばれるコールバック（切断中に取りこぼした変更の補完用）
+        self.reconnect_callback: Optional[Callable] = None
         
     async def _initialize_client(self):
         """非同期クライアントを初期化"""
-        if not ASYNC_SUPABASE_AVAILABLE:
+        factory = self.client_factory or create_async_client
+        if factory is None:
             msg = "[Realtime] 非同期版Supabaseが利用できません"
             self.logger.error(msg)
             if self.log_callback:
@@ -54,7 +98,7 @@ class RealtimeSync:
             
         try:
             cloud_config = self.config.get("cloud_sync", {})
-            self.client = await create_async_client(
+            self.client = await factory(
                 cloud_config["url"],
                 cloud_config["anon_key"]
             )
@@ -74,70 +118,59 @@ class RealtimeSync:
             return False
     
     async def _setup_channels(self):
-        """Realtimeチャンネルを設定"""
+        """全時間足テーブルの変更を1つのRealtimeチャンネルで購読"""
         if not self.client:
             return False
-            
-        tables = [
-            ('order_book_5min', '5分足'),
-            ('order_book_15min', '15分足'),
-            ('order_book_30min', '30分足'),
-            ('order_book_1hour', '1時間足'),
-            ('order_book_2hour', '2時間足'),
-            ('order_book_4hour', '4時間足'),
-            ('order_book_daily', '日足')
-        ]
         
         try:
-            for table_name, timeframe_name in tables:
-                channel_name = f'realtime-{table_name}-{self.group_id}'
-                
-                # チャンネルを作成
-                channel = self.client.channel(channel_name)
-                
-                # コールバック関数を作成（非同期版用）
-                def create_handler(tn, tfn):
-                    def handler(payload):
-                        # 非同期関数を同期的に処理
-                        try:
-                            self._process_update(tn, tfn, payload)
-                        except Exception as e:
-                            self.logger.error(f"[Realtime] 更新処理エラー: {e}")
-                    return handler
-                
-                # 非同期版のAPIに合わせて修正
-                try:
-                    # on_postgres_changesメソッドを使用
-                    channel.on_postgres_changes(
-                        event='*',  # INSERT, UPDATE, DELETE
-                        schema='public',
-                        table=table_name,
-                        filter=f'group_id=eq.{self.group_id}',
-                        callback=create_handler(table_name, timeframe_name)
-                    )
-                    
-                    # 購読を開始
-                    await channel.subscribe()
-                    
-                except AttributeError:
-                    # 新しいAPIの場合
-                    try:
-                        # 代替メソッドを試す
-                        await channel.on_broadcast(
-                            event=f'table-{table_name}',
-                            callback=create_handler(table_name, timeframe_name)
-                        ).subscribe()
-                    except:
-                        msg = f"[Realtime] {table_name}のチャンネル設定をスキップ（API非対応）"
-                        self.logger.warning(msg)
-                        continue
-                
-                self.channels[table_name] = channel
-                
-                msg = f"[Realtime] {timeframe_name}の監視を開始しました"
-                self.logger.info(msg)
+            channel_name = f'realtime-order-book-{self.group_id}'
+            channel = self.client.channel(channel_name)
+            
+            # 1チャンネルに7テーブル分のpostgres_changesフィルタを登録し、
+            # 受信したイベントはペイロードのテーブル名で振り分ける
+            for table_name, _ in REALTIME_TABLES:
+                channel.on_postgres_changes(
+                    event='*',  # INSERT, UPDATE, DELETE
+                    schema='public',
+                    table=table_name,
+                    filter=f'group_id=eq.{self.group_id}',
+                    callback=self._route_update
+                )
+            
+            # 購読完了（SUBSCRIBED）までの時間を計測
+            subscribed = asyncio.Event()
+            started = time.perf_counter()
+            
+            disconnected = self._disconnected
+            
+            def on_status(status, error=None):
+                state = getattr(status, 'value', status)
+                if state == 'SUBSCRIBED' and not subscribed.is_set():
+                    self.stats['subscribe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                    subscribed.set()
+                elif state in DISCONNECTED_STATES:
+                    self.logger.warning(f"[Realtime] 購読状態: {state} {error or ''}")
+                    if disconnected:
+                        disconnected.set()
+            
+            self.channel = channel
+            await channel.subscribe(on_status)
+            try:
+                await asyncio.wait_for(subscribed.wait(), timeout=self.subscribe_timeout)
+            except asyncio.TimeoutError:
+                msg = f"[Realtime] {self.subscribe_timeout}秒以内に購読完了の通知がありませんでした"
+                self.logger.warning(msg)
                 if self.log_callback:
-                    self.log_callback(msg, "INFO")
+                    self.log_callback(msg, "WARNING")
+                return False
+            
+            names = '・'.join(name for _, name in REALTIME_TABLES)
+            subscribe_ms = self.stats.get('subscribe_ms')
+            elapsed = f"（購読 {subscribe_ms}ms）" if subscribe_ms is not None else ""
+            msg = f"[Realtime] 1チャンネルで{names}の監視を開始しました{elapsed}"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
             
             return True
             
@@ -148,6 +181,19 @@ class RealtimeSync:
                 self.log_callback(msg, "ERROR")
             return False
     
+    def _route_update(self, payload: Dict[str, Any]):
+        """ペイロードのテーブル名で時間足ごとの処理に振り分ける"""
+        try:
+            table_name = payload.get('data', {}).get('table')
+            timeframe_name = self._routes.get(table_name)
+            if timeframe_name is None:
+                self.logger.debug(f"[Realtime] 対象外のテーブル: {table_name}")
+                return
+            self.stats['events'][table_name] = self.stats['events'].get(table_name, 0) + 1
+            self._process_update(table_name, timeframe_name, payload)
+        except Exception as e:
+            self.logger.error(f"[Realtime] 更新処理エラー: {e}")
+    
     def _process_update(self, table_name: str, timeframe_name: str, payload: Dict[str, Any]):
         """更新イベントを同期的に処理"""
         try:
@@ -165,8 +211,15 @@ class RealtimeSync:
                 new_data = payload.get('data', {}).get('record', {})
                 
                 if new_data and self.update_callback:
+                    # コミット時刻はレコードに付けて渡す（反映を後回しにするコールバックが遅延の計測に使う）
+                    commit_timestamp = payload.get('data', {}).get('commit_timestamp')
+                    if commit_timestamp:
+                        new_data = dict(new_data, commit_timestamp=commit_timestamp)
                     # メインスレッドのコールバックを呼び出す（event_typeも渡す）
-                    self.update_callback(table_name, timeframe_name, new_data, event_type)
+                    deferred = self.update_callback(table_name, timeframe_name, new_data, event_type)
+                    # Trueを返したコールバックは、ローカルへ反映した時点で record_lag() を呼ぶ
+                    if deferred is not True:
+                        self.record_lag(commit_timestamp)
                     
                     msg = f"[Realtime] {timeframe_name}の更新を検出"
                     self.logger.info(msg)  # debugからinfoに変更して確実に表示
@@ -179,25 +232,127 @@ class RealtimeSync:
             if self.log_callback:
                 self.log_callback(msg, "ERROR")
     
-    async def _run_async(self):
-        """非同期イベントループを実行"""
+    def record_lag(self, commit_timestamp: Optional[str]):
+        """コミット時刻から反映完了までの遅延を記録"""
+        if not commit_timestamp:
+            return
         try:
-            # クライアントを初期化
-            if not await self._initialize_client():
-                return
-            
-            # チャンネルを設定
-            if not await self._setup_channels():
-                return
-            
-            msg = "[Realtime] 同期を開始しました"
-            self.logger.info(msg)
+            committed = datetime.fromisoformat(commit_timestamp.replace('Z', '+00:00'))
+            if committed.tzinfo is None:
+                committed = committed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return
+        lag_ms = round((datetime.now(timezone.utc) - committed).total_seconds() * 1000, 1)
+        self.stats['lag_ms'] = lag_ms
+        average = self.stats['lag_ms_avg']
+        self.stats['lag_ms_avg'] = lag_ms if average is None else round(average * 0.8 + lag_ms * 0.2, 1)
+        if self.stats['lag_ms_max'] is None or lag_ms > self.stats['lag_ms_max']:
+            self.stats['lag_ms_max'] = lag_ms
+    
+    def _set_state(self, state: str):
+        """接続状態を更新"""
+        if self.state != state:
+            self.logger.debug(f"[Realtime] 接続状態: {self.state} -> {state}")
+        self.state = state
+        self.stats['state'] = state
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """再接続までの待ち時間（指数バックオフ + ジッター）"""
+        delay = min(self.reconnect_max_delay, self.reconnect_base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def _connect(self) -> bool:
+        """クライアントを初期化してチャンネルを購読"""
+        self._disconnected = asyncio.Event()
+        if not await self._initialize_client():
+            return False
+        return await self._setup_channels()
+    
+    async def _wait_for_disconnect(self):
+        """停止するか接続が切れるまで待つ"""
+        while self.is_running and not self._disconnected.is_set():
+            try:
+                await asyncio.wait_for(self._disconnected.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+            # 購読状態の通知がなくてもソケットが閉じていれば切断とみなす
+            realtime = getattr(self.client, 'realtime', None)
+            if realtime is not None and getattr(realtime, 'is_connected', True) is False:
+                self._disconnected.set()
+    
+    async def _sleep_while_running(self, seconds: float):
+        """停止要求に反応できるよう小刻みに待つ"""
+        deadline = time.monotonic() + seconds
+        while self.is_running and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+    
+    async def _disconnect(self):
+        """切断後の後始末（再接続前に古いチャンネルとソケットを閉じる）"""
+        if self.channel:
+            try:
+                await self.channel.unsubscribe()
+            except Exception as e:
+                self.logger.debug(f"[Realtime] 切断済みチャンネルの解除エラー: {e}")
+            self.channel = None
+        realtime = getattr(self.client, 'realtime', None)
+        close = getattr(realtime, 'close', None)
+        if close:
+            try:
+                await close()
+            except Exception as e:
+                self.logger.debug(f"[Realtime] ソケットのクローズエラー: {e}")
+        self.client = None
+    
+    def _notify_reconnect(self):
+        """再接続したことを通知（取りこぼした変更の補完を依頼）"""
+        if not self.reconnect_callback:
+            return
+        try:
+            self.reconnect_callback()
+        except Exception as e:
+            msg = f"[Realtime] 再接続後の補完処理エラー: {e}"
+            self.logger.error(msg)
             if self.log_callback:
-                self.log_callback(msg, "INFO")
-            
-            # イベントループを維持
+                self.log_callback(msg, "ERROR")
+    
+    async def _run_async(self):
+        """非同期イベントループを実行（切断時は指数バックオフで再接続）"""
+        attempt = 0
+        connected_before = False
+        try:
             while self.is_running:
-                await asyncio.sleep(1)
+                self._set_state(STATE_RECONNECTING if connected_before else STATE_CONNECTING)
+                if await self._connect():
+                    attempt = 0
+                    self._set_state(STATE_SUBSCRIBED)
+                    if connected_before:
+                        self.stats['reconnects'] += 1
+                        msg = "[Realtime] 再接続しました。切断中の変更を補完します"
+                        self._notify_reconnect()
+                    else:
+                        msg = "[Realtime] 同期を開始しました"
+                    connected_before = True
+                    self.logger.info(msg)
+                    if self.log_callback:
+                        self.log_callback(msg, "INFO")
+                    
+                    await self._wait_for_disconnect()
+                    if not self.is_running:
+                        break
+                    self.stats['disconnects'] += 1
+                
+                await self._disconnect()
+                if not self.is_running:
+                    break
+                
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                self._set_state(STATE_RECONNECTING)
+                msg = f"[Realtime] 接続が切れました。{delay:.1f}秒後に再接続します（{attempt}回目）"
+                self.logger.warning(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "WARNING")
+                await self._sleep_while_running(delay)
                 
         except Exception as e:
             msg = f"[Realtime] 実行エラー: {e}"
@@ -206,24 +361,28 @@ class RealtimeSync:
                 self.log_callback(msg, "ERROR")
         finally:
             await self._cleanup()
+            self._set_state(STATE_STOPPED)
     
     async def _cleanup(self):
         """クリーンアップ処理"""
         try:
             # チャンネルの購読を解除
-            for table_name, channel in self.channels.items():
+            if self.channel:
                 try:
-                    await channel.unsubscribe()
-                    msg = f"[Realtime] {table_name}の監視を停止"
-                    self.logger.debug(msg)
+                    await self.channel.unsubscribe()
+                    self.logger.debug("[Realtime] 全時間足の監視を停止")
                 except Exception as e:
-                    self.logger.warning(f"[Realtime] {table_name}のクリーンアップエラー: {e}")
-            
-            self.channels.clear()
+                    self.logger.warning(f"[Realtime] チャンネルのクリーンアップエラー: {e}")
+                self.channel = None
             
             # クライアントを閉じる
             if self.client:
                 await self.client.auth.sign_out()
+                # Realtimeのソケットも閉じる
+                realtime = getattr(self.client, 'realtime', None)
+                close = getattr(realtime, 'close', None)
+                if close and getattr(realtime, 'is_connected', False):
+                    await close()
                 
         except Exception as e:
             msg = f"[Realtime] クリーンアップエラー: {e}"
@@ -241,7 +400,7 @@ class RealtimeSync:
         finally:
             self.loop.close()
     
-    def start(self, update_callback: Optional[Callable] = None):
+    def start(self, update_callback: Optional[Callable] = None, reconnect_callback: Optional[Callable] = None):
         """Realtime同期を開始"""
         if not self.enabled:
             msg = "[Realtime] Realtime同期が無効です"
@@ -257,6 +416,7 @@ class RealtimeSync:
         
         try:
             self.update_callback = update_callback
+            self.reconnect_callback = reconnect_callback
             self.is_running = True
             
             # 別スレッドで非同期処理を開始
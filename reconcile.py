@@ -0,0 +1,287 @@
+"""
+ローカルSQLiteとSupabaseの内容ハッシュによる範囲照合
+テーブルを固定長の時間バケットに分け、両側でバケットごとの件数と内容ハッシュを計算して比較する。
+一致しないバケットだけを細かいバケットに分割して掘り下げ、最後に行を取得して差分を修復する。
+全件を取得して比較する検証スクリプトと違い、一致している範囲はバケットごとの集計値しか転送しない
+
+ハッシュの定義（create_reconcile_functions.sql の order_book_bucket_hashes と同じ）:
+  - 行の文字列   : "<UNIX秒>|<ask_total>|<bid_total>|<price>"（値は小数点以下scale桁で四捨五入した整数）
+  - 行のハッシュ : 文字列のMD5の先頭15桁（16進）を整数にしたもの
+  - バケット     : floor(UNIX秒 / bucket_seconds) * bucket_seconds ごとの件数と行ハッシュの合計
+行の順序に依存しないため、SQLの集約関数とPythonの計算で同じ値になる
+"""
+
+import hashlib
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cloud_batch_writer import BULK_UPSERT_FUNCTION, merge_row
+from cloud_pager import iter_pages
+from sync_scheduler import TABLE_INTERVALS, parse_timestamp
+
+# create_reconcile_functions.sql のバケット集計関数
+BUCKET_HASH_FUNCTION = 'order_book_bucket_hashes'
+
+# 値を比較する小数点以下の桁数
+DEFAULT_SCALE = 2
+
+# バケット内の件数がこれ以下なら分割せずに行を比較する
+DEFAULT_LEAF_ROWS = 64
+
+# 不一致バケットを何分割して掘り下げるか
+DEFAULT_FANOUT = 8
+
+# 1回の一括upsertで送る行数
+REPAIR_CHUNK_SIZE = 500
+
+# ローカルの範囲クエリに足す余白（秒）。タイムスタンプは文字列で比較するため、表記違い（Z付き・空白区切り・
+# タイムゾーン付き）の行も取りこぼさないよう広めに読み、UNIX秒で正確に絞り込む
+LOCAL_RANGE_MARGIN_SECONDS = 86400
+
+# バケット: 開始UNIX秒 -> (件数, 行ハッシュの合計)
+BucketHashes = Dict[int, Tuple[int, int]]
+
+
+def default_bucket_seconds(table_name: str) -> int:
+    """1バケットに約288行（5分足なら1日）が入る長さ"""
+    return TABLE_INTERVALS.get(table_name, 5) * 60 * 288
+
+
+def to_epoch(timestamp: str) -> int:
+    """タイムスタンプをUNIX秒に変換（タイムゾーンなしはUTC）"""
+    return int(parse_timestamp(timestamp).timestamp())
+
+
+def epoch_to_iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def quantize(value: Any, scale: int = DEFAULT_SCALE) -> int:
+    """値を小数点以下scale桁で四捨五入した整数（PostgreSQLのround(numeric)と同じ結果）"""
+    # floatは最短表記の10進数として扱う（JSON経由でNUMERICに保存された値と同じ）
+    decimal = Decimal(repr(value)) if isinstance(value, float) else Decimal(str(value))
+    return int((decimal * (10 ** scale)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def row_hash(epoch: int, ask_total: Any, bid_total: Any, price: Any, scale: int = DEFAULT_SCALE) -> int:
+    text = f"{epoch}|{quantize(ask_total, scale)}|{quantize(bid_total, scale)}|{quantize(price, scale)}"
+    return int(hashlib.md5(text.encode()).hexdigest()[:15], 16)
+
+
+def bucket_hashes(rows: Iterable[Tuple[int, Any, Any, Any]], bucket_seconds: int,
+                  scale: int = DEFAULT_SCALE) -> BucketHashes:
+    """(UNIX秒, ask_total, bid_total, price) の行からバケットごとの件数とハッシュ合計を計算"""
+    buckets: Dict[int, List[int]] = {}
+    for epoch, ask_total, bid_total, price in rows:
+        bucket = buckets.setdefault(epoch - epoch % bucket_seconds, [0, 0])
+        bucket[0] += 1
+        bucket[1] += row_hash(epoch, ask_total, bid_total, price, scale)
+    return {start: (count, total) for start, (count, total) in buckets.items()}
+
+
+def _sql_bound(epoch: int) -> str:
+    """ローカルの範囲クエリの境界（タイムゾーンなしのISO形式）"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def _in_range(epoch: int, start: Optional[int], end: Optional[int]) -> bool:
+    return (start is None or epoch >= start) and (end is None or epoch < end)
+
+
+class LocalHashSource:
+    """ローカルSQLite（時間足テーブル: timestamp, ask_total, bid_total, price）側の集計と修復"""
+
+    def __init__(self, conn: sqlite3.Connection, write_lock=None):
+        self.conn = conn
+        self.write_lock = write_lock
+
+    def rows(self, table_name: str, start: Optional[int], end: Optional[int]) -> Dict[int, Dict[str, Any]]:
+        """範囲内の行をUNIX秒の順に返す（同じ時刻の表記違いは最大値で1行にまとめる）
+
+        timestamp列の索引で範囲（前後に余白付き）だけを読み、テーブル全体は読み込まない
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(_sql_bound(start - LOCAL_RANGE_MARGIN_SECONDS))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(_sql_bound(end + LOCAL_RANGE_MARGIN_SECONDS))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows: Dict[int, Dict[str, Any]] = {}
+        cursor = self.conn.execute(f"SELECT timestamp, ask_total, bid_total, price FROM {table_name}{where}", params)
+        for timestamp, ask_total, bid_total, price in cursor:
+            epoch = to_epoch(timestamp)
+            if not _in_range(epoch, start, end):
+                continue
+            row = {'timestamp': timestamp, 'ask_total': ask_total, 'bid_total': bid_total, 'price': price}
+            existing = rows.get(epoch)
+            rows[epoch] = row if existing is None else merge_row(existing, row)
+        return dict(sorted(rows.items()))
+
+    def bucket_hashes(self, table_name: str, start: Optional[int], end: Optional[int],
+                      bucket_seconds: int, scale: int = DEFAULT_SCALE) -> BucketHashes:
+        rows = self.rows(table_name, start, end)
+        return bucket_hashes(((epoch, r['ask_total'], r['bid_total'], r['price']) for epoch, r in rows.items()),
+                             bucket_seconds, scale)
+
+    def write_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        """修復した行を絶対値で保存（1トランザクション）"""
+        # タイムスタンプをUTC付きで保持
+        params = [(r['timestamp'].replace('Z', '+00:00'), r['ask_total'], r['bid_total'], r['price']) for r in rows]
+        sql = f"""
+            INSERT INTO {table_name} (timestamp, ask_total, bid_total, price)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(timestamp) DO UPDATE SET
+                ask_total = excluded.ask_total,
+                bid_total = excluded.bid_total,
+                price = excluded.price
+        """
+        if self.write_lock:
+            with self.write_lock:
+                self.conn.executemany(sql, params)
+                self.conn.commit()
+        else:
+            self.conn.executemany(sql, params)
+            self.conn.commit()
+
+
+class CloudHashSource:
+    """Supabase側の集計（order_book_bucket_hashes関数）と修復（upsert_order_book_max_bulk）"""
+
+    def __init__(self, client, group_id: str, page_size: int = 1000):
+        self.client = client
+        self.group_id = group_id
+        self.page_size = page_size
+
+    def rows(self, table_name: str, start: Optional[int], end: Optional[int]) -> Dict[int, Dict[str, Any]]:
+        rows: Dict[int, Dict[str, Any]] = {}
+        after = epoch_to_iso(start) if start is not None else None
+        until = epoch_to_iso(end) if end is not None else None
+        for page in iter_pages(self.client, table_name, self.group_id, after=after, until=until,
+                               page_size=self.page_size, include_after=True):
+            for row in page:
+                epoch = to_epoch(row['timestamp'])
+                if _in_range(epoch, start, end):
+                    rows[epoch] = row
+        return rows
+
+    def bucket_hashes(self, table_name: str, start: Optional[int], end: Optional[int],
+                      bucket_seconds: int, scale: int = DEFAULT_SCALE) -> BucketHashes:
+        result = self.client.rpc(BUCKET_HASH_FUNCTION, {
+            'p_table': table_name,
+            'p_group_id': self.group_id,
+            'p_start': epoch_to_iso(start) if start is not None else None,
+            'p_end': epoch_to_iso(end) if end is not None else None,
+            'p_bucket_seconds': bucket_seconds,
+            'p_scale': scale,
+        }).execute()
+        return {int(r['bucket_start']): (int(r['row_count']), int(r['hash_sum'])) for r in result.data or []}
+
+    def write_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        """修復した行を最大値マージで一括upsert"""
+        payload = [{'table': table_name, 'timestamp': r['timestamp'], 'ask_total': r['ask_total'],
+                    'bid_total': r['bid_total'], 'price': r['price'], 'group_id': self.group_id} for r in rows]
+        for i in range(0, len(payload), REPAIR_CHUNK_SIZE):
+            self.client.rpc(BULK_UPSERT_FUNCTION, {'p_rows': payload[i:i + REPAIR_CHUNK_SIZE]}).execute()
+
+
+class Reconciler:
+    """バケットハッシュで不一致の範囲を絞り込み、差分の行だけを修復する
+
+    修復の方針（最大値マージ）:
+      - クラウドにない行        : クラウドへ送信
+      - ローカルにない行        : ローカルへ保存
+      - 値が異なる行            : クラウドの行にローカルの行を最大値マージし、
+                                  クラウドより大きくなればクラウドへ送信、ローカルはその値で上書き
+    """
+
+    def __init__(self, local: LocalHashSource, cloud: CloudHashSource, scale: int = DEFAULT_SCALE,
+                 leaf_rows: int = DEFAULT_LEAF_ROWS, fanout: int = DEFAULT_FANOUT, log_callback=None):
+        self.local = local
+        self.cloud = cloud
+        self.scale = scale
+        self.leaf_rows = leaf_rows
+        self.fanout = max(2, fanout)
+        self.log_callback = log_callback
+        self.logger = logging.getLogger(__name__)
+
+    def reconcile_table(self, table_name: str, start: Optional[str] = None, end: Optional[str] = None,
+                        bucket_seconds: Optional[int] = None, repair: bool = True) -> Dict[str, Any]:
+        """start以上end未満（Noneなら全範囲）を照合し、repairなら差分を修復して結果を返す"""
+        result = {'table': table_name, 'buckets_compared': 0, 'mismatched_buckets': 0, 'hash_requests': 0,
+                  'rows_fetched': 0, 'missing_local': 0, 'missing_cloud': 0, 'differing': 0,
+                  'repaired_local': 0, 'repaired_cloud': 0}
+        to_local: List[Dict[str, Any]] = []
+        to_cloud: List[Dict[str, Any]] = []
+        self._compare(table_name, to_epoch(start) if start else None, to_epoch(end) if end else None,
+                      bucket_seconds or default_bucket_seconds(table_name), result, to_local, to_cloud)
+
+        if repair:
+            if to_cloud:
+                self.cloud.write_rows(table_name, to_cloud)
+                result['repaired_cloud'] = len(to_cloud)
+            if to_local:
+                self.local.write_rows(table_name, to_local)
+                result['repaired_local'] = len(to_local)
+
+        if result['mismatched_buckets']:
+            msg = (f"[照合] {table_name}: 不一致バケット{result['mismatched_buckets']}/{result['buckets_compared']}、"
+                   f"ローカル欠損{result['missing_local']}件・クラウド欠損{result['missing_cloud']}件・"
+                   f"値の相違{result['differing']}件")
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+        return result
+
+    def _compare(self, table_name, start, end, bucket_seconds, result, to_local, to_cloud):
+        local = self.local.bucket_hashes(table_name, start, end, bucket_seconds, self.scale)
+        cloud = self.cloud.bucket_hashes(table_name, start, end, bucket_seconds, self.scale)
+        result['hash_requests'] += 1
+        buckets = set(local) | set(cloud)
+        result['buckets_compared'] += len(buckets)
+
+        min_seconds = TABLE_INTERVALS.get(table_name, 5) * 60
+        for bucket_start in sorted(buckets):
+            local_bucket = local.get(bucket_start, (0, 0))
+            cloud_bucket = cloud.get(bucket_start, (0, 0))
+            if local_bucket == cloud_bucket:
+                continue
+            result['mismatched_buckets'] += 1
+            # 親の範囲からはみ出さないように切り詰める
+            sub_start = bucket_start if start is None else max(bucket_start, start)
+            sub_end = bucket_start + bucket_seconds if end is None else min(bucket_start + bucket_seconds, end)
+            rows = max(local_bucket[0], cloud_bucket[0])
+            sub_seconds = bucket_seconds // self.fanout
+            if rows > self.leaf_rows and sub_seconds >= min_seconds:
+                self._compare(table_name, sub_start, sub_end, sub_seconds, result, to_local, to_cloud)
+            else:
+                self._diff_rows(table_name, sub_start, sub_end, result, to_local, to_cloud)
+
+    def _diff_rows(self, table_name, start, end, result, to_local, to_cloud):
+        local_rows = self.local.rows(table_name, start, end)
+        cloud_rows = self.cloud.rows(table_name, start, end)
+        result['rows_fetched'] += len(cloud_rows)
+        for epoch in sorted(set(local_rows) | set(cloud_rows)):
+            local_row = local_rows.get(epoch)
+            cloud_row = cloud_rows.get(epoch)
+            if cloud_row is None:
+                result['missing_cloud'] += 1
+                to_cloud.append(local_row)
+            elif local_row is None:
+                result['missing_local'] += 1
+                to_local.append(cloud_row)
+            elif self._row_hash(epoch, local_row) != self._row_hash(epoch, cloud_row):
+                result['differing'] += 1
+                merged = merge_row(cloud_row, local_row)
+                if merged is not cloud_row:
+                    to_cloud.append(merged)
+                # ローカルは既存行のタイムスタンプ表記のまま上書きする
+                to_local.append(dict(merged, timestamp=local_row['timestamp']))
+
+    def _row_hash(self, epoch: int, row: Dict[str, Any]) -> int:
+        return row_hash(epoch, row['ask_total'], row['bid_total'], row['price'], self.scale)
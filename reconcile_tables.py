@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ローカルDBとSupabaseの照合・修復スクリプト
+全件を取得して比べる代わりに、時間バケットごとの内容ハッシュ（create_reconcile_functions.sql）を比較し、
+不一致のバケットだけを掘り下げて差分の行を一括upsertで修復する
+
+  python reconcile_tables.py                 # 直近90日を照合して修復
+  python reconcile_tables.py --days 365 --dry-run
+  python reconcile_tables.py --all --table order_book_5min
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from supabase_client_factory import create_supabase_client, RequestMetrics
+from reconcile import Reconciler, LocalHashSource, CloudHashSource
+from sync_scheduler import TABLE_INTERVALS
+
+# 時間足の表示名
+TIMEFRAME_NAMES = {
+    'order_book_5min': '5分足',
+    'order_book_15min': '15分足',
+    'order_book_30min': '30分足',
+    'order_book_1hour': '1時間足',
+    'order_book_2hour': '2時間足',
+    'order_book_4hour': '4時間足',
+    'order_book_daily': '日足'
+}
+
+
+def load_config():
+    """設定ファイルを読み込む"""
+    appdata_dir = os.path.join(os.environ.get('APPDATA', ''), 'CoinglassScraper')
+    config_path = os.path.join(appdata_dir, 'config.json')
+
+    if not os.path.exists(config_path):
+        print(f"設定ファイルが見つかりません: {config_path}")
+        return None
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカルDBとSupabaseの照合・修復")
+    parser.add_argument('--days', type=int, default=90, help="照合する日数（直近から）")
+    parser.add_argument('--all', action='store_true', help="全期間を照合")
+    parser.add_argument('--table', action='append', help="照合するテーブル（複数指定可、省略時は全時間足）")
+    parser.add_argument('--dry-run', action='store_true', help="差分の表示のみで修復しない")
+    args = parser.parse_args()
+
+    config = load_config()
+    if not config:
+        return
+
+    cloud_config = config.get("cloud_sync", {})
+    if not cloud_config.get("enabled"):
+        print("クラウド同期が無効になっています")
+        return
+
+    db_path = os.path.join(os.environ.get('APPDATA', ''), 'CoinglassScraper', 'btc_usdt_order_book.db')
+    if not os.path.exists(db_path):
+        print(f"ローカルDBが見つかりません: {db_path}")
+        return
+
+    # Supabaseクライアントを初期化
+    try:
+        metrics = RequestMetrics()
+        client = create_supabase_client(
+            cloud_config["url"],
+            cloud_config["anon_key"],
+            http_config=cloud_config.get("http"),
+            metrics=metrics
+        )
+        print("Supabaseに接続しました\n")
+    except Exception as e:
+        print(f"Supabase接続エラー: {e}")
+        return
+
+    conn = sqlite3.connect(db_path)
+    reconciler = Reconciler(
+        LocalHashSource(conn),
+        CloudHashSource(client, cloud_config.get("group_id", "default-group"),
+                        page_size=cloud_config.get("page_size", 1000))
+    )
+
+    start = None if args.all else (datetime.now(timezone.utc) - timedelta(days=args.days)).isoformat()
+    period = "全期間" if args.all else f"直近{args.days}日"
+    print(f"=== 照合（{period}{'、修復なし' if args.dry_run else ''}） ===\n")
+
+    for table_name in args.table or list(TABLE_INTERVALS):
+        name = TIMEFRAME_NAMES.get(table_name, table_name)
+        try:
+            result = reconciler.reconcile_table(table_name, start=start, repair=not args.dry_run)
+        except Exception as e:
+            print(f"{name}: エラー - {e}")
+            continue
+
+        if not result['mismatched_buckets']:
+            print(f"{name}: 一致（{result['buckets_compared']}バケット）")
+            continue
+        print(f"{name}: 不一致バケット {result['mismatched_buckets']}/{result['buckets_compared']}、"
+              f"取得 {result['rows_fetched']}行")
+        print(f"  ローカル欠損 {result['missing_local']}件 / クラウド欠損 {result['missing_cloud']}件 / "
+              f"値の相違 {result['differing']}件")
+        if not args.dry_run:
+            print(f"  修復: ローカル {result['repaired_local']}件 / クラウド {result['repaired_cloud']}件")
+
+    conn.close()
+    print(f"\n{metrics.format_summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Supabaseクライアントの共通ファクトリー
+アプリ本体（cloud_sync.py）と一括処理スクリプトが同じ設定のHTTP接続を使うようにする
+
+  - keep-aliveで接続を使い回すコネクションプール
+  - h2パッケージがあればHTTP/2
+  - 接続・読み取りのタイムアウト
+  - gzip（brotli/brotlicffiがあればbrも）で圧縮されたレスポンスを受け付ける
+  - httpxのイベントフックでリクエストごとの応答時間を計測（RequestMetrics）
+"""
+
+import importlib.util
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+# httpxのインポートを試行（supabaseの依存パッケージ）
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+# Supabaseのインポートを試行
+try:
+    from supabase import create_client, ClientOptions
+    SUPABASE_AVAILABLE = True
+except ImportError:
+    create_client = None
+    ClientOptions = None
+    SUPABASE_AVAILABLE = False
+
+H2_AVAILABLE = importlib.util.find_spec('h2') is not None
+BROTLI_AVAILABLE = (importlib.util.find_spec('brotli') is not None or
+                    importlib.util.find_spec('brotlicffi') is not None)
+
+# config.json の cloud_sync.http で上書きできる既定値
+DEFAULT_HTTP_CONFIG = {
+    'timeout_seconds': 10.0,
+    'connect_timeout_seconds': 5.0,
+    'max_connections': 20,
+    'max_keepalive_connections': 10,
+    'keepalive_expiry_seconds': 60.0,
+    'http2': True,
+}
+
+
+def accept_encoding() -> str:
+    """デコード可能な圧縮形式だけを受け付けるAccept-Encoding"""
+    return 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate'
+
+
+def _endpoint(url) -> str:
+    """URLから集計用のエンドポイント名を取り出す（/rest/v1/order_book_5min -> order_book_5min）"""
+    path = urlparse(str(url)).path
+    for prefix in ('/rest/v1/', '/auth/v1/', '/storage/v1/'):
+        if path.startswith(prefix):
+            return path[len(prefix):] or path
+    return path
+
+
+class RequestMetrics:
+    """リクエストごとの応答時間（ヘッダー受信まで）をエンドポイント別に集計
+
+    送受信バイト数は、リクエスト本文の長さと、レスポンスのContent-Length（圧縮後の転送量）を数える
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._started: Dict[int, float] = {}
+        self._samples: Dict[str, List[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self.http_versions: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def on_request(self, request):
+        with self._lock:
+            # 応答が返らなかったリクエストの開始時刻が溜まり続けないようにする
+            if len(self._started) > self.max_samples:
+                self._started.clear()
+            self._started[id(request)] = time.perf_counter()
+        try:
+            size = len(request.content)
+        except Exception:
+            # ストリーミングの本文は長さが分からないため数えない
+            size = 0
+        self.add_bytes(sent=size)
+
+    def on_response(self, response):
+        finished = time.perf_counter()
+        with self._lock:
+            started = self._started.pop(id(response.request), None)
+        if started is None:
+            return
+        version = getattr(response, 'http_version', None)
+        headers = getattr(response, 'headers', None) or {}
+        try:
+            self.add_bytes(received=int(headers.get('content-length') or 0))
+        except (TypeError, ValueError):
+            pass
+        self.record(_endpoint(response.request.url), (finished - started) * 1000,
+                    error=response.status_code >= 400, http_version=version)
+
+    def record(self, endpoint: str, elapsed_ms: float, error: bool = False, http_version: Optional[str] = None):
+        with self._lock:
+            samples = self._samples.setdefault(endpoint, [])
+            samples.append(elapsed_ms)
+            if len(samples) > self.max_samples:
+                del samples[:len(samples) - self.max_samples]
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if error:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+            if http_version:
+                self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+
+    def add_bytes(self, sent: int = 0, received: int = 0):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    @staticmethod
+    def _percentile(ordered: List[float], ratio: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+    def summary(self) -> Dict[str, Any]:
+        """全体とエンドポイント別の件数・エラー数・応答時間（ms）"""
+        with self._lock:
+            endpoints = {}
+            all_samples = []
+            for endpoint, samples in self._samples.items():
+                ordered = sorted(samples)
+                all_samples.extend(samples)
+                endpoints[endpoint] = {
+                    'count': self._counts[endpoint],
+                    'errors': self._errors.get(endpoint, 0),
+                    'avg_ms': round(sum(ordered) / len(ordered), 1),
+                    'p95_ms': round(self._percentile(ordered, 0.95), 1),
+                }
+            total = {'count': sum(self._counts.values()), 'errors': sum(self._errors.values()),
+                     'http_versions': dict(self.http_versions), 'endpoints': endpoints,
+                     'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received}
+            if all_samples:
+                ordered = sorted(all_samples)
+                total['avg_ms'] = round(sum(ordered) / len(ordered), 1)
+                total['p50_ms'] = round(self._percentile(ordered, 0.5), 1)
+                total['p95_ms'] = round(self._percentile(ordered, 0.95), 1)
+                total['max_ms'] = round(ordered[-1], 1)
+            return total
+
+    def format_summary(self) -> str:
+        """スクリプトの最後に表示する集計結果"""
+        s = self.summary()
+        if not s['count']:
+            return "HTTPリクエスト: なし"
+        lines = [f"HTTPリクエスト: {s['count']}件（エラー {s['errors']}件） "
+                 f"平均 {s['avg_ms']}ms / p50 {s['p50_ms']}ms / p95 {s['p95_ms']}ms / 最大 {s['max_ms']}ms "
+                 f"{s['http_versions']}"]
+        for endpoint, e in sorted(s['endpoints'].items()):
+            lines.append(f"  {endpoint}: {e['count']}件 平均 {e['avg_ms']}ms / p95 {e['p95_ms']}ms")
+        return "\n".join(lines)
+
+
+def build_http_client(http_config: Optional[Dict[str, Any]] = None,
+                      metrics: Optional[RequestMetrics] = None):
+    """チューニング済みのhttpx.Clientを作成"""
+    if not HTTPX_AVAILABLE:
+        raise ImportError("httpxがインストールされていません")
+    config = dict(DEFAULT_HTTP_CONFIG)
+    config.update(http_config or {})
+
+    event_hooks = {'request': [metrics.on_request], 'response': [metrics.on_response]} if metrics else {}
+    return httpx.Client(
+        http2=bool(config['http2']) and H2_AVAILABLE,
+        timeout=httpx.Timeout(config['timeout_seconds'], connect=config['connect_timeout_seconds']),
+        limits=httpx.Limits(
+            max_connections=config['max_connections'],
+            max_keepalive_connections=config['max_keepalive_connections'],
+            keepalive_expiry=config['keepalive_expiry_seconds'],
+        ),
+        headers={'Accept-Encoding': accept_encoding()},
+        event_hooks=event_hooks,
+    )
+
+
+def create_supabase_client(url: str, key: str, http_config: Optional[Dict[str, Any]] = None,
+                           metrics: Optional[RequestMetrics] = None):
+    """共通設定のSupabaseクライアントを作成
+
+    ClientOptionsがhttpx_clientを受け付けるバージョンではチューニング済みの接続を渡す。
+    古いバージョンでは圧縮・タイムアウトの設定と、既存セッションへの計測フックの追加のみ行う
+    """
+    if not SUPABASE_AVAILABLE:
+        raise ImportError("supabaseがインストールされていません")
+    logger = logging.getLogger(__name__)
+    config = dict(DEFAULT_HTTP_CONFIG)
+    config.update(http_config or {})
+
+    http_client = build_http_client(config, metrics) if HTTPX_AVAILABLE else None
+    options = None
+    if http_client is not None:
+        try:
+            options = ClientOptions(postgrest_client_timeout=config['timeout_seconds'], httpx_client=http_client)
+        except TypeError:
+            http_client.close()
+            http_client = None
+    if options is None:
+        options = ClientOptions(postgrest_client_timeout=config['timeout_seconds'])
+    options.headers['Accept-Encoding'] = accept_encoding()
+
+    client = create_client(url, key, options=options)
+
+    if http_client is None:
+        logger.info("ClientOptionsがhttpx_clientに未対応のため、既定の接続設定を使用します")
+        if metrics:
+            try:
+                client.postgrest.session.event_hooks = {
+                    'request': [metrics.on_request], 'response': [metrics.on_response]}
+            except AttributeError:
+                pass
+    return client
@@ -0,0 +1,125 @@
+"""
+サンプルのタイムスタンプに基づくクラウド同期スケジューラー
+ローカル時計の「分 % 5」ではなく、取得したサンプル自身のタイムスタンプとテーブルごとの境界で
+書き込みを決める。境界から猶予時間内に届いた最初のサンプルがその境界の値になるため、
+:00ちょうどに取得できず:01に届いたサンプルも5分足・上位時間足に同期される。
+直近N区間のうち、サンプルはあるのに同期されていない境界（送信に失敗した・サンプルが前後して届いた）は
+次のサンプル時にまとめて同期する
+ローカルの時間足テーブル（coinglass_scraper.py の save_to_database）も同じ規則で保存し、両者の境界の行を揃える
+"""
+
+import bisect
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+# テーブルごとの時間足の長さ（分）
+TABLE_INTERVALS = {
+    'order_book_5min': 5,
+    'order_book_15min': 15,
+    'order_book_30min': 30,
+    'order_book_1hour': 60,
+    'order_book_2hour': 120,
+    'order_book_4hour': 240,
+    'order_book_daily': 1440,
+}
+
+# (テーブル名, 境界タイムスタンプ, ask_total, bid_total, price)
+DueRow = Tuple[str, str, float, float, float]
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """ISO形式のタイムスタンプをUTCのdatetimeに変換（タイムゾーンなしはUTCとみなす）"""
+    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def floor_to_boundary(dt: datetime, interval_minutes: int) -> datetime:
+    """UTCの時間足境界に切り捨て（日足は00:00、4時間足は0,4,8..時）"""
+    seconds = interval_minutes * 60
+    epoch = int(dt.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc)
+
+
+class SyncScheduler:
+    """サンプルごとに同期すべき(テーブル, 境界)を返す
+
+    grace_seconds    : 境界からこの秒数未満に取得したサンプルを境界の値として使う（時間足の長さが上限）
+    catchup_intervals: 各テーブルで現在の区間から何区間前までの未同期の境界を補うか
+    """
+
+    def __init__(self, intervals: Optional[Dict[str, int]] = None, grace_seconds: float = 240,
+                 catchup_intervals: int = 3):
+        self.intervals = dict(intervals or TABLE_INTERVALS)
+        self.grace = timedelta(seconds=grace_seconds)
+        self.catchup_intervals = max(0, int(catchup_intervals))
+        self._lock = threading.Lock()
+        self._samples: Dict[datetime, Tuple[float, float, float]] = {}
+        self._times: List[datetime] = []  # _samplesのキー（昇順）
+        self._synced: Dict[str, Set[datetime]] = {table_name: set() for table_name in self.intervals}
+        self._latest: Optional[datetime] = None
+        self.stats = {'samples': 0, 'synced_boundaries': 0, 'caught_up_boundaries': 0}
+
+    def on_sample(self, timestamp: str, ask_total: float, bid_total: float, price: float) -> List[DueRow]:
+        """サンプルを記録し、同期すべき行を境界の古い順に返す
+
+        返した境界は mark_synced を呼ぶまで未同期のままで、送信に失敗した場合は次のサンプルで再度返す
+        """
+        with self._lock:
+            dt = parse_timestamp(timestamp)
+            self._record(dt, ask_total, bid_total, price)
+
+            due = []
+            for table_name, minutes in self.intervals.items():
+                interval = timedelta(minutes=minutes)
+                current = floor_to_boundary(dt, minutes)
+                synced = self._synced[table_name]
+                for k in range(self.catchup_intervals, -1, -1):
+                    boundary = current - interval * k
+                    if boundary in synced:
+                        continue
+                    # 猶予は時間足の長さを超えない（1分足で次の区間のサンプルを使わないため）
+                    sample = self._first_sample(boundary, boundary + min(self.grace, interval))
+                    if sample is not None:
+                        due.append((table_name, boundary.isoformat()) + sample)
+            due.sort(key=lambda row: row[1])
+            return due
+
+    def mark_synced(self, rows: List[DueRow]):
+        """on_sampleが返した行の送信（キュー投入）が完了したことを記録"""
+        with self._lock:
+            for table_name, timestamp, *_ in rows:
+                boundary = parse_timestamp(timestamp)
+                synced = self._synced[table_name]
+                if boundary in synced:
+                    continue
+                synced.add(boundary)
+                self.stats['synced_boundaries'] += 1
+                if self._latest and boundary < floor_to_boundary(self._latest, self.intervals[table_name]):
+                    self.stats['caught_up_boundaries'] += 1
+
+    def _record(self, dt: datetime, ask_total: float, bid_total: float, price: float):
+        self.stats['samples'] += 1
+        if dt not in self._samples:
+            self._samples[dt] = (ask_total, bid_total, price)
+            bisect.insort(self._times, dt)
+        if self._latest is None or dt > self._latest:
+            self._latest = dt
+            # 補完対象の範囲より古いサンプルと同期済みの記録を削除
+            window = timedelta(minutes=max(self.intervals.values()) * (self.catchup_intervals + 1))
+            stale = bisect.bisect_left(self._times, self._latest - window)
+            for old in self._times[:stale]:
+                del self._samples[old]
+            del self._times[:stale]
+            for table_name, minutes in self.intervals.items():
+                cutoff = self._latest - timedelta(minutes=minutes * (self.catchup_intervals + 1))
+                self._synced[table_name] = {b for b in self._synced[table_name] if b >= cutoff}
+
+    def _first_sample(self, start: datetime, end: datetime) -> Optional[Tuple[float, float, float]]:
+        """start以上end未満で最も早いサンプル"""
+        i = bisect.bisect_left(self._times, start)
+        if i < len(self._times) and self._times[i] < end:
+            return self._samples[self._times[i]]
+        return None
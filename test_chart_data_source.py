@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+グラフ用範囲データソースのテストスクリプト
+一時SQLiteに5分足データを作成し、範囲クエリ・ブロックキャッシュ・LRU破棄を確認
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from chart_data_source import ChartRangeSource
+
+
+def create_test_db(path, count):
+    """5分足テーブルにテストデータを作成"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE order_book_5min (
+            timestamp TEXT PRIMARY KEY,
+            ask_total REAL NOT NULL,
+            bid_total REAL NOT NULL,
+            price REAL NOT NULL
+        )
+    """)
+    start = datetime(2025, 8, 1, tzinfo=timezone.utc)
+    rows = [((start + timedelta(minutes=5 * i)).isoformat(), 1000.0 + i, 2000.0 + i, 115000.0)
+            for i in range(count)]
+    conn.executemany("INSERT INTO order_book_5min VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return start
+
+
+def wait_ready(source, table, start, end):
+    """範囲データの取得完了を待つ"""
+    done = threading.Event()
+    if source.request_range(table, start, end, on_ready=lambda t: done.set()):
+        assert done.wait(5)
+
+
+def test_range_query_and_cache():
+    """範囲データが取得され、2回目はキャッシュから返されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'test.db')
+        start = create_test_db(db_path, 2000)
+        source = ChartRangeSource(db_path, block_points=100)
+        source.start()
+        try:
+            view_start = start + timedelta(hours=24)
+            view_end = start + timedelta(hours=30)
+            wait_ready(source, 'order_book_5min', view_start, view_end)
+
+            rows = source.get_range('order_book_5min', view_start, view_end)
+            assert len(rows) == 6 * 12 + 1
+            assert rows[0][0] == view_start
+            queries = source.stats['queries']
+
+            # 同じ範囲の再要求はキャッシュヒットのみ
+            assert not source.request_range('order_book_5min', view_start, view_end)
+            assert source.stats['queries'] == queries
+            assert source.stats['cache_hits'] > 0
+            print(f"[OK] 範囲クエリで{len(rows)}件を取得し、再要求はキャッシュから返されました")
+        finally:
+            source.stop()
+
+
+def test_lru_eviction():
+    """キャッシュ上限を超えると古いブロックが破棄されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'test.db')
+        start = create_test_db(db_path, 2000)
+        source = ChartRangeSource(db_path, block_points=100, max_blocks=3, prefetch_ratio=0)
+        source.start()
+        try:
+            for day in range(5):
+                day_start = start + timedelta(hours=day * 24)
+                wait_ready(source, 'order_book_5min', day_start, day_start + timedelta(hours=1))
+
+            assert len(source._blocks) <= 3
+            assert source.stats['evictions'] > 0
+            print(f"[OK] LRUにより{source.stats['evictions']}ブロックが破棄されました")
+        finally:
+            source.stop()
+
+
+if __name__ == "__main__":
+    test_range_query_and_cache()
+    test_lru_eviction()
+    print("\nすべてのテストが完了しました")
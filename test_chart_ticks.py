@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+X軸ティック生成のテストスクリプト
+従来のループ処理と同じ位置・ラベルになるか、ラベルキャッシュが再利用されるかを確認
+"""
+
+from datetime import datetime, timedelta, timezone
+from chart_ticks import DataPointLocator, TickLabelCache, to_epoch_array
+import matplotlib.dates as mdates
+
+
+def legacy_ticks(times, timeframe, max_labels=30):
+    """update_graphの従来ロジックでティック位置とラベルを生成"""
+    skip_interval = max(1, len(times) // max_labels)
+    positions, labels = [], []
+    for i in range(0, len(times), skip_interval):
+        time_obj = times[i]
+        positions.append(time_obj)
+        if timeframe == "1日" or (time_obj.hour == 0 and time_obj.minute == 0):
+            labels.append(f"{time_obj.month}/{time_obj.day}")
+        else:
+            labels.append(f"{time_obj.hour}")
+    return positions, labels
+
+
+def test_matches_legacy_labels():
+    """従来ロジックと同じティック位置・ラベルが生成されるか"""
+    start = datetime(2025, 7, 30, tzinfo=timezone.utc)
+    for timeframe, step in (("5分", 5), ("1時間", 60), ("1日", 1440)):
+        times = [start + timedelta(minutes=step * i) for i in range(300)]
+        epochs = to_epoch_array(times)
+
+        locator = DataPointLocator(epochs)
+        cache = TickLabelCache()
+        labels = cache.labels_for(timeframe, locator.tick_epochs)
+
+        positions, legacy_labels = legacy_ticks(times, timeframe)
+        expected_positions = mdates.date2num(positions)
+        assert all(abs(a - b) < 1e-9 for a, b in zip(locator(), expected_positions))
+        assert [labels[int(e // 60) * 60] for e in locator.tick_epochs] == legacy_labels
+    print("[OK] 従来ロジックと同じティック位置・ラベルが生成されました")
+
+
+def test_label_cache_reuse():
+    """同じ時間足の再描画でラベルキャッシュが再利用されるか"""
+    start = datetime(2025, 8, 1, tzinfo=timezone.utc)
+    times = [start + timedelta(hours=i) for i in range(300)]
+    locator = DataPointLocator(to_epoch_array(times))
+    cache = TickLabelCache()
+
+    cache.labels_for("1時間", locator.tick_epochs)
+    misses = cache.stats['misses']
+    cache.labels_for("1時間", locator.tick_epochs)
+
+    assert cache.stats['misses'] == misses
+    assert cache.stats['hits'] == len(locator.tick_epochs)
+    print(f"[OK] 再描画時は{cache.stats['hits']}件すべてキャッシュから取得されました")
+
+
+if __name__ == "__main__":
+    test_matches_legacy_labels()
+    test_label_cache_reuse()
+    print("\nすべてのテストが完了しました")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クラウド一括書き込みのテストスクリプト
+日足境界（00:00 UTC）の1回の取得で全時間足が1リクエストで保存されるか、
+時間窓内の書き込みがまとめられるかを確認
+"""
+
+import os
+import tempfile
+import threading
+from cloud_batch_writer import CloudBatchWriter
+from cloud_sync import CloudSyncManager, TIMEFRAME_NAMES
+from local_postgrest import LocalPostgrestClient
+
+
+def create_manager(client):
+    """設定ファイルなし・同期送信のマネージャーを作成"""
+    config_path = os.path.join(tempfile.mkdtemp(), 'nonexistent_config.json')
+    manager = CloudSyncManager(config_path=config_path, client=client)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    return manager
+
+
+def test_daily_boundary_single_request():
+    """00:00 UTCの取得で7テーブルが1リクエストで保存されるか"""
+    client = LocalPostgrestClient()
+    manager = create_manager(client)
+
+    manager.sync_data_async('2025-08-04T00:00:00+00:00', 1000.0, 2000.0, 115000.0)
+
+    assert client.request_count == 1
+    assert client.rpc_calls == {'upsert_order_book_max_bulk': 1}
+    for table in TIMEFRAME_NAMES:
+        rows = client.table(table).select('*').execute().data
+        assert len(rows) == 1 and rows[0]['ask_total'] == 1000.0, table
+    assert manager.stats['successful_saves'] == 7
+    print("[OK] 日足境界の7テーブル書き込みが1リクエストで保存されました")
+
+
+def test_per_table_results():
+    """テーブルごとの結果（新規・更新・スキップ）が返されるか"""
+    client = LocalPostgrestClient()
+    manager = create_manager(client)
+    timestamp = '2025-08-04T01:00:00+00:00'
+    manager._save_batch([manager._build_row('order_book_1hour', timestamp, 1000.0, 2000.0, 115000.0)])
+
+    results = manager._save_batch([
+        manager._build_row('order_book_5min', timestamp, 1000.0, 2000.0, 115000.0),
+        manager._build_row('order_book_1hour', timestamp, 1200.0, 1500.0, 115100.0),
+        manager._build_row('order_book_15min', timestamp, 1000.0, 2000.0, 115000.0),
+    ])
+    assert results == {'order_book_5min': 'inserted', 'order_book_1hour': 'updated', 'order_book_15min': 'inserted'}
+
+    results = manager._save_batch([
+        manager._build_row('order_book_1hour', timestamp, 900.0, 1900.0, 115200.0)])
+    assert results == {'order_book_1hour': 'skipped'}
+    print("[OK] テーブルごとの保存結果が返されました")
+
+
+def test_window_merges_rows():
+    """時間窓内の同じ行が最大値マージされ、1バッチで送信されるか"""
+    batches = []
+    done = threading.Event()
+
+    def write_batch(batch):
+        batches.append(batch)
+        done.set()
+
+    writer = CloudBatchWriter(write_batch, window_seconds=0.05,
+                              dispatch=lambda func, batch: func(batch))
+    row = {'table': 'order_book_5min', 'timestamp': '2025-08-04T00:05:00+00:00',
+           'ask_total': 1000.0, 'bid_total': 2000.0, 'price': 115000.0, 'group_id': 'default-group'}
+    writer.submit([row])
+    writer.submit([dict(row, ask_total=1100.0, bid_total=1500.0, price=115100.0)])
+    writer.submit([dict(row, table='order_book_15min')])
+
+    assert done.wait(2)
+    assert len(batches) == 1 and len(batches[0]) == 2
+    merged = batches[0][0]
+    assert merged['ask_total'] == 1100.0 and merged['bid_total'] == 2000.0 and merged['price'] == 115100.0
+    assert writer.stats['merged_rows'] == 1
+    print("[OK] 時間窓内の書き込みが1バッチにまとめられました")
+
+
+if __name__ == "__main__":
+    test_daily_boundary_single_request()
+    test_per_table_results()
+    test_window_merges_rows()
+    print("\nすべてのテストが完了しました")
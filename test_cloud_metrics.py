@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クラウド同期のメトリクスのテストスクリプト
+エラーの分類、ヒストグラムとPrometheusのテキスト形式、テーブルごとの書き込み時間・エラー分類ごとのリトライの集計、
+/metrics と /health のローカルエンドポイント、ヘルスチェックがネットワークにアクセスしないことを確認
+"""
+
+import json
+import os
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from cloud_metrics import CloudMetrics, Histogram, classify_error, render_prometheus
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient, LocalPostgrestError
+from supabase_client_factory import RequestMetrics
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ReadTimeout(Exception):
+    pass
+
+
+def make_manager(client, **options):
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': options}, f)
+    return CloudSyncManager(config_path=config_path, client=client)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_classify_error():
+    """例外をエラー分類に振り分けるか"""
+    assert classify_error(TimeoutError()) == 'timeout'
+    assert classify_error(ReadTimeout()) == 'timeout'
+    assert classify_error(ConnectionResetError()) == 'connection'
+    assert classify_error(LocalPostgrestError('missing', code='PGRST202')) == 'missing_function'
+    assert classify_error(StatusError(429)) == 'rate_limited'
+    assert classify_error(StatusError(503)) == 'server_error'
+    assert classify_error(StatusError(400)) == 'client_error'
+    assert classify_error(LocalPostgrestError('dup', code='23505')) == 'database'
+    assert classify_error(ValueError('x')) == 'other'
+    print("[OK] エラーの分類")
+
+
+def test_histogram_and_text_format():
+    """累積バケットと _sum / _count をPrometheusのテキスト形式で出力するか"""
+    histogram = Histogram((0.1, 0.5, 1.0))
+    for value in (0.05, 0.2, 0.3, 2.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [('0.1', 1), ('0.5', 3), ('1.0', 3), ('+Inf', 4)]
+    assert histogram.quantile(0.5) == 0.5
+
+    metrics = CloudMetrics(buckets=(0.1, 0.5))
+    metrics.observe_write('order_book_5min', 0.2)
+    metrics.count_rows('order_book_5min', 'inserted', 2)
+    metrics.record_error('write', TimeoutError())
+    text = render_prometheus(metrics.families())
+    assert '# TYPE cloud_write_duration_seconds histogram' in text
+    assert 'cloud_write_duration_seconds_bucket{table="order_book_5min",le="0.1"} 0.0' in text
+    assert 'cloud_write_duration_seconds_bucket{table="order_book_5min",le="+Inf"} 1.0' in text
+    assert 'cloud_write_duration_seconds_count{table="order_book_5min"} 1.0' in text
+    assert 'cloud_rows_written_total{table="order_book_5min",action="inserted"} 2.0' in text
+    assert 'cloud_errors_total{stage="write",error_class="timeout"} 1.0' in text
+    assert text.endswith('\n')
+    print("[OK] ヒストグラムとテキスト形式")
+
+
+def test_request_bytes():
+    """リクエスト本文とレスポンスのContent-Lengthを送受信バイト数として数えるか"""
+    class Request:
+        url = 'https://example.supabase.co/rest/v1/rpc/upsert_order_book_max_bulk'
+        content = b'x' * 120
+
+    class Response:
+        request = Request()
+        status_code = 200
+        headers = {'content-length': '45'}
+
+    metrics = RequestMetrics()
+    metrics.on_request(Response.request)
+    metrics.on_response(Response())
+    summary = metrics.summary()
+    assert (summary['bytes_sent'], summary['bytes_received']) == (120, 45)
+    print("[OK] 送受信バイト数")
+
+
+def test_write_latency_and_retries():
+    """テーブルごとの書き込み時間と、エラー分類ごとのリトライ数を集計するか"""
+    client = LocalPostgrestClient()
+    manager = make_manager(client)
+    manager.write_pool.base_delay = 0.01
+    original_rpc = client.rpc
+    failures = [TimeoutError('timed out'), StatusError(503)]
+
+    def flaky_rpc(name, params=None):
+        if failures:
+            raise failures.pop(0)
+        return original_rpc(name, params)
+
+    client.rpc = flaky_rpc
+    manager.sync_data_async('2025-08-04T00:15:10+00:00', 1000.0, 2000.0, 115000.0)
+    assert wait_for(lambda: manager.write_pool.get_stats()['completed'] == 1)
+
+    snapshot = manager.metrics.snapshot()
+    assert snapshot['retries'] == {'timeout': 1, 'server_error': 1}
+    assert snapshot['errors'] == {'write.timeout': 1, 'write.server_error': 1}
+    assert set(snapshot['write_latency']) == {'order_book_5min', 'order_book_15min'}
+    assert snapshot['write_latency']['order_book_5min']['count'] == 1
+    text = manager.render_metrics()
+    assert 'cloud_write_retries_total{error_class="timeout"} 1.0' in text
+    assert 'cloud_write_queue_depth{queue="ready"} 0.0' in text
+    assert 'cloud_table_data_age_seconds{table="order_book_15min"}' in text
+    manager.shutdown_writes()
+    print("[OK] 書き込み時間とリトライの集計")
+
+
+def test_health_check_without_network():
+    """ヘルスチェックはリクエストを送らず、保存・受信した最新時刻から判定するか"""
+    client = LocalPostgrestClient()
+    # 5分足だけを書き込む設定にして、日足の鮮度はRealtime等で受け取った時刻だけで決まるようにする
+    manager = make_manager(client, server_rollup=True)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    boundary = now.replace(minute=now.minute - now.minute % 5)
+    manager.sync_data_async(boundary.isoformat(), 1000.0, 2000.0, 115000.0)
+    manager.update_latest_timestamps('order_book_daily', '2020-01-01T00:00:00+00:00')
+
+    before = client.request_count
+    health = manager.health_check()
+    assert client.request_count == before
+    assert health['table_status']['order_book_5min']['status'] == 'OK'
+    assert health['table_status']['order_book_daily']['status'] == 'STALE'
+    assert health['status'] == 'WARNING'
+    assert health['write_pool']['breaker_state'] == 'closed'
+    manager.shutdown_writes()
+    print("[OK] ネットワークなしのヘルスチェック")
+
+
+def test_health_check_logs_status_changes_only():
+    """ヘルスチェックを繰り返しても、状態が変わったときだけログに記録するか"""
+    logs = []
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': {}}, f)
+    manager = CloudSyncManager(config_path=config_path, client=LocalPostgrestClient(),
+                               log_callback=lambda msg, level: logs.append(msg))
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+
+    for _ in range(5):
+        manager.health_check()
+    health_logs = [msg for msg in logs if msg.startswith('[ヘルスチェック]')]
+    assert len(health_logs) == 1
+
+    manager.update_latest_timestamps('order_book_daily', '2020-01-01T00:00:00+00:00')
+    for _ in range(5):
+        assert manager.health_check()['status'] == 'WARNING'
+    health_logs = [msg for msg in logs if msg.startswith('[ヘルスチェック]')]
+    assert len(health_logs) == 2
+    assert health_logs[-1].startswith('[ヘルスチェック] WARNING')
+    manager.shutdown_writes()
+    print("[OK] ヘルスチェックは状態の変化時だけ記録")
+
+
+def test_metrics_endpoint():
+    """/metrics と /health をローカルのHTTPエンドポイントで返すか"""
+    client = LocalPostgrestClient()
+    manager = make_manager(client, metrics_port=0)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    manager.sync_data_async('2025-08-04T00:05:00+00:00', 1000.0, 2000.0, 115000.0)
+    base = f"http://127.0.0.1:{manager.metrics_server.port}"
+    before = client.request_count
+
+    with urllib.request.urlopen(base + '/metrics', timeout=5) as response:
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        text = response.read().decode('utf-8')
+    assert 'cloud_write_duration_seconds_bucket{table="order_book_5min",le="+Inf"} 1.0' in text
+    with urllib.request.urlopen(base + '/health', timeout=5) as response:
+        health = json.loads(response.read().decode('utf-8'))
+    assert health['table_status']['order_book_5min']['last_update'] == '2025-08-04T00:05:00+00:00'
+    assert client.request_count == before
+
+    manager.shutdown_writes()
+    assert manager.metrics_server is None
+    print("[OK] メトリクスのエンドポイント")
+
+
+if __name__ == "__main__":
+    print("=== クラウド同期のメトリクスのテスト ===\n")
+    test_classify_error()
+    test_histogram_and_text_format()
+    test_request_bytes()
+    test_write_latency_and_retries()
+    test_health_check_without_network()
+    test_health_check_logs_status_changes_only()
+    test_metrics_endpoint()
+    print("\n全てのテストが成功しました")
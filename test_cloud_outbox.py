@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クラウド書き込みアウトボックスのテストスクリプト
+通信断中の書き込みがファイルに残り、復帰後にタイムスタンプ順でまとめて再送されるかを確認
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from cloud_outbox import CloudOutbox
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+
+
+class OfflineSwitchClient(LocalPostgrestClient):
+    """offline=Trueの間はすべてのリクエストが接続エラーになるクライアント"""
+
+    def __init__(self):
+        super().__init__()
+        self.offline = False
+        self.replayed_timestamps = []
+
+    def _begin_request(self):
+        if self.offline:
+            raise ConnectionError("network is unreachable")
+        super()._begin_request()
+
+    def _call_rpc(self, name, params):
+        result = super()._call_rpc(name, params)
+        self.replayed_timestamps.extend(row['timestamp'] for row in params.get('p_rows', []))
+        return result
+
+
+def create_manager(client, config_dir):
+    """同期送信・即時再送のマネージャーを作成"""
+    manager = CloudSyncManager(config_path=os.path.join(config_dir, 'config.json'), client=client)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    manager.outbox_drainer.stop()
+    manager.outbox_drainer.min_age = 0
+    return manager
+
+
+def capture(manager, count, start):
+    """5分ごとのデータをcount件同期（失敗は無視）"""
+    for i in range(count):
+        timestamp = (start + timedelta(minutes=5 * i)).isoformat()
+        try:
+            manager.sync_data_async(timestamp, 1000.0 + i, 2000.0 + i, 115000.0)
+        except ConnectionError:
+            pass
+
+
+def test_replay_after_outage():
+    """通信断中の書き込みが復帰後にタイムスタンプ順で再送されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = OfflineSwitchClient()
+        manager = create_manager(client, tmp)
+        start = datetime(2025, 8, 4, 0, 5, tzinfo=timezone.utc)
+
+        client.offline = True
+        capture(manager, 6, start)
+        assert manager.outbox.count() == 9  # 5分足6件 + 15分足2件 + 30分足1件
+
+        client.offline = False
+        assert manager.outbox_drainer.drain()
+        assert manager.outbox.count() == 0
+        assert client.replayed_timestamps == sorted(client.replayed_timestamps)
+        assert len(client.table('order_book_5min').select('*').execute().data) == 6
+
+        # 同じ行を再送しても結果は変わらない
+        manager._replay_outbox_rows([manager._build_row('order_book_5min', start.isoformat(), 500.0, 500.0, 1.0)])
+        row = client.table('order_book_5min').select('*').eq('timestamp', start.isoformat()).execute().data[0]
+        assert row['ask_total'] == 1000.0 and row['bid_total'] == 2000.0
+        manager.shutdown_writes()
+        print("[OK] 通信断中の9件が復帰後にタイムスタンプ順で再送されました")
+
+
+def test_outbox_survives_restart():
+    """アウトボックスがアプリ再起動後も残り、同じ行は最大値マージされるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cloud_outbox.db')
+        row = {'table': 'order_book_1hour', 'timestamp': '2025-08-04T01:00:00+00:00', 'group_id': 'default-group',
+               'ask_total': 1000.0, 'bid_total': 2000.0, 'price': 115000.0}
+        outbox = CloudOutbox(path)
+        outbox.add([row])
+        outbox.add([dict(row, ask_total=1200.0, bid_total=1500.0, price=115100.0)])
+        outbox.close()
+
+        outbox = CloudOutbox(path)
+        pending = outbox.peek()
+        assert len(pending) == 1
+        assert pending[0]['ask_total'] == 1200.0 and pending[0]['bid_total'] == 2000.0
+        assert pending[0]['price'] == 115100.0
+
+        # 送信後に大きな値が記録された行は削除しない
+        outbox.add([dict(row, ask_total=1300.0)])
+        outbox.remove(pending)
+        assert outbox.count() == 1
+        outbox.close()
+        print("[OK] 再起動後もアウトボックスの行が最大値マージされた状態で残りました")
+
+
+def test_success_removes_rows():
+    """送信に成功した行はアウトボックスから削除されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = OfflineSwitchClient()
+        manager = create_manager(client, tmp)
+        capture(manager, 3, datetime(2025, 8, 4, 2, 0, tzinfo=timezone.utc))
+        assert manager.outbox.count() == 0
+        assert manager.get_statistics()['outbox_pending'] == 0
+        manager.shutdown_writes()
+        print("[OK] 送信済みの行はアウトボックスから削除されました")
+
+
+if __name__ == "__main__":
+    test_replay_after_outage()
+    test_outbox_survives_restart()
+    test_success_removes_rows()
+    print("\nすべてのテストが完了しました")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+キーセットページング読み出しのテストスクリプト
+1週間分の5分足の欠損が件数上限なしで全件ローカルDBへ流し込まれるか、
+中断した読み出しが保存位置から再開されるかを確認
+"""
+
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+
+START = datetime(2025, 8, 1, tzinfo=timezone.utc)
+WEEK_ROWS = 7 * 24 * 12
+
+
+def create_manager(tmp, count):
+    """5分足にcount件を持つクラウドとマネージャーを作成"""
+    client = LocalPostgrestClient()
+    rows = [{'timestamp': (START + timedelta(minutes=5 * i)).isoformat(), 'ask_total': 1000.0 + i,
+             'bid_total': 2000.0, 'price': 115000.0, 'group_id': 'default-group'} for i in range(count)]
+    client.table('order_book_5min').insert(rows).execute()
+    client.request_count = 0
+    manager = CloudSyncManager(config_path=os.path.join(tmp, 'config.json'), client=client)
+    manager.page_size = 200
+    return client, manager
+
+
+class LocalSink:
+    """ページをローカルSQLiteへ最大値マージで一括保存するシンク"""
+
+    def __init__(self, fail_after_pages=None):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE order_book_5min (timestamp TEXT PRIMARY KEY, ask_total REAL, bid_total REAL, price REAL)")
+        self.max_page = 0
+        self.pages = 0
+        self.fail_after_pages = fail_after_pages
+
+    def __call__(self, table_name, page):
+        if self.fail_after_pages is not None and self.pages >= self.fail_after_pages:
+            raise ConnectionError("connection reset")
+        self.conn.executemany(f"""
+            INSERT INTO {table_name} (timestamp, ask_total, bid_total, price) VALUES (?, ?, ?, ?)
+            ON CONFLICT(timestamp) DO UPDATE SET
+                ask_total = MAX(ask_total, excluded.ask_total),
+                bid_total = MAX(bid_total, excluded.bid_total),
+                price = excluded.price
+            WHERE excluded.ask_total > ask_total OR excluded.bid_total > bid_total
+        """, [(r['timestamp'], r['ask_total'], r['bid_total'], r['price']) for r in page])
+        self.conn.commit()
+        self.max_page = max(self.max_page, len(page))
+        self.pages += 1
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM order_book_5min").fetchone()[0]
+
+
+def test_week_gap_fully_recovered():
+    """1週間分の欠損が件数上限なしで全件取得され、1ページ分ずつ処理されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client, manager = create_manager(tmp, WEEK_ROWS + 50)
+        sink = LocalSink()
+        end = (START + timedelta(minutes=5 * WEEK_ROWS)).isoformat()
+
+        total = manager.stream_range('order_book_5min', START.isoformat(), end, sink)
+
+        assert total == WEEK_ROWS  # 開始時刻の行は含まず、終了時刻の行は含む
+        assert sink.count() == WEEK_ROWS
+        assert sink.max_page <= manager.page_size
+        assert client.request_count == WEEK_ROWS // manager.page_size + 1
+        assert len(manager.fetch_gap_data('order_book_5min', START.isoformat(), end)) == WEEK_ROWS
+        manager.shutdown_writes()
+        print(f"[OK] 1週間分{total}件が{sink.pages}ページに分けて取得されました")
+
+
+def test_resume_from_saved_position():
+    """中断した読み出しが保存位置から再開されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client, manager = create_manager(tmp, 1000)
+        end = (START + timedelta(minutes=5 * 999)).isoformat()
+
+        failing = LocalSink(fail_after_pages=3)
+        try:
+            manager.stream_range('order_book_5min', None, end, failing, job='gap:order_book_5min')
+        except ConnectionError:
+            pass
+        assert failing.count() == 600
+        saved = manager.cursor_store.get('gap:order_book_5min')
+        assert saved['position'] == (START + timedelta(minutes=5 * 599)).isoformat()
+
+        # 再開時は保存位置の後から読み出す
+        sink = LocalSink()
+        client.request_count = 0
+        total = manager.stream_range('order_book_5min', None, end, sink, job='gap:order_book_5min')
+        assert total == 400 and client.request_count == 3
+        assert manager.cursor_store.get('gap:order_book_5min') is None
+        manager.shutdown_writes()
+        print("[OK] 600件で中断した読み出しが残り400件から再開されました")
+
+
+if __name__ == "__main__":
+    test_week_gap_fully_recovered()
+    test_resume_from_saved_position()
+    print("\nすべてのテストが完了しました")
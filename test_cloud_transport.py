@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クラウド書き込み方式（cloud_transport.py）のテストスクリプト
+rest / bulk_rpc / memory の各方式が同じ最大値マージ結果になること、設定での切り替え、
+一括関数が未作成のときの切り替え、旧モジュール（cloud_sync_optimized / cloud_sync_backup）の互換を確認
+"""
+
+import importlib
+import json
+import os
+import sys
+import tempfile
+import warnings
+from cloud_sync import CloudSyncManager
+from cloud_transport import BulkRpcTransport, InMemoryTransport, RestTransport, create_transport
+from local_postgrest import LocalPostgrestClient
+
+ROWS = [
+    {'table': 'order_book_5min', 'timestamp': '2025-08-04T00:05:00+00:00', 'ask_total': 1000.0,
+     'bid_total': 2000.0, 'price': 115000.0, 'group_id': 'default-group'},
+    {'table': 'order_book_15min', 'timestamp': '2025-08-04T00:15:00+00:00', 'ask_total': 1100.0,
+     'bid_total': 2100.0, 'price': 115100.0, 'group_id': 'default-group'},
+]
+
+
+def make_manager(client, injected=None, log_callback=None, **options):
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': options}, f)
+    manager = CloudSyncManager(config_path=config_path, client=client, transport=injected,
+                               log_callback=log_callback)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    return manager
+
+
+def actions(results):
+    return {key: action for key, (action, _, _) in results.items()}
+
+
+def test_transports_agree():
+    """どの方式でも同じ行に同じ action（inserted / updated / skipped）を返すか"""
+    smaller = [dict(row, ask_total=row['ask_total'] - 1) for row in ROWS]
+    larger = [dict(ROWS[0], bid_total=2500.0, price=115500.0)]
+    expected = None
+    for name in ('rest', 'bulk_rpc', 'memory'):
+        transport = create_transport(name, LocalPostgrestClient(), 'default-group')
+        result = [actions(transport.write_rows(batch)) for batch in (ROWS, smaller, larger)]
+        if expected is None:
+            expected = result
+        assert result == expected, name
+    assert set(expected[0].values()) == {'inserted'}
+    assert set(expected[1].values()) == {'skipped'}
+    assert set(expected[2].values()) == {'updated'}
+    print("[OK] 各方式の最大値マージ結果が一致")
+
+
+def test_memory_transport():
+    """メモリ方式は既存の行をpreviousとして返し、最大値を残すか"""
+    transport = InMemoryTransport()
+    transport.write_rows(ROWS)
+    results = transport.write_rows([dict(ROWS[0], ask_total=900.0, bid_total=2200.0, price=116000.0)])
+    action, previous, current = results[('order_book_5min', ROWS[0]['timestamp'])]
+    assert action == 'updated'
+    assert previous['bid_total'] == 2000.0
+    assert (current['ask_total'], current['bid_total'], current['price']) == (1000.0, 2200.0, 116000.0)
+    assert [row['timestamp'] for row in transport.rows('order_book_5min')] == [ROWS[0]['timestamp']]
+    assert transport.get_stats() == {'requests': 2, 'rows': 3, 'transport': 'memory'}
+    print("[OK] メモリ方式の最大値マージ")
+
+
+def test_bulk_falls_back_to_rest():
+    """一括関数がないサーバーでは1行ずつの方式に切り替えるか"""
+    client = LocalPostgrestClient()
+    client.unregister_rpc('upsert_order_book_max_bulk')
+    transport = BulkRpcTransport(client, 'default-group')
+    assert set(actions(transport.write_rows(ROWS)).values()) == {'inserted'}
+    assert not transport.available
+    before = client.request_count
+    transport.write_rows(ROWS)
+    assert client.request_count - before == len(ROWS)
+    stats = transport.get_stats()
+    assert stats['bulk_available'] is False
+    assert (stats['requests'], stats['rows']) == (5, 4)  # 失敗した一括呼び出しは行数に含めない
+    print("[OK] 一括関数がない場合の切り替え")
+
+
+def test_manager_selects_transport():
+    """設定の cloud_sync.transport で書き込み方式を選ぶか"""
+    sample = ('2025-08-04T00:15:10+00:00', 1000.0, 2000.0, 115000.0)
+
+    client = LocalPostgrestClient()
+    manager = make_manager(client)
+    assert isinstance(manager.transport, BulkRpcTransport) and manager.use_rpc_upsert
+    manager.sync_data_async(*sample)
+    assert client.request_count == 1
+    manager.shutdown_writes()
+
+    client = LocalPostgrestClient()
+    manager = make_manager(client, transport='rest')
+    manager.sync_data_async(*sample)
+    assert client.request_count == 2  # 5分足と15分足を1行ずつ
+    manager.shutdown_writes()
+
+    client = LocalPostgrestClient()
+    manager = make_manager(client, use_rpc_upsert=False)
+    assert isinstance(manager.transport, RestTransport) and not manager.use_rpc_upsert
+    manager.shutdown_writes()
+
+    client = LocalPostgrestClient()
+    manager = make_manager(client, injected=InMemoryTransport())
+    manager.sync_data_async(*sample)
+    assert client.request_count == 0
+    assert manager.transport_name == 'memory'
+    assert len(manager.transport.rows('order_book_15min')) == 1
+    assert manager.get_statistics()['transport']['transport'] == 'memory'
+    assert 'cloud_transport_requests_total{transport="memory"} 1.0' in manager.render_metrics()
+    manager.shutdown_writes()
+
+    # 設定でmemoryを選んでも、クラウドへ送らない方式にはしない
+    logs = []
+    client = LocalPostgrestClient()
+    manager = make_manager(client, log_callback=lambda msg, level: logs.append((level, msg)), transport='memory')
+    assert manager.transport_name == 'bulk_rpc' and isinstance(manager.transport, BulkRpcTransport)
+    assert any(level == 'WARNING' and 'memory' in msg for level, msg in logs)
+    manager.sync_data_async(*sample)
+    assert client.request_count == 1
+    manager.shutdown_writes()
+
+    manager = make_manager(LocalPostgrestClient(), transport='carrier-pigeon')
+    assert manager.transport_name == 'bulk_rpc' and isinstance(manager.transport, BulkRpcTransport)
+    manager.shutdown_writes()
+    print("[OK] 設定による書き込み方式の選択")
+
+
+def test_legacy_modules():
+    """旧モジュールは統合したCloudSyncManagerを警告付きで返すか"""
+    for module_name in ('cloud_sync_optimized', 'cloud_sync_backup'):
+        sys.modules.pop(module_name, None)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            module = importlib.import_module(module_name)
+        assert module.CloudSyncManager is CloudSyncManager
+        assert any(issubclass(w.category, DeprecationWarning) for w in caught)
+    print("[OK] 旧モジュールの互換")
+
+
+if __name__ == "__main__":
+    print("=== クラウド書き込み方式のテスト ===\n")
+    test_transports_agree()
+    test_memory_transport()
+    test_bulk_falls_back_to_rest()
+    test_manager_selects_transport()
+    test_legacy_modules()
+    print("\n全てのテストが成功しました")
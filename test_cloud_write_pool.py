@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+クラウド書き込みワーカープールのテストスクリプト
+上限付きキュー・ワーカーを止めないリトライ・サーキットブレーカーの動作を確認
+"""
+
+import threading
+import time
+from cloud_write_pool import CloudWritePool
+
+
+def wait_until(condition, timeout=3.0):
+    """条件が成立するまで待つ"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_bounded_queue_rejects():
+    """キューが満杯のときsubmitがブロックせずFalseを返すか"""
+    pool = CloudWritePool(workers=1, max_queue=2)
+    release = threading.Event()
+    pool.submit(release.wait)
+    accepted = [pool.submit(lambda: None) for _ in range(5)]
+
+    assert not all(accepted)
+    assert pool.get_stats()['rejected'] == accepted.count(False)
+    print(f"[OK] 満杯のキューで{accepted.count(False)}件が拒否されました")
+
+
+def test_retry_does_not_block_worker():
+    """リトライ待ちの間も1つのワーカーで他の書き込みが処理されるか"""
+    pool = CloudWritePool(workers=1, max_queue=10, base_delay=0.2, jitter=0)
+    pool.start()
+    try:
+        attempts = []
+        done = []
+
+        def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise ConnectionError("timeout")
+
+        pool.submit(flaky)
+        time.sleep(0.05)
+        pool.submit(lambda: done.append(time.monotonic()))
+
+        assert wait_until(lambda: len(attempts) == 3)
+        assert done and done[0] < attempts[1]  # 2件目はバックオフ中に完了
+        assert attempts[2] - attempts[1] >= 0.35  # 2回目の待ちは倍（0.4秒）
+        stats = pool.get_stats()
+        assert stats['retried'] == 2 and stats['completed'] == 2 and stats['in_flight'] == 0
+        print("[OK] バックオフ中もワーカーが他の書き込みを処理しました")
+    finally:
+        pool.stop()
+
+
+def test_circuit_breaker_and_failure_callback():
+    """連続失敗でブレーカーが開き、リトライ上限でon_failureが呼ばれるか"""
+    failed = []
+    calls = []
+
+    def always_fail(n):
+        calls.append(n)
+        raise ConnectionError("503")
+
+    pool = CloudWritePool(workers=2, max_queue=10, max_retries=1, base_delay=0.01,
+                          breaker_threshold=3, breaker_cooldown=0.3,
+                          on_failure=lambda func, args, error: failed.append(args[0]))
+    pool.start()
+    try:
+        for n in range(6):
+            pool.submit(always_fail, n)
+
+        assert wait_until(lambda: pool.get_stats()['breaker_state'] == CloudWritePool.OPEN)
+        time.sleep(0.1)
+        calls_while_open = len(calls)
+        assert calls_while_open < 6  # 開いている間は送信しない
+
+        # クールダウン後に1件ずつ試行し、最終的にすべてon_failureへ
+        assert wait_until(lambda: len(failed) == 6, timeout=5)
+        assert pool.get_stats()['breaker_trips'] >= 2
+        print(f"[OK] ブレーカー開放中は送信が止まり（{calls_while_open}件で停止）、失敗分が通知されました")
+    finally:
+        pool.stop()
+
+
+def test_backpressure_while_breaker_open():
+    """ブレーカー開放中もバックオフ待ちを含めた件数で上限を超えたら拒否するか"""
+    pool = CloudWritePool(workers=1, max_queue=3, max_retries=5, base_delay=0.01,
+                          breaker_threshold=1, breaker_cooldown=30)
+
+    def fail():
+        raise ConnectionError("503")
+
+    pool.start()
+    try:
+        pool.submit(fail)
+        assert wait_until(lambda: pool.get_stats()['breaker_state'] == CloudWritePool.OPEN)
+        accepted = []
+        for _ in range(10):
+            accepted.append(pool.submit(lambda: None))
+            time.sleep(0.02)  # ワーカーがキューからバックオフ待ちへ移す時間
+
+        stats = pool.get_stats()
+        assert stats['queue_depth'] + stats['scheduled'] <= 3
+        assert accepted.count(True) == 2  # 失敗したタスクの再試行待ち1件 + 2件で上限
+        assert stats['rejected'] == 8
+        print(f"[OK] ブレーカー開放中も{accepted.count(False)}件を拒否しました")
+    finally:
+        pool.stop(timeout=1)
+
+
+if __name__ == "__main__":
+    test_bounded_queue_rejects()
+    test_retry_does_not_block_worker()
+    test_circuit_breaker_and_failure_callback()
+    test_backpressure_while_breaker_open()
+    print("\nすべてのテストが完了しました")
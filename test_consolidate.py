@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重複タイムスタンプ統合のテストスクリプト
+最大値選択の結果が従来のループと一致し、統合した行でもid・group_idが失われないかを確認
+"""
+
+import os
+import tempfile
+from consolidate import consolidate_max
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+
+
+def make_rows():
+    return [
+        {'id': 1, 'timestamp': '2025-08-01T00:00:00+00:00', 'ask_total': 100.0, 'bid_total': 300.0, 'price': 1.0, 'group_id': 'g'},
+        {'id': 2, 'timestamp': '2025-08-01T00:05:00+00:00', 'ask_total': 150.0, 'bid_total': 250.0, 'price': 2.0, 'group_id': 'g'},
+        {'id': 3, 'timestamp': '2025-08-01T00:00:00+00:00', 'ask_total': 120.0, 'bid_total': 200.0, 'price': 3.0, 'group_id': 'g'},
+        {'id': 4, 'timestamp': '2025-08-01T00:00:00+00:00', 'ask_total': 110.0, 'bid_total': 350.0, 'price': 4.0, 'group_id': 'g'},
+    ]
+
+
+def test_max_and_fields_kept():
+    """最大値選択・最後のprice・id/group_idの保持"""
+    rows = make_rows()
+    result = consolidate_max(rows)
+
+    assert [r['timestamp'] for r in result] == ['2025-08-01T00:00:00+00:00', '2025-08-01T00:05:00+00:00']
+    merged = result[0]
+    assert (merged['ask_total'], merged['bid_total'], merged['price']) == (120.0, 350.0, 4.0)
+    assert merged['id'] == 1 and merged['group_id'] == 'g'
+    assert result[1] is rows[1]  # 重複のない行はそのまま
+    assert rows[0]['ask_total'] == 100.0  # 入力は書き換えない
+    assert consolidate_max([]) == []
+    print("[OK] 最大値で統合され、id・group_idが保持されました")
+
+
+def test_fetch_paths_keep_group_id():
+    """取得経路の結果でgroup_idが残るか"""
+    client = LocalPostgrestClient()
+    client.table('order_book_5min').insert([
+        {'timestamp': '2025-08-01T00:00:00+00:00', 'ask_total': 100.0, 'bid_total': 200.0, 'price': 1.0, 'group_id': 'default-group'},
+        {'timestamp': '2025-08-01T00:05:00+00:00', 'ask_total': 110.0, 'bid_total': 210.0, 'price': 2.0, 'group_id': 'default-group'},
+    ]).execute()
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'), client=client)
+
+    for rows in (manager.fetch_all_data(), manager.fetch_gap_data('order_book_5min', None, '2025-08-01T00:05:00+00:00')):
+        assert len(rows) == 2 and all(r['group_id'] == 'default-group' for r in rows)
+    manager.shutdown_writes()
+    print("[OK] 取得結果にgroup_idが保持されました")
+
+
+if __name__ == "__main__":
+    test_max_and_fields_kept()
+    test_fetch_paths_keep_group_id()
+    print("\nすべてのテストが完了しました")
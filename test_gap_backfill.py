@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Realtime欠損補完コーディネーターのテストスクリプト
+INSERTイベントが連続しても、テーブルごとに範囲がまとめられ、取得は常に1本だけで、
+結果がまとめてローカルへ反映されるかを確認
+"""
+
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from gap_backfill import GapBackfillCoordinator
+from local_postgrest import LocalPostgrestClient
+
+START = datetime(2025, 8, 1, tzinfo=timezone.utc)
+
+
+def ts(i):
+    return (START + timedelta(minutes=5 * i)).isoformat()
+
+
+def test_burst_of_inserts_is_coalesced():
+    """INSERTイベントの連続が少数の取得・保存にまとめられるか"""
+    client = LocalPostgrestClient(latency=0.05)
+    client.table('order_book_5min').insert([
+        {'timestamp': ts(i), 'ask_total': 1000.0 + i, 'bid_total': 2000.0, 'price': 115000.0} for i in range(40)
+    ]).execute()
+
+    saved = []
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'), client=client,
+                               local_db_callback=lambda table, rows: saved.append((table, list(rows))))
+    manager.initialize_latest_timestamps({'order_book_5min': ts(9)})
+
+    started = time.monotonic()
+    for i in range(10, 40):
+        payload = {'event_type': 'INSERT', 'new': {'timestamp': ts(i)}}
+        manager.handle_realtime_update('order_book_5min', '5分足', payload)
+    elapsed = time.monotonic() - started
+
+    deadline = time.monotonic() + 5
+    while not manager.gap_backfill.is_idle() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stats = manager.gap_backfill.stats
+    applied = sorted(row['timestamp'] for _, rows in saved for row in rows)
+    assert elapsed < 0.05  # コールバック内でネットワーク待ちをしない
+    assert applied == [ts(i) for i in range(10, 40)]
+    assert stats['fetches'] <= 3 and len(saved) == stats['fetches']
+    assert manager.latest_timestamps['order_book_5min'] == ts(39)
+    manager.shutdown_writes()
+    print(f"[OK] 30件のINSERTイベントが{stats['fetches']}回の取得・保存にまとめられました")
+
+
+def test_one_fetch_per_table():
+    """同じテーブルの取得が同時に2本以上実行されないか"""
+    running = {}
+    max_running = {}
+    lock = threading.Lock()
+    applied = []
+
+    def fetch(table, after, until):
+        with lock:
+            running[table] = running.get(table, 0) + 1
+            max_running[table] = max(max_running.get(table, 0), running[table])
+        time.sleep(0.03)
+        with lock:
+            running[table] -= 1
+        return [{'timestamp': until}]
+
+    coordinator = GapBackfillCoordinator(fetch, lambda table, rows, until: applied.append((table, until)))
+    for i in range(1, 30):
+        for table in ('order_book_5min', 'order_book_15min'):
+            coordinator.request(table, ts(0), ts(i))
+        time.sleep(0.005)
+
+    deadline = time.monotonic() + 5
+    while not coordinator.is_idle() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    coordinator.stop()
+
+    assert max_running == {'order_book_5min': 1, 'order_book_15min': 1}
+    assert ('order_book_5min', ts(29)) in applied and ('order_book_15min', ts(29)) in applied
+    assert coordinator.stats['merged_requests'] + coordinator.stats['skipped_requests'] > 0
+    print(f"[OK] テーブルごとに取得は1本ずつ（{coordinator.stats['fetches']}回）で実行されました")
+
+
+def test_failure_keeps_pending_range():
+    """取得に失敗したとき、実行中に届いた要求の始端（最初からを含む）を失わないか"""
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch(table, after, until):
+        calls.append((after, until))
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            raise ConnectionError("503")
+        return [{'timestamp': until}]
+
+    coordinator = GapBackfillCoordinator(fetch, lambda table, rows, until: None)
+    coordinator.request('order_book_5min', ts(5), ts(10))
+    assert started.wait(5)
+    # 取得中に「最初から」の要求が届く（実行中の範囲の終端まで切り詰めて保留）
+    coordinator.request('order_book_5min', None, ts(12))
+    release.set()
+
+    deadline = time.monotonic() + 5
+    while coordinator.stats['errors'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # 失敗後の次の要求で、保留していた範囲を最初から再取得する
+    coordinator.request('order_book_5min', ts(12), ts(13))
+    while not coordinator.is_idle() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    coordinator.stop()
+
+    assert calls[0] == (ts(5), ts(10))
+    assert calls[1:] == [(None, ts(13))], calls
+    print("[OK] 取得失敗時も保留中の範囲を最初から再取得しました")
+
+
+if __name__ == "__main__":
+    test_burst_of_inserts_is_coalesced()
+    test_one_fetch_per_table()
+    test_failure_keeps_pending_range()
+    print("\nすべてのテストが完了しました")
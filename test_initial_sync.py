@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時の差分同期のテストスクリプト
+ローカルの最新タイムスタンプ以降の行だけがページ単位で取得され、7テーブルが並行して取得されるかを確認
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager, TIMEFRAME_NAMES
+from local_postgrest import LocalPostgrestClient
+
+START = datetime(2025, 8, 1, tzinfo=timezone.utc)
+
+
+def create_cloud(count):
+    """各テーブルにcount件のデータを持つクラウドを作成"""
+    client = LocalPostgrestClient()
+    for table in TIMEFRAME_NAMES:
+        rows = [{'timestamp': (START + timedelta(minutes=5 * i)).isoformat(), 'ask_total': 1000.0 + i,
+                 'bid_total': 2000.0 + i, 'price': 115000.0, 'group_id': 'default-group'} for i in range(count)]
+        client.table(table).insert(rows).execute()
+    client.request_count = 0
+    return client
+
+
+def create_manager(client):
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    return CloudSyncManager(config_path=config_path, client=client)
+
+
+def test_fetch_only_newer_rows():
+    """ローカル最新タイムスタンプ以降の行だけが取得されるか"""
+    client = create_cloud(1000)
+    manager = create_manager(client)
+    watermark = (START + timedelta(minutes=5 * 994)).isoformat()
+
+    data = manager.fetch_initial_data(since={table: watermark for table in TIMEFRAME_NAMES})
+
+    for table in TIMEFRAME_NAMES:
+        assert len(data[table]) == 6, table  # 最新タイムスタンプの行 + 新しい5行
+    assert client.request_count == 7
+    print(f"[OK] 差分のみ取得されました（7テーブル合計{sum(len(v) for v in data.values())}件、{client.request_count}リクエスト）")
+
+
+def test_cursor_pagination():
+    """ページサイズを超える差分もすべて取得されるか"""
+    client = create_cloud(250)
+    manager = create_manager(client)
+
+    manager.page_size = 100
+    data = manager.fetch_initial_data(since={'order_book_5min': START.isoformat()})
+
+    timestamps = [row['timestamp'] for row in data['order_book_5min']]
+    assert len(timestamps) == 250 and len(set(timestamps)) == 250
+    assert client.rpc_calls == {}
+    print("[OK] 250件が100件ずつのページで取得されました")
+
+
+def test_tables_fetched_concurrently():
+    """7テーブルが並行して取得されるか"""
+    client = create_cloud(10)
+    client.latency = 0.1
+    manager = create_manager(client)
+    watermark = START.isoformat()
+
+    started = time.monotonic()
+    manager.fetch_initial_data(since={table: watermark for table in TIMEFRAME_NAMES})
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.5  # 逐次なら0.7秒以上
+    print(f"[OK] 7テーブルを{elapsed:.2f}秒で取得しました")
+
+
+def test_empty_table_fetches_full_history():
+    """ローカルが空のテーブル（since=None）はクラウドの全期間を取得するか"""
+    client = create_cloud(3000)  # 5分間隔で10日分以上
+    manager = create_manager(client)
+    manager.page_size = 1000
+    received = {}
+
+    def sink(table_name, page):
+        received.setdefault(table_name, []).extend(page)
+
+    counts = manager.sync_tables_to_local({table: None for table in TIMEFRAME_NAMES}, sink)
+
+    for table in TIMEFRAME_NAMES:
+        assert counts[table] == 3000, table
+        assert received[table][0]['timestamp'] == START.isoformat()
+    print("[OK] 空のテーブルは全期間（3000件）を取得しました")
+
+
+if __name__ == "__main__":
+    test_fetch_only_newer_rows()
+    test_cursor_pagination()
+    test_empty_table_fetches_full_history()
+    test_tables_fetched_concurrently()
+    print("\nすべてのテストが完了しました")
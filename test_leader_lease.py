@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+リースによるリーダー選出のテストスクリプト
+LocalPostgrestClient（acquire_collector_lease / release_collector_lease のローカル実装）を共有する
+複数のクライアントで、リーダーだけが書き込み、リースが切れると引き継ぎ、
+フォロワーはリーダーが保存していない境界だけを補完するかを確認
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from leader_lease import LeaderLease
+from local_postgrest import LocalPostgrestClient
+
+START = datetime(2025, 8, 4, tzinfo=timezone.utc)
+
+
+def make_manager(client, holder_id, **options):
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': dict({'leader_election': True, 'leader_holder_id': holder_id}, **options)}, f)
+    manager = CloudSyncManager(config_path=config_path, client=client)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    written = []
+    original = manager.batch_writer.write_batch
+    manager.batch_writer.write_batch = lambda rows: (written.extend(rows), original(rows))[1]
+    return manager, written
+
+
+def sample(minutes, seconds=20):
+    return ((START + timedelta(minutes=minutes, seconds=seconds)).isoformat(), 1000.0 + minutes, 2000.0, 115000.0)
+
+
+def test_single_leader_and_release():
+    """同じグループでリーダーは1台だけで、解放すると他のクライアントが引き継ぐか"""
+    client = LocalPostgrestClient()
+    a = LeaderLease(client, 'g', holder_id='a')
+    b = LeaderLease(client, 'g', holder_id='b')
+    other = LeaderLease(client, 'other-group', holder_id='b2')
+    assert a.renew() is True
+    assert b.renew() is False
+    assert b.leader == 'a'
+    assert other.renew() is True
+    # 更新しても保持者は変わらない
+    assert a.renew() is True and b.renew() is False
+
+    a.release()
+    assert not a.is_leader()
+    assert b.renew() is True
+    assert a.renew() is False
+    print("[OK] リーダーは1台だけ・解放で引き継ぎ")
+
+
+def test_lease_expires():
+    """更新が止まったリーダーはTTLの2/3で自分からやめ、TTL後に他が引き継ぐか"""
+    client = LocalPostgrestClient()
+    now = [0.0]
+    a = LeaderLease(client, 'g', holder_id='a', ttl_seconds=0.3, clock=lambda: now[0])
+    b = LeaderLease(client, 'g', holder_id='b', ttl_seconds=0.3)
+    assert a.renew()
+    now[0] = 0.19
+    assert a.is_leader()
+    now[0] = 0.21
+    assert not a.is_leader()
+    assert b.renew() is False
+    time.sleep(0.35)
+    assert b.renew() is True
+    assert a.renew() is False
+    assert a.stats['lost'] == 1
+    print("[OK] リースの失効と引き継ぎ")
+
+
+def test_missing_function_falls_back():
+    """リース関数がないサーバーでは全員リーダーとして扱うか"""
+    client = LocalPostgrestClient()
+    client.unregister_rpc('acquire_collector_lease')
+    lease = LeaderLease(client, 'g', holder_id='a')
+    assert lease.renew() is True
+    assert lease.is_leader() and not lease.available
+    print("[OK] 関数がない場合は全員が書き込み")
+
+
+def test_only_leader_writes():
+    """リーダーだけが書き込み、フォロワーは保存済みの境界を送らないか"""
+    client = LocalPostgrestClient()
+    leader, leader_written = make_manager(client, 'a')
+    leader.leader_lease.renew()
+    follower, follower_written = make_manager(client, 'b')
+    follower.leader_lease.renew()
+    assert leader.leader_lease.is_leader() and not follower.leader_lease.is_leader()
+
+    for minutes in range(0, 31, 5):
+        leader.sync_data_async(*sample(minutes))
+        leader.leader_lease.renew()
+        follower.leader_lease.renew()
+        follower.sync_data_async(*sample(minutes, seconds=40))
+    assert leader_written
+    assert follower_written == []
+    assert follower.get_statistics()['leader']['synced_until'] == (START + timedelta(minutes=30)).isoformat()
+    leader.shutdown_writes()
+    follower.shutdown_writes()
+    print("[OK] リーダーだけが書き込み")
+
+
+def test_follower_takes_over_after_lapse():
+    """リーダーが止まるとフォロワーがリースを引き継ぎ、未保存の境界を送るか"""
+    client = LocalPostgrestClient()
+    leader, _ = make_manager(client, 'a', leader_lease_ttl_seconds=0.3)
+    leader.leader_lease.renew()
+    follower, follower_written = make_manager(client, 'b', leader_lease_ttl_seconds=0.3)
+    follower.leader_lease.renew()
+
+    leader.sync_data_async(*sample(0))
+    leader.leader_lease.renew()
+    follower.leader_lease.renew()
+    follower.sync_data_async(*sample(0, seconds=40))
+    # リーダーが異常終了（リースを解放しない）
+    leader.leader_lease.stop(release=False)
+    follower.sync_data_async(*sample(5, seconds=40))
+    assert follower_written == []
+
+    time.sleep(0.35)
+    assert follower.leader_lease.renew()
+    follower.sync_data_async(*sample(6, seconds=40))
+    # 00:05の5分足はリーダーが保存していないため、引き継いだ時点で送る
+    assert [(row['table'], row['timestamp']) for row in follower_written] == \
+        [('order_book_5min', (START + timedelta(minutes=5)).isoformat())]
+    leader.shutdown_writes()
+    follower.shutdown_writes()
+    print("[OK] リース失効後の引き継ぎ")
+
+
+def test_follower_gap_fill():
+    """リーダーが保存していない境界は、猶予を過ぎたらフォロワーが補完するか"""
+    client = LocalPostgrestClient()
+    leader = LeaderLease(client, 'default-group', holder_id='a')
+    leader.renew()
+    follower, follower_written = make_manager(client, 'b', leader_gap_fill_seconds=180)
+    follower.leader_lease.renew()
+
+    for minutes in range(3):
+        follower.sync_data_async(*sample(minutes))
+    assert follower_written == []
+    follower.sync_data_async(*sample(3))
+    assert [row['timestamp'] for row in follower_written] == [START.isoformat()] * 7
+    assert follower.get_statistics()['leader_gap_fills'] == 7
+    follower.shutdown_writes()
+    print("[OK] フォロワーによる欠損の補完")
+
+
+def test_follower_waits_for_minute_tier_upload():
+    """1分足の階層を使っていても、フォロワーがリーダーと重複して書き込まないか"""
+    client = LocalPostgrestClient()
+    leader, leader_written = make_manager(client, 'a', minute_tier_enabled=True)
+    leader.leader_lease.renew()
+    follower, follower_written = make_manager(client, 'b', minute_tier_enabled=True, leader_gap_fill_seconds=180)
+    follower.leader_lease.renew()
+
+    for minutes in range(31):
+        leader.sync_data_async(*sample(minutes))
+        leader.leader_lease.renew()
+        follower.leader_lease.renew()
+        follower.sync_data_async(*sample(minutes, seconds=40))
+    assert any(row['table'] == 'order_book_1min' for row in leader_written)
+    assert follower_written == []
+    assert follower.get_statistics()['leader_gap_fills'] == 0
+
+    # リーダーが止まっても、フォロワーが補完するのは5分足などの境界だけ
+    leader.leader_lease.stop(release=False)
+    for minutes in range(31, 45):
+        follower.sync_data_async(*sample(minutes, seconds=40))
+    assert follower_written
+    assert 'order_book_1min' not in {row['table'] for row in follower_written}
+    leader.shutdown_writes()
+    follower.shutdown_writes()
+
+    # 猶予は補完対象の区間（既定は3区間）を超えない
+    manager, _ = make_manager(LocalPostgrestClient(), 'c', leader_gap_fill_seconds=3600)
+    assert manager._leader_gap_fill_for('order_book_5min') == timedelta(minutes=15)
+    assert manager._leader_gap_fill_for('order_book_1hour') == timedelta(hours=1)
+    manager.shutdown_writes()
+    print("[OK] 1分足はリーダーのまとめ送信に任せ、猶予は時間足ごとに制限")
+
+
+if __name__ == "__main__":
+    print("=== リーダー選出のテスト ===\n")
+    test_single_leader_and_release()
+    test_lease_expires()
+    test_missing_function_falls_back()
+    test_only_leader_writes()
+    test_follower_takes_over_after_lapse()
+    test_follower_gap_fill()
+    test_follower_waits_for_minute_tier_upload()
+    print("\n全てのテストが成功しました")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ローカルRealtimeサーバーのテストスクリプト
+RealtimeSyncがローカルサーバーに購読でき、配信したUPDATEイベントがgroup_idのフィルタどおりに届くか、
+サーバー側から切断したときに再接続するか、
+CloudSyncManager経由でローカルDBへの一括反映まで届くかを確認
+"""
+
+import json
+import os
+import tempfile
+import time
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+from local_realtime_server import LocalRealtimeServer, create_local_realtime_client, LOCAL_ANON_KEY
+from realtime_sync import RealtimeSync, STATE_SUBSCRIBED
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def make_config(url, **extra):
+    cloud_sync = {'enabled': True, 'url': url, 'anon_key': LOCAL_ANON_KEY, 'group_id': 'test-group'}
+    cloud_sync.update(extra)
+    return {'cloud_sync': cloud_sync}
+
+
+def record(timestamp, ask, group_id='test-group'):
+    return {'id': 1, 'timestamp': timestamp, 'ask_total': ask, 'bid_total': ask * 2,
+            'price': 100000.0, 'group_id': group_id}
+
+
+def test_subscribe_and_receive():
+    """購読してUPDATEイベントを受信し、他グループのイベントは届かないか"""
+    server = LocalRealtimeServer()
+    url = server.start()
+    received = []
+    realtime = RealtimeSync(make_config(url), client_factory=create_local_realtime_client)
+    try:
+        assert realtime.start(update_callback=lambda t, n, data, e: received.append((t, e, data['ask_total'])))
+        assert wait_until(lambda: realtime.state == STATE_SUBSCRIBED)
+        assert realtime.stats['subscribe_ms'] is not None
+        assert server.subscriber_count() == 1
+
+        server.publish('order_book_15min', record('2025-01-01T00:00:00+00:00', 10.0))
+        server.publish('order_book_15min', record('2025-01-01T00:00:00+00:00', 99.0, group_id='other'))
+        server.publish('order_book_daily', record('2025-01-01T00:00:00+00:00', 20.0), event_type='INSERT')
+        assert wait_until(lambda: len(received) == 2)
+        time.sleep(0.1)
+        assert received == [('order_book_15min', 'UPDATE', 10.0), ('order_book_daily', 'INSERT', 20.0)]
+        assert realtime.stats['events'] == {'order_book_15min': 1, 'order_book_daily': 1}
+        assert realtime.stats['lag_ms'] is not None
+    finally:
+        realtime.stop()
+        server.stop()
+    print("[OK] 購読とイベント受信")
+
+
+def test_reconnect_after_server_drop():
+    """サーバー側で接続を切ると再接続して再購読するか"""
+    server = LocalRealtimeServer()
+    url = server.start()
+    reconnects = []
+    realtime = RealtimeSync(make_config(url, realtime_reconnect_base_seconds=0.05),
+                            client_factory=create_local_realtime_client)
+    try:
+        realtime.start(update_callback=lambda *args: None, reconnect_callback=lambda: reconnects.append(1))
+        assert wait_until(lambda: realtime.state == STATE_SUBSCRIBED)
+        server.drop_connections()
+        assert wait_until(lambda: reconnects, timeout=10)
+        assert wait_until(lambda: realtime.state == STATE_SUBSCRIBED and server.subscriber_count() == 1)
+        assert realtime.stats['disconnects'] == 1
+        assert server.stats['joins'] == 2
+    finally:
+        realtime.stop()
+        server.stop()
+    print("[OK] 切断後の再接続")
+
+
+def test_manager_end_to_end():
+    """配信したイベントがCloudSyncManagerのバッチ反映まで届くか"""
+    server = LocalRealtimeServer()
+    url = server.start()
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(make_config(url, realtime_batch_window_ms=50), f)
+    batches = []
+    manager = CloudSyncManager(config_path=config_path, client=LocalPostgrestClient(),
+                               local_batch_callback=batches.append,
+                               realtime_client_factory=create_local_realtime_client)
+    try:
+        assert manager.setup_realtime_sync()
+        assert wait_until(lambda: manager.realtime_sync.state == STATE_SUBSCRIBED)
+        for ask in (1.0, 2.0, 3.0):
+            server.publish('order_book_5min', record('2025-01-01T00:00:00+00:00', ask))
+        server.publish('order_book_1hour', record('2025-01-01T00:00:00+00:00', 5.0))
+        assert wait_until(lambda: sum(len(rows) for b in batches for rows in b.values()) >= 2)
+        applied = {t: rows[-1]['ask_total'] for b in batches for t, rows in b.items()}
+        assert applied == {'order_book_5min': 3.0, 'order_book_1hour': 5.0}
+    finally:
+        manager.cleanup_realtime()
+        manager.shutdown_writes()
+        server.stop()
+    print("[OK] CloudSyncManagerまでの反映")
+
+
+if __name__ == "__main__":
+    print("=== ローカルRealtimeサーバーのテスト ===\n")
+    test_subscribe_and_receive()
+    test_reconnect_after_server_drop()
+    test_manager_end_to_end()
+    print("\n全てのテストが成功しました")
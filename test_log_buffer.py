@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ログリングバッファのテストスクリプト
+容量超過時のファイル退避、表示レベルのフィルタ、退避ファイルを含む検索を確認
+"""
+
+import os
+import tempfile
+from log_buffer import LogRingBuffer
+
+
+def test_capacity_and_spill():
+    """容量を超えたログがファイルに退避されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_path = os.path.join(tmp, 'spill.log')
+        buffer = LogRingBuffer(capacity=10, spill_path=spill_path)
+
+        for i in range(25):
+            buffer.append("INFO", f"[00:00:00] INFO: message {i}\n")
+
+        assert len(buffer) == 10
+        assert buffer.stats['spilled'] == 15
+        with open(spill_path, encoding='utf-8') as f:
+            spilled = f.readlines()
+        assert spilled[0] == "[00:00:00] INFO: message 0\n"
+        assert len(spilled) == 15
+        print("[OK] 容量超過分の15件がファイルに退避されました")
+
+
+def test_extend_spills_once_per_batch():
+    """まとめて追加したログの溢れ分が1回の書き込みで退避されるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_path = os.path.join(tmp, 'spill.log')
+        buffer = LogRingBuffer(capacity=10, spill_path=spill_path, min_level='INFO')
+        spill_calls = []
+        original_spill = buffer._spill
+        buffer._spill = lambda entries: (spill_calls.append(len(entries)), original_spill(entries))
+
+        buffer.extend([("INFO", f"message {i}\n") for i in range(10)])
+        visible = buffer.extend([("DEBUG" if i % 2 else "INFO", f"message {i}\n") for i in range(10, 40)])
+
+        assert spill_calls == [30]
+        assert buffer.stats['spilled'] == 30
+        assert buffer.stats['appended'] == 40
+        assert visible == [f"message {i}\n" for i in range(10, 40, 2)]
+        with open(spill_path, encoding='utf-8') as f:
+            assert f.readlines() == [f"message {i}\n" for i in range(30)]
+        print("[OK] 30件の溢れを1回の書き込みで退避しました")
+
+
+def test_level_filter():
+    """表示レベルで表示対象が絞り込まれるか"""
+    buffer = LogRingBuffer(capacity=100)
+    assert buffer.append("DEBUG", "debug\n")
+    buffer.append("INFO", "info\n")
+    buffer.append("ERROR", "error\n")
+
+    buffer.set_min_level("WARNING")
+    assert not buffer.is_visible("INFO")
+    assert buffer.visible_entries() == ["error\n"]
+
+    buffer.set_min_level("DEBUG")
+    assert buffer.visible_entries(limit=2) == ["info\n", "error\n"]
+    print("[OK] 表示レベルによるフィルタが正しく動作しました")
+
+
+def test_search_across_spill():
+    """退避ファイルとメモリの両方から検索できるか"""
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_path = os.path.join(tmp, 'spill.log')
+        buffer = LogRingBuffer(capacity=5, spill_path=spill_path)
+
+        for i in range(20):
+            level = "ERROR" if i % 4 == 0 else "INFO"
+            buffer.append(level, f"{level}: message {i}\n")
+
+        results = buffer.search("error")
+        assert results == [f"ERROR: message {i}\n" for i in range(0, 20, 4)]
+        print(f"[OK] 退避ファイルを含めて{len(results)}件を検索できました")
+
+
+if __name__ == "__main__":
+    test_capacity_and_spill()
+    test_extend_spills_once_per_batch()
+    test_level_filter()
+    test_search_across_spill()
+    print("\nすべてのテストが完了しました")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+1分足のクラウド階層のテストスクリプト
+1分足が送信の境界でまとめて（他の時間足と同じ一括upsertで）送られるか、
+保持期間より古い1分足が5分足へ間引かれてから削除されるかを
+LocalPostgrestClient（downsample_order_book_1min のローカル実装）で確認
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient, LocalPostgrestError
+from minute_tier import MinuteTierBuffer, downsample_cutoff, downsample_minute_rows
+from sync_scheduler import SyncScheduler
+
+START = datetime(2025, 8, 4, tzinfo=timezone.utc)
+
+
+def make_manager(client, **options):
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': dict({'minute_tier_enabled': True}, **options)}, f)
+    manager = CloudSyncManager(config_path=config_path, client=client)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    return manager
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def minute_row(dt, ask, group_id='g'):
+    return {'table': 'order_book_1min', 'timestamp': dt.isoformat(), 'ask_total': ask,
+            'bid_total': ask * 2, 'price': 115000.0 + ask, 'group_id': group_id}
+
+
+def test_buffer_flushes_on_upload_boundary():
+    """送信の境界をまたいだ時点で、統合済みの行をまとめて返すか"""
+    buffer = MinuteTierBuffer(upload_minutes=15)
+    for minute in range(1, 15):
+        assert buffer.add([minute_row(START + timedelta(minutes=minute), 100.0)]) == []
+    # 同じタイムスタンプは最大値で1行に統合
+    assert buffer.add([minute_row(START + timedelta(minutes=3), 150.0)]) == []
+    rows = buffer.add([minute_row(START + timedelta(minutes=15), 100.0)])
+    assert [row['timestamp'] for row in rows] == [(START + timedelta(minutes=m)).isoformat() for m in range(1, 16)]
+    assert rows[2]['ask_total'] == 150.0
+    assert buffer.pending_count() == 0
+    assert buffer.stats['uploads'] == 1
+    print("[OK] 送信の境界でまとめて送信")
+
+
+def test_scheduler_grace_limited_to_interval():
+    """1分足では猶予時間が1分を超えず、次の区間のサンプルを前の境界に使わないか"""
+    scheduler = SyncScheduler(intervals={'order_book_1min': 1}, grace_seconds=240)
+    due = scheduler.on_sample((START + timedelta(minutes=1, seconds=30)).isoformat(), 1.0, 2.0, 3.0)
+    assert [boundary for _, boundary, *_ in due] == [(START + timedelta(minutes=1)).isoformat()]
+    print("[OK] 1分足の猶予時間")
+
+
+def test_minute_rows_share_requests():
+    """1分足が15分足の境界で他の時間足と同じリクエストにまとめて送られるか"""
+    client = LocalPostgrestClient()
+    manager = make_manager(client)
+    manager.use_downsample = False
+    batches = []
+    original = manager.batch_writer.write_batch
+    manager.batch_writer.write_batch = lambda rows: (batches.append(rows), original(rows))[1]
+
+    for minute in range(32):
+        sample = START + timedelta(minutes=minute, seconds=20)
+        manager.sync_data_async(sample.isoformat(), 1000.0 + minute, 2000.0, 115000.0)
+    manager.shutdown_writes()
+
+    minute_batches = [[row for row in rows if row['table'] == 'order_book_1min'] for rows in batches]
+    minute_batches = [rows for rows in minute_batches if rows]
+    # 00:00〜00:15、00:16〜00:30、終了時の00:31
+    assert [len(rows) for rows in minute_batches] == [16, 15, 1]
+    # 1分足のためだけのリクエストは終了時の1回だけ
+    assert sum(1 for rows in batches if {row['table'] for row in rows} == {'order_book_1min'}) == 1
+    # 1分足以外の送信回数は1分足なしの場合と同じ（5分足の境界ごと）
+    assert len(batches) == 7 + 1
+
+    saved = client.table('order_book_1min').select('*').order('timestamp').execute().data
+    assert len(saved) == 32
+    assert saved[5]['timestamp'] == '2025-08-04T00:05:00+00:00'
+    assert saved[5]['ask_total'] == 1005.0
+    assert manager.get_statistics()['minute_tier']['uploaded_rows'] == 32
+    print("[OK] 1分足を他の時間足とまとめて送信")
+
+
+def test_downsample_and_retention():
+    """保持期間より古い1分足を5分足へ間引いてから削除し、新しい1分足は残すか"""
+    client = LocalPostgrestClient()
+    manager = make_manager(client, minute_tier_retention_days=1, group_id='g')
+    cutoff = downsample_cutoff(datetime.now(timezone.utc), 1)
+
+    old = [minute_row(cutoff - timedelta(minutes=10) + timedelta(minutes=m), 100.0 + m) for m in range(10)]
+    old[0]['timestamp'] = (cutoff - timedelta(minutes=10, seconds=-30)).isoformat()
+    recent = [minute_row(cutoff + timedelta(minutes=m), 200.0 + m) for m in range(3)]
+    other_group = [minute_row(cutoff - timedelta(minutes=5), 999.0, group_id='other')]
+    rows = old + recent + other_group
+    client.table('order_book_1min').insert([{k: v for k, v in row.items() if k != 'table'} for row in rows]).execute()
+    # 既存の5分足の方が大きい場合は最大値マージで残る
+    client.table('order_book_5min').insert([{
+        'timestamp': (cutoff - timedelta(minutes=5)).isoformat(), 'ask_total': 500.0, 'bid_total': 0.0,
+        'price': 1.0, 'group_id': 'g'}]).execute()
+
+    counts = manager.downsample_minute_tier()
+    assert counts == {'downsampled': 2, 'deleted': 10}, counts
+    manager.shutdown_writes()
+
+    five = [(r['timestamp'], r['ask_total']) for r in
+            client.table('order_book_5min').select('*').eq('group_id', 'g').order('timestamp').execute().data]
+    assert five == [((cutoff - timedelta(minutes=10)).isoformat(), 100.0),
+                    ((cutoff - timedelta(minutes=5)).isoformat(), 500.0)], five
+    remaining = client.table('order_book_1min').select('*').execute().data
+    assert sorted(r['ask_total'] for r in remaining) == [200.0, 201.0, 202.0, 999.0]
+    print("[OK] 1分足の間引きと保持期間")
+
+
+def test_downsample_rejects_unsafe_arguments():
+    """グループなし・保持0日の呼び出しは拒否し、設定の保持日数は1日以上に丸めるか"""
+    client = LocalPostgrestClient()
+    now = datetime.now(timezone.utc)
+    client.table('order_book_1min').insert([
+        {'timestamp': (now - timedelta(hours=h)).isoformat(), 'ask_total': 1.0, 'bid_total': 2.0,
+         'price': 3.0, 'group_id': group_id} for h in (1, 2) for group_id in ('g', 'other')]).execute()
+
+    for params in ({'p_retention_days': 1}, {'p_group_id': None, 'p_retention_days': 1},
+                   {'p_group_id': 'g', 'p_retention_days': 0}, {'p_group_id': 'g', 'p_retention_days': -3}):
+        try:
+            client.rpc('downsample_order_book_1min', params).execute()
+        except LocalPostgrestError:
+            pass
+        else:
+            raise AssertionError(params)
+    assert len(client.table('order_book_1min').select('*').execute().data) == 4
+
+    manager = make_manager(client, minute_tier_retention_days=0, group_id='g')
+    assert manager.minute_tier_retention_days == 1
+    assert manager.downsample_minute_tier() == {'downsampled': 0, 'deleted': 0}
+    assert len(client.table('order_book_1min').select('*').execute().data) == 4
+    manager.shutdown_writes()
+    print("[OK] 危険な引数の拒否と保持日数の下限")
+
+
+def test_downsample_failure_counts_against_pool():
+    """間引きの失敗がワーカープールに失敗として数えられ、関数なしの場合だけ黙って止めるか"""
+    client = LocalPostgrestClient()
+    manager = make_manager(client, group_id='g')
+    manager.write_pool.max_retries = 1
+    original_rpc = client.rpc
+
+    def failing_rpc(name, params):
+        if name == 'downsample_order_book_1min':
+            raise RuntimeError('503 Service Unavailable')
+        return original_rpc(name, params)
+
+    client.rpc = failing_rpc
+    try:
+        manager.downsample_minute_tier()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('エラーが送出されていません')
+
+    assert manager.write_pool.submit(manager.downsample_minute_tier)
+    assert wait_for(lambda: manager.write_pool.get_stats()['failed'] == 1)
+    assert manager.write_pool.get_stats()['completed'] == 0
+    assert manager.use_downsample
+
+    client.rpc = original_rpc
+    client.unregister_rpc('downsample_order_book_1min')
+    assert manager.downsample_minute_tier() is None
+    assert not manager.use_downsample
+    manager.shutdown_writes()
+    print("[OK] 間引きの失敗をプールが失敗として数える")
+
+
+def test_downsample_rule():
+    """5分境界から猶予時間内の最も早い1分足を5分足の値にするか"""
+    rows = [minute_row(START + timedelta(minutes=m), 100.0 + m) for m in (4, 6, 7, 13)]
+    result = downsample_minute_rows(rows)
+    assert [(r['timestamp'], r['ask_total']) for r in result] == [
+        ((START + timedelta(minutes=5)).isoformat(), 106.0),
+        ((START + timedelta(minutes=10)).isoformat(), 113.0)]
+    print("[OK] 間引きの規則")
+
+
+def test_minute_tier_to_local():
+    """クラウドの1分足をページ単位でローカルへ流すか（無効なら取得しない）"""
+    client = LocalPostgrestClient()
+    rows = [minute_row(START + timedelta(minutes=m), 100.0 + m, group_id='default-group') for m in range(5)]
+    client.table('order_book_1min').insert([{k: v for k, v in row.items() if k != 'table'} for row in rows]).execute()
+
+    received = []
+    manager = make_manager(client, page_size=2)
+    count = manager.sync_minute_tier_to_local(rows[1]['timestamp'], lambda table, page: received.extend(page))
+    manager.shutdown_writes()
+    assert count == 4
+    assert [r['ask_total'] for r in received] == [101.0, 102.0, 103.0, 104.0]
+
+    manager = make_manager(client, minute_tier_enabled=False)
+    assert manager.sync_minute_tier_to_local(None, lambda table, page: received.extend(page)) == 0
+    manager.shutdown_writes()
+    print("[OK] 1分足のローカルへの取り込み")
+
+
+if __name__ == "__main__":
+    print("=== 1分足のクラウド階層のテスト ===\n")
+    test_buffer_flushes_on_upload_boundary()
+    test_scheduler_grace_limited_to_interval()
+    test_minute_rows_share_requests()
+    test_downsample_and_retention()
+    test_downsample_rejects_unsafe_arguments()
+    test_downsample_failure_counts_against_pool()
+    test_downsample_rule()
+    test_minute_tier_to_local()
+    print("\n全てのテストが成功しました")
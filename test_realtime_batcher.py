@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Realtimeイベントのマイクロバッチのテストスクリプト
+時間窓内のイベントが(テーブル, タイムスタンプ)ごとに最後の値へまとめられるか、
+CloudSyncManagerのUPDATEイベントが1回の反映にまとめられるかを確認
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+from realtime_batcher import RealtimeBatcher
+from realtime_sync import RealtimeSync
+
+
+def row(timestamp, ask, bid, price=100.0):
+    return {'timestamp': timestamp, 'ask_total': ask, 'bid_total': bid, 'price': price}
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_last_value_wins():
+    """同じテーブル・タイムスタンプは最後の値だけが反映されるか"""
+    applied = []
+    batcher = RealtimeBatcher(applied.append, window_seconds=60)
+    batcher.submit('order_book_5min', row('2025-01-01T00:00:00+00:00', 10, 20))
+    batcher.submit('order_book_5min', row('2025-01-01T00:00:00+00:00', 5, 30))
+    batcher.submit('order_book_15min', row('2025-01-01T00:00:00+00:00', 1, 2))
+    batcher.submit('order_book_5min', row('2025-01-01T00:05:00+00:00', 7, 8))
+    assert batcher.pending_count() == 3
+    batcher.flush()
+
+    assert len(applied) == 1
+    batch = applied[0]
+    # 最大値ではなく最後に届いた値を採用する
+    assert batch['order_book_5min'][0]['ask_total'] == 5
+    assert batch['order_book_5min'][0]['bid_total'] == 30
+    assert [r['timestamp'] for r in batch['order_book_5min']] == [
+        '2025-01-01T00:00:00+00:00', '2025-01-01T00:05:00+00:00']
+    assert len(batch['order_book_15min']) == 1
+    assert batcher.stats['events'] == 4
+    assert batcher.stats['superseded_events'] == 1
+    assert batcher.stats['batches'] == 1
+    assert batcher.stats['rows_applied'] == 3
+    print("[OK] 最後の値だけを反映")
+
+
+def test_window_flushes_once():
+    """時間窓内のイベントがタイマーで1回にまとめて反映されるか"""
+    applied = []
+    batcher = RealtimeBatcher(applied.append, window_seconds=0.1)
+    for i in range(20):
+        batcher.submit('order_book_5min', row(f'2025-01-01T00:{i:02d}:00+00:00', i, i))
+    assert applied == []
+    assert wait_until(lambda: applied)
+    time.sleep(0.15)
+    assert len(applied) == 1
+    assert len(applied[0]['order_book_5min']) == 20
+    assert batcher.stats['delay_ms'] is not None
+    print("[OK] 時間窓ごとに1回反映")
+
+
+def test_zero_window_applies_immediately():
+    """時間窓0ならsubmitごとに反映されるか"""
+    applied = []
+    batcher = RealtimeBatcher(applied.append, window_seconds=0)
+    batcher.submit('order_book_5min', row('2025-01-01T00:00:00+00:00', 1, 1))
+    batcher.submit('order_book_5min', row('2025-01-01T00:00:00+00:00', 2, 2))
+    assert len(applied) == 2
+    print("[OK] 時間窓0で即反映")
+
+
+def test_apply_error_is_counted():
+    """反映に失敗しても例外を外に出さず、エラーとして記録するか"""
+    logs = []
+
+    def failing_apply(batches):
+        raise RuntimeError("database is locked")
+
+    batcher = RealtimeBatcher(failing_apply, window_seconds=60, log_callback=lambda m, l: logs.append(l))
+    batcher.submit('order_book_5min', row('2025-01-01T00:00:00+00:00', 1, 1))
+    batcher.flush()
+    assert batcher.stats['errors'] == 1
+    assert batcher.stats['batches'] == 0
+    assert logs == ['ERROR']
+    print("[OK] 反映エラーを記録")
+
+
+def test_stop_flushes_pending():
+    """停止時に保留中のイベントを反映し、以降は受け付けないか"""
+    applied = []
+    batcher = RealtimeBatcher(applied.append, window_seconds=60)
+    batcher.submit('order_book_5min', row('2025-01-01T00:00:00+00:00', 1, 1))
+    batcher.stop()
+    batcher.submit('order_book_5min', row('2025-01-01T00:05:00+00:00', 1, 1))
+    batcher.flush()
+    assert len(applied) == 1
+    assert batcher.pending_count() == 0
+    print("[OK] 停止時に保留分を反映")
+
+
+def test_manager_batches_update_events():
+    """CloudSyncManagerのUPDATEイベントが1回のバッチコールバックにまとめられるか"""
+    batches = []
+    per_table_calls = []
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'),
+                               client=LocalPostgrestClient(),
+                               local_db_callback=lambda t, r: per_table_calls.append(t),
+                               local_batch_callback=batches.append)
+    manager.realtime_batcher.window_seconds = 60
+    for i in range(10):
+        manager.handle_realtime_update('order_book_5min', '5分足', {
+            'event_type': 'UPDATE', 'new': row('2025-01-01T00:00:00+00:00', i, i)})
+    manager.handle_realtime_update('order_book_1hour', '1時間足', {
+        'event_type': 'UPDATE', 'new': row('2025-01-01T00:00:00+00:00', 3, 3)})
+    manager.realtime_batcher.flush()
+
+    assert per_table_calls == []
+    assert len(batches) == 1
+    assert batches[0]['order_book_5min'] == [row('2025-01-01T00:00:00+00:00', 9, 9)]
+    assert len(batches[0]['order_book_1hour']) == 1
+    assert manager.get_statistics()['realtime_updates'] == 2
+    assert manager.get_statistics()['realtime_batch']['superseded_events'] == 9
+    manager.shutdown_writes()
+    print("[OK] UPDATEイベントをまとめて反映")
+
+
+def test_manager_falls_back_to_per_table_callback():
+    """バッチコールバックがない場合はテーブルごとのコールバックで反映するか"""
+    calls = []
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'),
+                               client=LocalPostgrestClient(),
+                               local_db_callback=lambda t, r: calls.append((t, len(r))))
+    manager.realtime_batcher.window_seconds = 60
+    manager.handle_realtime_update('order_book_5min', '5分足', {
+        'event_type': 'UPDATE', 'new': row('2025-01-01T00:00:00+00:00', 1, 1)})
+    manager.handle_realtime_update('order_book_5min', '5分足', {
+        'event_type': 'UPDATE', 'new': row('2025-01-01T00:05:00+00:00', 1, 1)})
+    manager.realtime_batcher.flush()
+    assert calls == [('order_book_5min', 2)]
+    manager.shutdown_writes()
+    print("[OK] テーブルごとのコールバックで反映")
+
+
+def test_manager_records_lag_when_applied():
+    """遅延がキューへの追加時ではなく、ローカルへ反映した時点で記録されるか"""
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'),
+                               client=LocalPostgrestClient(),
+                               local_batch_callback=lambda batches: time.sleep(0.2))
+    manager.realtime_sync = RealtimeSync({'cloud_sync': {}})
+    manager.realtime_batcher.window_seconds = 60
+    commit_timestamp = (datetime.now(timezone.utc) - timedelta(seconds=2)).isoformat()
+    for i in range(3):
+        new_data = dict(row('2025-01-01T00:00:00+00:00', i, i), commit_timestamp=commit_timestamp)
+        assert manager.handle_realtime_update('order_book_5min', '5分足',
+                                              {'event_type': 'UPDATE', 'new': new_data}) is True
+    assert manager.realtime_sync.stats['lag_ms'] is None
+
+    manager.realtime_batcher.flush()
+    # コミットからの2秒に、反映にかかった0.2秒が含まれる
+    assert manager.realtime_sync.stats['lag_ms'] >= 2200
+    assert manager.realtime_sync.stats['lag_ms_max'] >= 2200
+    manager.shutdown_writes()
+    print("[OK] 反映時点で遅延を記録")
+
+
+if __name__ == "__main__":
+    print("=== Realtimeマイクロバッチのテスト ===\n")
+    test_last_value_wins()
+    test_window_flushes_once()
+    test_zero_window_applies_immediately()
+    test_apply_error_is_counted()
+    test_stop_flushes_pending()
+    test_manager_batches_update_events()
+    test_manager_falls_back_to_per_table_callback()
+    test_manager_records_lag_when_applied()
+    print("\n全てのテストが成功しました")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Realtime購読のテストスクリプト
+7テーブルのpostgres_changesが1チャンネルにまとめて登録され、
+受信したイベントがテーブル名で振り分けられ、購読時間が計測されるかを確認
+"""
+
+import asyncio
+from realtime_sync import RealtimeSync, REALTIME_TABLES
+
+
+class FakeChannel:
+    """購読完了を少し遅れて通知するチャンネル"""
+
+    def __init__(self, name):
+        self.name = name
+        self.bindings = []
+        self.subscribe_calls = 0
+
+    def on_postgres_changes(self, event, schema, table, filter, callback):
+        self.bindings.append({'table': table, 'filter': filter, 'callback': callback})
+        return self
+
+    async def subscribe(self, callback=None):
+        self.subscribe_calls += 1
+
+        async def notify():
+            await asyncio.sleep(0.02)
+            callback('SUBSCRIBED', None)
+        asyncio.get_running_loop().create_task(notify())
+        return self
+
+
+class FakeClient:
+    def __init__(self):
+        self.channels = []
+
+    def channel(self, name):
+        channel = FakeChannel(name)
+        self.channels.append(channel)
+        return channel
+
+
+def test_single_channel_routes_by_table():
+    """1チャンネルで全テーブルを購読し、イベントがテーブル名で振り分けられるか"""
+    realtime = RealtimeSync({'cloud_sync': {'group_id': 'test-group'}})
+    realtime.client = FakeClient()
+    received = []
+    realtime.update_callback = lambda table, name, record, event: received.append((table, name, record['timestamp'], event))
+
+    assert asyncio.run(realtime._setup_channels())
+
+    assert len(realtime.client.channels) == 1
+    channel = realtime.client.channels[0]
+    assert channel.subscribe_calls == 1
+    assert [b['table'] for b in channel.bindings] == [t for t, _ in REALTIME_TABLES]
+    assert all(b['filter'] == 'group_id=eq.test-group' for b in channel.bindings)
+    assert realtime.stats['subscribe_ms'] >= 20
+
+    callback = channel.bindings[0]['callback']
+    for table in ('order_book_1hour', 'order_book_5min', 'order_book_other'):
+        callback({'data': {'table': table, 'type': 'UPDATE', 'record': {'timestamp': '2025-08-04T00:00:00+00:00'}}})
+
+    assert received == [('order_book_1hour', '1時間足', '2025-08-04T00:00:00+00:00', 'UPDATE'),
+                        ('order_book_5min', '5分足', '2025-08-04T00:00:00+00:00', 'UPDATE')]
+    assert realtime.stats['events'] == {'order_book_1hour': 1, 'order_book_5min': 1}
+    print(f"[OK] 1チャンネルで7テーブルを購読しました（購読 {realtime.stats['subscribe_ms']}ms）")
+
+
+if __name__ == "__main__":
+    test_single_channel_routes_by_table()
+    print("\nすべてのテストが完了しました")
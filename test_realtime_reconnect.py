@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Realtime再接続のテストスクリプト
+ソケットが切れたら指数バックオフで再接続して補完コールバックが呼ばれるか、
+再接続後の補完で最新タイムスタンプ以降の行がローカルへ反映されるか、
+コミット時刻からの遅延が記録されるかを確認
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+from realtime_sync import RealtimeSync, STATE_SUBSCRIBED, STATE_STOPPED
+
+
+class FakeSocket:
+    def __init__(self):
+        self.is_connected = True
+
+    async def close(self):
+        self.is_connected = False
+
+
+class FakeChannel:
+    async def unsubscribe(self):
+        pass
+
+    def on_postgres_changes(self, event, schema, table, filter, callback):
+        return self
+
+    async def subscribe(self, callback=None):
+        callback('SUBSCRIBED', None)
+        return self
+
+
+class FakeClient:
+    def __init__(self):
+        self.realtime = FakeSocket()
+
+    def channel(self, name):
+        return FakeChannel()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_reconnect_after_socket_drop():
+    """ソケットが切れたら再接続し、補完コールバックが呼ばれるか"""
+    realtime = RealtimeSync({'cloud_sync': {'realtime_reconnect_base_seconds': 0.05}})
+    clients = []
+
+    async def fake_initialize():
+        realtime.client = FakeClient()
+        clients.append(realtime.client)
+        return True
+    realtime._initialize_client = fake_initialize
+
+    reconnected = threading.Event()
+    assert realtime.start(update_callback=lambda *args: None, reconnect_callback=reconnected.set)
+    try:
+        assert wait_until(lambda: realtime.state == STATE_SUBSCRIBED)
+        clients[0].realtime.is_connected = False  # 通知なしでソケットが閉じた
+
+        assert reconnected.wait(5)
+        assert wait_until(lambda: realtime.state == STATE_SUBSCRIBED and len(clients) == 2)
+        assert realtime.stats['disconnects'] == 1 and realtime.stats['reconnects'] == 1
+    finally:
+        realtime.stop()
+    assert realtime.stats['state'] == STATE_STOPPED
+    print("[OK] 切断後に再接続し、補完コールバックが呼ばれました")
+
+
+def test_backoff_grows_and_caps():
+    """再接続の待ち時間が倍々に増え、上限で止まるか"""
+    realtime = RealtimeSync({'cloud_sync': {'realtime_reconnect_base_seconds': 1, 'realtime_reconnect_max_seconds': 8}})
+    delays = [realtime._backoff_delay(attempt) for attempt in range(6)]
+    assert 0.5 <= delays[0] <= 1 and 2 <= delays[2] <= 4
+    assert all(4 <= d <= 8 for d in delays[3:])
+    print("[OK] 再接続の待ち時間が指数的に増えました")
+
+
+def test_lag_recorded():
+    """コミット時刻から反映完了までの遅延が記録されるか"""
+    realtime = RealtimeSync({'cloud_sync': {}})
+    realtime.update_callback = lambda *args: None
+    committed = (datetime.now(timezone.utc) - timedelta(seconds=2)).isoformat().replace('+00:00', 'Z')
+    realtime._process_update('order_book_5min', '5分足', {
+        'data': {'type': 'UPDATE', 'record': {'timestamp': '2025-08-04T00:00:00+00:00'}, 'commit_timestamp': committed}})
+    assert 2000 <= realtime.stats['lag_ms'] < 3000
+    assert realtime.stats['lag_ms_max'] == realtime.stats['lag_ms_avg'] == realtime.stats['lag_ms']
+    print(f"[OK] Realtimeの遅延 {realtime.stats['lag_ms']}ms が記録されました")
+
+
+def test_catch_up_from_latest_timestamp():
+    """再接続後の補完で、各テーブルの最新タイムスタンプより新しい行だけが反映されるか"""
+    client = LocalPostgrestClient()
+    start = datetime(2025, 8, 4, tzinfo=timezone.utc)
+    client.table('order_book_5min').insert([
+        {'timestamp': (start + timedelta(minutes=5 * i)).isoformat(), 'ask_total': 1000.0 + i,
+         'bid_total': 2000.0, 'price': 115000.0, 'group_id': 'default-group'} for i in range(10)]).execute()
+    saved = []
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'), client=client,
+                               local_db_callback=lambda table, rows: saved.extend(rows))
+    manager.initialize_latest_timestamps({'order_book_5min': (start + timedelta(minutes=5 * 6)).isoformat()})
+
+    manager.catch_up_realtime()
+    assert wait_until(manager.gap_backfill.is_idle)
+
+    # 最新タイムスタンプを含む直近2区間は取得し直す
+    assert [r['ask_total'] for r in saved] == [1005.0, 1006.0, 1007.0, 1008.0, 1009.0]
+    assert manager.latest_timestamps['order_book_5min'] == (start + timedelta(minutes=45)).isoformat()
+    manager.shutdown_writes()
+    print("[OK] 切断中に追加された3件が補完されました")
+
+
+def test_catch_up_refetches_updated_rows():
+    """切断中に最新タイムスタンプの行へ入ったUPDATEが、再接続後の補完で反映されるか"""
+    client = LocalPostgrestClient()
+    latest = datetime(2025, 8, 4, 0, 30, tzinfo=timezone.utc).isoformat()
+    client.table('order_book_5min').insert({'timestamp': latest, 'ask_total': 1000.0, 'bid_total': 2000.0,
+                                            'price': 115000.0, 'group_id': 'default-group'}).execute()
+    saved = []
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'), client=client,
+                               local_db_callback=lambda table, rows: saved.extend(rows))
+    manager.initialize_latest_timestamps({'order_book_5min': latest})
+
+    # 切断中に他のクライアントが同じ境界を最大値マージで更新
+    client.table('order_book_5min').update({'ask_total': 1500.0}).eq('timestamp', latest).execute()
+    manager.catch_up_realtime()
+    assert wait_until(manager.gap_backfill.is_idle)
+
+    assert [(r['timestamp'], r['ask_total']) for r in saved] == [(latest, 1500.0)]
+    manager.shutdown_writes()
+    print("[OK] 切断中に更新された行が反映されました")
+
+
+if __name__ == "__main__":
+    test_reconnect_after_socket_drop()
+    test_backoff_grows_and_caps()
+    test_lag_recorded()
+    test_catch_up_from_latest_timestamp()
+    test_catch_up_refetches_updated_rows()
+    print("\nすべてのテストが完了しました")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容ハッシュによる範囲照合のテストスクリプト
+ローカルSQLiteとクラウド（LocalPostgrestClient）でバケットハッシュが一致するか、
+不一致のバケットだけを掘り下げて行を取得するか、修復後に両側が一致するかを確認
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from local_postgrest import LocalPostgrestClient
+from reconcile import (Reconciler, LocalHashSource, CloudHashSource, bucket_hashes, quantize,
+                       row_hash, to_epoch)
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+GROUP_ID = 'test-group'
+
+
+def make_rows(count, minutes=5):
+    return [{'timestamp': (START + timedelta(minutes=minutes * i)).isoformat(),
+             'ask_total': 1000.0 + i * 0.37, 'bid_total': 2000.0 + i * 0.11, 'price': 95000.5 + i}
+            for i in range(count)]
+
+
+def make_local(rows, table='order_book_5min'):
+    conn = sqlite3.connect(':memory:')
+    conn.execute(f"CREATE TABLE {table} (timestamp TEXT PRIMARY KEY, ask_total REAL, bid_total REAL, price REAL)")
+    conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?)",
+                     [(r['timestamp'], r['ask_total'], r['bid_total'], r['price']) for r in rows])
+    conn.commit()
+    return conn
+
+
+def make_cloud(rows, table='order_book_5min'):
+    client = LocalPostgrestClient()
+    client.table(table).insert([dict(r, group_id=GROUP_ID) for r in rows]).execute()
+    return client
+
+
+class CountingConnection:
+    """読み出した行数を数えるSQLite接続"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows_read = 0
+
+    def execute(self, sql, params=()):
+        rows = self.conn.execute(sql, params).fetchall()
+        self.rows_read += len(rows)
+        return iter(rows)
+
+
+def test_quantize_matches_numeric_rounding():
+    """floatを最短表記の10進数として四捨五入するか（PostgreSQLのround(numeric)と同じ）"""
+    assert quantize(0.285) == 29
+    assert quantize(1.005) == 101
+    assert quantize(2.5, scale=0) == 3
+    assert quantize('1234.565') == 123457
+    assert quantize(100) == 10000
+    print("[OK] 値の四捨五入")
+
+
+def test_bucket_hashes_match_both_sides():
+    """同じデータならローカルとクラウドのバケットハッシュが一致するか"""
+    rows = make_rows(600)
+    local = LocalHashSource(make_local(rows))
+    cloud = CloudHashSource(make_cloud(rows), GROUP_ID)
+    local_buckets = local.bucket_hashes('order_book_5min', None, None, 86400)
+    cloud_buckets = cloud.bucket_hashes('order_book_5min', None, None, 86400)
+    assert local_buckets == cloud_buckets
+    assert sum(count for count, _ in local_buckets.values()) == 600
+    # 行の順序に依存しない
+    shuffled = [(to_epoch(r['timestamp']), r['ask_total'], r['bid_total'], r['price']) for r in reversed(rows)]
+    assert bucket_hashes(shuffled, 86400) == local_buckets
+    print("[OK] バケットハッシュの一致")
+
+
+def test_matching_tables_fetch_no_rows():
+    """一致している場合は行を取得しないか"""
+    rows = make_rows(2000)
+    cloud_client = make_cloud(rows)
+    reconciler = Reconciler(LocalHashSource(make_local(rows)), CloudHashSource(cloud_client, GROUP_ID))
+    before = cloud_client.request_count
+    result = reconciler.reconcile_table('order_book_5min')
+    assert result['mismatched_buckets'] == 0
+    assert result['rows_fetched'] == 0
+    assert cloud_client.request_count - before == 1
+    print("[OK] 一致時はバケット集計のみ")
+
+
+def test_drill_down_and_repair():
+    """不一致のバケットだけを掘り下げて修復し、修復後は一致するか"""
+    rows = make_rows(2000)
+    local_rows = [dict(r) for r in rows]
+    cloud_rows = [dict(r) for r in rows]
+    local_rows[800]['ask_total'] += 50     # ローカルの方が大きい
+    cloud_rows[1200]['price'] += 10        # 価格だけ異なる（クラウドの値を採用）
+    del local_rows[100]                    # ローカルに欠損
+    del cloud_rows[1500]                   # クラウドに欠損
+
+    local_conn = make_local(local_rows)
+    cloud_client = make_cloud(cloud_rows)
+    reconciler = Reconciler(LocalHashSource(local_conn), CloudHashSource(cloud_client, GROUP_ID))
+    result = reconciler.reconcile_table('order_book_5min')
+
+    assert result['missing_local'] == 1
+    assert result['missing_cloud'] == 1
+    assert result['differing'] == 2
+    assert result['mismatched_buckets'] >= 4
+    # 不一致の4行の周辺だけを取得する
+    assert result['rows_fetched'] < 2000 // 10, result
+    assert result['repaired_cloud'] == 2
+    assert result['repaired_local'] == 3
+
+    again = reconciler.reconcile_table('order_book_5min')
+    assert again['mismatched_buckets'] == 0, again
+
+    local_value = local_conn.execute("SELECT ask_total FROM order_book_5min WHERE timestamp = ?",
+                                     (rows[800]['timestamp'],)).fetchone()[0]
+    assert local_value == rows[800]['ask_total'] + 50
+    cloud_price = cloud_client.table('order_book_5min').select('*').eq('timestamp', rows[1200]['timestamp']) \
+        .execute().data[0]['price']
+    local_price = local_conn.execute("SELECT price FROM order_book_5min WHERE timestamp = ?",
+                                     (rows[1200]['timestamp'],)).fetchone()[0]
+    assert cloud_price == local_price == rows[1200]['price'] + 10
+    print("[OK] 不一致バケットの掘り下げと修復")
+
+
+def test_range_and_dry_run():
+    """範囲外の差分は無視し、dry-runでは修復しないか"""
+    rows = make_rows(1000)
+    cloud_rows = rows[:900]
+    local_conn = make_local(rows)
+    cloud_client = make_cloud(cloud_rows)
+    reconciler = Reconciler(LocalHashSource(local_conn), CloudHashSource(cloud_client, GROUP_ID))
+
+    result = reconciler.reconcile_table('order_book_5min', end=rows[900]['timestamp'])
+    assert result['mismatched_buckets'] == 0
+
+    result = reconciler.reconcile_table('order_book_5min', start=rows[850]['timestamp'], repair=False)
+    assert result['missing_cloud'] == 100
+    assert result['repaired_cloud'] == 0
+    assert len(cloud_client.table('order_book_5min').select('*').execute().data) == 900
+    print("[OK] 範囲指定とdry-run")
+
+
+def test_local_timestamp_formats():
+    """ローカルのタイムスタンプ表記（Z付き）が違っても同じ時刻として照合するか"""
+    rows = make_rows(10)
+    local_rows = [dict(r, timestamp=r['timestamp'].replace('+00:00', 'Z')) for r in rows]
+    reconciler = Reconciler(LocalHashSource(make_local(local_rows)),
+                            CloudHashSource(make_cloud(rows), GROUP_ID))
+    assert reconciler.reconcile_table('order_book_5min')['mismatched_buckets'] == 0
+    assert row_hash(to_epoch(local_rows[0]['timestamp']), 1, 2, 3) == row_hash(to_epoch(rows[0]['timestamp']), 1, 2, 3)
+    print("[OK] タイムスタンプ表記の違い")
+
+
+def test_local_range_reads_only_range():
+    """範囲指定の照合では、ローカルは範囲付近の行だけを読み、範囲端の表記違いも含めるか"""
+    rows = make_rows(3000)
+    local_rows = [dict(r) for r in rows]
+    # 範囲の先頭はZ付き、末尾の直前は空白区切り・タイムゾーンなしで保存されている
+    local_rows[1500]['timestamp'] = local_rows[1500]['timestamp'].replace('+00:00', 'Z')
+    local_rows[1599]['timestamp'] = local_rows[1599]['timestamp'].replace('T', ' ').replace('+00:00', '')
+    conn = CountingConnection(make_local(local_rows))
+    local = LocalHashSource(conn)
+    start, end = to_epoch(rows[1500]['timestamp']), to_epoch(rows[1600]['timestamp'])
+
+    assert list(local.rows('order_book_5min', start, end)) == [to_epoch(r['timestamp']) for r in rows[1500:1600]]
+    # 前後1日（288行ずつ）の余白を含めても、テーブル全体（3000行）は読まない
+    assert 100 <= conn.rows_read <= 100 + 2 * 289
+
+    reconciler = Reconciler(LocalHashSource(make_local(local_rows)), CloudHashSource(make_cloud(rows), GROUP_ID))
+    result = reconciler.reconcile_table('order_book_5min', start=rows[1500]['timestamp'], end=rows[1600]['timestamp'])
+    assert result['mismatched_buckets'] == 0
+    print("[OK] 範囲指定のローカル読み込み")
+
+
+if __name__ == "__main__":
+    print("=== 内容ハッシュ照合のテスト ===\n")
+    test_quantize_matches_numeric_rounding()
+    test_bucket_hashes_match_both_sides()
+    test_matching_tables_fetch_no_rows()
+    test_drill_down_and_repair()
+    test_range_and_dry_run()
+    test_local_timestamp_formats()
+    test_local_range_reads_only_range()
+    print("\n全てのテストが成功しました")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最大値マージupsert（RPC）のテストスクリプト
+ローカルのPostgREST代替クライアントでCloudSyncManagerの保存処理を実行し、
+1リクエストで保存されること・最大値が採用されること・関数未作成時の切り替えを確認
+"""
+
+import os
+import tempfile
+import threading
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+
+
+def create_manager(client):
+    """設定ファイルなしでローカルクライアントを使うマネージャーを作成"""
+    config_path = os.path.join(tempfile.mkdtemp(), 'nonexistent_config.json')
+    return CloudSyncManager(config_path=config_path, client=client)
+
+
+def write(manager, table, timestamp, ask_total, bid_total, price):
+    """1行を保存"""
+    manager._save_batch([manager._build_row(table, timestamp, ask_total, bid_total, price)])
+
+
+def fetch_row(client, table, timestamp):
+    result = client.table(table).select('*').eq('timestamp', timestamp).eq('group_id', 'default-group').execute()
+    return result.data[0] if result.data else None
+
+
+def test_single_roundtrip_max_merge():
+    """1回のRPCで保存され、既存より小さい値では更新されないか"""
+    client = LocalPostgrestClient()
+    manager = create_manager(client)
+    timestamp = '2025-08-01T00:05:00+00:00'
+
+    write(manager, 'order_book_5min', timestamp, 1000.0, 2000.0, 115000.0)
+    assert client.request_count == 1
+
+    write(manager, 'order_book_5min', timestamp, 1500.0, 1800.0, 115100.0)
+    write(manager, 'order_book_5min', timestamp, 900.0, 1900.0, 115200.0)
+    assert client.request_count == 3
+
+    row = fetch_row(client, 'order_book_5min', timestamp)
+    assert row['ask_total'] == 1500.0 and row['bid_total'] == 2000.0
+    assert row['price'] == 115100.0  # 最大値が更新されなかった書き込みの価格は反映しない
+    assert manager.stats['successful_saves'] == 3
+    print("[OK] 1書き込み1リクエストで最大値マージされました")
+
+
+def test_fallback_without_function():
+    """RPC関数がないサーバーでは従来の確認→書き込みに切り替わるか"""
+    client = LocalPostgrestClient()
+    client.unregister_rpc('upsert_order_book_max')
+    client.unregister_rpc('upsert_order_book_max_bulk')
+    manager = create_manager(client)
+    timestamp = '2025-08-01T01:00:00+00:00'
+
+    write(manager, 'order_book_1hour', timestamp, 1000.0, 2000.0, 115000.0)
+    assert not manager.use_rpc_upsert
+    write(manager, 'order_book_1hour', timestamp, 1200.0, 1000.0, 115100.0)
+
+    row = fetch_row(client, 'order_book_1hour', timestamp)
+    assert row['ask_total'] == 1200.0 and row['bid_total'] == 2000.0
+    print("[OK] 関数未作成時はSELECT→UPDATE/INSERTで保存されました")
+
+
+def test_concurrent_writers():
+    """同じグループの複数クライアントが同時に書き込んでも最大値が残るか"""
+    client = LocalPostgrestClient(latency=0.001)
+    managers = [create_manager(client) for _ in range(4)]
+    timestamp = '2025-08-01T02:00:00+00:00'
+
+    def writer(manager, offset):
+        for i in range(25):
+            write(manager, 'order_book_5min', timestamp, 1000.0 + offset + i * 4, 3000.0 - offset - i * 4, 115000.0)
+
+    threads = [threading.Thread(target=writer, args=(m, n)) for n, m in enumerate(managers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    row = fetch_row(client, 'order_book_5min', timestamp)
+    assert row['ask_total'] == 1000.0 + 3 + 24 * 4
+    assert row['bid_total'] == 3000.0
+    assert len(client.table('order_book_5min').select('*').execute().data) == 1
+    print(f"[OK] 並行書き込み{client.request_count}件で最大値が保持されました")
+
+
+if __name__ == "__main__":
+    test_single_roundtrip_max_merge()
+    test_fallback_without_function()
+    test_concurrent_writers()
+    print("\nすべてのテストが完了しました")
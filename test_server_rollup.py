@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+サーバー側ロールアップのテストスクリプト
+cloud_sync.server_rollup を有効にするとクライアントは5分足だけを書き込み、
+上位時間足はサーバー側のトリガー（LocalPostgrestClient.install_rollup_triggers）で
+クライアント側の保存と同じ境界・値で生成されるかを確認
+"""
+
+import json
+import os
+import tempfile
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+
+SAMPLES = [
+    ('2025-08-04T00:00:40+00:00', 1000.0, 2000.0, 115000.0),
+    ('2025-08-04T00:05:10+00:00', 1100.0, 2100.0, 115100.0),
+    ('2025-08-04T00:10:05+00:00', 1200.0, 2200.0, 115200.0),
+    ('2025-08-04T00:15:30+00:00', 1300.0, 2300.0, 115300.0),
+    ('2025-08-04T00:30:20+00:00', 1400.0, 2400.0, 115400.0),
+    ('2025-08-04T01:00:50+00:00', 1500.0, 2500.0, 115500.0),
+    ('2025-08-04T04:00:15+00:00', 1600.0, 2600.0, 115600.0),
+]
+
+TABLES = ['order_book_5min', 'order_book_15min', 'order_book_30min', 'order_book_1hour',
+          'order_book_2hour', 'order_book_4hour', 'order_book_daily']
+
+
+def make_manager(client, server_rollup):
+    config_path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'cloud_sync': {'server_rollup': server_rollup}}, f)
+    manager = CloudSyncManager(config_path=config_path, client=client)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+    return manager
+
+
+def snapshot(client):
+    return {table: [(r['timestamp'], r['ask_total'], r['bid_total'], r['price'])
+                    for r in client.table(table).select('*').order('timestamp').execute().data]
+            for table in TABLES}
+
+
+def test_client_writes_only_5min():
+    """server_rollupでは5分足だけを書き込むか"""
+    client = LocalPostgrestClient()
+    manager = make_manager(client, server_rollup=True)
+    written = []
+    original = manager.batch_writer.write_batch
+    manager.batch_writer.write_batch = lambda rows: (written.extend(rows), original(rows))[1]
+    for sample in SAMPLES:
+        manager.sync_data_async(*sample)
+    manager.shutdown_writes()
+    assert {row['table'] for row in written} == {'order_book_5min'}
+    assert len(written) == len(SAMPLES)
+    assert snapshot(client)['order_book_15min'] == []
+    print("[OK] 5分足だけを書き込み")
+
+
+def test_trigger_matches_client_rollup():
+    """トリガーで生成した上位時間足がクライアント側の保存と一致するか"""
+    client_side = LocalPostgrestClient()
+    manager = make_manager(client_side, server_rollup=False)
+    for sample in SAMPLES:
+        manager.sync_data_async(*sample)
+    manager.shutdown_writes()
+
+    server_side = LocalPostgrestClient()
+    server_side.install_rollup_triggers()
+    manager = make_manager(server_side, server_rollup=True)
+    for sample in SAMPLES:
+        manager.sync_data_async(*sample)
+    manager.shutdown_writes()
+
+    expected = snapshot(client_side)
+    actual = snapshot(server_side)
+    assert actual == expected, (actual, expected)
+    assert [ts for ts, *_ in actual['order_book_4hour']] == ['2025-08-04T00:00:00+00:00', '2025-08-04T04:00:00+00:00']
+    assert [ts for ts, *_ in actual['order_book_daily']] == ['2025-08-04T00:00:00+00:00']
+    print("[OK] トリガーの生成結果がクライアント側と一致")
+
+
+def test_trigger_max_merge():
+    """5分足が最大値マージで更新されると上位時間足も更新され、小さい値では変わらないか"""
+    client = LocalPostgrestClient()
+    client.install_rollup_triggers()
+    for ask, bid in ((1000.0, 2000.0), (1500.0, 1800.0), (900.0, 1900.0)):
+        client.rpc('upsert_order_book_max', {
+            'p_table': 'order_book_5min', 'p_timestamp': '2025-08-04T01:00:00+00:00',
+            'p_ask_total': ask, 'p_bid_total': bid, 'p_price': 115000.0, 'p_group_id': 'g'}).execute()
+    rows = snapshot(client)
+    assert rows['order_book_1hour'] == [('2025-08-04T01:00:00+00:00', 1500.0, 2000.0, 115000.0)]
+    assert rows['order_book_2hour'] == []
+    print("[OK] 上位時間足の最大値マージ")
+
+
+if __name__ == "__main__":
+    print("=== サーバー側ロールアップのテスト ===\n")
+    test_client_writes_only_5min()
+    test_trigger_matches_client_rollup()
+    test_trigger_max_merge()
+    print("\n全てのテストが成功しました")
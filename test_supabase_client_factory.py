@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Supabaseクライアントファクトリーのテストスクリプト
+リクエストごとの応答時間がエンドポイント別に集計されるか、
+接続設定（圧縮・タイムアウト・プール）がhttpxクライアントに反映されるかを確認
+"""
+
+import os
+import tempfile
+import time
+import supabase_client_factory as factory
+from supabase_client_factory import RequestMetrics
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+
+
+class FakeRequest:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeResponse:
+    def __init__(self, request, status_code=200, http_version='HTTP/2'):
+        self.request = request
+        self.status_code = status_code
+        self.http_version = http_version
+
+
+def test_latency_per_endpoint():
+    """イベントフック経由の応答時間がエンドポイント別に集計されるか"""
+    metrics = RequestMetrics()
+    base = 'https://example.supabase.co/rest/v1/'
+    for path, status in (('order_book_5min?select=*', 200), ('order_book_5min?select=*', 200),
+                         ('rpc/upsert_order_book_max_bulk', 200), ('order_book_15min', 500)):
+        request = FakeRequest(base + path)
+        metrics.on_request(request)
+        time.sleep(0.01)
+        metrics.on_response(FakeResponse(request, status))
+
+    summary = metrics.summary()
+    assert summary['count'] == 4 and summary['errors'] == 1
+    assert summary['endpoints']['order_book_5min']['count'] == 2
+    assert summary['endpoints']['rpc/upsert_order_book_max_bulk']['avg_ms'] >= 10
+    assert summary['http_versions'] == {'HTTP/2': 4}
+    assert summary['p50_ms'] <= summary['p95_ms'] <= summary['max_ms']
+    assert 'order_book_15min' in metrics.format_summary()
+    print(f"[OK] 応答時間が集計されました（平均 {summary['avg_ms']}ms）")
+
+
+def test_accept_encoding():
+    """デコードできる圧縮形式だけを要求するか"""
+    encoding = factory.accept_encoding()
+    assert encoding.startswith('gzip')
+    assert ('br' in encoding) == factory.BROTLI_AVAILABLE
+    print(f"[OK] Accept-Encoding: {encoding}")
+
+
+def test_http_client_settings():
+    """httpxクライアントに接続設定が反映されるか（httpx未インストール時はスキップ）"""
+    if not factory.HTTPX_AVAILABLE:
+        print("[SKIP] httpxがインストールされていません")
+        return
+    metrics = RequestMetrics()
+    client = factory.build_http_client({'timeout_seconds': 3, 'connect_timeout_seconds': 1}, metrics)
+    try:
+        assert client.timeout.read == 3 and client.timeout.connect == 1
+        assert client.headers['Accept-Encoding'] == factory.accept_encoding()
+        assert metrics.on_request in client.event_hooks['request']
+    finally:
+        client.close()
+    print("[OK] 接続設定がhttpxクライアントに反映されました")
+
+
+def test_statistics_include_http():
+    """同期マネージャーの統計にHTTPの集計が含まれるか"""
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'),
+                               client=LocalPostgrestClient())
+    assert manager.get_statistics()['http']['count'] == 0
+    manager.shutdown_writes()
+    print("[OK] 統計情報にHTTPリクエストの集計が含まれました")
+
+
+if __name__ == "__main__":
+    test_latency_per_endpoint()
+    test_accept_encoding()
+    test_http_client_settings()
+    test_statistics_include_http()
+    print("\nすべてのテストが完了しました")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同期スケジューラーのテストスクリプト
+ローカル時計ではなくサンプルのタイムスタンプで境界が判定され、遅れて届いたサンプルも同期されるか、
+送信できなかった境界が次のサンプルで補完されるかを確認
+"""
+
+import os
+import tempfile
+from cloud_sync import CloudSyncManager
+from local_postgrest import LocalPostgrestClient
+from sync_scheduler import SyncScheduler, floor_to_boundary, parse_timestamp
+
+
+def tables_of(due):
+    return {(table, ts) for table, ts, *_ in due}
+
+
+def test_delayed_sample_synced_to_boundary():
+    """:00ちょうどではなく:01に届いたサンプルが5分足〜日足の境界に同期されるか"""
+    scheduler = SyncScheduler()
+    due = scheduler.on_sample('2025-08-04T00:01:00+00:00', 1000.0, 2000.0, 115000.0)
+    assert len(due) == 7
+    assert all(ts == '2025-08-04T00:00:00+00:00' for _, ts, *_ in due)
+    scheduler.mark_synced(due)
+
+    # 同じ区間の2回目以降のサンプルでは同期しない
+    assert scheduler.on_sample('2025-08-04T00:02:00+00:00', 1100.0, 2100.0, 115100.0) == []
+    # 猶予（240秒）を過ぎてから区間の最初のサンプルが届いた境界は同期しない
+    assert scheduler.on_sample('2025-08-04T00:09:00+00:00', 1100.0, 2100.0, 115100.0) == []
+    due = scheduler.on_sample('2025-08-04T00:10:30+00:00', 1200.0, 2200.0, 115200.0)
+    assert due == [('order_book_5min', '2025-08-04T00:10:00+00:00', 1200.0, 2200.0, 115200.0)]
+    print("[OK] 遅れて届いたサンプルがサンプルのタイムスタンプの境界に同期されました")
+
+
+def test_unsent_boundary_caught_up():
+    """送信できなかった境界が直近N区間以内なら次のサンプルで補完されるか"""
+    scheduler = SyncScheduler(catchup_intervals=2)
+    due = scheduler.on_sample('2025-08-04T01:05:00+00:00', 1000.0, 2000.0, 115000.0)
+    assert tables_of(due) == {('order_book_5min', '2025-08-04T01:05:00+00:00')}
+    # 送信失敗（mark_syncedを呼ばない）
+
+    due = scheduler.on_sample('2025-08-04T01:10:00+00:00', 1100.0, 2100.0, 115100.0)
+    assert [ts for _, ts, *_ in due] == ['2025-08-04T01:05:00+00:00', '2025-08-04T01:10:00+00:00']
+    assert due[0][2:] == (1000.0, 2000.0, 115000.0)
+    scheduler.mark_synced(due)
+    assert scheduler.stats['caught_up_boundaries'] == 1
+
+    # N区間より前の境界は補完しない
+    scheduler.on_sample('2025-08-04T01:15:00+00:00', 1200.0, 2200.0, 115200.0)
+    due = scheduler.on_sample('2025-08-04T01:30:00+00:00', 1300.0, 2300.0, 115300.0)
+    assert ('order_book_5min', '2025-08-04T01:15:00+00:00') not in tables_of(due)
+    assert ('order_book_15min', '2025-08-04T01:15:00+00:00') in tables_of(due)  # 15分足では直近2区間以内
+    print("[OK] 未送信の境界が直近の区間内で補完されました")
+
+
+def test_boundaries_in_utc():
+    """境界がUTC基準で計算されるか（タイムゾーン付きの入力も含む）"""
+    dt = parse_timestamp('2025-08-04T09:59:00+09:00')
+    assert floor_to_boundary(dt, 1440).isoformat() == '2025-08-04T00:00:00+00:00'
+    assert floor_to_boundary(dt, 240).isoformat() == '2025-08-04T00:00:00+00:00'
+    assert floor_to_boundary(parse_timestamp('2025-08-04T03:59:00'), 120).isoformat() == '2025-08-04T02:00:00+00:00'
+    print("[OK] 境界がUTC基準で計算されました")
+
+
+def test_manager_uses_sample_timestamp():
+    """マネージャーがローカル時計に関係なく:01のサンプルを5分足に保存するか"""
+    client = LocalPostgrestClient()
+    manager = CloudSyncManager(config_path=os.path.join(tempfile.mkdtemp(), 'config.json'), client=client)
+    manager.batch_writer.dispatch = lambda func, batch: func(batch)
+
+    manager.sync_data_async('2025-08-04T00:16:00+00:00', 1000.0, 2000.0, 115000.0)
+    manager.sync_data_async('2025-08-04T00:17:00+00:00', 1500.0, 2500.0, 115500.0)
+
+    rows = client.table('order_book_5min').select('*').execute().data
+    assert [(r['timestamp'], r['ask_total']) for r in rows] == [('2025-08-04T00:15:00+00:00', 1000.0)]
+    assert len(client.table('order_book_15min').select('*').execute().data) == 1
+    assert client.table('order_book_30min').select('*').execute().data == []
+    manager.shutdown_writes()
+    print("[OK] :16のサンプルが5分足・15分足の境界に保存されました")
+
+
+if __name__ == "__main__":
+    test_delayed_sample_synced_to_boundary()
+    test_unsent_boundary_caught_up()
+    test_boundaries_in_utc()
+    test_manager_uses_sample_timestamp()
+    print("\nすべてのテストが完了しました")
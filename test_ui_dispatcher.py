@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UIディスパッチャのテストスクリプト
+Tkを使わずにダミーのrootでキュー処理・ログのまとめ挿入・グラフ更新の集約を確認
+"""
+
+import threading
+from ui_dispatcher import UIDispatcher
+
+
+class DummyRoot:
+    """after()呼び出しを記録するだけのダミーroot"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms, func):
+        self.callbacks.append(func)
+        return len(self.callbacks)
+
+    def after_cancel(self, after_id):
+        pass
+
+    def run_frame(self):
+        """登録済みのコールバックを1フレーム分実行"""
+        callbacks, self.callbacks = self.callbacks, []
+        for func in callbacks:
+            func()
+
+
+def test_log_batching():
+    """複数スレッドからのログが1回の挿入にまとめられるか"""
+    root = DummyRoot()
+    inserted = []
+    dispatcher = UIDispatcher(root, log_sink=inserted.append, graph_refresh=lambda: None)
+    dispatcher.start()
+
+    threads = [
+        threading.Thread(target=lambda i=i: [dispatcher.post_log(f"{i}-{n}\n") for n in range(50)])
+        for i in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    root.run_frame()
+
+    assert len(inserted) == 1
+    assert len(inserted[0]) == 200
+    assert dispatcher.get_stats()['log_batches'] == 1
+    print("[OK] 200件のログが1回の挿入にまとめられました")
+
+
+def test_graph_refresh_coalescing():
+    """連続したグラフ更新要求が1フレーム1回に集約されるか"""
+    root = DummyRoot()
+    refreshes = []
+    dispatcher = UIDispatcher(root, log_sink=lambda e: None,
+                              graph_refresh=lambda: refreshes.append(1))
+    dispatcher.start()
+
+    for _ in range(10):
+        dispatcher.request_graph_refresh()
+    root.run_frame()
+    root.run_frame()
+
+    stats = dispatcher.get_stats()
+    assert len(refreshes) == 1
+    assert stats['graph_requests'] == 10
+    assert stats['coalesced_refreshes'] == 9
+    print("[OK] 10回の更新要求が1回の再描画に集約されました")
+
+
+def test_dropped_logs():
+    """キュー上限を超えたログが破棄されカウントされるか"""
+    root = DummyRoot()
+    inserted = []
+    dispatcher = UIDispatcher(root, log_sink=inserted.extend, graph_refresh=lambda: None,
+                              max_queue=5)
+    dispatcher.start()
+
+    for n in range(8):
+        dispatcher.post_log(f"{n}\n")
+    root.run_frame()
+
+    stats = dispatcher.get_stats()
+    assert len(inserted) == 5
+    assert stats['dropped_logs'] == 3
+    print("[OK] 上限超過の3件が破棄としてカウントされました")
+
+
+if __name__ == "__main__":
+    test_log_batching()
+    test_graph_refresh_coalescing()
+    test_dropped_logs()
+    print("\nすべてのテストが完了しました")
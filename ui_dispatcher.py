@@ -0,0 +1,152 @@
+"""
+Tkメインスレッド向けのUIディスパッチャ
+スクレイパー・クラウド同期・Realtimeの各スレッドからのログ追加やグラフ更新要求を
+スレッドセーフなキューに積み、Tkスレッド上で1フレームごとにまとめて処理する
+"""
+
+import queue
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+
+class UIDispatcher:
+    """Tkスレッドで定期的にキューを処理するディスパッチャ"""
+
+    def __init__(self, root, log_sink: Callable[[List[Any]], None],
+                 graph_refresh: Callable[[], None], frame_ms: int = 50,
+                 max_queue: int = 5000, max_log_batch: int = 500):
+        """
+        Args:
+            root: Tkのルートウィンドウ（after()を持つオブジェクト）
+            log_sink: 溜まったログをまとめて受け取る関数（Tkスレッドで呼ばれる）
+            graph_refresh: グラフ再描画関数（Tkスレッドで呼ばれる）
+            frame_ms: キューを処理する間隔（ミリ秒）
+            max_queue: キューに保持する最大ログ件数（超過分は破棄）
+            max_log_batch: 1フレームで処理する最大ログ件数
+        """
+        self.root = root
+        self.log_sink = log_sink
+        self.graph_refresh = graph_refresh
+        self.frame_ms = frame_ms
+        self.max_log_batch = max_log_batch
+        self.logger = logging.getLogger(__name__)
+
+        # ログ用キュー（上限付き）と汎用タスク用キュー
+        self._log_queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._task_queue: queue.Queue = queue.Queue()
+
+        # グラフ更新要求のフラグ（複数回の要求を1回にまとめる）
+        self._graph_pending = False
+        self._lock = threading.Lock()
+
+        self._running = False
+        self._after_id = None
+
+        # 統計情報
+        self.stats = {
+            'posted_logs': 0,
+            'dropped_logs': 0,
+            'log_batches': 0,
+            'graph_requests': 0,
+            'coalesced_refreshes': 0,
+            'graph_refreshes': 0,
+            'tasks_run': 0
+        }
+
+    def start(self):
+        """キューの定期処理を開始"""
+        if self._running:
+            return
+        self._running = True
+        self._schedule()
+
+    def stop(self):
+        """キューの定期処理を停止"""
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def post_log(self, entry: Any):
+        """ログを追加（どのスレッドからでも呼び出し可能）"""
+        try:
+            self._log_queue.put_nowait(entry)
+            with self._lock:
+                self.stats['posted_logs'] += 1
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped_logs'] += 1
+
+    def request_graph_refresh(self):
+        """グラフ更新を要求（次のフレームで1回だけ実行される）"""
+        with self._lock:
+            self.stats['graph_requests'] += 1
+            if self._graph_pending:
+                self.stats['coalesced_refreshes'] += 1
+            else:
+                self._graph_pending = True
+
+    def call_soon(self, func: Callable, *args):
+        """任意の関数を次のフレームでTkスレッドから実行"""
+        self._task_queue.put((func, args))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+        with self._lock:
+            stats = self.stats.copy()
+        stats['queue_depth'] = self._log_queue.qsize()
+        return stats
+
+    def _schedule(self):
+        if self._running:
+            self._after_id = self.root.after(self.frame_ms, self._drain)
+
+    def _drain(self):
+        """キューを処理（Tkスレッドで実行）"""
+        try:
+            # ログをまとめて取り出し、1回の挿入で反映
+            entries = []
+            while len(entries) < self.max_log_batch:
+                try:
+                    entries.append(self._log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if entries:
+                try:
+                    self.log_sink(entries)
+                except Exception as e:
+                    self.logger.error(f"ログ表示エラー: {e}")
+                with self._lock:
+                    self.stats['log_batches'] += 1
+
+            # 汎用タスクを実行
+            while True:
+                try:
+                    func, args = self._task_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args)
+                except Exception as e:
+                    self.logger.error(f"UIタスク実行エラー: {e}")
+                with self._lock:
+                    self.stats['tasks_run'] += 1
+
+            # グラフ更新要求があれば1回だけ実行
+            with self._lock:
+                refresh = self._graph_pending
+                self._graph_pending = False
+            if refresh:
+                try:
+                    self.graph_refresh()
+                except Exception as e:
+                    self.logger.error(f"グラフ更新エラー: {e}")
+                with self._lock:
+                    self.stats['graph_refreshes'] += 1
+        finally:
+            self._schedule()
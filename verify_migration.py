@@ -8,7 +8,7 @@
 import json
 import os
 from datetime import datetime
-from supabase import create_client, Client
+from supabase_client_factory import create_supabase_client, RequestMetrics
 
 def load_config():
     """設定ファイルを読み込む"""
@@ -37,9 +37,12 @@ def verify_migration():
     
     # Supabaseクライアントを初期化
     try:
-        client = create_client(
+        metrics = RequestMetrics()
+        client = create_supabase_client(
             cloud_config["url"],
-            cloud_config["anon_key"]
+            cloud_config["anon_key"],
+            http_config=cloud_config.get("http"),
+            metrics=metrics
         )
         print("Supabaseに接続しました\n")
     except Exception as e:
@@ -181,6 +184,7 @@ def verify_migration():
     else:
         print("[OK] すべての時間足にデータが正常に存在します")
     
+    print(f"\n{metrics.format_summary()}")
     return results
 
 if __name__ == "__main__":